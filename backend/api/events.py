@@ -6,7 +6,7 @@ from typing import Optional
 
 from fastapi import APIRouter, Query, WebSocket, WebSocketDisconnect
 
-from backend.core.auth import consume_ws_ticket, decode_access_token, is_origin_allowed, is_session_revoked
+from backend.core.auth import consume_ws_ticket_async, decode_access_token, is_origin_allowed, is_session_revoked
 from backend.core.events import ws_manager
 from backend.core.plugin.registry import get_security_settings
 
@@ -119,7 +119,7 @@ async def websocket_endpoint(
 
         # Проверка одноразового билета
         if raw_token.startswith("wst_"):
-            ticket_data = consume_ws_ticket(raw_token)
+            ticket_data = await consume_ws_ticket_async(raw_token)
             if not ticket_data:
                 _log.warning("Rejecting WS connection with invalid or expired ticket")
                 await websocket.close(code=1008, reason="Unauthorized: Invalid ticket")
@@ -144,7 +144,7 @@ async def websocket_endpoint(
     else:
         # Аутентификация отключена системно (auth_enabled = False)
         if raw_token and raw_token.startswith("wst_"):
-            ticket_data = consume_ws_ticket(raw_token)
+            ticket_data = await consume_ws_ticket_async(raw_token)
             if ticket_data:
                 user_id = str(ticket_data["user_id"])
         elif raw_token and raw_token != "system_disabled_auth":
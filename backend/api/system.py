@@ -2,19 +2,46 @@ import asyncio
 import os
 import re
 import shutil
-import sqlite3
 import time
 import uuid
 from pathlib import Path
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, Request, Response, WebSocket, WebSocketDisconnect, status
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, Query, Request, Response, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from starlette.background import BackgroundTask
 
+from backend.core.activity import activity_tracker
 from backend.core.auth import CurrentUser, decode_access_token, require_permission
 from backend.core.audit import log_audit_event
-from backend.core.database import DB_PATH, get_db_connection
+from backend.core.backup import (
+    RESTORE_MAX_BYTES,
+    BackupTooLargeError,
+    BackupUploadWriter,
+    InvalidBackupError,
+    create_online_backup,
+    iter_backup_file,
+    restore_backup_file,
+    verify_backup_file,
+)
+from backend.core.database import (
+    get_db_connection,
+    get_db_pool_stats,
+    get_db_read_connection,
+    get_db_read_pool_stats,
+    settings_cache,
+)
+from backend.core.db_writer import db_writer
+from backend.core.maintenance import db_maintenance
+from backend.core.password_hasher import password_hasher
+from backend.core.rate_limiter import rate_limiter
+from backend.core.shared_state import get_shared_state_stats
+from backend.core.event_fanout import get_event_fanout_stats
+from backend.core.permission_index import permission_index
+from backend.core.principal_cache import invalidate_principals, principal_cache
+from backend.core.revocation import revocation_registry, revoke_sessions
+from backend.core.sql_profiler import sql_profiler
 from backend.core.i18n import tr
 from backend.core.exceptions import NotFoundError, ValidationError, NMSError
 from backend.core.log_providers import RemoteHTTPLogProvider, log_provider_registry, matches_log_level, shared_log_stream_manager
@@ -84,6 +111,38 @@ async def get_system_health():
     }
 
 
+def _collect_runtime_stats() -> dict:
+    from backend.api.users import mfa_tickets
+    from backend.core.auth import ws_tickets
+
+    return {
+        "database": {
+            "pool": get_db_pool_stats(),
+            "read_pool": get_db_read_pool_stats(),
+            "writer": db_writer.get_stats(),
+            "settings_cache": settings_cache.get_stats(),
+            "principal_cache": principal_cache.get_stats(),
+            "activity": activity_tracker.get_stats(),
+            "revocations": revocation_registry.get_stats(),
+            "permission_index": permission_index.get_stats(),
+            "maintenance": db_maintenance.get_status(),
+        },
+        "password_hasher": password_hasher.get_stats(),
+        "rate_limiter": rate_limiter.get_stats(),
+        "shared_state": get_shared_state_stats(),
+        "event_fanout": get_event_fanout_stats(),
+        "tickets": {"ws": ws_tickets.get_stats(), "mfa": mfa_tickets.get_stats()},
+    }
+
+
+@router.get("/runtime")
+async def get_runtime_stats(
+    user: CurrentUser = Depends(require_permission("system.admin")),
+):
+    """Внутренняя статистика процесса: пулы и писатель БД, кэши, хеширование, лимиты, общее состояние."""
+    return await asyncio.to_thread(_collect_runtime_stats)
+
+
 class RemoteLogSourceCreate(BaseModel):
     name: str
     url: str
@@ -93,13 +152,38 @@ class RemoteLogSourceCreate(BaseModel):
 @router.get("/backup")
 async def download_backup(
     request: Request,
+    fmt: str = Query("db", alias="format"),
     user: CurrentUser = Depends(require_permission("system.admin")),
 ):
-    """Скачать резервную копию базы данных nms.db."""
-    if not DB_PATH.exists():
+    """Скачать согласованный онлайн-снимок базы данных nms.db (потоково, со сжатием gzip).
+
+    format=gz — файл .db.gz; иначе .db, сжатый на лету через Content-Encoding, если клиент поддерживает gzip.
+    """
+    from backend.core import database
+
+    db_path = Path(database.DB_PATH)
+    if not db_path.exists():
         raise NotFoundError(message=tr(request, "db_file_not_found"), code="DB_FILE_NOT_FOUND")
 
+    snapshot_path = db_path.parent / f"backup_{uuid.uuid4().hex}.db"
+    try:
+        await asyncio.to_thread(create_online_backup, snapshot_path, source_path=db_path)
+    except Exception as exc:
+        snapshot_path.unlink(missing_ok=True)
+        raise NMSError(message=tr(request, "db_backup_error", exc=str(exc)), status_code=500, code="DB_BACKUP_ERROR", details={"exc": str(exc)})
+
     filename = f"nms-backup-{time.strftime('%Y%m%d-%H%M%S')}.db"
+    headers = {}
+    if fmt == "gz":
+        filename += ".gz"
+        media_type = "application/gzip"
+        compress = True
+    else:
+        media_type = "application/x-sqlite3"
+        compress = "gzip" in request.headers.get("accept-encoding", "").lower()
+        if compress:
+            headers["Content-Encoding"] = "gzip"
+    headers["Content-Disposition"] = f'attachment; filename="{filename}"'
 
     log_audit_event(
         user_id=user.id,
@@ -110,10 +194,11 @@ async def download_backup(
         ip_address=request.client.host if request.client else None,
     )
 
-    return FileResponse(
-        path=DB_PATH,
-        filename=filename,
-        media_type="application/x-sqlite3",
+    return StreamingResponse(
+        iter_backup_file(snapshot_path, compress=compress),
+        media_type=media_type,
+        headers=headers,
+        background=BackgroundTask(snapshot_path.unlink, missing_ok=True),
     )
 
 
@@ -122,40 +207,36 @@ async def restore_backup(
     request: Request,
     user: CurrentUser = Depends(require_permission("system.admin")),
 ):
-    """Восстановление системы из загруженного файла .db."""
-    content = await request.body()
-    if not content or len(content) < 100:
-        raise ValidationError(message=tr(request, "backup_file_empty"), code="BACKUP_FILE_EMPTY")
+    """Восстановление системы из загруженного файла .db (или .db.gz), принимаемого потоком."""
+    from backend.core import database
 
-    temp_restore_path = DB_PATH.parent / "temp_restore.db"
-    try:
-        with open(temp_restore_path, "wb") as f:
-            f.write(content)
+    db_path = Path(database.DB_PATH)
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > RESTORE_MAX_BYTES:
+        raise NMSError(message=tr(request, "backup_file_too_large"), status_code=413, code="BACKUP_FILE_TOO_LARGE")
 
-        # Проверка целостности SQLite файла
+    temp_restore_path = db_path.parent / f"temp_restore_{uuid.uuid4().hex}.db"
+    try:
+        writer = await asyncio.to_thread(BackupUploadWriter, temp_restore_path)
         try:
-            conn = sqlite3.connect(temp_restore_path)
-            cur = conn.cursor()
-            res = cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='users'").fetchone()
-            conn.close()
-            if not res:
-                if temp_restore_path.exists():
-                    temp_restore_path.unlink()
-                raise ValidationError(message=tr(request, "db_no_users_table"), code="DB_INVALID_BACKUP")
-        except ValidationError:
+            async for chunk in request.stream():
+                if chunk:
+                    await asyncio.to_thread(writer.write, chunk)
+            await asyncio.to_thread(writer.close)
+        except BaseException:
+            writer.abort()
             raise
-        except Exception as e:
-            if temp_restore_path.exists():
-                temp_restore_path.unlink()
-            raise ValidationError(message=tr(request, "db_invalid_backup", exc=str(e)), code="DB_INVALID_BACKUP", details={"exc": str(e)})
+
+        # Проверка целостности SQLite файла вне event loop
+        await asyncio.to_thread(verify_backup_file, temp_restore_path)
 
         # Резервная копия текущей БД
-        backup_current = DB_PATH.parent / f"nms.db.bak_{int(time.time())}"
-        if DB_PATH.exists():
-            shutil.copy2(DB_PATH, backup_current)
+        if db_path.exists():
+            backup_current = db_path.parent / f"nms.db.bak_{int(time.time())}"
+            await asyncio.to_thread(create_online_backup, backup_current, source_path=db_path)
 
-        # Замена базы данных
-        shutil.move(temp_restore_path, DB_PATH)
+        # Перенос данных в живую БД
+        await asyncio.to_thread(restore_backup_file, temp_restore_path)
 
         log_audit_event(
             user_id=user.id,
@@ -167,12 +248,20 @@ async def restore_backup(
         )
 
         return {"message": tr(request, "db_restored_success")}
+    except BackupTooLargeError:
+        raise NMSError(message=tr(request, "backup_file_too_large"), status_code=413, code="BACKUP_FILE_TOO_LARGE")
+    except InvalidBackupError as exc:
+        if exc.reason == "empty":
+            raise ValidationError(message=tr(request, "backup_file_empty"), code="BACKUP_FILE_EMPTY")
+        if exc.reason == "no_users":
+            raise ValidationError(message=tr(request, "db_no_users_table"), code="DB_INVALID_BACKUP")
+        raise ValidationError(message=tr(request, "db_invalid_backup", exc=str(exc)), code="DB_INVALID_BACKUP", details={"exc": str(exc)})
     except NMSError:
         raise
     except Exception as exc:
-        if temp_restore_path.exists():
-            temp_restore_path.unlink()
         raise NMSError(message=tr(request, "db_restore_error", exc=str(exc)), status_code=500, code="DB_RESTORE_ERROR", details={"exc": str(exc)})
+    finally:
+        temp_restore_path.unlink(missing_ok=True)
 
 
 @router.get("/logs")
@@ -302,8 +391,76 @@ async def get_websocket_metrics(
     user: CurrentUser = Depends(require_permission("system.admin")),
 ):
     """Получить метрики активности WebSocket соединений."""
+    from backend.core.bus import event_bus
     from backend.core.events import ws_manager
-    return ws_manager.get_metrics()
+    return {**ws_manager.get_metrics(), "event_bus": event_bus.metrics.get_summary()}
+
+
+@router.get("/event-bus")
+async def get_event_bus_metrics(
+    limit: int = Query(50, ge=1, le=1000),
+    sort: str = Query("total", pattern="^(total|max|avg|p95|calls|failures|dropped)$"),
+    topic_sort: str = Query("publishes", pattern="^(publishes|rate|deliveries|failures|dropped)$"),
+    user: CurrentUser = Depends(require_permission("system.admin")),
+):
+    """Счётчики шины событий по топикам и гистограммы задержек обработчиков (самые медленные первыми)."""
+    from backend.core.bus import event_bus
+    from backend.core.bus_rpc import request_router
+    from backend.core.durable_events import durable_events
+    return {
+        "summary": event_bus.metrics.get_summary(),
+        "topics": event_bus.metrics.get_topics(limit=limit, sort=topic_sort),
+        "handlers": event_bus.metrics.get_handlers(limit=limit, sort=sort),
+        "mailboxes": event_bus.get_stats()["mailboxes"],
+        "durable": durable_events.get_stats(),
+        "requests": request_router.get_stats(),
+    }
+
+
+@router.post("/event-bus/reset")
+async def reset_event_bus_metrics(
+    user: CurrentUser = Depends(require_permission("system.admin")),
+):
+    """Сбросить накопленные метрики шины событий."""
+    from backend.core.bus import event_bus
+    event_bus.metrics.reset()
+    return {"ok": True}
+
+
+def _build_sql_profile(limit: int, sort: str, explain: bool) -> dict:
+    statements = sql_profiler.get_top(limit=limit, sort=sort)
+    if explain and statements:
+        conn = get_db_read_connection()
+        try:
+            for item in statements:
+                item["query_plan"] = sql_profiler.explain(item["sql"], conn)
+        finally:
+            conn.close()
+    return {
+        "profiler": sql_profiler.get_stats(),
+        "statements": statements,
+        "slow_log": sql_profiler.get_slow_log(),
+    }
+
+
+@router.get("/sql-profile")
+async def get_sql_profile(
+    limit: int = Query(20, ge=1, le=500),
+    sort: str = Query("total", pattern="^(total|max|avg|p95|count)$"),
+    explain: bool = True,
+    user: CurrentUser = Depends(require_permission("system.admin")),
+):
+    """Худшие SQL-запросы (гистограммы задержек, EXPLAIN QUERY PLAN) и журнал медленных запросов."""
+    return await asyncio.to_thread(_build_sql_profile, limit, sort, explain)
+
+
+@router.post("/sql-profile/reset")
+async def reset_sql_profile(
+    user: CurrentUser = Depends(require_permission("system.admin")),
+):
+    """Сбросить накопленную статистику профилировщика SQL."""
+    sql_profiler.reset()
+    return {"ok": True}
 
 
 @router.websocket("/logs/{log_name}/stream")
@@ -315,7 +472,7 @@ async def stream_log_websocket(
     token: Optional[str] = None,
 ):
     """Безопасный WebSocket стриминг логов в реальном времени с поддержкой RFC 6455 subprotocol и ticket-auth."""
-    from backend.core.auth import consume_ws_ticket, is_origin_allowed, is_session_revoked, user_has_permission
+    from backend.core.auth import consume_ws_ticket_async, is_origin_allowed, is_session_revoked, user_has_permission
 
     # 1. Защита от CSWSH
     origin = websocket.headers.get("origin")
@@ -351,7 +508,7 @@ async def stream_log_websocket(
 
         user_id = None
         if raw_token.startswith("wst_"):
-            ticket_data = consume_ws_ticket(raw_token)
+            ticket_data = await consume_ws_ticket_async(raw_token)
             if not ticket_data:
                 await websocket.close(code=1008, reason="Unauthorized: Invalid ticket")
                 return
@@ -441,11 +598,12 @@ async def list_active_sessions(
                 "role_name": r["role_name"],
                 "ip_address": r["ip_address"],
                 "user_agent": r["user_agent"],
-                "last_seen": r["last_seen"],
+                "last_seen": activity_tracker.session_last_seen(r["token_jti"], r["last_seen"]),
                 "created_at": r["created_at"],
                 "is_active": True,
                 "is_current": bool(current_jti and r["token_jti"] == current_jti),
             })
+        sessions.sort(key=lambda s: str(s["last_seen"] or ""), reverse=True)
         return sessions
     finally:
         conn.close()
@@ -470,6 +628,10 @@ async def terminate_all_sessions(
 
     conn = get_db_connection()
     try:
+        revoked_jtis = [
+            r[0] for r in conn.execute("SELECT token_jti FROM active_sessions WHERE is_revoked = 0").fetchall()
+            if r[0] and not (keep_current and r[0] == current_jti)
+        ]
         with conn:
             if keep_current and current_jti:
                 conn.execute("UPDATE active_sessions SET is_revoked = 1 WHERE token_jti != ?", (current_jti,))
@@ -477,6 +639,8 @@ async def terminate_all_sessions(
             else:
                 conn.execute("UPDATE active_sessions SET is_revoked = 1")
                 conn.execute("UPDATE users SET token_valid_after = ?", (now,))
+        revoke_sessions(revoked_jtis)
+        invalidate_principals(everything=True)
 
         log_audit_event(
             user_id=user.id,
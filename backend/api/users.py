@@ -13,8 +13,10 @@ from pydantic import BaseModel, EmailStr
 import hashlib
 import json
 import secrets
+import sqlite3
+from backend.core.activity import activity_tracker
 from backend.core.crypto import encrypt_secret, decrypt_secret, mask_secret
-from backend.core.rate_limiter import rate_limiter
+from backend.core.rate_limiter import rate_limit, request_ip
 from backend.core.auth import create_refresh_token, decode_refresh_token
 
 from backend.core.exceptions import NMSError, NotFoundError, ValidationError, AuthenticationError, PermissionDeniedError
@@ -22,7 +24,7 @@ from backend.core.auth import (
     CurrentUser,
     clear_permissions_cache,
     create_access_token,
-    create_ws_ticket,
+    create_ws_ticket_async,
     decode_access_token,
     generate_qr_svg,
     generate_totp_secret,
@@ -33,14 +35,19 @@ from backend.core.auth import (
     verify_totp_code,
 )
 from backend.core.audit import log_audit_event
-from backend.core.database import get_db_connection, hash_password, verify_password
+from backend.core.database import get_db_connection, get_db_read_connection, password_needs_rehash
+from backend.core.db_writer import db_writer
+from backend.core.password_hasher import KDFBusyError, password_hasher
 from backend.core.i18n import get_lang, tr
 from backend.core.plugin.registry import get_security_settings, save_security_settings
+from backend.core.principal_cache import invalidate_principals
+from backend.core.revocation import live_session_jtis, revoke_sessions
+from backend.core.ticket_store import create_ticket_store
 
 router = APIRouter(prefix="/api", tags=["auth_users_rbac"])
 
 # Хранилище билетов для второго шага MFA (ticket -> {user_id, username, expires_at})
-mfa_tickets: Dict[str, Dict[str, Any]] = {}
+mfa_tickets = create_ticket_store("mfa", ttl=300)
 
 
 def generate_mfa_recovery_codes(count: int = 8) -> tuple[list[str], list[str]]:
@@ -57,24 +64,32 @@ def generate_mfa_recovery_codes(count: int = 8) -> tuple[list[str], list[str]]:
     return plain_codes, hashed_codes
 
 
-def verify_and_consume_recovery_code(user_id: str, code: str, current_hashed_json: str | None, conn) -> bool:
-    """Проверяет кодовую фразу против хешей и сжигает использованную при совпадении."""
+def _remaining_recovery_codes(code: str, current_hashed_json: str | None) -> list[str] | None:
+    """Хеши recovery-кодов без использованного, если код совпал; иначе None."""
     if not current_hashed_json:
-        return False
+        return None
     try:
         hashes: list[str] = json.loads(current_hashed_json)
     except Exception:
-        return False
+        return None
 
     code_hash = hashlib.sha256(code.strip().upper().encode("utf-8")).hexdigest()
-    if code_hash in hashes:
-        hashes.remove(code_hash)
-        conn.execute(
-            "UPDATE users SET mfa_recovery_codes = ? WHERE id = ?",
-            (json.dumps(hashes), user_id),
-        )
-        return True
-    return False
+    if code_hash not in hashes:
+        return None
+    hashes.remove(code_hash)
+    return hashes
+
+
+def verify_and_consume_recovery_code(user_id: str, code: str, current_hashed_json: str | None, conn) -> bool:
+    """Проверяет кодовую фразу против хешей и сжигает использованную при совпадении."""
+    hashes = _remaining_recovery_codes(code, current_hashed_json)
+    if hashes is None:
+        return False
+    conn.execute(
+        "UPDATE users SET mfa_recovery_codes = ? WHERE id = ?",
+        (json.dumps(hashes), user_id),
+    )
+    return True
 
 
 # ── Схемы данных (Pydantic) ──────────────────────────────────────────
@@ -153,26 +168,110 @@ class RoleCreateUpdateRequest(BaseModel):
 @router.post("/auth/ws-ticket")
 async def get_ws_ticket(user: CurrentUser = Depends(get_current_user)):
     """Выдача одноразового 30-секундного билета для подключения к WebSocket."""
-    ticket = create_ws_ticket(user_id=user.id, jti=user.token_jti)
+    ticket = await create_ws_ticket_async(user_id=user.id, jti=user.token_jti)
     return {"ticket": ticket, "expires_in": 30}
 
 
+def _is_locked(locked_until: Any, now: datetime.datetime) -> bool:
+    """Действует ли блокировка входа до locked_until (ISO-строка) на момент now."""
+    if not locked_until:
+        return False
+    try:
+        locked_until_dt = datetime.datetime.fromisoformat(str(locked_until))
+    except ValueError:
+        return False
+    if locked_until_dt.tzinfo is None:
+        locked_until_dt = locked_until_dt.replace(tzinfo=datetime.timezone.utc)
+    return now < locked_until_dt
+
+
+def _store_failed_login(conn, user_id: str, max_attempts: int, lockout_minutes: int) -> str:
+    """Атомарно учесть неудачную попытку входа (операция писателя).
+
+    Возвращает "failed", "locked" (попытка исчерпала лимит) или "already_locked"
+    (вход уже заблокирован параллельной попыткой).
+    """
+    row = conn.execute(
+        """
+        UPDATE users SET failed_login_attempts = COALESCE(failed_login_attempts, 0) + 1
+        WHERE id = ? RETURNING failed_login_attempts, locked_until
+        """,
+        (user_id,),
+    ).fetchone()
+    if row is None:
+        return "failed"
+    failed_cnt, locked_until = row[0], row[1]
+    now = datetime.datetime.now(datetime.timezone.utc)
+    if _is_locked(locked_until, now):
+        return "already_locked"
+    if failed_cnt >= max_attempts:
+        conn.execute(
+            "UPDATE users SET locked_until = ? WHERE id = ?",
+            ((now + datetime.timedelta(minutes=lockout_minutes)).isoformat(), user_id),
+        )
+        return "locked"
+    return "failed"
+
+
+def _store_successful_login(conn, user_id: str, new_hash: Optional[str]) -> bool:
+    """Сбросить счётчик неудачных попыток; False, если вход успел заблокироваться параллельной попыткой."""
+    row = conn.execute("SELECT locked_until FROM users WHERE id = ?", (user_id,)).fetchone()
+    if row is not None and _is_locked(row[0], datetime.datetime.now(datetime.timezone.utc)):
+        return False
+    conn.execute("UPDATE users SET last_login = CURRENT_TIMESTAMP, failed_login_attempts = 0, locked_until = NULL WHERE id = ?", (user_id,))
+    if new_hash is not None:
+        conn.execute("UPDATE users SET hashed_password = ? WHERE id = ?", (new_hash, user_id))
+    return True
+
+
+def _account_locked_error(request: Request, user_id: str, username: str) -> NMSError:
+    log_audit_event(
+        user_id=user_id,
+        username=username,
+        action="auth.login_failed",
+        resource="auth",
+        details=tr(request, "login_attempt_locked"),
+        ip_address=request.client.host if request.client else None,
+    )
+    return NMSError(message=tr(request, "account_temporarily_locked"), status_code=429, code="ACCOUNT_TEMPORARILY_LOCKED")
+
+
+def _store_mfa_login(
+    conn,
+    user_id: str,
+    remaining_codes: Optional[list[str]],
+    enc_secret: Optional[str],
+    recovery_hashes: Optional[list[str]],
+) -> None:
+    if remaining_codes is not None:
+        conn.execute("UPDATE users SET mfa_recovery_codes = ? WHERE id = ?", (json.dumps(remaining_codes), user_id))
+    if enc_secret is not None:
+        conn.execute(
+            "UPDATE users SET mfa_enabled = 1, mfa_secret = ?, mfa_recovery_codes = ? WHERE id = ?",
+            (enc_secret, json.dumps(recovery_hashes), user_id),
+        )
+    conn.execute("UPDATE users SET last_login = CURRENT_TIMESTAMP, failed_login_attempts = 0, locked_until = NULL WHERE id = ?", (user_id,))
+
+
 @router.post("/auth/login", response_model=LoginResponse)
+@rate_limit(
+    "login", max_requests=10, window_seconds=60,
+    key=lambda request, kwargs: f"{request_ip(request)}:{kwargs['body'].username}",
+    message="Too many login attempts. Please wait.",
+)
 async def login(body: LoginRequest, request: Request, response: Response):
     """Вход пользователя в систему."""
     sec_settings = get_security_settings()
 
-    client_ip = request.client.host if request and request.client else "local"
-    rate_key = f"login:{client_ip}:{body.username}"
-    if rate_limiter.is_rate_limited(rate_key, max_requests=10, window_seconds=60):
-        raise NMSError(message=tr(request, "rate_limit_exceeded", default="Too many login attempts. Please wait."), status_code=429, code="RATE_LIMIT_EXCEEDED")
+    client_ip = request_ip(request)
 
     ip_whitelist = sec_settings.get("ip_whitelist", "")
     if ip_whitelist and request and request.client:
         if not is_ip_whitelisted(client_ip, ip_whitelist):
             raise PermissionDeniedError(message=tr(request, "ip_access_denied", client_ip=client_ip), code="IP_ACCESS_DENIED")
 
-    conn = get_db_connection()
+    # Соединение не удерживается на время проверки пароля: KDF может занимать сотни миллисекунд
+    conn = get_db_read_connection()
     try:
         user = conn.execute(
             """
@@ -184,190 +283,175 @@ async def login(body: LoginRequest, request: Request, response: Response):
             """,
             (body.username,),
         ).fetchone()
+        perms = []
+        if user:
+            perm_rows = conn.execute(
+                "SELECT permission_id FROM role_permissions WHERE role_id = ?",
+                (user["role_id"],),
+            ).fetchall()
+            perms = [p["permission_id"] for p in perm_rows]
+    finally:
+        conn.close()
 
-        now = datetime.datetime.now(datetime.timezone.utc)
-        if user and user["locked_until"]:
-            try:
-                locked_until_dt = datetime.datetime.fromisoformat(str(user["locked_until"]))
-                if locked_until_dt.tzinfo is None:
-                    locked_until_dt = locked_until_dt.replace(tzinfo=datetime.timezone.utc)
-                if now < locked_until_dt:
-                    log_audit_event(
-                        user_id=user["id"],
-                        username=body.username,
-                        action="auth.login_failed",
-                        resource="auth",
-                        details=tr(request, "login_attempt_locked"),
-                        ip_address=request.client.host if request.client else None,
-                    )
-                    raise NMSError(message=tr(request, "account_temporarily_locked"), status_code=429, code="ACCOUNT_TEMPORARILY_LOCKED")
-            except NMSError:
-                raise
-            except Exception:
-                pass
-
-        if not user or not verify_password(body.password, user["hashed_password"]):
-            if user:
-                failed_cnt = (user["failed_login_attempts"] or 0) + 1
-                max_attempts = int(sec_settings.get("max_login_attempts", 5))
-                lockout_duration = int(sec_settings.get("lockout_duration", 30))
-                if failed_cnt >= max_attempts:
-                    locked_until_time = (now + datetime.timedelta(minutes=lockout_duration)).isoformat()
-                    conn.execute(
-                        "UPDATE users SET failed_login_attempts = ?, locked_until = ? WHERE id = ?",
-                        (failed_cnt, locked_until_time, user["id"]),
-                    )
-                    conn.commit()
-                    log_audit_event(
-                        user_id=user["id"],
-                        username=body.username,
-                        action="auth.login_lockout",
-                        resource="auth",
-                        details=tr(request, "account_locked_duration_audit", lockout_duration=lockout_duration),
-                        ip_address=request.client.host if request.client else None,
-                    )
-                    raise NMSError(message=tr(request, "account_locked_duration_detail", lockout_duration=lockout_duration), status_code=429, code="ACCOUNT_LOCKED_DURATION")
-                else:
-                    conn.execute("UPDATE users SET failed_login_attempts = ? WHERE id = ?", (failed_cnt, user["id"]))
-                    conn.commit()
-
-            log_audit_event(
-                user_id=None,
-                username=body.username,
-                action="auth.login_failed",
-                resource="auth",
-                details=tr(request, "invalid_credentials"),
-                ip_address=request.client.host if request.client else None,
-            )
-            raise AuthenticationError(message=tr(request, "invalid_credentials"), code="INVALID_CREDENTIALS")
+    if user and _is_locked(user["locked_until"], datetime.datetime.now(datetime.timezone.utc)):
+        raise _account_locked_error(request, user["id"], body.username)
+
+    if not user or not await _verify_password(request, body.password, user["hashed_password"]):
+        if user:
+            max_attempts = int(sec_settings.get("max_login_attempts", 5))
+            lockout_duration = int(sec_settings.get("lockout_duration", 30))
+            # Счётчик увеличивается в писателе: параллельные попытки не теряют инкременты
+            outcome = await db_writer.execute_async(_store_failed_login, user["id"], max_attempts, lockout_duration)
+            if outcome == "already_locked":
+                raise _account_locked_error(request, user["id"], body.username)
+            if outcome == "locked":
+                log_audit_event(
+                    user_id=user["id"],
+                    username=body.username,
+                    action="auth.login_lockout",
+                    resource="auth",
+                    details=tr(request, "account_locked_duration_audit", lockout_duration=lockout_duration),
+                    ip_address=request.client.host if request.client else None,
+                )
+                raise NMSError(message=tr(request, "account_locked_duration_detail", lockout_duration=lockout_duration), status_code=429, code="ACCOUNT_LOCKED_DURATION")
 
-        if not user["is_active"]:
-            raise PermissionDeniedError(message=tr(request, "account_locked"), code="ACCOUNT_LOCKED")
+        log_audit_event(
+            user_id=None,
+            username=body.username,
+            action="auth.login_failed",
+            resource="auth",
+            details=tr(request, "invalid_credentials"),
+            ip_address=request.client.host if request.client else None,
+        )
+        raise AuthenticationError(message=tr(request, "invalid_credentials"), code="INVALID_CREDENTIALS")
 
-        # Проверка MFA
-        force_mfa = bool(sec_settings.get("force_mfa", False))
-        user_mfa_enabled = bool(user["mfa_enabled"] if "mfa_enabled" in user.keys() and user["mfa_enabled"] else False)
-        raw_mfa_secret = user["mfa_secret"] if "mfa_secret" in user.keys() else None
-        user_mfa_secret = decrypt_secret(raw_mfa_secret) if raw_mfa_secret else None
+    if not user["is_active"]:
+        raise PermissionDeniedError(message=tr(request, "account_locked"), code="ACCOUNT_LOCKED")
 
-        if user_mfa_enabled and user_mfa_secret:
-            mfa_ticket = f"mfat_{uuid.uuid4().hex}"
-            mfa_tickets[mfa_ticket] = {
+    # Проверка MFA
+    force_mfa = bool(sec_settings.get("force_mfa", False))
+    user_mfa_enabled = bool(user["mfa_enabled"] if "mfa_enabled" in user.keys() and user["mfa_enabled"] else False)
+    raw_mfa_secret = user["mfa_secret"] if "mfa_secret" in user.keys() else None
+    user_mfa_secret = decrypt_secret(raw_mfa_secret) if raw_mfa_secret else None
+
+    if user_mfa_enabled and user_mfa_secret:
+        mfa_ticket = await mfa_tickets.issue_async(
+            "mfat_",
+            {
                 "user_id": user["id"],
                 "username": user["username"],
                 "mfa_secret": user_mfa_secret,
                 "is_setup": False,
-                "expires_at": time.time() + 300,
-            }
-            return {
-                "token": "",
-                "mfa_required": True,
-                "mfa_setup_required": False,
-                "mfa_ticket": mfa_ticket,
-                "must_change_password": bool(user["must_change_password"]),
-                "user": {},
-            }
-        elif force_mfa:
-            setup_secret = generate_totp_secret()
-            totp_uri = get_totp_uri(setup_secret, user["username"], issuer="NMS WebUI")
-            qr_svg = generate_qr_svg(totp_uri)
-
-            mfa_ticket = f"mfat_{uuid.uuid4().hex}"
-            mfa_tickets[mfa_ticket] = {
+            },
+        )
+        return {
+            "token": "",
+            "mfa_required": True,
+            "mfa_setup_required": False,
+            "mfa_ticket": mfa_ticket,
+            "must_change_password": bool(user["must_change_password"]),
+            "user": {},
+        }
+    elif force_mfa:
+        setup_secret = generate_totp_secret()
+        totp_uri = get_totp_uri(setup_secret, user["username"], issuer="NMS WebUI")
+        qr_svg = generate_qr_svg(totp_uri)
+
+        mfa_ticket = await mfa_tickets.issue_async(
+            "mfat_",
+            {
                 "user_id": user["id"],
                 "username": user["username"],
                 "mfa_secret": setup_secret,
                 "is_setup": True,
-                "expires_at": time.time() + 300,
-            }
-            return {
-                "token": "",
-                "mfa_required": True,
-                "mfa_setup_required": True,
-                "mfa_ticket": mfa_ticket,
-                "qr_code": qr_svg,
-                "secret": setup_secret,
-                "must_change_password": bool(user["must_change_password"]),
-                "user": {},
-            }
-
-        # Сброс неверных входов при успешной аутентификации
-        conn.execute("UPDATE users SET last_login = CURRENT_TIMESTAMP, failed_login_attempts = 0, locked_until = NULL WHERE id = ?", (user["id"],))
-        conn.commit()
-
-        user_agent = request.headers.get("user-agent") if request else "Browser Session"
-        token = create_access_token(user["id"], user["username"], client_ip, user_agent)
-        token_payload = decode_access_token(token)
-        jti = token_payload.get("jti") if token_payload else f"jti-{uuid.uuid4().hex}"
-        refresh_tok = create_refresh_token(user["id"], user["username"], jti)
-
-        response.set_cookie(
-            key="nms_refresh_token",
-            value=refresh_tok,
-            httponly=True,
-            samesite="lax",
-            secure=False,
-            max_age=7 * 86400,
+            },
         )
+        return {
+            "token": "",
+            "mfa_required": True,
+            "mfa_setup_required": True,
+            "mfa_ticket": mfa_ticket,
+            "qr_code": qr_svg,
+            "secret": setup_secret,
+            "must_change_password": bool(user["must_change_password"]),
+            "user": {},
+        }
 
-        must_change = bool(user["must_change_password"])
+    new_hash = None
+    if password_needs_rehash(user["hashed_password"]):
+        # Число итераций PBKDF2 изменилось — пересчитать хеш, пока известен пароль (вне транзакции)
+        try:
+            new_hash = await password_hasher.hash(body.password)
+        except KDFBusyError:
+            pass
+    # Сброс неверных входов при успешной аутентификации — одной короткой транзакцией
+    if not await db_writer.execute_async(_store_successful_login, user["id"], new_hash):
+        raise _account_locked_error(request, user["id"], body.username)
+
+    user_agent = request.headers.get("user-agent") if request else "Browser Session"
+    token = create_access_token(user["id"], user["username"], client_ip, user_agent)
+    token_payload = decode_access_token(token)
+    jti = token_payload.get("jti") if token_payload else f"jti-{uuid.uuid4().hex}"
+    refresh_tok = create_refresh_token(user["id"], user["username"], jti)
+
+    response.set_cookie(
+        key="nms_refresh_token",
+        value=refresh_tok,
+        httponly=True,
+        samesite="lax",
+        secure=False,
+        max_age=7 * 86400,
+    )
 
-        perm_rows = conn.execute(
-            "SELECT permission_id FROM role_permissions WHERE role_id = ?",
-            (user["role_id"],),
-        ).fetchall()
-        perms = [p["permission_id"] for p in perm_rows]
+    must_change = bool(user["must_change_password"])
 
-        log_audit_event(
-            user_id=user["id"],
-            username=user["username"],
-            action="auth.login_success",
-            resource="auth",
-            details=tr(request, "successful_login"),
-            ip_address=request.client.host if request.client else None,
-        )
+    log_audit_event(
+        user_id=user["id"],
+        username=user["username"],
+        action="auth.login_success",
+        resource="auth",
+        details=tr(request, "successful_login"),
+        ip_address=request.client.host if request.client else None,
+    )
 
-        from backend.core.bus import event_bus
-        event_bus.publish("core.users.login", {"user_id": user["id"], "username": user["username"]}, is_core=True)
+    from backend.core.bus import event_bus
+    event_bus.publish("core.users.login", {"user_id": user["id"], "username": user["username"]}, is_core=True)
 
-        return {
-            "token": token,
-            "refresh_token": refresh_tok,
+    return {
+        "token": token,
+        "refresh_token": refresh_tok,
+        "must_change_password": must_change,
+        "mfa_required": False,
+        "user": {
+            "id": user["id"],
+            "username": user["username"],
+            "full_name": user["full_name"],
+            "email": user["email"],
+            "uid": user["uid"],
+            "role_id": user["role_id"],
+            "role_name": user["role_name"],
+            "avatar": user["avatar"],
+            "permissions": perms,
             "must_change_password": must_change,
-            "mfa_required": False,
-            "user": {
-                "id": user["id"],
-                "username": user["username"],
-                "full_name": user["full_name"],
-                "email": user["email"],
-                "uid": user["uid"],
-                "role_id": user["role_id"],
-                "role_name": user["role_name"],
-                "avatar": user["avatar"],
-                "permissions": perms,
-                "must_change_password": must_change,
-            },
-        }
-    finally:
-        conn.close()
+        },
+    }
 
 
 @router.post("/auth/mfa/verify", response_model=LoginResponse)
+@rate_limit("mfa_verify", max_requests=10, window_seconds=60, message="Too many MFA attempts. Please wait.")
 async def verify_mfa_login(body: MfaVerifyRequest, request: Request, response: Response):
     """Подтверждение шага MFA по мфа-билету и 6-значному коду или recovery-коду."""
-    client_ip = request.client.host if request and request.client else "local"
-    rate_key = f"mfa_verify:{client_ip}"
-    if rate_limiter.is_rate_limited(rate_key, max_requests=10, window_seconds=60):
-        raise NMSError(message=tr(request, "rate_limit_exceeded", default="Too many MFA attempts. Please wait."), status_code=429, code="RATE_LIMIT_EXCEEDED")
+    client_ip = request_ip(request)
 
-    ticket_info = mfa_tickets.get(body.mfa_ticket)
-    if not ticket_info or time.time() > ticket_info["expires_at"]:
+    ticket_info = await mfa_tickets.get_async(body.mfa_ticket)
+    if not ticket_info:
         raise AuthenticationError(message=tr(request, "login_session_expired"), code="LOGIN_SESSION_EXPIRED")
 
     user_id = ticket_info["user_id"]
     mfa_secret = ticket_info["mfa_secret"]
 
-    conn = get_db_connection()
+    # Соединение не удерживается на время обращения к хранилищу билетов и записи через писателя
+    conn = get_db_read_connection()
     try:
         user = conn.execute(
             """
@@ -379,109 +463,107 @@ async def verify_mfa_login(body: MfaVerifyRequest, request: Request, response: R
             """,
             (user_id,),
         ).fetchone()
+        perm_rows = conn.execute(
+            "SELECT permission_id FROM role_permissions WHERE role_id = ?",
+            (user["role_id"],),
+        ).fetchall() if user else []
+    finally:
+        conn.close()
 
-        if not user:
-            raise NotFoundError(message=tr(request, "user_not_found"), code="USER_NOT_FOUND")
-
-        raw_db_secret = user["mfa_secret"] if "mfa_secret" in user.keys() else None
-        secret_to_check = mfa_secret or (decrypt_secret(raw_db_secret) if raw_db_secret else None)
-
-        is_valid = False
-        if secret_to_check and verify_totp_code(secret_to_check, body.code):
-            is_valid = True
-        elif verify_and_consume_recovery_code(user["id"], body.code, user["mfa_recovery_codes"] if "mfa_recovery_codes" in user.keys() else None, conn):
-            is_valid = True
-
-        if not is_valid:
-            log_audit_event(
-                user_id=user["id"],
-                username=user["username"],
-                action="auth.mfa_failed",
-                resource="auth",
-                details=tr(request, "invalid_2fa_code"),
-                ip_address=request.client.host if request.client else None,
-            )
-            raise AuthenticationError(message=tr(request, "invalid_2fa_code"), code="INVALID_2FA_CODE")
-
-        is_setup = ticket_info.get("is_setup", False)
-        mfa_tickets.pop(body.mfa_ticket, None)
-
-        recovery_plain = None
-        if is_setup:
-            enc_secret = encrypt_secret(secret_to_check)
-            recovery_plain, recovery_hashes = generate_mfa_recovery_codes()
-            conn.execute(
-                "UPDATE users SET mfa_enabled = 1, mfa_secret = ?, mfa_recovery_codes = ? WHERE id = ?",
-                (enc_secret, json.dumps(recovery_hashes), user["id"]),
-            )
-            log_audit_event(
-                user_id=user["id"],
-                username=user["username"],
-                action="user.mfa_enabled",
-                resource="user",
-                details=tr(request, "2fa_forcibly_enabled"),
-                ip_address=request.client.host if request and request.client else None,
-            )
+    if not user:
+        raise NotFoundError(message=tr(request, "user_not_found"), code="USER_NOT_FOUND")
 
-        conn.execute("UPDATE users SET last_login = CURRENT_TIMESTAMP, failed_login_attempts = 0, locked_until = NULL WHERE id = ?", (user["id"],))
-        conn.commit()
+    raw_db_secret = user["mfa_secret"] if "mfa_secret" in user.keys() else None
+    secret_to_check = mfa_secret or (decrypt_secret(raw_db_secret) if raw_db_secret else None)
 
-        user_agent = request.headers.get("user-agent") if request else "Browser Session"
-        token = create_access_token(user["id"], user["username"], client_ip, user_agent)
-        token_payload = decode_access_token(token)
-        jti = token_payload.get("jti") if token_payload else f"jti-{uuid.uuid4().hex}"
-        refresh_tok = create_refresh_token(user["id"], user["username"], jti)
+    remaining_codes = None
+    is_valid = bool(secret_to_check and verify_totp_code(secret_to_check, body.code))
+    if not is_valid:
+        remaining_codes = _remaining_recovery_codes(body.code, user["mfa_recovery_codes"] if "mfa_recovery_codes" in user.keys() else None)
+        is_valid = remaining_codes is not None
 
-        response.set_cookie(
-            key="nms_refresh_token",
-            value=refresh_tok,
-            httponly=True,
-            samesite="lax",
-            secure=False,
-            max_age=7 * 86400,
+    if not is_valid:
+        log_audit_event(
+            user_id=user["id"],
+            username=user["username"],
+            action="auth.mfa_failed",
+            resource="auth",
+            details=tr(request, "invalid_2fa_code"),
+            ip_address=request.client.host if request.client else None,
         )
+        raise AuthenticationError(message=tr(request, "invalid_2fa_code"), code="INVALID_2FA_CODE")
 
-        must_change = bool(user["must_change_password"])
-
-        perm_rows = conn.execute(
-            "SELECT permission_id FROM role_permissions WHERE role_id = ?",
-            (user["role_id"],),
-        ).fetchall()
-        perms = [p["permission_id"] for p in perm_rows]
+    # Билет гасится атомарно: параллельный запрос с тем же билетом получит отказ
+    if await mfa_tickets.consume_async(body.mfa_ticket) is None:
+        raise AuthenticationError(message=tr(request, "login_session_expired"), code="LOGIN_SESSION_EXPIRED")
+    is_setup = ticket_info.get("is_setup", False)
 
+    recovery_plain = None
+    enc_secret = None
+    recovery_hashes = None
+    if is_setup:
+        enc_secret = encrypt_secret(secret_to_check)
+        recovery_plain, recovery_hashes = generate_mfa_recovery_codes()
+    await db_writer.execute_async(_store_mfa_login, user["id"], remaining_codes, enc_secret, recovery_hashes)
+    if is_setup:
         log_audit_event(
             user_id=user["id"],
             username=user["username"],
-            action="auth.login_success",
-            resource="auth",
-            details=tr(request, "successful_login_mfa"),
-            ip_address=request.client.host if request.client else None,
+            action="user.mfa_enabled",
+            resource="user",
+            details=tr(request, "2fa_forcibly_enabled"),
+            ip_address=request.client.host if request and request.client else None,
         )
 
-        from backend.core.bus import event_bus
-        event_bus.publish("core.users.login", {"user_id": user["id"], "username": user["username"]}, is_core=True)
+    user_agent = request.headers.get("user-agent") if request else "Browser Session"
+    token = create_access_token(user["id"], user["username"], client_ip, user_agent)
+    token_payload = decode_access_token(token)
+    jti = token_payload.get("jti") if token_payload else f"jti-{uuid.uuid4().hex}"
+    refresh_tok = create_refresh_token(user["id"], user["username"], jti)
+
+    response.set_cookie(
+        key="nms_refresh_token",
+        value=refresh_tok,
+        httponly=True,
+        samesite="lax",
+        secure=False,
+        max_age=7 * 86400,
+    )
+
+    must_change = bool(user["must_change_password"])
+    perms = [p["permission_id"] for p in perm_rows]
 
-        return {
-            "token": token,
-            "refresh_token": refresh_tok,
-            "recovery_codes": recovery_plain,
+    log_audit_event(
+        user_id=user["id"],
+        username=user["username"],
+        action="auth.login_success",
+        resource="auth",
+        details=tr(request, "successful_login_mfa"),
+        ip_address=request.client.host if request.client else None,
+    )
+
+    from backend.core.bus import event_bus
+    event_bus.publish("core.users.login", {"user_id": user["id"], "username": user["username"]}, is_core=True)
+
+    return {
+        "token": token,
+        "refresh_token": refresh_tok,
+        "recovery_codes": recovery_plain,
+        "must_change_password": must_change,
+        "mfa_required": False,
+        "user": {
+            "id": user["id"],
+            "username": user["username"],
+            "full_name": user["full_name"],
+            "email": user["email"],
+            "uid": user["uid"],
+            "role_id": user["role_id"],
+            "role_name": user["role_name"],
+            "avatar": user["avatar"],
+            "permissions": perms,
             "must_change_password": must_change,
-            "mfa_required": False,
-            "user": {
-                "id": user["id"],
-                "username": user["username"],
-                "full_name": user["full_name"],
-                "email": user["email"],
-                "uid": user["uid"],
-                "role_id": user["role_id"],
-                "role_name": user["role_name"],
-                "avatar": user["avatar"],
-                "permissions": perms,
-                "must_change_password": must_change,
-            },
-        }
-    finally:
-        conn.close()
+        },
+    }
 
 
 @router.post("/auth/refresh")
@@ -558,17 +640,17 @@ async def setup_mfa(current_user: CurrentUser = Depends(get_current_user)):
 
 
 @router.post("/auth/mfa/enable")
+@rate_limit(
+    "mfa_enable", max_requests=5, window_seconds=60,
+    key=lambda request, kwargs: f"{kwargs['current_user'].id}:{request_ip(request)}",
+    message="Too many MFA enable attempts. Please wait.",
+)
 async def enable_mfa(
     body: MfaEnableRequest,
     current_user: CurrentUser = Depends(get_current_user),
     request: Request = None,
 ):
     """Подтверждение и активация 2FA в аккаунте."""
-    client_ip = request.client.host if request and request.client else "local"
-    rate_key = f"mfa_enable:{current_user.id}:{client_ip}"
-    if rate_limiter.is_rate_limited(rate_key, max_requests=5, window_seconds=60):
-        raise NMSError(message=tr(request, "rate_limit_exceeded", default="Too many MFA enable attempts. Please wait."), status_code=429, code="RATE_LIMIT_EXCEEDED")
-
     if not verify_totp_code(body.secret, body.code):
         raise ValidationError(message=tr(request, "invalid_mfa_code"), code="INVALID_MFA_CODE")
 
@@ -638,6 +720,7 @@ async def logout(current_user: CurrentUser = Depends(get_current_user), request:
             if payload and "jti" in payload:
                 conn.execute("UPDATE active_sessions SET is_revoked = 1 WHERE token_jti = ?", (payload["jti"],))
                 conn.commit()
+                revoke_sessions([payload["jti"]])
     except Exception:
         pass
     finally:
@@ -673,6 +756,7 @@ async def terminate_all_sessions(
                 if payload:
                     current_jti = payload.get("jti")
 
+        revoked_jtis = live_session_jtis(conn, [current_user.id], exclude_jti=current_jti if other_only else None)
         if other_only and current_jti:
             conn.execute(
                 "UPDATE active_sessions SET is_revoked = 1 WHERE user_id = ? AND token_jti != ?",
@@ -688,6 +772,8 @@ async def terminate_all_sessions(
                 (now_ts, current_user.id),
             )
         conn.commit()
+        revoke_sessions(revoked_jtis)
+        invalidate_principals(user_ids=[current_user.id])
 
         log_audit_event(
             user_id=current_user.id,
@@ -741,7 +827,7 @@ async def list_users(
     current_user: CurrentUser = Depends(require_permission("users.view")),
 ):
     """Получение списка всех пользователей с поддержкой пагинации, поиска и статуса активности."""
-    conn = get_db_connection()
+    conn = get_db_read_connection()
     try:
         sec_settings = get_security_settings()
         inactivity_timeout = int(sec_settings.get("inactivity_timeout_mins", 30))
@@ -796,7 +882,12 @@ async def list_users(
                 ).fetchone()
                 if active_sess and active_sess["cnt"] > 0:
                     is_online = True
+                else:
+                    # Отметка активности могла ещё не попасть в БД
+                    seen_at = activity_tracker.user_seen_at(u_dict["id"])
+                    is_online = seen_at is not None and time.time() - seen_at <= inactivity_seconds
 
+            u_dict["last_seen"] = activity_tracker.user_last_seen(u_dict["id"], u_dict.get("last_seen"))
             u_dict["is_online"] = is_online
             items.append(u_dict)
 
@@ -810,6 +901,28 @@ async def list_users(
         conn.close()
 
 
+def _insert_user(conn, params: tuple) -> None:
+    conn.execute(
+        """
+        INSERT INTO users (id, username, full_name, email, title, uid, hashed_password, is_active, role_id, must_change_password)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        params,
+    )
+
+
+def _replace_own_password(conn, user_id: str, old_hash: str, new_hash: str) -> bool:
+    cur = conn.execute(
+        "UPDATE users SET hashed_password = ?, must_change_password = 0 WHERE id = ? AND hashed_password = ?",
+        (new_hash, user_id, old_hash),
+    )
+    return cur.rowcount == 1
+
+
+def _update_user_row(conn, sql: str, params: list) -> None:
+    conn.execute(sql, params)
+
+
 @router.post("/users")
 async def create_user(
     body: UserCreateRequest,
@@ -817,47 +930,47 @@ async def create_user(
     request: Request = None,
 ):
     """Создание нового пользователя."""
-    conn = get_db_connection()
-    try:
-        user_uid = body.uid.strip() if (body.uid and body.uid.strip()) else f"UID-{uuid.uuid4().hex[:6].upper()}"
+    user_uid = body.uid.strip() if (body.uid and body.uid.strip()) else f"UID-{uuid.uuid4().hex[:6].upper()}"
 
-        # Проверка сложности пароля
-        validate_password_complexity(body.password, request)
+    # Проверка сложности пароля
+    validate_password_complexity(body.password, request)
 
-        # Проверка уникальности username и uid
+    # Проверка уникальности username и uid (соединение возвращается в пул до вычисления хеша)
+    conn = get_db_read_connection()
+    try:
         existing = conn.execute(
             "SELECT username, uid FROM users WHERE username = ? OR uid = ?",
             (body.username, user_uid),
         ).fetchone()
-        if existing:
-            raise ValidationError(message=tr(request, "user_already_exists"), code="USER_ALREADY_EXISTS")
+    finally:
+        conn.close()
+    if existing:
+        raise ValidationError(message=tr(request, "user_already_exists"), code="USER_ALREADY_EXISTS")
 
-        new_id = f"usr-{uuid.uuid4().hex[:8]}"
-        hashed_pass = hash_password(body.password)
+    new_id = f"usr-{uuid.uuid4().hex[:8]}"
+    hashed_pass = await _hash_password(request, body.password)
 
-        sec_settings = get_security_settings()
-        must_change = body.must_change_password if body.must_change_password is not None else bool(sec_settings.get("mandatory_password_change", False))
+    sec_settings = get_security_settings()
+    must_change = body.must_change_password if body.must_change_password is not None else bool(sec_settings.get("mandatory_password_change", False))
 
-        conn.execute(
-            """
-            INSERT INTO users (id, username, full_name, email, title, uid, hashed_password, is_active, role_id, must_change_password)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
+    try:
+        await db_writer.execute_async(
+            _insert_user,
             (new_id, body.username, body.full_name, body.email, body.title or "", user_uid, hashed_pass, int(body.is_active), body.role_id, int(must_change)),
         )
-        conn.commit()
+    except sqlite3.IntegrityError:
+        # Параллельный запрос успел создать пользователя с тем же username или uid
+        raise ValidationError(message=tr(request, "user_already_exists"), code="USER_ALREADY_EXISTS")
 
-        log_audit_event(
-            user_id=current_user.id,
-            username=current_user.username,
-            action="user.create",
-            resource=f"user:{new_id}",
-            details=tr(request, "created_user_audit", username=body.username, full_name=body.full_name),
-            ip_address=request.client.host if request and request.client else None,
-        )
-        return {"ok": True, "id": new_id}
-    finally:
-        conn.close()
+    log_audit_event(
+        user_id=current_user.id,
+        username=current_user.username,
+        action="user.create",
+        resource=f"user:{new_id}",
+        details=tr(request, "created_user_audit", username=body.username, full_name=body.full_name),
+        ip_address=request.client.host if request and request.client else None,
+    )
+    return {"ok": True, "id": new_id}
 
 
 @router.put("/users/me")
@@ -885,6 +998,7 @@ async def update_own_profile(
             params.append(current_user.id)
             conn.execute(f"UPDATE users SET {', '.join(updates)} WHERE id = ?", params)
             conn.commit()
+            invalidate_principals(user_ids=[current_user.id])
 
         log_audit_event(
             user_id=current_user.id,
@@ -906,29 +1020,30 @@ async def change_own_password(
     request: Request = None,
 ):
     """Смена собственного пароля."""
-    conn = get_db_connection()
+    conn = get_db_read_connection()
     try:
         user = conn.execute("SELECT hashed_password FROM users WHERE id = ?", (current_user.id,)).fetchone()
-        if not verify_password(body.old_password, user["hashed_password"]):
-            raise ValidationError(message=tr(request, "current_password_incorrect"), code="CURRENT_PASSWORD_INCORRECT")
+    finally:
+        conn.close()
+    if not user or not await _verify_password(request, body.old_password, user["hashed_password"]):
+        raise ValidationError(message=tr(request, "current_password_incorrect"), code="CURRENT_PASSWORD_INCORRECT")
 
-        validate_password_complexity(body.new_password, request)
+    validate_password_complexity(body.new_password, request)
 
-        new_hash = hash_password(body.new_password)
-        conn.execute("UPDATE users SET hashed_password = ?, must_change_password = 0 WHERE id = ?", (new_hash, current_user.id))
-        conn.commit()
+    new_hash = await _hash_password(request, body.new_password)
+    # Пароль меняется, только если его не сменили параллельно, пока шла проверка старого
+    if not await db_writer.execute_async(_replace_own_password, current_user.id, user["hashed_password"], new_hash):
+        raise ValidationError(message=tr(request, "current_password_incorrect"), code="CURRENT_PASSWORD_INCORRECT")
 
-        log_audit_event(
-            user_id=current_user.id,
-            username=current_user.username,
-            action="user.change_password",
-            resource="profile",
-            details=tr(request, "user_changed_password_audit"),
-            ip_address=request.client.host if request and request.client else None,
-        )
-        return {"ok": True}
-    finally:
-        conn.close()
+    log_audit_event(
+        user_id=current_user.id,
+        username=current_user.username,
+        action="user.change_password",
+        resource="profile",
+        details=tr(request, "user_changed_password_audit"),
+        ip_address=request.client.host if request and request.client else None,
+    )
+    return {"ok": True}
 
 
 @router.put("/users/{user_id}")
@@ -939,40 +1054,12 @@ async def update_user(
     request: Request = None,
 ):
     """Редактирование пользователя."""
-    conn = get_db_connection()
+    conn = get_db_read_connection()
     try:
         user = conn.execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
         if not user:
             raise NotFoundError(message=tr(request, "user_not_found"), code="USER_NOT_FOUND")
 
-        updates = []
-        params = []
-        if body.full_name is not None:
-            updates.append("full_name = ?")
-            params.append(body.full_name)
-        if body.email is not None:
-            updates.append("email = ?")
-            params.append(body.email)
-        if body.title is not None:
-            updates.append("title = ?")
-            params.append(body.title)
-        if body.role_id is not None:
-            updates.append("role_id = ?")
-            params.append(body.role_id)
-        if body.is_active is not None:
-            updates.append("is_active = ?")
-            params.append(int(body.is_active))
-            if body.is_active:
-                updates.append("failed_login_attempts = 0")
-                updates.append("locked_until = NULL")
-        if body.must_change_password is not None:
-            updates.append("must_change_password = ?")
-            params.append(int(body.must_change_password))
-        if body.password and body.password.strip():
-            validate_password_complexity(body.password, request)
-            updates.append("hashed_password = ?")
-            params.append(hash_password(body.password))
-
         # Проверка защиты root от отключения / смены роли
         if (body.is_active is False or (body.role_id and body.role_id != '1')) and (user["username"] == "root" or user["role_id"] == "1"):
             other_superusers = conn.execute(
@@ -981,24 +1068,52 @@ async def update_user(
             ).fetchone()["cnt"]
             if other_superusers == 0:
                 raise ValidationError(message=tr(request, "cannot_disable_root"), code="CANNOT_DISABLE_ROOT")
-
-        if updates:
-            params.append(user_id)
-            conn.execute(f"UPDATE users SET {', '.join(updates)} WHERE id = ?", params)
-            conn.commit()
-
-        log_audit_event(
-            user_id=current_user.id,
-            username=current_user.username,
-            action="user.update",
-            resource=f"user:{user_id}",
-            details=tr(request, "updated_user_audit", username=user['username']),
-            ip_address=request.client.host if request and request.client else None,
-        )
-        return {"ok": True}
     finally:
         conn.close()
 
+    updates = []
+    params = []
+    if body.full_name is not None:
+        updates.append("full_name = ?")
+        params.append(body.full_name)
+    if body.email is not None:
+        updates.append("email = ?")
+        params.append(body.email)
+    if body.title is not None:
+        updates.append("title = ?")
+        params.append(body.title)
+    if body.role_id is not None:
+        updates.append("role_id = ?")
+        params.append(body.role_id)
+    if body.is_active is not None:
+        updates.append("is_active = ?")
+        params.append(int(body.is_active))
+        if body.is_active:
+            updates.append("failed_login_attempts = 0")
+            updates.append("locked_until = NULL")
+    if body.must_change_password is not None:
+        updates.append("must_change_password = ?")
+        params.append(int(body.must_change_password))
+    if body.password and body.password.strip():
+        validate_password_complexity(body.password, request)
+        updates.append("hashed_password = ?")
+        params.append(await _hash_password(request, body.password))
+
+    if updates:
+        params.append(user_id)
+        await db_writer.execute_async(_update_user_row, f"UPDATE users SET {', '.join(updates)} WHERE id = ?", params)
+        invalidate_principals(user_ids=[user_id])
+
+    log_audit_event(
+        user_id=current_user.id,
+        username=current_user.username,
+        action="user.update",
+        resource=f"user:{user_id}",
+        details=tr(request, "updated_user_audit", username=user['username']),
+        ip_address=request.client.host if request and request.client else None,
+    )
+    return {"ok": True}
+
 
 @router.delete("/users/{user_id}")
 async def delete_user(
@@ -1026,6 +1141,7 @@ async def delete_user(
 
         conn.execute("DELETE FROM users WHERE id = ?", (user_id,))
         conn.commit()
+        invalidate_principals(user_ids=[user_id])
 
         log_audit_event(
             user_id=current_user.id,
@@ -1055,9 +1171,12 @@ async def terminate_user_sessions(
 
         import time
         now_ts = int(time.time())
+        revoked_jtis = live_session_jtis(conn, [user_id])
         conn.execute("UPDATE active_sessions SET is_revoked = 1 WHERE user_id = ?", (user_id,))
         conn.execute("UPDATE users SET token_valid_after = ? WHERE id = ?", (now_ts, user_id))
         conn.commit()
+        revoke_sessions(revoked_jtis)
+        invalidate_principals(user_ids=[user_id])
 
         log_audit_event(
             user_id=current_user.id,
@@ -1138,6 +1257,7 @@ async def create_role(
                 (new_id, pid),
             )
         conn.commit()
+        clear_permissions_cache(new_id)
 
         log_audit_event(
             user_id=current_user.id,
@@ -1241,7 +1361,7 @@ async def get_audit_logs(
     current_user: CurrentUser = Depends(require_permission("audit.view")),
 ):
     """Получение журнала событий аудита с поддержкой серверной фильтрации."""
-    conn = get_db_connection()
+    conn = get_db_read_connection()
     try:
         where_clauses = []
         params = []
@@ -1363,7 +1483,7 @@ async def export_audit_logs(
     current_user: CurrentUser = Depends(require_permission("audit.export")),
 ):
     """Экспорт журнала событий аудита в формат Excel (.xlsx) с форматированием или CSV."""
-    conn = get_db_connection()
+    conn = get_db_read_connection()
     try:
         rows = conn.execute(
             """
@@ -1424,6 +1544,22 @@ async def rotate_audit_logs_endpoint(
     return {"ok": True, "deleted_count": deleted}
 
 
+async def _hash_password(request: Optional[Request], password: str) -> str:
+    """Хеш пароля в пуле KDF (429, если очередь хеширования заполнена)."""
+    try:
+        return await password_hasher.hash(password)
+    except KDFBusyError:
+        raise NMSError(message=tr(request, "password_hashing_busy"), status_code=429, code="PASSWORD_HASHING_BUSY")
+
+
+async def _verify_password(request: Optional[Request], password: str, hashed_password: str) -> bool:
+    """Проверка пароля в пуле KDF (429, если очередь хеширования заполнена)."""
+    try:
+        return await password_hasher.verify(password, hashed_password)
+    except KDFBusyError:
+        raise NMSError(message=tr(request, "password_hashing_busy"), status_code=429, code="PASSWORD_HASHING_BUSY")
+
+
 def validate_password_complexity(password: str, request: Request = None) -> None:
     """Проверка пароля на соответствие системной политике сложности."""
     if not password:
@@ -1527,8 +1663,10 @@ async def get_my_sessions(
         result = []
         for r in rows:
             d = dict(r)
+            d["last_seen"] = activity_tracker.session_last_seen(d.get("token_jti"), d.get("last_seen"))
             d["is_current"] = bool(current_jti and d.get("token_jti") == current_jti)
             result.append(d)
+        result.sort(key=lambda d: str(d.get("last_seen") or ""), reverse=True)
         return result
     finally:
         conn.close()
@@ -1543,8 +1681,13 @@ async def revoke_my_session(
     """Аннулирование собственной сессии пользователя."""
     conn = get_db_connection()
     try:
+        sess = conn.execute(
+            "SELECT token_jti FROM active_sessions WHERE id = ? AND user_id = ?", (session_id, current_user.id)
+        ).fetchone()
         conn.execute("UPDATE active_sessions SET is_revoked = 1 WHERE id = ? AND user_id = ?", (session_id, current_user.id))
         conn.commit()
+        if sess:
+            revoke_sessions([sess["token_jti"]])
         return {"ok": True}
     finally:
         conn.close()
@@ -1564,7 +1707,7 @@ async def get_user_sessions(
     try:
         rows = conn.execute(
             """
-            SELECT id, ip_address, user_agent, created_at, last_seen, is_revoked
+            SELECT id, token_jti, ip_address, user_agent, created_at, last_seen, is_revoked
             FROM active_sessions
             WHERE user_id = ? AND is_revoked = 0
               AND (julianday('now') - julianday(replace(last_seen, 'T', ' '))) * 86400 <= ?
@@ -1572,7 +1715,13 @@ async def get_user_sessions(
             """,
             (user_id, ttl_seconds),
         ).fetchall()
-        return [dict(r) for r in rows]
+        result = []
+        for r in rows:
+            d = dict(r)
+            d["last_seen"] = activity_tracker.session_last_seen(d.pop("token_jti"), d.get("last_seen"))
+            result.append(d)
+        result.sort(key=lambda d: str(d.get("last_seen") or ""), reverse=True)
+        return result
     finally:
         conn.close()
 
@@ -1586,8 +1735,11 @@ async def revoke_session(
     """Точечное аннулирование выбранной сессии."""
     conn = get_db_connection()
     try:
+        sess = conn.execute("SELECT token_jti FROM active_sessions WHERE id = ?", (session_id,)).fetchone()
         conn.execute("UPDATE active_sessions SET is_revoked = 1 WHERE id = ?", (session_id,))
         conn.commit()
+        if sess:
+            revoke_sessions([sess["token_jti"]])
         log_audit_event(
             user_id=current_user.id,
             username=current_user.username,
@@ -1633,9 +1785,12 @@ async def bulk_users_action(
             now_ts = int(time.time())
             placeholders = ",".join(["?"] * len(body.user_ids))
             params = [now_ts] + body.user_ids
+            revoked_jtis = live_session_jtis(conn, body.user_ids)
             conn.execute(f"UPDATE users SET token_valid_after = ? WHERE id IN ({placeholders})", params)
             conn.execute(f"UPDATE active_sessions SET is_revoked = 1 WHERE user_id IN ({placeholders})", body.user_ids)
             conn.commit()
+            revoke_sessions(revoked_jtis)
+        invalidate_principals(user_ids=body.user_ids)
 
         log_audit_event(
             user_id=current_user.id,
@@ -0,0 +1,142 @@
+"""Отложенная запись отметок активности (last_seen) пользователей и сессий.
+
+Каждый аутентифицированный запрос только обновляет метку в памяти процесса; накопленные
+метки сбрасываются в БД одной транзакцией (executemany) раз в ACTIVITY_FLUSH_INTERVAL секунд
+и при остановке приложения. Эндпоинты статуса «в сети» и списков сессий накладывают
+ещё не записанные метки на прочитанные из БД (см. user_last_seen / session_last_seen).
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Optional
+
+_log = logging.getLogger("nms.core.activity")
+
+ACTIVITY_FLUSH_INTERVAL = float(os.environ.get("NMS_ACTIVITY_FLUSH_INTERVAL", "5"))
+
+# Формат CURRENT_TIMESTAMP в SQLite (UTC)
+_TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _format_ts(ts: float) -> str:
+    return time.strftime(_TS_FORMAT, time.gmtime(ts))
+
+
+def _write_activity(conn: Any, users: list[tuple[str, str]], sessions: list[tuple[str, str]]) -> None:
+    if sessions:
+        conn.executemany("UPDATE active_sessions SET last_seen = ? WHERE token_jti = ?", sessions)
+    if users:
+        conn.executemany("UPDATE users SET last_seen = ? WHERE id = ?", users)
+
+
+class ActivityTracker:
+    """Буфер последних отметок активности по id пользователя и jti сессии."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._users: dict[str, float] = {}
+        self._sessions: dict[str, float] = {}
+        # Метки, уже отданные потоку-писателю, но ещё не закоммиченные
+        self._inflight_users: dict[str, float] = {}
+        self._inflight_sessions: dict[str, float] = {}
+        self.touches = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.last_flush_at: Optional[float] = None
+
+    def touch(self, user_id: str, token_jti: Optional[str] = None) -> None:
+        """Отметить активность пользователя (и сессии) в памяти."""
+        now = time.time()
+        with self._lock:
+            self._users[user_id] = now
+            if token_jti:
+                self._sessions[token_jti] = now
+            self.touches += 1
+
+    def _pending(self, pending: dict[str, float], inflight: dict[str, float], key: Optional[str]) -> Optional[float]:
+        if not key:
+            return None
+        with self._lock:
+            ts = pending.get(key)
+            return ts if ts is not None else inflight.get(key)
+
+    def user_seen_at(self, user_id: str) -> Optional[float]:
+        """Незаписанная метка активности пользователя (unix time) или None."""
+        return self._pending(self._users, self._inflight_users, user_id)
+
+    def user_last_seen(self, user_id: str, db_value: Optional[str]) -> Optional[str]:
+        """last_seen пользователя с учётом незаписанной метки."""
+        ts = self.user_seen_at(user_id)
+        if ts is None:
+            return db_value
+        pending = _format_ts(ts)
+        return pending if not db_value or pending > str(db_value).replace("T", " ") else db_value
+
+    def session_last_seen(self, token_jti: Optional[str], db_value: Optional[str]) -> Optional[str]:
+        """last_seen сессии с учётом незаписанной метки."""
+        ts = self._pending(self._sessions, self._inflight_sessions, token_jti)
+        if ts is None:
+            return db_value
+        pending = _format_ts(ts)
+        return pending if not db_value or pending > str(db_value).replace("T", " ") else db_value
+
+    def flush(self) -> int:
+        """Записать накопленные метки одной транзакцией. Возвращает число обновлённых записей."""
+        from backend.core.db_writer import db_writer
+
+        with self._flush_lock:
+            with self._lock:
+                if not self._users and not self._sessions:
+                    return 0
+                self._inflight_users, self._users = self._users, {}
+                self._inflight_sessions, self._sessions = self._sessions, {}
+                users = [(_format_ts(ts), uid) for uid, ts in self._inflight_users.items()]
+                sessions = [(_format_ts(ts), jti) for jti, ts in self._inflight_sessions.items()]
+            try:
+                db_writer.execute(_write_activity, users, sessions)
+            except Exception as exc:
+                _log.warning("Failed to flush activity timestamps: %s", exc)
+                with self._lock:
+                    # Вернуть метки в буфер, не затирая более свежие
+                    for uid, ts in self._inflight_users.items():
+                        self._users[uid] = max(ts, self._users.get(uid, 0.0))
+                    for jti, ts in self._inflight_sessions.items():
+                        self._sessions[jti] = max(ts, self._sessions.get(jti, 0.0))
+                    self._inflight_users, self._inflight_sessions = {}, {}
+                return 0
+            with self._lock:
+                self._inflight_users, self._inflight_sessions = {}, {}
+                self.flushes += 1
+                self.rows_written += len(users) + len(sessions)
+                self.last_flush_at = time.time()
+            return len(users) + len(sessions)
+
+    def clear(self) -> None:
+        """Отбросить незаписанные метки (после замены БД)."""
+        with self._lock:
+            self._users.clear()
+            self._sessions.clear()
+
+    def get_stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "pending_users": len(self._users),
+                "pending_sessions": len(self._sessions),
+                "touches": self.touches,
+                "flushes": self.flushes,
+                "rows_written": self.rows_written,
+                "last_flush_at": self.last_flush_at,
+                "flush_interval": ACTIVITY_FLUSH_INTERVAL,
+            }
+
+
+activity_tracker = ActivityTracker()
+
+
+def flush_activity() -> int:
+    """Фоновая задача: сбросить отметки активности в БД."""
+    return activity_tracker.flush()
@@ -39,6 +39,45 @@ async def lifespan(app: FastAPI):
     from backend.core.notify import prune_notifications
     scheduler.cron("0 3 * * *", prune_notifications, name="prune_notifications")
 
+    from backend.core.maintenance import MAINTENANCE_CRON, run_db_maintenance
+    scheduler.cron(MAINTENANCE_CRON, run_db_maintenance, name="db_maintenance")
+
+    from backend.core.activity import ACTIVITY_FLUSH_INTERVAL, flush_activity
+    scheduler.every(ACTIVITY_FLUSH_INTERVAL, flush_activity, name="activity_flush")
+
+    from backend.core.revocation import (
+        REVOCATION_SYNC_INTERVAL,
+        revocation_registry,
+        setup_revocation_listeners,
+        sync_revocations,
+    )
+    setup_revocation_listeners()
+    revocation_registry.sync()
+    scheduler.every(REVOCATION_SYNC_INTERVAL, sync_revocations, name="revocation_sync")
+
+    from backend.core.rate_limiter import RATE_LIMIT_GC_INTERVAL, rate_limiter
+    scheduler.every(RATE_LIMIT_GC_INTERVAL, rate_limiter.gc, name="rate_limit_gc")
+
+    from backend.core.shared_state import (
+        SHARED_STATE_GC_INTERVAL,
+        SHARED_STATE_POLL_INTERVAL,
+        gc_shared_state,
+        signal_relay,
+    )
+    if signal_relay is not None:
+        await asyncio.to_thread(signal_relay.prime)
+        scheduler.every(SHARED_STATE_POLL_INTERVAL, signal_relay.poll, name="shared_state_poll")
+        scheduler.every(SHARED_STATE_GC_INTERVAL, gc_shared_state, name="shared_state_gc")
+
+    from backend.core.event_fanout import EVENT_FANOUT_POLL_INTERVAL, event_fanout
+    if event_fanout is not None:
+        scheduler.every(EVENT_FANOUT_POLL_INTERVAL, event_fanout.poll, name="event_fanout_poll")
+
+    from backend.core.durable_events import BUS_JOURNAL_PRUNE_INTERVAL, PATTERNS_REFRESH_INTERVAL, durable_events
+    await asyncio.to_thread(durable_events.load)
+    durable_events.start()
+    scheduler.every(BUS_JOURNAL_PRUNE_INTERVAL, durable_events.prune, name="bus_journal_prune")
+    scheduler.every(PATTERNS_REFRESH_INTERVAL, durable_events.refresh, name="bus_durable_refresh")
 
     # Запуск всех загруженных модулей при активном event loop
     for mid, inst in get_all_instances().items():
@@ -68,8 +107,18 @@ async def lifespan(app: FastAPI):
 
     # Остановка шины событий и завершение фоновых задач
     from backend.core.bus import event_bus
+    from backend.core.durable_events import durable_events
+    await durable_events.stop()
     await event_bus.shutdown()
 
+    # Дописать отметки активности и очередь записи SQLite, остановить поток-писатель
+    from backend.core.activity import flush_activity
+    from backend.core.db_writer import db_writer
+    await asyncio.to_thread(flush_activity)
+    from backend.core.password_hasher import password_hasher
+    await asyncio.to_thread(password_hasher.shutdown)
+    await asyncio.to_thread(db_writer.stop)
+
 
 
 def create_app() -> FastAPI:
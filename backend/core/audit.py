@@ -6,11 +6,21 @@ from __future__ import annotations
 
 import logging
 from typing import Optional
-from backend.core.database import get_db_connection
+from backend.core.db_writer import db_writer
 
 _log = logging.getLogger("nms.audit")
 
 
+def _insert_audit_event(conn, params: tuple) -> None:
+    conn.execute(
+        """
+        INSERT INTO audit_logs (user_id, username, action, resource, details, ip_address)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        params,
+    )
+
+
 def log_audit_event(
     user_id: Optional[str],
     username: str,
@@ -19,70 +29,54 @@ def log_audit_event(
     details: Optional[str] = None,
     ip_address: Optional[str] = None,
 ) -> None:
-    """Записать событие аудита в базу данных."""
-    import time
-    for attempt in range(5):
-        try:
-            conn = get_db_connection()
-            try:
-                with conn:
-                    conn.execute(
-                        """
-                        INSERT INTO audit_logs (user_id, username, action, resource, details, ip_address)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                        """,
-                        (user_id, username, action, resource, details, ip_address),
-                    )
-                break
-            finally:
-                conn.close()
-        except Exception as exc:
-            if "locked" in str(exc).lower() and attempt < 4:
-                time.sleep(0.05 * (2 ** attempt))
-                continue
-            _log.error("Failed to write audit log: %s", exc)
-            break
+    """Записать событие аудита в базу данных (через очередь единственного писателя).
+
+    Запись ставится в очередь без ожидания, поэтому вызов не блокирует event loop;
+    ошибки записи пишутся в лог из done-callback.
+    """
+    try:
+        future = db_writer.submit(_insert_audit_event, (user_id, username, action, resource, details, ip_address))
+    except Exception as exc:
+        _log.error("Failed to write audit log: %s", exc)
+        return
+    future.add_done_callback(_on_audit_written)
+
+
+def _on_audit_written(future) -> None:
+    if future.exception() is not None:
+        _log.error("Failed to write audit log: %s", future.exception())
+
+
+def _rotate_audit_logs(conn, max_days: int, max_records: int) -> int:
+    deleted_count = 0
+    # 1. Удаление записей старше max_days
+    cur = conn.execute(
+        """
+        DELETE FROM audit_logs
+        WHERE (julianday('now') - julianday(replace(timestamp, 'T', ' '))) > ?
+        """,
+        (max_days,),
+    )
+    deleted_count += cur.rowcount
+
+    # 2. Ограничение общего количества записей до max_records (удаление самых старых)
+    cur = conn.execute(
+        """
+        DELETE FROM audit_logs
+        WHERE id <= (SELECT id FROM audit_logs ORDER BY id DESC LIMIT 1 OFFSET ?)
+        """,
+        (max_records,),
+    )
+    deleted_count += cur.rowcount
+    return deleted_count
 
 
 def rotate_audit_logs(max_days: int = 90, max_records: int = 100000) -> int:
     """Удаление устаревших записей аудита по дням и ограничению количества.
     Возвращает количество удаленных записей.
     """
-    deleted_count = 0
-    import time
-    for attempt in range(5):
-        try:
-            conn = get_db_connection()
-            try:
-                with conn:
-                    # 1. Удаление записей старше max_days
-                    cur = conn.execute(
-                        """
-                        DELETE FROM audit_logs
-                        WHERE (julianday('now') - julianday(replace(timestamp, 'T', ' '))) > ?
-                        """,
-                        (max_days,),
-                    )
-                    deleted_count += cur.rowcount
-
-                    # 2. Ограничение общего количества записей до max_records (удаление самых старых)
-                    cur = conn.execute(
-                        """
-                        DELETE FROM audit_logs
-                        WHERE id NOT IN (
-                            SELECT id FROM audit_logs ORDER BY id DESC LIMIT ?
-                        )
-                        """,
-                        (max_records,),
-                    )
-                    deleted_count += cur.rowcount
-                break
-            finally:
-                conn.close()
-        except Exception as exc:
-            if "locked" in str(exc).lower() and attempt < 4:
-                time.sleep(0.05 * (2 ** attempt))
-                continue
-            _log.error("Failed to rotate audit logs: %s", exc)
-            break
-    return deleted_count
+    try:
+        return db_writer.execute(_rotate_audit_logs, max_days, max_records)
+    except Exception as exc:
+        _log.error("Failed to rotate audit logs: %s", exc)
+        return 0
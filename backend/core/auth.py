@@ -9,20 +9,26 @@ import hmac
 import hashlib
 import ipaddress
 import json
-import re
 import secrets
 import struct
 import time
 import urllib.parse
 from dataclasses import dataclass
+from functools import cached_property
 from typing import Optional, Tuple
 
 from fastapi import Depends, Request, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
+from backend.core.activity import activity_tracker
 from backend.core.database import get_db_connection
 from backend.core.i18n import tr
+from backend.core.ip_allowlist import get_ip_allowlist
 from backend.core.exceptions import AuthenticationError, PermissionDeniedError, ModuleDisabledError
+from backend.core.permission_index import accepted_permissions, permission_index
+from backend.core.principal_cache import invalidate_principals, principal_cache
+from backend.core.revocation import revocation_registry, revoke_sessions
+from backend.core.ticket_store import create_ticket_store
 
 import logging
 from backend.core.config import get_settings
@@ -69,88 +75,49 @@ def is_origin_allowed(origin: Optional[str], allowed_origins: Optional[list[str]
 
 
 def is_session_revoked(jti: Optional[str]) -> bool:
-    """Проверить, аннулирована ли сессия по ее JTI в БД."""
-    if not jti:
-        return False
-    try:
-        conn = get_db_connection()
-        try:
-            row = conn.execute(
-                "SELECT is_revoked FROM active_sessions WHERE token_jti = ?",
-                (jti,)
-            ).fetchone()
-            if row and row["is_revoked"] == 1:
-                return True
-        finally:
-            conn.close()
-    except Exception:
-        pass
-    return False
+    """Проверить, аннулирована ли сессия по ее JTI (по реестру отзывов в памяти)."""
+    return revocation_registry.is_revoked(jti)
 
 
-_ws_tickets: dict[str, dict] = {}
+ws_tickets = create_ticket_store("ws", ttl=30)
 
 
-def create_ws_ticket(user_id: str, jti: Optional[str] = None, expires_in: int = 30) -> str:
-    """Сгенерировать одноразовый билет для подключения к WebSocket."""
-    ticket = f"wst_{secrets.token_urlsafe(24)}"
-    _ws_tickets[ticket] = {
+def _ws_ticket_value(user_id: str, jti: Optional[str], expires_in: int) -> dict:
+    return {
         "user_id": str(user_id),
         "jti": str(jti) if jti else None,
         "expires_at": time.time() + expires_in,
     }
-    return ticket
+
+
+def create_ws_ticket(user_id: str, jti: Optional[str] = None, expires_in: int = 30) -> str:
+    """Сгенерировать одноразовый билет для подключения к WebSocket."""
+    return ws_tickets.issue("wst_", _ws_ticket_value(user_id, jti, expires_in), ttl=expires_in)
 
 
 def consume_ws_ticket(ticket: str) -> Optional[dict]:
     """Проверить и погасить (удалить) одноразовый WebSocket билет."""
-    now = time.time()
-    # Очистка устаревших билетов
-    expired = [t for t, data in _ws_tickets.items() if data["expires_at"] < now]
-    for t in expired:
-        _ws_tickets.pop(t, None)
-
-    data = _ws_tickets.pop(ticket, None)
-    if data and data["expires_at"] >= now:
-        return data
-    return None
+    return ws_tickets.consume(ticket)
+
+
+async def create_ws_ticket_async(user_id: str, jti: Optional[str] = None, expires_in: int = 30) -> str:
+    """create_ws_ticket() для event loop: общее хранилище билетов опрашивается в пуле потоков."""
+    return await ws_tickets.issue_async("wst_", _ws_ticket_value(user_id, jti, expires_in), ttl=expires_in)
+
+
+async def consume_ws_ticket_async(ticket: str) -> Optional[dict]:
+    """consume_ws_ticket() для event loop."""
+    return await ws_tickets.consume_async(ticket)
 
 
 
 def user_has_permission(user_id: str, permission: str) -> bool:
 
-    """Проверка наличия разрешения у пользователя по его user_id."""
+    """Проверка наличия разрешения у пользователя по его user_id (по индексу разрешений в памяти)."""
     if not user_id:
         return False
     try:
-        conn = get_db_connection()
-        try:
-            row = conn.execute(
-                """
-                SELECT u.role_id, r.name as role_name
-                FROM users u
-                JOIN roles r ON u.role_id = r.id
-                WHERE u.id = ? AND u.is_active = 1
-                """,
-                (user_id,),
-            ).fetchone()
-            if not row:
-                return False
-
-            role_id_str = str(row["role_id"])
-            if role_id_str in _role_permissions_cache:
-                permissions = _role_permissions_cache[role_id_str]
-            else:
-                perm_rows = conn.execute(
-                    "SELECT permission_id FROM role_permissions WHERE role_id = ?",
-                    (row["role_id"],),
-                ).fetchall()
-                permissions = tuple(p["permission_id"] for p in perm_rows)
-                _role_permissions_cache[role_id_str] = permissions
-
-            return "system.all" in permissions or permission in permissions
-        finally:
-            conn.close()
+        return permission_index.user_has(user_id, permission)
     except Exception:
         pass
     return False
@@ -167,28 +134,7 @@ def is_ip_whitelisted(client_ip: str, whitelist_str: str) -> bool:
     """Проверка, входит ли client_ip в список whitelist (разделенный запятыми/пробелами/переводами строк)."""
     if not whitelist_str or not whitelist_str.strip():
         return True
-    try:
-        ip_obj = ipaddress.ip_address(client_ip)
-    except ValueError:
-        return False
-
-    subnets = [s.strip() for s in re.split(r"[\s,;\n]+", whitelist_str) if s.strip()]
-    if not subnets:
-        return True
-
-    for item in subnets:
-        try:
-            if "/" in item:
-                net = ipaddress.ip_network(item, strict=False)
-                if ip_obj in net:
-                    return True
-            else:
-                target_ip = ipaddress.ip_address(item)
-                if ip_obj == target_ip:
-                    return True
-        except ValueError:
-            continue
-    return False
+    return get_ip_allowlist(whitelist_str).contains(client_ip)
 
 
 @dataclass(frozen=True)
@@ -205,6 +151,11 @@ class CurrentUser:
     permissions: Tuple[str, ...] = ()
     token_jti: Optional[str] = None
 
+    @cached_property
+    def permission_set(self) -> frozenset[str]:
+        """Разрешения в виде frozenset (строится один раз на объект)."""
+        return frozenset(self.permissions)
+
 
 def create_access_token(
     user_id: str,
@@ -248,26 +199,20 @@ def create_access_token(
         actual_ua = user_agent or "Browser Session"
 
         # Аннулируем предыдущие активные сессии с того же браузера/устройства для пользователя
-        conn.execute(
-            """
-            UPDATE active_sessions
-            SET is_revoked = 1
-            WHERE user_id = ? AND ip_address = ? AND user_agent = ? AND is_revoked = 0
-            """,
-            (user_id, actual_ip, actual_ua),
-        )
+        same_device_where = "user_id = ? AND ip_address = ? AND user_agent = ? AND is_revoked = 0"
+        same_device_params = (user_id, actual_ip, actual_ua)
+        revoked_jtis = [
+            r[0] for r in conn.execute(f"SELECT token_jti FROM active_sessions WHERE {same_device_where}", same_device_params)
+        ]
+        conn.execute(f"UPDATE active_sessions SET is_revoked = 1 WHERE {same_device_where}", same_device_params)
 
         # Аннулируем устаревшие сессий (last_seen > ttl_hours)
         ttl_seconds_calc = ttl_hours * 3600
-        conn.execute(
-            """
-            UPDATE active_sessions
-            SET is_revoked = 1
-            WHERE is_revoked = 0
-              AND (julianday('now') - julianday(replace(last_seen, 'T', ' '))) * 86400 > ?
-            """,
-            (ttl_seconds_calc,),
-        )
+        expired_where = "is_revoked = 0 AND (julianday('now') - julianday(replace(last_seen, 'T', ' '))) * 86400 > ?"
+        revoked_jtis += [
+            r[0] for r in conn.execute(f"SELECT token_jti FROM active_sessions WHERE {expired_where}", (ttl_seconds_calc,))
+        ]
+        conn.execute(f"UPDATE active_sessions SET is_revoked = 1 WHERE {expired_where}", (ttl_seconds_calc,))
 
         sess_id = f"sess-{uuid.uuid4().hex[:8]}"
         conn.execute(
@@ -279,6 +224,7 @@ def create_access_token(
         )
         conn.commit()
         conn.close()
+        revoke_sessions(revoked_jtis)
     except Exception as e:
         _log.error("Failed to register active session in database: %s", e, exc_info=True)
 
@@ -363,15 +309,13 @@ def decode_access_token(token: str) -> Optional[dict]:
         return None
 
 
-_role_permissions_cache: dict[str, tuple[str, ...]] = {}
-
-
 def clear_permissions_cache(role_id: Optional[str] = None) -> None:
-    """Очистка кэша разрешений ролей."""
+    """Сброс индекса разрешений ролей (после изменения role_permissions)."""
+    permission_index.clear()
     if role_id:
-        _role_permissions_cache.pop(str(role_id), None)
+        invalidate_principals(role_ids=[role_id])
     else:
-        _role_permissions_cache.clear()
+        invalidate_principals(everything=True)
 
 
 async def get_current_user(
@@ -433,6 +377,20 @@ async def get_current_user(
     user_id = payload["sub"]
     token_iat = payload.get("iat", 0)
     token_jti = payload.get("jti")
+
+    cached = principal_cache.get(token_jti, token_iat)
+    if cached is not None:
+        activity_tracker.touch(cached.user.id, token_jti)
+        return cached.user
+
+    if is_session_revoked(token_jti):
+        raise AuthenticationError(
+            message=tr(request, "session_revoked_by_admin"),
+            code="SESSION_REVOKED_BY_ADMIN",
+        )
+
+    principal_cache.setup()
+    generation = principal_cache.generation
     conn = get_db_connection()
     try:
         row = conn.execute(
@@ -459,6 +417,7 @@ async def get_current_user(
             )
 
         # Проверка индивидуального отзыва конкретной сессии
+        sess_row = None
         if token_jti:
             sess_row = conn.execute("SELECT id, is_revoked FROM active_sessions WHERE token_jti = ?", (token_jti,)).fetchone()
             if sess_row and sess_row["is_revoked"]:
@@ -466,33 +425,14 @@ async def get_current_user(
                     message=tr(request, "session_revoked_by_admin"),
                     code="SESSION_REVOKED_BY_ADMIN",
                 )
-            if sess_row:
-                try:
-                    conn.execute("UPDATE active_sessions SET last_seen = CURRENT_TIMESTAMP WHERE id = ?", (sess_row["id"],))
-                    conn.commit()
-                except Exception:
-                    pass
-
-        # Обновление метки последней активности пользователя
-        try:
-            conn.execute("UPDATE users SET last_seen = CURRENT_TIMESTAMP WHERE id = ?", (row["id"],))
-            conn.commit()
-        except Exception:
-            pass
-
-        # Выборка разрешений пользователя по его роли (из кэша или БД)
-        role_id_str = str(row["role_id"])
-        if role_id_str in _role_permissions_cache:
-            permissions = _role_permissions_cache[role_id_str]
-        else:
-            perm_rows = conn.execute(
-                "SELECT permission_id FROM role_permissions WHERE role_id = ?",
-                (row["role_id"],),
-            ).fetchall()
-            permissions = tuple(p["permission_id"] for p in perm_rows)
-            _role_permissions_cache[role_id_str] = permissions
-
-        return CurrentUser(
+
+        # Обновление метки последней активности пользователя и сессии (запись отложенная)
+        activity_tracker.touch(row["id"], token_jti if sess_row else None)
+
+        # Разрешения роли пользователя из индекса
+        permissions = permission_index.for_role(row["role_id"]).items
+
+        user = CurrentUser(
             id=row["id"],
             username=row["username"],
             full_name=row["full_name"],
@@ -508,6 +448,11 @@ async def get_current_user(
     finally:
         conn.close()
 
+    # Сессия без записи в active_sessions не кэшируется: её отзыв некому опубликовать
+    if sess_row:
+        principal_cache.put(token_jti, user, token_iat, generation)
+    return user
+
 
 async def get_current_user_optional(
     request: Request = None,
@@ -530,18 +475,10 @@ def require_permission(permission: str):
         "modules.view": {"modules.manage"},
         "audit.view": {"audit.export"},
     }
+    accepted = accepted_permissions(permission, *implied_map.get(permission, ()))
 
     async def permission_checker(request: Request = None, current_user: CurrentUser = Depends(get_current_user)):
-        user_perms = set(current_user.permissions or ())
-        if "system.all" in user_perms:
-            return current_user
-        
-        if permission in user_perms:
-            return current_user
-        
-        # Проверяем, есть ли альтернативное управляющее право
-        implied = implied_map.get(permission, set())
-        if user_perms.intersection(implied):
+        if not accepted.isdisjoint(current_user.permission_set):
             return current_user
 
         raise PermissionDeniedError(
@@ -557,15 +494,14 @@ def require_module_permission(module_id: str, action: str = "view"):
     """Проверка включенности модуля в системе и наличии пермишена у роли пользователя."""
     from backend.core.plugin.registry import is_module_enabled
 
+    perm_key = f"module.{module_id}.{action}"
+    accepted = accepted_permissions(perm_key, f"{module_id}.{action}")
+
     async def module_permission_checker(request: Request = None, current_user: CurrentUser = Depends(get_current_user)):
         if not is_module_enabled(module_id):
             raise ModuleDisabledError(module_id=module_id)
 
-        if "system.all" in current_user.permissions:
-            return current_user
-
-        perm_key = f"module.{module_id}.{action}"
-        if perm_key in current_user.permissions or f"{module_id}.{action}" in current_user.permissions:
+        if not accepted.isdisjoint(current_user.permission_set):
             return current_user
 
         raise PermissionDeniedError(
@@ -0,0 +1,240 @@
+"""Онлайн-резервное копирование и восстановление SQLite без остановки записи.
+
+Снимок строится через sqlite3 backup API порциями страниц (писатели не блокируются,
+WAL учитывается), затем потоково сжимается gzip и отдаётся клиенту.
+Восстановление принимает загрузку потоком на диск с лимитом размера, проверяет
+файл через PRAGMA integrity_check и переносит его в живую БД тем же backup API
+в потоке-писателе — без подмены файла под открытыми WAL-соединениями.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import time
+import zlib
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+_log = logging.getLogger("nms.core.backup")
+
+BACKUP_PAGES_PER_STEP = int(os.environ.get("NMS_BACKUP_PAGES_PER_STEP", "1024"))
+BACKUP_STEP_SLEEP = float(os.environ.get("NMS_BACKUP_STEP_SLEEP", "0.002"))
+BACKUP_MAX_RESTARTS = 3
+BACKUP_CHUNK_SIZE = 1024 * 1024
+BACKUP_COMPRESS_LEVEL = 6
+RESTORE_MAX_BYTES = int(os.environ.get("NMS_RESTORE_MAX_BYTES", str(16 * 1024**3)))
+RESTORE_MIN_BYTES = 100
+
+_GZIP_MAGIC = b"\x1f\x8b"
+
+
+class BackupTooLargeError(ValueError):
+    """Загруженная резервная копия превышает допустимый размер."""
+
+
+class InvalidBackupError(ValueError):
+    """Файл не является целостной БД NMS (reason: empty, integrity, no_users)."""
+
+    def __init__(self, reason: str, message: str = "") -> None:
+        super().__init__(message or reason)
+        self.reason = reason
+
+
+class _BackupRestarted(Exception):
+    pass
+
+
+def _current_db_path() -> Path:
+    from backend.core import database
+    return Path(database.DB_PATH)
+
+
+# ── Резервное копирование ─────────────────────────────────────────
+def create_online_backup(
+    dest_path: Path,
+    *,
+    source_path: Path | None = None,
+    pages: int = BACKUP_PAGES_PER_STEP,
+    step_sleep: float = BACKUP_STEP_SLEEP,
+) -> dict[str, Any]:
+    """Снять согласованный снимок БД в dest_path через backup API (блокирующий вызов, для to_thread).
+
+    Если запись в источник постоянно перезапускает пошаговое копирование,
+    после BACKUP_MAX_RESTARTS выполняется копирование за один шаг (в WAL оно не блокирует писателей).
+    """
+    source_path = source_path or _current_db_path()
+    started = time.monotonic()
+    state = {"remaining": None, "restarts": 0, "steps": 0}
+
+    def progress(_status: int, remaining: int, total: int) -> None:
+        state["steps"] += 1
+        if state["remaining"] is not None and remaining > state["remaining"]:
+            state["restarts"] += 1
+            if state["restarts"] > BACKUP_MAX_RESTARTS:
+                raise _BackupRestarted()
+        state["remaining"] = remaining
+        if step_sleep > 0 and remaining:
+            time.sleep(step_sleep)
+
+    src = sqlite3.connect(f"file:{source_path}?mode=ro", uri=True, timeout=30.0)
+    try:
+        dest_path.unlink(missing_ok=True)
+        dst = sqlite3.connect(dest_path)
+        try:
+            try:
+                src.backup(dst, pages=pages, progress=progress)
+            except _BackupRestarted:
+                _log.info("Online backup restarted %d times by concurrent writes, copying in one step", state["restarts"])
+                src.backup(dst, pages=-1)
+            # Снимок должен быть самодостаточным файлом без WAL
+            dst.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            dst.close()
+    finally:
+        src.close()
+
+    stats = {
+        "path": str(dest_path),
+        "size_bytes": dest_path.stat().st_size,
+        "steps": state["steps"],
+        "restarts": state["restarts"],
+        "duration_ms": round((time.monotonic() - started) * 1000, 1),
+    }
+    _log.info("Online backup of %s finished: %s", source_path, stats)
+    return stats
+
+
+def iter_backup_file(path: Path, *, compress: bool = True, remove: bool = True, chunk_size: int = BACKUP_CHUNK_SIZE) -> Iterator[bytes]:
+    """Потоково читать файл снимка (с gzip-сжатием), удаляя его по завершении.
+
+    Синхронный генератор: StreamingResponse выполняет его в пуле потоков.
+    """
+    compressor = zlib.compressobj(BACKUP_COMPRESS_LEVEL, zlib.DEFLATED, 31) if compress else None
+    try:
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                if compressor is None:
+                    yield chunk
+                    continue
+                data = compressor.compress(chunk)
+                if data:
+                    yield data
+        if compressor is not None:
+            yield compressor.flush()
+    finally:
+        if remove:
+            path.unlink(missing_ok=True)
+
+
+# ── Восстановление ────────────────────────────────────────────────
+class BackupUploadWriter:
+    """Запись загружаемой резервной копии на диск по частям с лимитом размера.
+
+    gzip-поток (по сигнатуре 1f 8b) распаковывается на лету; лимит применяется
+    к распакованному размеру.
+    """
+
+    def __init__(self, dest_path: Path, *, max_bytes: int = RESTORE_MAX_BYTES) -> None:
+        self.dest_path = dest_path
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.received = 0
+        self._file = open(dest_path, "wb")
+        self._decompressor: Any = None
+        self._head = b""
+
+    def write(self, chunk: bytes) -> None:
+        self.received += len(chunk)
+        if self._decompressor is None and self._head is not None:
+            # Определение gzip по первым байтам потока
+            self._head += chunk
+            if len(self._head) < len(_GZIP_MAGIC):
+                return
+            chunk, self._head = self._head, None
+            if chunk.startswith(_GZIP_MAGIC):
+                self._decompressor = zlib.decompressobj(31)
+        if self._decompressor is not None:
+            # Ограничение выхода защищает от gzip-бомб
+            while chunk:
+                data = self._decompressor.decompress(chunk, BACKUP_CHUNK_SIZE)
+                self._write_plain(data)
+                chunk = self._decompressor.unconsumed_tail
+        else:
+            self._write_plain(chunk)
+
+    def _write_plain(self, data: bytes) -> None:
+        if not data:
+            return
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise BackupTooLargeError(f"Backup exceeds {self.max_bytes} bytes")
+        self._file.write(data)
+
+    def close(self) -> None:
+        if self._head:
+            self._write_plain(self._head)
+            self._head = None
+        if self._decompressor is not None:
+            self._write_plain(self._decompressor.flush())
+            if not self._decompressor.eof:
+                self.abort()
+                raise InvalidBackupError("integrity", "Truncated gzip stream")
+        self._file.close()
+
+    def abort(self) -> None:
+        try:
+            self._file.close()
+        finally:
+            self.dest_path.unlink(missing_ok=True)
+
+
+def verify_backup_file(path: Path) -> None:
+    """Проверить загруженный файл: integrity_check и наличие таблицы users (блокирующий вызов)."""
+    if not path.exists() or path.stat().st_size < RESTORE_MIN_BYTES:
+        raise InvalidBackupError("empty")
+    try:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            rows = conn.execute("PRAGMA integrity_check").fetchall()
+            if [r[0] for r in rows] != ["ok"]:
+                raise InvalidBackupError("integrity", "; ".join(str(r[0]) for r in rows[:5]))
+            has_users = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='users'").fetchone()
+        finally:
+            conn.close()
+    except InvalidBackupError:
+        raise
+    except sqlite3.Error as exc:
+        raise InvalidBackupError("integrity", str(exc)) from exc
+    if not has_users:
+        raise InvalidBackupError("no_users")
+
+
+def _load_backup_into(conn: sqlite3.Connection, source_path: Path) -> None:
+    src = sqlite3.connect(f"file:{source_path}?mode=ro", uri=True)
+    try:
+        src.backup(conn)
+    finally:
+        src.close()
+    conn.execute("PRAGMA journal_mode=WAL")
+
+
+def restore_backup_file(source_path: Path) -> None:
+    """Перенести проверенный файл в живую БД через backup API в потоке-писателе (блокирующий вызов)."""
+    from backend.core.activity import activity_tracker
+    from backend.core.database import close_db_pool, init_db
+    from backend.core.db_writer import db_writer
+    from backend.core.principal_cache import invalidate_principals
+    from backend.core.revocation import revocation_registry
+
+    activity_tracker.clear()
+    db_writer.execute(_load_backup_into, source_path, isolated=True)
+    # Простаивающие соединения и кэши держат состояние старой БД
+    close_db_pool()
+    init_db()
+    revocation_registry.clear()
+    invalidate_principals(everything=True)
@@ -3,15 +3,34 @@ from __future__ import annotations
 
 import asyncio
 import inspect
+import itertools
 import logging
+import os
 import threading
-from collections.abc import Callable
-from typing import Any
+import time
+from collections import OrderedDict, deque
+from collections.abc import Callable, Hashable, Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any
 
+from backend.core.bus_metrics import BusMetrics, HandlerStats
 from backend.core.exceptions import PermissionDeniedError, ValidationError
 
+if TYPE_CHECKING:
+    from backend.core.durable_events import DurableEvents
+
 _log = logging.getLogger("nms.core.bus")
 
+MATCH_CACHE_SIZE = 1024
+MAILBOX_SIZE = int(os.environ.get("NMS_EVENT_BUS_MAILBOX_SIZE", "1000"))
+HANDLER_THREADS = int(os.environ.get("NMS_EVENT_BUS_THREADS", "4"))
+BLOCK_TIMEOUT = 5.0
+
+OVERFLOW_POLICIES = ("drop_oldest", "drop_newest", "block", "coalesce")
+DISPATCH_MODES = ("inline", "thread", "async")
+
+_subscription_order = itertools.count()
+
 
 def match_topic(pattern: str, topic: str) -> bool:
     """Проверяет соответствие топика (topic) шаблону подписки (pattern).
@@ -67,7 +86,7 @@ def _inspect_subscriber_params(handler: Callable) -> int:
 class Subscriber:
     """Кэшированная структура данных подписчика."""
 
-    __slots__ = ("handler", "has_wildcard", "is_async", "params_count", "pattern")
+    __slots__ = ("batch", "handler", "has_wildcard", "is_async", "mailbox", "order", "params_count", "pattern", "stats")
 
     def __init__(self, pattern: str, handler: Callable, params_count: int, is_async: bool) -> None:
         self.pattern = pattern
@@ -75,6 +94,274 @@ class Subscriber:
         self.params_count = params_count
         self.is_async = is_async
         self.has_wildcard = any(char in pattern for char in ("*", "+", "#"))
+        self.order = next(_subscription_order)
+        self.mailbox: Mailbox | None = None
+        self.batch = False
+        self.stats: HandlerStats | None = None
+
+    def topics_of(self, topic: str, payload: Any) -> list[str]:
+        """Топики доставки: у batch-подписчика payload — список пар (topic, payload)."""
+        return [t for t, _ in payload] if self.batch else [topic]
+
+
+def _can_block() -> bool:
+    """Можно ли ждать места в очереди: в потоке event loop ожидание заблокировало бы сам обработчик."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return True
+    return False
+
+
+class Mailbox:
+    """Ограниченная очередь событий подписчика, которую разбирает один исполнитель.
+
+    Асинхронный обработчик разбирается задачей в event loop, синхронный в режиме
+    thread — потоком общего пула шины. Исполнитель запускается при первом событии
+    и завершается, когда очередь пуста. Политики переполнения:
+    drop_oldest — вытеснить самое старое событие; drop_newest — отбросить новое;
+    block — ждать места до BLOCK_TIMEOUT (только из потоков без event loop, иначе
+    как drop_newest); coalesce — событие с тем же ключом coalesce_key(topic, payload)
+    заменяет ожидающее, при переполнении вытесняется самое старое.
+    """
+
+    def __init__(
+        self,
+        bus: EventBus,
+        sub: Subscriber,
+        max_size: int,
+        overflow: str,
+        timeout: float | None,
+        coalesce_key: Callable[[str, Any], Hashable] | None,
+    ) -> None:
+        self._bus = bus
+        self.sub = sub
+        self.max_size = max(1, max_size)
+        self.overflow = overflow
+        self.timeout = timeout
+        self.coalesce_key = coalesce_key
+        self._queue: deque[list] = deque()  # элементы [ключ, топик, payload]
+        self._pending: dict[Hashable, list] = {}
+        self._cond = threading.Condition()
+        self._running = False
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self.processed = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    def put(self, topic: str, payload: Any) -> bool:
+        """Поставить событие в очередь; False, если оно отброшено политикой переполнения."""
+        key = None
+        if self.overflow == "coalesce":
+            try:
+                key = self.coalesce_key(topic, payload)
+            except Exception as exc:  # noqa: BLE001
+                _log.warning("coalesce_key failed for subscriber %s: %s", self.sub.handler, exc)
+        with self._cond:
+            if key is not None:
+                entry = self._pending.get(key)
+                if entry is not None:
+                    entry[1], entry[2] = topic, payload
+                    self.coalesced += 1
+                    return True
+            if len(self._queue) >= self.max_size and not self._make_room_locked():
+                self.dropped += 1
+                self._bus.metrics.dropped(self.sub.stats, self.sub.topics_of(topic, payload))
+                return False
+            entry = [key, topic, payload]
+            self._queue.append(entry)
+            if key is not None:
+                self._pending[key] = entry
+            start = not self._running
+            self._running = True
+        if start:
+            self._start()
+        return True
+
+    def _make_room_locked(self) -> bool:
+        if self.overflow == "block" and _can_block():
+            if self._cond.wait_for(lambda: len(self._queue) < self.max_size, timeout=BLOCK_TIMEOUT):
+                return True
+        if self.overflow in ("drop_newest", "block"):
+            return False
+        oldest = self._queue.popleft()
+        if oldest[0] is not None:
+            self._pending.pop(oldest[0], None)
+        self.dropped += 1
+        self._bus.metrics.dropped(self.sub.stats, self.sub.topics_of(oldest[1], oldest[2]))
+        return True
+
+    def _take(self) -> list | None:
+        with self._cond:
+            if not self._queue:
+                self._running = False
+                return None
+            entry = self._queue.popleft()
+            if entry[0] is not None:
+                self._pending.pop(entry[0], None)
+            self._cond.notify()
+            return entry
+
+    def _stopped(self) -> None:
+        with self._cond:
+            self._running = False
+
+    def _start(self) -> None:
+        if not self.sub.is_async:
+            self._bus._submit(self._drain_sync)
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is not None:
+            self._loop = loop
+            self._bus._track_task(loop.create_task(self._drain_async()))
+        elif self._loop is not None and self._loop.is_running():
+            self._loop.call_soon_threadsafe(lambda: self._bus._track_task(self._loop.create_task(self._drain_async())))
+        else:
+            # ponytail: синхронный фоновый поток без запущенного event loop
+            asyncio.run(self._drain_async())
+
+    async def _drain_async(self) -> None:
+        try:
+            while (entry := self._take()) is not None:
+                _, topic, payload = entry
+                ok = timed_out = False
+                started = time.perf_counter()
+                try:
+                    call = self._bus._call_async_handler(self.sub, topic, payload)
+                    await (asyncio.wait_for(call, self.timeout) if self.timeout else call)
+                    self.processed += 1
+                    ok = True
+                except asyncio.TimeoutError:
+                    self.timeouts += 1
+                    timed_out = True
+                    _log.warning("Async subscriber %s timed out after %.1fs on topic '%s'", self.sub.handler, self.timeout, topic)
+                except Exception as exc:  # noqa: BLE001
+                    self.errors += 1
+                    _log.exception("Error in async subscriber %s for topic '%s': %s", self.sub.handler, topic, exc)
+                self._bus.metrics.completed(
+                    self.sub.stats, self.sub.topics_of(topic, payload), (time.perf_counter() - started) * 1000, ok, timed_out
+                )
+        except BaseException:
+            self._stopped()
+            raise
+
+    def _drain_sync(self) -> None:
+        try:
+            while (entry := self._take()) is not None:
+                _, topic, payload = entry
+                ok = False
+                started = time.perf_counter()
+                try:
+                    self._bus._call_sync_handler(self.sub, topic, payload)
+                    self.processed += 1
+                    ok = True
+                except Exception as exc:  # noqa: BLE001
+                    self.errors += 1
+                    _log.exception("Error in subscriber %s for topic '%s': %s", self.sub.handler, topic, exc)
+                elapsed = time.perf_counter() - started
+                # Поток прервать нельзя: превышение таймаута только учитывается
+                timed_out = bool(self.timeout and elapsed > self.timeout)
+                if timed_out:
+                    self.timeouts += 1
+                    _log.warning("Subscriber %s exceeded %.1fs on topic '%s'", self.sub.handler, self.timeout, topic)
+                self._bus.metrics.completed(self.sub.stats, self.sub.topics_of(topic, payload), elapsed * 1000, ok, timed_out)
+        except BaseException:
+            self._stopped()
+            raise
+
+    def get_stats(self) -> dict[str, Any]:
+        with self._cond:
+            queued = len(self._queue)
+        return {
+            "pattern": self.sub.pattern,
+            "handler": getattr(self.sub.handler, "__qualname__", repr(self.sub.handler)),
+            "mode": "async" if self.sub.is_async else "thread",
+            "queued": queued,
+            "max_size": self.max_size,
+            "overflow": self.overflow,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+        }
+
+
+class _TrieNode:
+    """Узел дерева масок: дочерние по сегменту, дочерний для «+»/«*», подписчики на узле и на хвост «#»."""
+
+    __slots__ = ("any_one", "children", "subs", "tail")
+
+    def __init__(self) -> None:
+        self.children: dict[str, _TrieNode] = {}
+        self.any_one: _TrieNode | None = None
+        self.subs: list[Subscriber] = []
+        self.tail: list[Subscriber] = []
+
+
+class _TopicTrie:
+    """Дерево сегментов масок подписки с семантикой match_topic.
+
+    Поиск проходит топик по сегментам один раз: время зависит от глубины топика
+    и числа подходящих ветвей, а не от общего числа подписок.
+    """
+
+    def __init__(self) -> None:
+        self._root = _TrieNode()
+
+    def _bucket(self, pattern: str) -> list[Subscriber]:
+        """Список подписчиков маски pattern (узлы создаются при необходимости)."""
+        if pattern in ("*", "#"):
+            return self._root.tail
+        parts = pattern.split(".")
+        trailing = parts[-1] == "#"
+        node = self._root
+        for part in parts[:-1] if trailing else parts:
+            if part in ("*", "+"):
+                if node.any_one is None:
+                    node.any_one = _TrieNode()
+                node = node.any_one
+            else:
+                child = node.children.get(part)
+                if child is None:
+                    child = node.children[part] = _TrieNode()
+                node = child
+        return node.tail if trailing else node.subs
+
+    def insert(self, sub: Subscriber) -> bool:
+        """Добавить подписчика; False, если такой обработчик уже подписан на эту маску."""
+        bucket = self._bucket(sub.pattern)
+        # Синонимы (a.* и a.+, * и #) делят список: сравниваем и маску, и обработчик
+        if any(s.pattern == sub.pattern and s.handler == sub.handler for s in bucket):
+            return False
+        bucket.append(sub)
+        return True
+
+    def match(self, topic: str) -> list[Subscriber]:
+        found: list[Subscriber] = []
+        frontier = [self._root]
+        for part in topic.split("."):
+            next_frontier = []
+            for node in frontier:
+                if node.tail:
+                    found.extend(node.tail)
+                child = node.children.get(part)
+                if child is not None:
+                    next_frontier.append(child)
+                if node.any_one is not None:
+                    next_frontier.append(node.any_one)
+            if not next_frontier:
+                return found
+            frontier = next_frontier
+        for node in frontier:
+            found.extend(node.subs)
+            found.extend(node.tail)
+        return found
 
 
 class EventBus:
@@ -84,25 +371,71 @@ class EventBus:
         self._subscribers: list[Subscriber] = []
         self._exact_subscribers: dict[str, list[Subscriber]] = {}
         self._wildcard_subscribers: list[Subscriber] = []
+        self._wildcard_trie = _TopicTrie()
+        # LRU топик → подписчики; сбрасывается при любом изменении подписок
+        self._match_cache: OrderedDict[str, tuple[Subscriber, ...]] = OrderedDict()
+        self._cache_hits = 0
+        self._cache_misses = 0
         self._lock = threading.Lock()
         self._background_tasks: set[asyncio.Task] = set()
-
-    def subscribe(self, pattern: str, handler: Callable) -> Callable:
-        """Зарегистрировать обработчик для топика или маски pattern."""
+        self._background_futures: set[Future] = set()
+        self._executor: ThreadPoolExecutor | None = None
+        self.metrics = BusMetrics()
+        # Журнал долговременных подписок (backend.core.durable_events), подключается при загрузке
+        self.durable: DurableEvents | None = None
+
+    def subscribe(
+        self,
+        pattern: str,
+        handler: Callable,
+        *,
+        mode: str | None = None,
+        max_queue: int | None = None,
+        overflow: str = "drop_oldest",
+        timeout: float | None = None,
+        coalesce_key: Callable[[str, Any], Hashable] | None = None,
+        batch: bool = False,
+    ) -> Callable:
+        """Зарегистрировать обработчик для топика или маски pattern.
+
+        Асинхронные обработчики получают очередь (Mailbox) длиной max_queue с политикой
+        overflow и таймаутом timeout на событие. Синхронные по умолчанию вызываются
+        прямо в publish() (mode="inline"); mode="thread" переносит их в пул потоков
+        шины с такой же очередью. С batch=True обработчик вызывается с одним аргументом —
+        списком пар (topic, payload): всеми подходящими событиями одного publish_many().
+        """
         if not callable(handler):
             raise ValidationError(message="Handler must be callable", code="INVALID_HANDLER")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValidationError(message=f"Unknown overflow policy: {overflow}", code="INVALID_OVERFLOW_POLICY")
+        if overflow == "coalesce" and (batch or not callable(coalesce_key)):
+            raise ValidationError(message="coalesce policy requires coalesce_key and no batch", code="INVALID_OVERFLOW_POLICY")
 
         is_async = inspect.iscoroutinefunction(handler) or asyncio.iscoroutinefunction(handler)
+        if mode is None:
+            mode = "async" if is_async else "inline"
+        if mode not in DISPATCH_MODES or (mode == "async") != is_async:
+            raise ValidationError(message=f"Dispatch mode {mode!r} does not fit this handler", code="INVALID_DISPATCH_MODE")
         params_count = _inspect_subscriber_params(handler)
-        sub = Subscriber(pattern, handler, params_count, is_async)
+        sub = Subscriber(pattern, handler, 1 if batch else params_count, is_async)
+        sub.batch = batch
+        sub.stats = self.metrics.handler(pattern, handler)
+        if mode != "inline":
+            sub.mailbox = Mailbox(self, sub, max_queue or MAILBOX_SIZE, overflow, timeout, coalesce_key)
 
         with self._lock:
-            if not any(s.pattern == pattern and s.handler == handler for s in self._subscribers):
-                self._subscribers.append(sub)
-                if sub.has_wildcard:
+            if sub.has_wildcard:
+                added = self._wildcard_trie.insert(sub)
+                if added:
                     self._wildcard_subscribers.append(sub)
-                else:
-                    self._exact_subscribers.setdefault(pattern, []).append(sub)
+            else:
+                exact = self._exact_subscribers.setdefault(pattern, [])
+                added = not any(s.handler == handler for s in exact)
+                if added:
+                    exact.append(sub)
+            if added:
+                self._subscribers.append(sub)
+                self._match_cache.clear()
 
         return handler
 
@@ -126,12 +459,32 @@ class EventBus:
         """Переиндексация точечных подписок и подписок по маске (вызывать под _lock)."""
         self._exact_subscribers.clear()
         self._wildcard_subscribers.clear()
+        self._wildcard_trie = _TopicTrie()
+        self._match_cache.clear()
         for sub in self._subscribers:
             if sub.has_wildcard:
                 self._wildcard_subscribers.append(sub)
+                self._wildcard_trie.insert(sub)
             else:
                 self._exact_subscribers.setdefault(sub.pattern, []).append(sub)
 
+    def _match_locked(self, topic: str) -> tuple[Subscriber, ...]:
+        """Подписчики топика: точные, затем маски в порядке подписки (вызывать под _lock)."""
+        cached = self._match_cache.get(topic)
+        if cached is not None:
+            self._match_cache.move_to_end(topic)
+            self._cache_hits += 1
+            return cached
+        self._cache_misses += 1
+        matched = list(self._exact_subscribers.get(topic, ()))
+        if self._wildcard_subscribers:
+            matched.extend(sorted(self._wildcard_trie.match(topic), key=lambda s: s.order))
+        result = tuple(matched)
+        self._match_cache[topic] = result
+        if len(self._match_cache) > MATCH_CACHE_SIZE:
+            self._match_cache.popitem(last=False)
+        return result
+
     def publish(self, topic: str, payload: Any = None, is_core: bool = False) -> int:
         """Опубликовать событие в шину.
 
@@ -144,47 +497,98 @@ class EventBus:
             raise PermissionDeniedError(f"Topics starting with 'core.' are reserved for core system code: {topic}")
 
         with self._lock:
-            matching_subs = list(self._exact_subscribers.get(topic, []))
-            if self._wildcard_subscribers:
-                matching_subs.extend(s for s in self._wildcard_subscribers if match_topic(s.pattern, topic))
+            matching_subs = self._match_locked(topic)
+        self.metrics.published((topic,))
+        durable = self.durable
+        if durable is not None and durable.wants(topic):
+            durable.append([(topic, payload)])
 
         success_count = 0
         for sub in matching_subs:
-            if self._dispatch(sub, topic, payload):
+            if self._dispatch(sub, topic, [(topic, payload)] if sub.batch else payload):
+                success_count += 1
+
+        return success_count
+
+    def publish_many(self, events: Iterable[tuple[str, Any]], is_core: bool = False) -> int:
+        """Опубликовать пачку событий [(topic, payload), ...].
+
+        Зарезервированные топики проверяются до рассылки: при нарушении не доставляется ни одно
+        событие. Подписчики находятся один раз на уникальный топик под одной блокировкой;
+        batch-подписчики получают все свои события пачки одним вызовом после остальных.
+        :return: Количество успешно отработавших/вызванных обработчиков
+        """
+        events = list(events)
+        topics = dict.fromkeys(topic for topic, _ in events)
+        if not is_core:
+            reserved = [topic for topic in topics if topic.startswith("core.")]
+            if reserved:
+                raise PermissionDeniedError(f"Topics starting with 'core.' are reserved for core system code: {', '.join(reserved)}")
+
+        with self._lock:
+            resolved = {topic: self._match_locked(topic) for topic in topics}
+        self.metrics.published(topic for topic, _ in events)
+        durable = self.durable
+        if durable is not None:
+            journaled = [(topic, payload) for topic, payload in events if durable.wants(topic)]
+            if journaled:
+                durable.append(journaled)
+
+        success_count = 0
+        batches: dict[Subscriber, list[tuple[str, Any]]] = {}
+        for topic, payload in events:
+            for sub in resolved[topic]:
+                if sub.batch:
+                    batches.setdefault(sub, []).append((topic, payload))
+                elif self._dispatch(sub, topic, payload):
+                    success_count += 1
+        for sub, items in batches.items():
+            if self._dispatch(sub, items[0][0], items):
                 success_count += 1
 
         return success_count
 
     def _dispatch(self, sub: Subscriber, topic: str, payload: Any) -> bool:
         """Безопасный вызов обработчика с изоляцией ошибок."""
+        if sub.mailbox is not None:
+            try:
+                return sub.mailbox.put(topic, payload)
+            except Exception as exc:  # noqa: BLE001
+                _log.exception("Error queueing event '%s' for subscriber %s: %s", topic, sub.handler, exc)
+                return False
+        started = time.perf_counter()
         try:
-            if sub.is_async:
-                try:
-                    loop = asyncio.get_running_loop()
-                    task = loop.create_task(self._safe_async_call(sub, topic, payload))
-                    with self._lock:
-                        self._background_tasks.add(task)
-
-                    def _on_task_done(t: asyncio.Task) -> None:
-                        with self._lock:
-                            self._background_tasks.discard(t)
-
-                    task.add_done_callback(_on_task_done)
-                except RuntimeError:
-                    # ponytail: синхронный фоновый поток без запущенного event loop
-                    asyncio.run(self._safe_async_call(sub, topic, payload))
-            else:
-                self._call_sync_handler(sub, topic, payload)
-            return True
+            self._call_sync_handler(sub, topic, payload)
+            ok = True
         except Exception as exc:  # noqa: BLE001
             _log.exception("Error dispatching event '%s' to subscriber %s: %s", topic, sub.handler, exc)
-            return False
+            ok = False
+        self.metrics.completed(sub.stats, sub.topics_of(topic, payload), (time.perf_counter() - started) * 1000, ok)
+        return ok
 
-    async def _safe_async_call(self, sub: Subscriber, topic: str, payload: Any) -> None:
-        try:
-            await self._call_async_handler(sub, topic, payload)
-        except Exception as exc:  # noqa: BLE001
-            _log.exception("Error in async subscriber %s for topic '%s': %s", sub.handler, topic, exc)
+    def _track_task(self, task: asyncio.Task) -> None:
+        with self._lock:
+            self._background_tasks.add(task)
+
+        def _on_task_done(t: asyncio.Task) -> None:
+            with self._lock:
+                self._background_tasks.discard(t)
+
+        task.add_done_callback(_on_task_done)
+
+    def _submit(self, fn: Callable[[], None]) -> None:
+        """Запустить исполнителя очереди в пуле потоков шины."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=max(1, HANDLER_THREADS), thread_name_prefix="nms-bus")
+            future = self._executor.submit(fn)
+            self._background_futures.add(future)
+
+        def _on_future_done(f: Future) -> None:
+            with self._lock:
+                self._background_futures.discard(f)
+
+        future.add_done_callback(_on_future_done)
 
     async def _call_async_handler(self, sub: Subscriber, topic: str, payload: Any) -> None:
         if sub.params_count == 1:
@@ -206,30 +610,37 @@ class EventBus:
         """Очистить всех зарегистрированных подписчиков."""
         with self._lock:
             self._subscribers.clear()
-            self._exact_subscribers.clear()
-            self._wildcard_subscribers.clear()
+            self._reindex_subscribers()
 
     def get_stats(self) -> dict[str, Any]:
         """Возвращает текущую статистику шины событий."""
         with self._lock:
             subscribers_count = len(self._subscribers)
             patterns = list({s.pattern for s in self._subscribers})
-            active_tasks = len(self._background_tasks)
+            active_tasks = len(self._background_tasks) + len(self._background_futures)
+            mailboxes = [s.mailbox for s in self._subscribers if s.mailbox is not None]
+            match_cache = {"size": len(self._match_cache), "hits": self._cache_hits, "misses": self._cache_misses}
         return {
             "subscribers_count": subscribers_count,
             "patterns_count": len(patterns),
             "patterns": patterns,
             "active_tasks_count": active_tasks,
+            "match_cache": match_cache,
+            "mailboxes": [m.get_stats() for m in mailboxes],
         }
 
     async def shutdown(self, timeout: float = 5.0) -> None:
         """Остановить шину событий: отписать всех подписчиков и завершить фоновые задачи."""
         with self._lock:
             tasks = list(self._background_tasks)
+            futures = list(self._background_futures)
+            executor, self._executor = self._executor, None
             self._subscribers.clear()
-            self._exact_subscribers.clear()
-            self._wildcard_subscribers.clear()
+            self._reindex_subscribers()
 
+        tasks.extend(asyncio.wrap_future(f) for f in futures)
+        if executor is not None:
+            executor.shutdown(wait=False)
         if not tasks:
             return
 
@@ -0,0 +1,183 @@
+"""Метрики шины событий: счётчики по топикам и гистограммы задержек обработчиков.
+
+Учёт всегда включён и стоит одного захвата блокировки на публикацию и на вызов
+обработчика. По топику: публикации (со скользящей скоростью за минуту), доставки,
+ошибки и отброшенные очередью события. По обработчику (маска + функция): вызовы,
+ошибки, таймауты, отбрасывания и гистограмма времени выполнения — для асинхронных
+обработчиков это время await без ожидания в очереди.
+"""
+from __future__ import annotations
+
+import math
+import threading
+import time
+from collections.abc import Callable, Iterable
+from typing import Any
+
+from backend.core.latency import LatencyHistogram
+
+MAX_TOPICS = 1000
+RATE_WINDOW = 60.0
+
+_OVERFLOW_TOPIC = "<other topics>"
+
+HANDLER_SORT_KEYS = ("total", "max", "avg", "p95", "calls", "failures", "dropped")
+TOPIC_SORT_KEYS = ("publishes", "rate", "deliveries", "failures", "dropped")
+
+
+def handler_name(handler: Callable) -> str:
+    """Имя обработчика с модулем: по нему видно, чей подписчик тормозит."""
+    module = getattr(handler, "__module__", None) or ""
+    qualname = getattr(handler, "__qualname__", None) or type(handler).__qualname__
+    return f"{module}.{qualname}" if module else qualname
+
+
+class _TopicStats:
+    __slots__ = ("deliveries", "dropped", "failures", "publishes", "rate", "rate_at")
+
+    def __init__(self) -> None:
+        self.publishes = 0
+        self.deliveries = 0
+        self.failures = 0
+        self.dropped = 0
+        self.rate = 0.0
+        self.rate_at = time.monotonic()
+
+    def rate_per_sec(self, now: float) -> float:
+        """Экспоненциально сглаженная скорость публикаций за RATE_WINDOW секунд."""
+        return self.rate * math.exp(-(now - self.rate_at) / RATE_WINDOW) / RATE_WINDOW
+
+
+class HandlerStats:
+    __slots__ = ("calls", "dropped", "failures", "handler", "latency", "pattern", "timeouts")
+
+    def __init__(self, pattern: str, handler: str) -> None:
+        self.pattern = pattern
+        self.handler = handler
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.dropped = 0
+        self.latency = LatencyHistogram()
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "pattern": self.pattern,
+            "handler": self.handler,
+            "calls": self.calls,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "dropped": self.dropped,
+            "total_ms": round(self.latency.total_ms, 3),
+            **{k: v for k, v in self.latency.as_dict().items() if k != "count"},
+        }
+
+
+class BusMetrics:
+    """Счётчики одной шины EventBus."""
+
+    def __init__(self, max_topics: int = MAX_TOPICS) -> None:
+        self.max_topics = max_topics
+        self._lock = threading.Lock()
+        self._topics: dict[str, _TopicStats] = {}
+        self._handlers: dict[tuple[str, str], HandlerStats] = {}
+        self._started_at = time.time()
+
+    def _topic_locked(self, topic: str) -> _TopicStats:
+        st = self._topics.get(topic)
+        if st is None:
+            if len(self._topics) >= self.max_topics:
+                topic = _OVERFLOW_TOPIC
+                st = self._topics.get(topic)
+            if st is None:
+                st = self._topics[topic] = _TopicStats()
+        return st
+
+    def handler(self, pattern: str, handler: Callable) -> HandlerStats:
+        """Статистика обработчика; повторная подписка продолжает прежние счётчики."""
+        key = (pattern, handler_name(handler))
+        with self._lock:
+            st = self._handlers.get(key)
+            if st is None:
+                st = self._handlers[key] = HandlerStats(*key)
+            return st
+
+    def published(self, topics: Iterable[str]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for topic in topics:
+                st = self._topic_locked(topic)
+                st.publishes += 1
+                st.rate = st.rate * math.exp(-(now - st.rate_at) / RATE_WINDOW) + 1
+                st.rate_at = now
+
+    def completed(self, stats: HandlerStats, topics: Iterable[str], elapsed_ms: float, ok: bool, timed_out: bool = False) -> None:
+        """Учесть вызов обработчика для событий topics (у batch-подписчика их несколько)."""
+        with self._lock:
+            stats.calls += 1
+            stats.latency.record(elapsed_ms)
+            if timed_out:
+                stats.timeouts += 1
+            if not ok:
+                stats.failures += 1
+            for topic in topics:
+                st = self._topic_locked(topic)
+                if ok:
+                    st.deliveries += 1
+                else:
+                    st.failures += 1
+
+    def dropped(self, stats: HandlerStats, topics: Iterable[str]) -> None:
+        """Учесть событие, отброшенное очередью подписчика."""
+        with self._lock:
+            stats.dropped += 1
+            for topic in topics:
+                self._topic_locked(topic).dropped += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._topics.clear()
+            for st in self._handlers.values():
+                st.calls = st.failures = st.timeouts = st.dropped = 0
+                st.latency = LatencyHistogram()
+            self._started_at = time.time()
+
+    # ── Отчёты ─────────────────────────────────────────────────────
+    def get_topics(self, limit: int = 50, sort: str = "publishes") -> list[dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            items = [
+                {
+                    "topic": topic,
+                    "publishes": st.publishes,
+                    "rate": round(st.rate_per_sec(now), 3),
+                    "deliveries": st.deliveries,
+                    "failures": st.failures,
+                    "dropped": st.dropped,
+                }
+                for topic, st in self._topics.items()
+            ]
+        items.sort(key=lambda item: item[sort], reverse=True)
+        return items[:limit]
+
+    def get_handlers(self, limit: int = 50, sort: str = "total") -> list[dict[str, Any]]:
+        with self._lock:
+            items = [st.as_dict() for st in self._handlers.values() if st.calls or st.dropped]
+        key = {"total": "total_ms", "max": "max_ms", "avg": "avg_ms", "p95": "p95_ms"}.get(sort, sort)
+        items.sort(key=lambda item: item[key], reverse=True)
+        return items[:limit]
+
+    def get_summary(self) -> dict[str, Any]:
+        with self._lock:
+            topics = list(self._topics.values())
+            handlers = list(self._handlers.values())
+            started_at = self._started_at
+        return {
+            "since": started_at,
+            "topics": len(topics),
+            "publishes": sum(st.publishes for st in topics),
+            "deliveries": sum(st.deliveries for st in topics),
+            "failures": sum(st.failures for st in topics),
+            "dropped": sum(st.dropped for st in topics),
+            "handlers": len(handlers),
+        }
@@ -0,0 +1,269 @@
+"""Запрос-ответ поверх топиков шины событий: ограниченные по времени вызовы между модулями.
+
+Отвечающий регистрирует обработчик на маску топика (reply_handler), запрашивающий
+вызывает request(topic, payload, timeout) и получает возвращённое обработчиком значение.
+Каждому вызову соответствует future; по таймауту незавершённые обработчики отменяются
+(синхронный обработчик в потоке дорабатывает, но его результат отбрасывается).
+gather(..., first=N) опрашивает всех подходящих отвечающих параллельно и возвращает
+первые N успешных ответов.
+
+У каждого отвечающего есть лимит одновременных вызовов (NMS_EVENT_BUS_REPLY_CONCURRENCY):
+лишние запросы ждут свободного слота в пределах своего таймаута.
+"""
+from __future__ import annotations
+
+import asyncio
+import inspect
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable
+from typing import Any, NamedTuple, Optional
+
+from backend.core.bus import _inspect_subscriber_params, match_topic
+from backend.core.bus_metrics import handler_name
+from backend.core.exceptions import NMSError, NotFoundError
+from backend.core.latency import LatencyHistogram
+
+_log = logging.getLogger("nms.core.bus_rpc")
+
+REQUEST_TIMEOUT = 5.0
+REPLY_CONCURRENCY = int(os.environ.get("NMS_EVENT_BUS_REPLY_CONCURRENCY", "16"))
+
+
+class RequestTimeoutError(NMSError):
+    """Отвечающий не уложился в таймаут запроса."""
+
+    def __init__(self, topic: str, timeout: float):
+        super().__init__(
+            message=f"No reply to request '{topic}' within {timeout}s",
+            status_code=504,
+            code="REQUEST_TIMEOUT",
+        )
+
+
+class Reply(NamedTuple):
+    pattern: str
+    handler: str
+    value: Any
+
+
+class ReplyEndpoint:
+    """Обработчик запросов на маску топика со счётчиками и гистограммой задержек."""
+
+    def __init__(self, pattern: str, handler: Callable, max_concurrency: int) -> None:
+        self.pattern = pattern
+        self.handler = handler
+        self.name = handler_name(handler)
+        self.is_async = inspect.iscoroutinefunction(handler)
+        self.params_count = _inspect_subscriber_params(handler)
+        self.max_concurrency = max(1, max_concurrency)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+        self.cancelled = 0
+        self.in_flight = 0
+        self.latency = LatencyHistogram()
+
+    def _args(self, topic: str, payload: Any) -> tuple:
+        if self.params_count == 1:
+            return (payload,)
+        if self.params_count == 0:
+            return ()
+        return (topic, payload)
+
+    async def call(self, topic: str, payload: Any) -> Any:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            with self._lock:
+                self.in_flight += 1
+            started = time.perf_counter()
+            ok: Optional[bool] = False
+            try:
+                if self.is_async:
+                    result = await self.handler(*self._args(topic, payload))
+                else:
+                    result = await asyncio.to_thread(self.handler, *self._args(topic, payload))
+                ok = True
+                return result
+            except asyncio.CancelledError:
+                with self._lock:
+                    self.cancelled += 1
+                ok = None
+                raise
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+                    self.calls += 1
+                    self.latency.record((time.perf_counter() - started) * 1000)
+                    if ok is False:
+                        self.failures += 1
+
+    def get_stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "pattern": self.pattern,
+                "handler": self.name,
+                "calls": self.calls,
+                "failures": self.failures,
+                "cancelled": self.cancelled,
+                "in_flight": self.in_flight,
+                "max_concurrency": self.max_concurrency,
+                **{k: v for k, v in self.latency.as_dict().items() if k != "count"},
+            }
+
+
+class RequestRouter:
+    """Реестр отвечающих и маршрутизация запросов по маскам топиков."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._endpoints: list[ReplyEndpoint] = []
+        self._match_cache: dict[str, tuple[ReplyEndpoint, ...]] = {}
+        self.requests = 0
+        self.timeouts = 0
+        self.no_responder = 0
+
+    def register(self, pattern: str, handler: Callable, *, max_concurrency: Optional[int] = None) -> ReplyEndpoint:
+        """Зарегистрировать обработчик запросов; его возвращаемое значение — ответ."""
+        endpoint = ReplyEndpoint(pattern, handler, max_concurrency or REPLY_CONCURRENCY)
+        with self._lock:
+            self._endpoints = [e for e in self._endpoints if not (e.pattern == pattern and e.handler == handler)]
+            self._endpoints.append(endpoint)
+            self._match_cache.clear()
+        return endpoint
+
+    def unregister(self, pattern: str | Callable, handler: Callable | None = None) -> bool:
+        """Снять обработчик: по маске и функции, только по маске или только по функции."""
+        if callable(pattern) and handler is None:
+            handler, pattern = pattern, None
+
+        def keep(e: ReplyEndpoint) -> bool:
+            return not ((pattern is None or e.pattern == pattern) and (handler is None or e.handler == handler))
+
+        with self._lock:
+            endpoints = [e for e in self._endpoints if keep(e)]
+            removed = len(endpoints) != len(self._endpoints)
+            self._endpoints = endpoints
+            self._match_cache.clear()
+        return removed
+
+    def _match(self, topic: str) -> tuple[ReplyEndpoint, ...]:
+        with self._lock:
+            matched = self._match_cache.get(topic)
+            if matched is None:
+                if len(self._match_cache) >= 1024:
+                    self._match_cache.clear()
+                matched = self._match_cache[topic] = tuple(e for e in self._endpoints if match_topic(e.pattern, topic))
+        return matched
+
+    async def _collect(
+        self,
+        endpoints: tuple[ReplyEndpoint, ...],
+        topic: str,
+        payload: Any,
+        need: int,
+        timeout: float,
+    ) -> tuple[list[Reply], list[BaseException], bool]:
+        """Вызвать отвечающих параллельно до `need` успешных ответов.
+
+        Возвращает (ответы, исключения упавших отвечающих, истёк ли таймаут).
+        """
+        tasks = {asyncio.ensure_future(e.call(topic, payload)): e for e in endpoints}
+        replies: list[Reply] = []
+        errors: list[BaseException] = []
+        deadline = asyncio.get_running_loop().time() + timeout
+        pending = set(tasks)
+        try:
+            while pending and len(replies) < need:
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    endpoint = tasks[task]
+                    if task.exception() is not None:
+                        _log.warning("Reply handler %s failed for request '%s': %s", endpoint.name, topic, task.exception())
+                        errors.append(task.exception())
+                        continue
+                    if len(replies) < need:
+                        replies.append(Reply(endpoint.pattern, endpoint.name, task.result()))
+        finally:
+            for task in pending:
+                task.cancel()
+        timed_out = len(replies) < need and bool(pending)
+        if timed_out:
+            with self._lock:
+                self.timeouts += 1
+        return replies, errors, timed_out
+
+    async def gather(
+        self,
+        topic: str,
+        payload: Any = None,
+        *,
+        first: Optional[int] = None,
+        timeout: float = REQUEST_TIMEOUT,
+    ) -> list[Reply]:
+        """Опросить всех подходящих отвечающих и вернуть первые `first` успешных ответов (None — все).
+
+        Ответы идут в порядке поступления; ошибки отвечающих пропускаются (и пишутся в лог),
+        по таймауту возвращается то, что успело прийти, остальные вызовы отменяются.
+        """
+        endpoints = self._match(topic)
+        with self._lock:
+            self.requests += 1
+            if not endpoints:
+                self.no_responder += 1
+        if not endpoints:
+            return []
+        need = len(endpoints) if first is None else max(1, min(first, len(endpoints)))
+        replies, _, _ = await self._collect(endpoints, topic, payload, need, timeout)
+        return replies
+
+    async def request(self, topic: str, payload: Any = None, *, timeout: float = REQUEST_TIMEOUT) -> Any:
+        """Вызвать отвечающего и вернуть его ответ.
+
+        Исключение единственного отвечающего пробрасывается вызывающему. При нескольких
+        подходящих отвечающих возвращается самый быстрый успешный ответ; если все они
+        упали — пробрасывается первое исключение, RequestTimeoutError — только по истечении таймаута.
+        """
+        endpoints = self._match(topic)
+        with self._lock:
+            self.requests += 1
+            if not endpoints:
+                self.no_responder += 1
+        if not endpoints:
+            raise NotFoundError(f"No reply handler for request topic '{topic}'", code="NO_RESPONDER")
+        if len(endpoints) > 1:
+            replies, errors, timed_out = await self._collect(endpoints, topic, payload, 1, timeout)
+            if replies:
+                return replies[0].value
+            if errors and not timed_out:
+                raise errors[0]
+            raise RequestTimeoutError(topic, timeout)
+        # asyncio.wait, а не wait_for: собственный TimeoutError обработчика не выдаётся за таймаут запроса
+        task = asyncio.ensure_future(endpoints[0].call(topic, payload))
+        try:
+            done, _ = await asyncio.wait({task}, timeout=timeout)
+        finally:
+            if not task.done():
+                task.cancel()
+        if not done:
+            with self._lock:
+                self.timeouts += 1
+            raise RequestTimeoutError(topic, timeout)
+        return task.result()
+
+    def get_stats(self) -> dict[str, Any]:
+        with self._lock:
+            endpoints = list(self._endpoints)
+            stats = {"requests": self.requests, "timeouts": self.timeouts, "no_responder": self.no_responder}
+        stats["endpoints"] = [e.get_stats() for e in endpoints]
+        return stats
+
+
+request_router = RequestRouter()
@@ -3,6 +3,7 @@ from __future__ import annotations
 
 import os
 import secrets
+import time
 from functools import lru_cache
 from pathlib import Path
 from pydantic_settings import BaseSettings
@@ -38,11 +39,19 @@ def _get_or_create_secret_key() -> str:
     new_key = secrets.token_urlsafe(64)
     try:
         data_dir.mkdir(parents=True, exist_ok=True)
-        secret_file.write_text(new_key)
-        try:
-            os.chmod(secret_file, 0o600)
-        except OSError:
-            pass
+        # O_EXCL: при одновременном первом запуске нескольких воркеров ключ создаёт только один
+        fd = os.open(secret_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w") as fh:
+            fh.write(new_key)
+    except FileExistsError:
+        for _ in range(100):
+            try:
+                key = secret_file.read_text().strip()
+                if key:
+                    return key
+            except Exception:
+                pass
+            time.sleep(0.01)
     except Exception:
         pass
     return new_key
@@ -5,399 +5,207 @@ Uses Python stdlib sqlite3 and hashlib (PBKDF2-HMAC-SHA256) for zero external de
 """
 from __future__ import annotations
 
+import asyncio
 import os
+import copy
 import json
 import sqlite3
 import hashlib
+import hmac
 import secrets
+import threading
+import time
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from backend.core.db_pool import ConnectionPool, PooledConnection
+from backend.core.sql_profiler import ProfiledConnection
 
 DATA_DIR = Path(__file__).resolve().parent.parent.parent / "data"
 DB_PATH = DATA_DIR / "nms.db"
 
+DB_POOL_SIZE = int(os.environ.get("NMS_DB_POOL_SIZE", "32"))
+DB_POOL_TIMEOUT = float(os.environ.get("NMS_DB_POOL_TIMEOUT", "30"))
+DB_READ_POOL_SIZE = int(os.environ.get("NMS_DB_READ_POOL_SIZE", "16"))
+DB_READ_CACHE_KB = int(os.environ.get("NMS_DB_READ_CACHE_KB", "32768"))
+DB_READ_MMAP_BYTES = int(os.environ.get("NMS_DB_READ_MMAP_BYTES", str(256 * 1024 * 1024)))
+DB_JOURNAL_SIZE_LIMIT = int(os.environ.get("NMS_DB_JOURNAL_SIZE_LIMIT", str(64 * 1024 * 1024)))
+SETTINGS_CACHE_CHECK_INTERVAL = float(os.environ.get("NMS_SETTINGS_CACHE_CHECK_INTERVAL", "1.0"))
+PASSWORD_HASH_ITERATIONS = int(os.environ.get("NMS_PASSWORD_HASH_ITERATIONS", "100000"))
+
+# Хеши вида salt$hex (без числа итераций) созданы с 100 000 итераций
+_LEGACY_PASSWORD_ITERATIONS = 100_000
+_PASSWORD_HASH_SCHEME = "pbkdf2_sha256"
+
+_db_pools: Dict[str, ConnectionPool] = {}
+_db_pool_lock = threading.Lock()
+
+
+def _configure_connection(conn: sqlite3.Connection) -> None:
+    """PRAGMA-настройки, выполняемые один раз при создании соединения пула."""
+    # Действует только для нового файла (до создания таблиц); существующая БД переводится VACUUM-ом
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL;")
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute(f"PRAGMA journal_size_limit={DB_JOURNAL_SIZE_LIMIT};")
+    conn.execute("PRAGMA busy_timeout=30000;")
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    conn.execute("PRAGMA foreign_keys=ON;")
+
+
+def _configure_read_connection(conn: sqlite3.Connection) -> None:
+    """PRAGMA-настройки соединений только для чтения: запрет записи, больший кэш страниц и mmap."""
+    conn.execute("PRAGMA busy_timeout=30000;")
+    conn.execute("PRAGMA query_only=ON;")
+    conn.execute(f"PRAGMA cache_size=-{DB_READ_CACHE_KB};")
+    conn.execute(f"PRAGMA mmap_size={DB_READ_MMAP_BYTES};")
+    conn.execute("PRAGMA temp_store=MEMORY;")
+
+
+def _get_pool(kind: str) -> ConnectionPool:
+    pool = _db_pools.get(kind)
+    db_path = Path(DB_PATH)
+    if pool is not None and not pool.is_closed and pool.db_path == db_path and pool.pid == os.getpid():
+        return pool
+    with _db_pool_lock:
+        pool = _db_pools.get(kind)
+        if pool is not None and not pool.is_closed and pool.db_path == db_path and pool.pid == os.getpid():
+            return pool
+        if pool is not None:
+            pool.close()
+        DATA_DIR.mkdir(parents=True, exist_ok=True)
+        if kind == "read":
+            pool = ConnectionPool(
+                db_path,
+                max_size=DB_READ_POOL_SIZE,
+                timeout=DB_POOL_TIMEOUT,
+                on_connect=_configure_read_connection,
+                read_only=True,
+                factory=ProfiledConnection,
+            )
+        else:
+            pool = ConnectionPool(
+                db_path,
+                max_size=DB_POOL_SIZE,
+                timeout=DB_POOL_TIMEOUT,
+                on_connect=_configure_connection,
+                factory=ProfiledConnection,
+            )
+        _db_pools[kind] = pool
+        return pool
 
-def get_db_connection() -> sqlite3.Connection:
-    """Получить соединение с SQLite базой данных."""
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(DB_PATH, timeout=30.0)
-    conn.row_factory = sqlite3.Row
-    try:
-        conn.execute("PRAGMA journal_mode=WAL;")
-        conn.execute("PRAGMA busy_timeout=30000;")
-        conn.execute("PRAGMA synchronous=NORMAL;")
-        conn.execute("PRAGMA foreign_keys=ON;")
-    except Exception:
-        pass
-    return conn
 
+def get_db_pool() -> ConnectionPool:
+    """Пул соединений для текущего DB_PATH (пересоздаётся при смене пути или после fork)."""
+    return _get_pool("rw")
 
-def hash_password(password: str, salt: Optional[str] = None) -> str:
-    """Хеширование пароля с помощью PBKDF2-HMAC-SHA256."""
-    if not salt:
-        salt = secrets.token_hex(16)
-    key = hashlib.pbkdf2_hmac(
-        'sha256',
-        password.encode('utf-8'),
-        salt.encode('utf-8'),
-        100_000
-    )
-    return f"{salt}${key.hex()}"
 
+def get_db_read_pool() -> ConnectionPool:
+    """Пул соединений только для чтения (mode=ro, query_only) для текущего DB_PATH."""
+    return _get_pool("read")
 
-def verify_password(password: str, hashed_password: str) -> bool:
-    """Проверка пароля по хешу."""
-    try:
-        salt, _ = hashed_password.split('$', 1)
-        return hash_password(password, salt) == hashed_password
-    except Exception:
-        return False
 
+def close_db_pool() -> None:
+    """Закрыть все простаивающие соединения пулов (например, после замены файла БД)."""
+    with _db_pool_lock:
+        for pool in _db_pools.values():
+            pool.close()
+        _db_pools.clear()
+    from backend.core.db_writer import db_writer
+    db_writer.reset_connection()
+    settings_cache.invalidate()
 
-def _init_db_tables(conn: sqlite3.Connection) -> None:
-    with conn:
-        # 1. Таблица ролей
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS roles (
-                id TEXT PRIMARY KEY,
-                name TEXT UNIQUE NOT NULL,
-                description TEXT,
-                is_system BOOLEAN DEFAULT 0
-            );
-        """)
-
-        # 2. Таблица разрешений (permissions)
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS permissions (
-                id TEXT PRIMARY KEY,
-                category TEXT NOT NULL,
-                name TEXT NOT NULL,
-                description TEXT,
-                module_id TEXT DEFAULT NULL
-            );
-        """)
-
-        existing_perm_cols = {col["name"] for col in conn.execute("PRAGMA table_info(permissions)").fetchall()}
-        if "module_id" not in existing_perm_cols:
-            conn.execute("ALTER TABLE permissions ADD COLUMN module_id TEXT DEFAULT NULL")
-
-        # 3. Связь ролей и разрешений
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS role_permissions (
-                role_id TEXT NOT NULL,
-                permission_id TEXT NOT NULL,
-                PRIMARY KEY (role_id, permission_id),
-                FOREIGN KEY (role_id) REFERENCES roles (id) ON DELETE CASCADE,
-                FOREIGN KEY (permission_id) REFERENCES permissions (id) ON DELETE CASCADE
-            );
-        """)
-
-        # 4. Таблица пользователей
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id TEXT PRIMARY KEY,
-                username TEXT UNIQUE NOT NULL,
-                full_name TEXT NOT NULL DEFAULT '',
-                email TEXT,
-                uid TEXT UNIQUE NOT NULL DEFAULT '',
-                hashed_password TEXT NOT NULL DEFAULT '',
-                is_active BOOLEAN DEFAULT 1,
-                role_id TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_login TIMESTAMP,
-                FOREIGN KEY (role_id) REFERENCES roles (id)
-            );
-        """)
-
-        # Автоматическая миграция для добавления отсутствующих полей
-        existing_cols = {col["name"] for col in conn.execute("PRAGMA table_info(users)").fetchall()}
-        if "full_name" not in existing_cols:
-            conn.execute("ALTER TABLE users ADD COLUMN full_name TEXT NOT NULL DEFAULT ''")
-        if "email" not in existing_cols:
-            conn.execute("ALTER TABLE users ADD COLUMN email TEXT")
-        if "uid" not in existing_cols:
-            conn.execute("ALTER TABLE users ADD COLUMN uid TEXT NOT NULL DEFAULT ''")
-        if "hashed_password" not in existing_cols:
-            conn.execute("ALTER TABLE users ADD COLUMN hashed_password TEXT NOT NULL DEFAULT ''")
-        if "avatar" not in existing_cols:
-            conn.execute("ALTER TABLE users ADD COLUMN avatar TEXT")
-        if "token_valid_after" not in existing_cols:
-            conn.execute("ALTER TABLE users ADD COLUMN token_valid_after INTEGER DEFAULT 0")
-        if "must_change_password" not in existing_cols:
-            conn.execute("ALTER TABLE users ADD COLUMN must_change_password BOOLEAN DEFAULT 0")
-        if "failed_login_attempts" not in existing_cols:
-            conn.execute("ALTER TABLE users ADD COLUMN failed_login_attempts INTEGER DEFAULT 0")
-        if "locked_until" not in existing_cols:
-            conn.execute("ALTER TABLE users ADD COLUMN locked_until TIMESTAMP")
-        if "title" not in existing_cols:
-            conn.execute("ALTER TABLE users ADD COLUMN title TEXT DEFAULT ''")
-        if "last_seen" not in existing_cols:
-            conn.execute("ALTER TABLE users ADD COLUMN last_seen TIMESTAMP")
-        if "mfa_enabled" not in existing_cols:
-            conn.execute("ALTER TABLE users ADD COLUMN mfa_enabled INTEGER DEFAULT 0")
-        if "mfa_secret" not in existing_cols:
-            conn.execute("ALTER TABLE users ADD COLUMN mfa_secret TEXT")
-        if "mfa_recovery_codes" not in existing_cols:
-            conn.execute("ALTER TABLE users ADD COLUMN mfa_recovery_codes TEXT")
-
-        # 5. Таблица аудита логов
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS audit_logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                user_id TEXT,
-                username TEXT NOT NULL,
-                action TEXT NOT NULL,
-                resource TEXT NOT NULL,
-                details TEXT,
-                ip_address TEXT
-            );
-        """)
-
-        # 6. Таблица системных настроек (key-value)
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS system_settings (
-                key TEXT PRIMARY KEY,
-                value TEXT NOT NULL
-            );
-        """)
-
-        # 7. Таблица активных сессий пользователей
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS active_sessions (
-                id TEXT PRIMARY KEY,
-                user_id TEXT NOT NULL,
-                token_jti TEXT NOT NULL,
-                ip_address TEXT,
-                user_agent TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                is_revoked BOOLEAN DEFAULT 0,
-                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
-            );
-        """)
-
-        # 8. Таблица удаленных источников логов
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS remote_log_sources (
-                id TEXT PRIMARY KEY,
-                name TEXT NOT NULL,
-                url TEXT NOT NULL,
-                api_token TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-
-        # 9. Таблица журнала системных событий (для WebSocket replay/recovery)
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS system_events_journal (
-                seq_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                event_type TEXT NOT NULL,
-                payload TEXT NOT NULL,
-                target_user_id TEXT,
-                topic TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_events_seq_id ON system_events_journal(seq_id);")
-
-        existing_journal_cols = {col["name"] for col in conn.execute("PRAGMA table_info(system_events_journal)").fetchall()}
-        if "topic" not in existing_journal_cols:
-            conn.execute("ALTER TABLE system_events_journal ADD COLUMN topic TEXT DEFAULT NULL")
-
-        # ── Инициализация начальных ролей ───────────────────
-        default_roles = [
-            ("1", "Superuser", "Полный доступ к системе и ее конфигурации", 1),
-            ("2", "Admin", "Административный контроль, ограничение на удаление", 1),
-            ("3", "Operator", "Управление конфигурациями и мониторингом", 1),
-            ("4", "Viewer", "Только чтение параметров и логов", 1),
-        ]
-        for r_id, r_name, r_desc, r_sys in default_roles:
-            conn.execute(
-                "INSERT OR IGNORE INTO roles (id, name, description, is_system) VALUES (?, ?, ?, ?)",
-                (r_id, r_name, r_desc, r_sys)
-            )
 
-        # ── Инициализация стандартных прав ──────────────────
-        default_permissions = [
-            ("system.all", "Система", "Полный доступ", "Полные права суперпользователя"),
-            ("system.admin", "Система", "Администрирование", "Просмотр логов, бэкапы, управление сессиями"),
-            ("users.view", "Пользователи", "Просмотр пользователей", "Просмотр списка пользователей и их данных"),
-            ("users.manage", "Пользователи", "Управление пользователями", "Создание, редактирование и удаление пользователей"),
-            ("roles.view", "Доступ", "Просмотр ролей", "Просмотр списка ролей и прав"),
-            ("roles.manage", "Доступ", "Управление ролями", "Изменение матрицы прав доступа и создание ролей"),
-            ("settings.view", "Настройки", "Просмотр настроек", "Просмотр системных настроек и конфигурации"),
-            ("settings.edit", "Настройки", "Изменение настроек", "Редактирование параметров системы и модулей"),
-            ("modules.view", "Модули", "Просмотр модулей", "Просмотр списка доступных модулей и статусов"),
-            ("modules.manage", "Модули", "Управление модулями", "Включение и выключение плагинов"),
-            ("audit.view", "Аудит", "Просмотр журнала аудита", "Доступ к событиям безопасности и журналам"),
-            ("audit.export", "Аудит", "Экспорт аудита", "Экспорт журнала аудита безопасности"),
-        ]
-        for p_id, p_cat, p_name, p_desc in default_permissions:
-            conn.execute(
-                "INSERT OR IGNORE INTO permissions (id, category, name, description) VALUES (?, ?, ?, ?)",
-                (p_id, p_cat, p_name, p_desc)
-            )
+def _pool_stats(kind: str, max_size: int) -> Dict[str, Any]:
+    pool = _db_pools.get(kind)
+    if pool is None:
+        return {"max_size": max_size, "size": 0, "idle": 0, "in_use": 0}
+    return pool.get_stats()
 
-        # ── Обновление стандартов привязок для системных ролей ──
-        conn.execute("DELETE FROM role_permissions WHERE role_id IN ('1', '2', '3', '4')")
 
-        # Назначение всех прав роли Superuser ('1')
-        for p_id, _, _, _ in default_permissions:
-            conn.execute(
-                "INSERT OR IGNORE INTO role_permissions (role_id, permission_id) VALUES ('1', ?)",
-                (p_id,)
-            )
+def get_db_pool_stats() -> Dict[str, Any]:
+    """Метрики пула соединений (выдачи, ожидания, попадания по потоку)."""
+    return _pool_stats("rw", DB_POOL_SIZE)
 
-        # Назначение прав роли Admin ('2')
-        admin_perms = [
-            "system.admin", "users.view", "users.manage", "roles.view", "roles.manage",
-            "settings.view", "settings.edit", "modules.view", "modules.manage", "audit.view", "audit.export"
-        ]
-        for p_id in admin_perms:
-            conn.execute(
-                "INSERT OR IGNORE INTO role_permissions (role_id, permission_id) VALUES ('2', ?)",
-                (p_id,)
-            )
 
-        # Назначение прав роли Operator ('3'): доступ к настройкам и модулям, без управления пользователями и ролями
-        operator_perms = ["settings.view", "settings.edit", "modules.view", "audit.view"]
-        for p_id in operator_perms:
-            conn.execute(
-                "INSERT OR IGNORE INTO role_permissions (role_id, permission_id) VALUES ('3', ?)",
-                (p_id,)
-            )
+def get_db_read_pool_stats() -> Dict[str, Any]:
+    """Метрики пула соединений только для чтения."""
+    return _pool_stats("read", DB_READ_POOL_SIZE)
 
-        # Назначение прав роли Viewer ('4'): только чтение логов и аудита (без пользователей, ролей, модулей и системных настроек)
-        viewer_perms = ["audit.view"]
-        for p_id in viewer_perms:
-            conn.execute(
-                "INSERT OR IGNORE INTO role_permissions (role_id, permission_id) VALUES ('4', ?)",
-                (p_id,)
-            )
 
-        # ── Автоматическая миграция admin -> root ──
-        conn.execute("UPDATE users SET username = 'root', full_name = 'Главный администратор (Root)', uid = 'ROOT-001' WHERE username = 'admin'")
-
-        # ── Инициализация системного пользователя root ──
-        root_user = conn.execute("SELECT id FROM users WHERE username = 'root'").fetchone()
-        if not root_user:
-            pass_hash = hash_password("admin")
-            conn.execute(
-                """
-                INSERT INTO users (id, username, full_name, email, uid, hashed_password, is_active, role_id)
-                VALUES (?, ?, ?, ?, ?, ?, 1, '1')
-                """,
-                ("usr-root-01", "root", "Главный администратор (Root)", "root@nms.local", "ROOT-001", pass_hash)
-            )
+def get_db_connection() -> PooledConnection:
+    """Получить соединение с SQLite базой данных из пула (close() возвращает его в пул).
+
+    В потоке event loop пул не ждёт: при исчерпании сразу отвечает PoolExhaustedError (503).
+    """
+    return get_db_pool().acquire(_acquire_timeout())
+
+
+def get_db_read_connection() -> PooledConnection:
+    """Получить соединение только для чтения (запросы на запись завершатся ошибкой)."""
+    return get_db_read_pool().acquire(_acquire_timeout())
+
+
+def _acquire_timeout() -> Optional[float]:
+    # Ожидание на Condition в потоке event loop остановило бы весь сервер — только try-acquire
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+    return 0.0
+
+
+def _pbkdf2(password: str, salt: str, iterations: int) -> str:
+    return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt.encode('utf-8'), iterations).hex()
 
-        # 10. Таблица уведомлений (notifications)
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS notifications (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                module_id TEXT NOT NULL DEFAULT 'core',
-                user_id TEXT NOT NULL,
-                title TEXT NOT NULL,
-                body TEXT DEFAULT '',
-                severity TEXT DEFAULT 'info',
-                category TEXT DEFAULT 'system',
-                entity_id TEXT DEFAULT NULL,
-                target_url TEXT DEFAULT NULL,
-                group_count INTEGER DEFAULT 1,
-                created_at REAL NOT NULL,
-                read_at REAL DEFAULT NULL
-            );
-        """)
-
-        existing_notif_cols = {col["name"] for col in conn.execute("PRAGMA table_info(notifications)").fetchall()}
-        if "category" not in existing_notif_cols:
-            conn.execute("ALTER TABLE notifications ADD COLUMN category TEXT DEFAULT 'system'")
-        if "target_url" not in existing_notif_cols:
-            conn.execute("ALTER TABLE notifications ADD COLUMN target_url TEXT DEFAULT NULL")
-        if "group_count" not in existing_notif_cols:
-            conn.execute("ALTER TABLE notifications ADD COLUMN group_count INTEGER DEFAULT 1")
-        if "actions" not in existing_notif_cols:
-            conn.execute("ALTER TABLE notifications ADD COLUMN actions TEXT DEFAULT NULL")
-        if "acknowledged_at" not in existing_notif_cols:
-            conn.execute("ALTER TABLE notifications ADD COLUMN acknowledged_at REAL DEFAULT NULL")
-        if "acknowledged_by" not in existing_notif_cols:
-            conn.execute("ALTER TABLE notifications ADD COLUMN acknowledged_by TEXT DEFAULT NULL")
-        if "escalated_at" not in existing_notif_cols:
-            conn.execute("ALTER TABLE notifications ADD COLUMN escalated_at REAL DEFAULT NULL")
-        if "title_template" not in existing_notif_cols:
-            conn.execute("ALTER TABLE notifications ADD COLUMN title_template TEXT DEFAULT NULL")
-
-        conn.execute("""
-            CREATE INDEX IF NOT EXISTS idx_notifications_user_read
-            ON notifications(user_id, read_at);
-        """)
-
-        conn.execute("""
-            CREATE INDEX IF NOT EXISTS idx_notifications_dedup
-            ON notifications(user_id, module_id, category, severity, title, read_at);
-        """)
-
-        conn.execute("""
-            CREATE INDEX IF NOT EXISTS idx_notifications_module
-            ON notifications(module_id);
-        """)
-
-        conn.execute("""
-            CREATE INDEX IF NOT EXISTS idx_notifications_created
-            ON notifications(created_at);
-        """)
-
-        conn.execute("""
-            CREATE INDEX IF NOT EXISTS idx_notifications_user_id
-            ON notifications(user_id, id DESC);
-        """)
-
-        # 11. Таблица предпочтений уведомлений (notification_preferences)
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS notification_preferences (
-                user_id TEXT PRIMARY KEY,
-                push_enabled BOOLEAN DEFAULT 1,
-                sound_enabled BOOLEAN DEFAULT 1,
-                muted_categories TEXT DEFAULT '[]',
-                subscribed_modules TEXT DEFAULT NULL,
-                module_rules TEXT DEFAULT '{}',
-                sound_signals TEXT DEFAULT '{}',
-                muted_until REAL DEFAULT NULL,
-                quiet_hours TEXT DEFAULT '{}'
-            );
-        """)
-
-        existing_pref_cols = {col["name"] for col in conn.execute("PRAGMA table_info(notification_preferences)").fetchall()}
-        if "subscribed_modules" not in existing_pref_cols:
-            conn.execute("ALTER TABLE notification_preferences ADD COLUMN subscribed_modules TEXT DEFAULT NULL")
-        if "module_rules" not in existing_pref_cols:
-            conn.execute("ALTER TABLE notification_preferences ADD COLUMN module_rules TEXT DEFAULT '{}'")
-        if "sound_signals" not in existing_pref_cols:
-            conn.execute("ALTER TABLE notification_preferences ADD COLUMN sound_signals TEXT DEFAULT '{}'")
-        if "muted_until" not in existing_pref_cols:
-            conn.execute("ALTER TABLE notification_preferences ADD COLUMN muted_until REAL DEFAULT NULL")
-        if "quiet_hours" not in existing_pref_cols:
-            conn.execute("ALTER TABLE notification_preferences ADD COLUMN quiet_hours TEXT DEFAULT '{}'")
 
+def _parse_password_hash(hashed_password: str) -> Tuple[str, int, str]:
+    """Разобрать хеш на (соль, число итераций, ключ); поддерживает старый формат salt$hex."""
+    parts = hashed_password.split('$')
+    if len(parts) == 4 and parts[0] == _PASSWORD_HASH_SCHEME:
+        return parts[2], int(parts[1]), parts[3]
+    if len(parts) == 2:
+        return parts[0], _LEGACY_PASSWORD_ITERATIONS, parts[1]
+    raise ValueError("Unknown password hash format")
+
+
+def hash_password(password: str, salt: Optional[str] = None, iterations: Optional[int] = None) -> str:
+    """Хеширование пароля с помощью PBKDF2-HMAC-SHA256."""
+    if not salt:
+        salt = secrets.token_hex(16)
+    iterations = iterations or PASSWORD_HASH_ITERATIONS
+    return f"{_PASSWORD_HASH_SCHEME}${iterations}${salt}${_pbkdf2(password, salt, iterations)}"
+
+
+def verify_password(password: str, hashed_password: str) -> bool:
+    """Проверка пароля по хешу."""
+    try:
+        salt, iterations, key = _parse_password_hash(hashed_password)
+        return hmac.compare_digest(_pbkdf2(password, salt, iterations), key)
+    except Exception:
+        return False
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """Хеш создан с другим числом итераций, чем PASSWORD_HASH_ITERATIONS (пересчитать при входе)."""
+    try:
+        return _parse_password_hash(hashed_password)[1] != PASSWORD_HASH_ITERATIONS
+    except Exception:
+        return False
 
 
 def init_db() -> None:
-    """Создание таблиц и наполнение первично необходимыми данными."""
-    import time
-    for attempt in range(5):
-        try:
-            conn = get_db_connection()
-            try:
-                _init_db_tables(conn)
-                break
-            finally:
-                conn.close()
-        except Exception as exc:
-            if "locked" in str(exc).lower() and attempt < 4:
-                time.sleep(0.1 * (2 ** attempt))
-                continue
-            raise
+    """Привести схему БД к актуальной версии (без записи, если миграции уже применены)."""
+    from backend.core.migrations import ensure_schema, is_schema_current
 
+    conn = get_db_connection()
+    try:
+        if is_schema_current(conn):
+            return
+    finally:
+        conn.close()
+
+    from backend.core.db_writer import db_writer
+    db_writer.execute(ensure_schema, isolated=True)
 
 
 def get_db():
@@ -409,23 +217,178 @@ def get_db():
         conn.close()
 
 
-def get_system_setting(key: str, default: Any = None) -> Any:
-    """Получить системную настройку из БД."""
-    conn = get_db_connection()
+def get_db_read():
+    """Dependency для FastAPI: соединение только для чтения для GET-эндпоинтов."""
+    conn = get_db_read_connection()
     try:
-        row = conn.execute("SELECT value FROM system_settings WHERE key = ?", (key,)).fetchone()
-        if row:
-            try:
-                return json.loads(row["value"])
-            except Exception:
-                return row["value"]
-        return default
+        yield conn
     finally:
         conn.close()
 
 
+class SettingsCache:
+    """Кэш system_settings процесса с локальной версией и сверкой счётчика изменений в БД.
+
+    Счётчик system_settings_version увеличивается триггерами при любой записи в
+    system_settings (в том числе из других процессов); кэш сверяется с ним не чаще
+    одного раза в check_interval секунд.
+    """
+
+    def __init__(self, check_interval: float) -> None:
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._values: Dict[str, Any] = {}
+        self._db_path: Optional[Path] = None
+        self._db_version: Optional[int] = None
+        self._checked_at = 0.0
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _reset_locked(self) -> None:
+        self._values.clear()
+        self.version += 1
+        self.invalidations += 1
+
+    def needs_sync(self) -> bool:
+        return Path(DB_PATH) != self._db_path or time.monotonic() - self._checked_at >= self.check_interval
+
+    def sync(self, db_version: Optional[int]) -> None:
+        """Сверить кэш со счётчиком изменений БД (None — счётчик недоступен, кэш сбрасывается)."""
+        with self._lock:
+            db_path = Path(DB_PATH)
+            if db_path != self._db_path or db_version is None or db_version != self._db_version:
+                self._reset_locked()
+            self._db_path = db_path
+            self._db_version = db_version
+            self._checked_at = time.monotonic()
+
+    def lookup(self, keys: List[str]) -> Tuple[Dict[str, Any], List[str], int]:
+        """Найти ключи в кэше: (найденные значения, отсутствующие в кэше ключи, версия кэша)."""
+        found: Dict[str, Any] = {}
+        missing: List[str] = []
+        with self._lock:
+            for key in keys:
+                value = self._values.get(key, _NOT_CACHED)
+                if value is _NOT_CACHED:
+                    missing.append(key)
+                elif value is not _ABSENT:
+                    found[key] = value
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+            return found, missing, self.version
+
+    def store(self, keys: List[str], loaded: Dict[str, Any], version: int) -> None:
+        """Сохранить прочитанные из БД значения (отсутствующие ключи тоже кэшируются)."""
+        with self._lock:
+            if version != self.version:
+                return
+            for key in keys:
+                self._values[key] = loaded.get(key, _ABSENT)
+
+    def write_through(self, key: str, value: Any, db_version: Optional[int]) -> None:
+        """Обновить значение после записи в БД и сдвинуть версию."""
+        with self._lock:
+            expected = self._db_version + 1 if self._db_version is not None else None
+            if db_version is None or db_version != expected or Path(DB_PATH) != self._db_path:
+                # Параллельно изменились и другие ключи (или другой процесс) — сбросить всё
+                self._values.clear()
+                self.invalidations += 1
+                self._db_path = Path(DB_PATH)
+                self._checked_at = time.monotonic()
+            self._db_version = db_version
+            self._values[key] = value
+            self.version += 1
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._reset_locked()
+            self._checked_at = 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "keys": len(self._values),
+                "version": self.version,
+                "db_version": self._db_version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
+
+
+_NOT_CACHED = object()
+_ABSENT = object()
+
+settings_cache = SettingsCache(SETTINGS_CACHE_CHECK_INTERVAL)
+
+
+def _decode_setting(raw: str) -> Any:
+    try:
+        return json.loads(raw)
+    except Exception:
+        return raw
+
+
+def _read_settings_version(conn: sqlite3.Connection) -> Optional[int]:
+    try:
+        row = conn.execute("SELECT version FROM system_settings_version WHERE id = 1").fetchone()
+    except sqlite3.Error:
+        return None
+    return int(row[0]) if row else None
+
+
+def get_settings_version() -> int:
+    """Локальная версия кэша настроек (растёт при любом изменении или сбросе)."""
+    return settings_cache.version
+
+
+def invalidate_settings_cache() -> None:
+    """Сбросить кэш настроек (после прямых SQL-изменений system_settings или замены БД)."""
+    settings_cache.invalidate()
+
+
+def get_system_settings(keys: Iterable[str], defaults: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Получить несколько системных настроек одним запросом (через кэш процесса)."""
+    key_list = list(dict.fromkeys(keys))
+    defaults = defaults or {}
+    found, missing, version = settings_cache.lookup(key_list)
+    if missing or settings_cache.needs_sync():
+        conn = get_db_connection()
+        try:
+            if settings_cache.needs_sync():
+                settings_cache.sync(_read_settings_version(conn))
+                found, missing, version = settings_cache.lookup(key_list)
+            if missing:
+                placeholders = ", ".join("?" for _ in missing)
+                rows = conn.execute(
+                    f"SELECT key, value FROM system_settings WHERE key IN ({placeholders})", missing
+                ).fetchall()
+                loaded = {row["key"]: _decode_setting(row["value"]) for row in rows}
+                settings_cache.store(missing, loaded, version)
+                found.update(loaded)
+        finally:
+            conn.close()
+
+    result: Dict[str, Any] = {}
+    for key in key_list:
+        if key in found:
+            value = found[key]
+            # Кэш хранит общий объект — вызывающий код может его изменять
+            result[key] = copy.deepcopy(value) if isinstance(value, (dict, list)) else value
+        else:
+            result[key] = defaults.get(key)
+    return result
+
+
+def get_system_setting(key: str, default: Any = None) -> Any:
+    """Получить системную настройку (через кэш процесса)."""
+    return get_system_settings([key], {key: default})[key]
+
+
 def set_system_setting(key: str, value: Any) -> None:
-    """Сохранить системную настройку в БД."""
+    """Сохранить системную настройку в БД и обновить кэш (write-through)."""
     conn = get_db_connection()
     try:
         val_str = json.dumps(value) if not isinstance(value, str) else value
@@ -433,11 +396,11 @@ def set_system_setting(key: str, value: Any) -> None:
             "INSERT INTO system_settings (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
             (key, val_str),
         )
+        db_version = _read_settings_version(conn)
         conn.commit()
     finally:
         conn.close()
-
-
+    settings_cache.write_through(key, _decode_setting(val_str), db_version)
 
 
 
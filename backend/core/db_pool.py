@@ -0,0 +1,328 @@
+"""Пул переиспользуемых SQLite-соединений с привязкой к потокам.
+
+Соединение создаётся один раз (sqlite3.connect + PRAGMA), после чего живёт в пуле
+и многократно выдаётся вызывающему коду. Поток по возможности получает то же
+соединение, которое вернул последним (тёплый кэш страниц и подготовленных выражений).
+"""
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+_log = logging.getLogger("nms.core.db_pool")
+
+DEFAULT_MAX_SIZE = 32
+DEFAULT_MAX_IDLE = 8
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_STATEMENT_CACHE_SIZE = 256
+DEFAULT_HEALTH_CHECK_INTERVAL = 30.0
+
+
+class PoolExhaustedError(sqlite3.OperationalError):
+    """Все соединения пула заняты дольше допустимого таймаута ожидания."""
+
+
+class _ReleasedConnection:
+    """Заглушка вместо соединения, уже возвращённого в пул."""
+
+    __slots__ = ()
+
+    def __getattr__(self, name: str) -> Any:
+        raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+
+
+_RELEASED = _ReleasedConnection()
+
+
+class PooledConnection:
+    """Прокси над sqlite3.Connection: close() возвращает соединение в пул вместо закрытия.
+
+    Поддерживает тот же контекстный менеджер транзакции (`with conn:`), что и sqlite3.Connection.
+    """
+
+    __slots__ = ("_conn", "_pool")
+
+    def __init__(self, conn: sqlite3.Connection, pool: ConnectionPool) -> None:
+        object.__setattr__(self, "_conn", conn)
+        object.__setattr__(self, "_pool", pool)
+
+    @property
+    def raw(self) -> sqlite3.Connection:
+        """Исходное sqlite3-соединение (только на время владения прокси)."""
+        return self._conn
+
+    @property
+    def closed(self) -> bool:
+        return self._conn is _RELEASED
+
+    def execute(self, sql: str, parameters: Any = (), /) -> sqlite3.Cursor:
+        return self._conn.execute(sql, parameters)
+
+    def executemany(self, sql: str, seq_of_parameters: Any, /) -> sqlite3.Cursor:
+        return self._conn.executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script: str, /) -> sqlite3.Cursor:
+        return self._conn.executescript(sql_script)
+
+    def cursor(self, *args: Any) -> sqlite3.Cursor:
+        return self._conn.cursor(*args)
+
+    def commit(self) -> None:
+        self._conn.commit()
+
+    def rollback(self) -> None:
+        self._conn.rollback()
+
+    def close(self) -> None:
+        """Вернуть соединение в пул (повторный вызов безопасен)."""
+        conn = self._conn
+        if conn is _RELEASED:
+            return
+        object.__setattr__(self, "_conn", _RELEASED)
+        self._pool.release(conn)
+
+    def __enter__(self) -> PooledConnection:
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return self._conn.__exit__(exc_type, exc, tb)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self._conn, name, value)
+
+    def __del__(self) -> None:
+        # Страховка для кода, забывающего close() (например, `with ctx.get_db() as conn:`)
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """Потокобезопасный пул SQLite-соединений с лимитом размера, health-check и метриками."""
+
+    def __init__(
+        self,
+        db_path: Path | str,
+        *,
+        max_size: int = DEFAULT_MAX_SIZE,
+        max_idle: int = DEFAULT_MAX_IDLE,
+        timeout: float = DEFAULT_TIMEOUT,
+        statement_cache_size: int = DEFAULT_STATEMENT_CACHE_SIZE,
+        health_check_interval: float = DEFAULT_HEALTH_CHECK_INTERVAL,
+        on_connect: Callable[[sqlite3.Connection], None] | None = None,
+        read_only: bool = False,
+        factory: type[sqlite3.Connection] = sqlite3.Connection,
+    ) -> None:
+        if max_size <= 0:
+            raise ValueError("max_size must be greater than 0.")
+        self.db_path = Path(db_path)
+        self.max_size = max_size
+        self.max_idle = max(0, min(max_idle, max_size))
+        self.timeout = timeout
+        self.statement_cache_size = statement_cache_size
+        self.health_check_interval = health_check_interval
+        self.read_only = read_only
+        self.factory = factory
+        self.pid = os.getpid()
+        self._on_connect = on_connect
+        self._cond = threading.Condition(threading.Lock())
+        # (соединение, ident потока-последнего владельца, время возврата по monotonic)
+        self._idle: list[tuple[sqlite3.Connection, int, float]] = []
+        self._size = 0
+        self._closed = False
+
+        self._checkouts = 0
+        self._thread_hits = 0
+        self._created = 0
+        self._discarded = 0
+        self._waits = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._timeouts = 0
+        self._health_check_failures = 0
+
+    # ── Выдача и возврат ───────────────────────────────────────────
+    def acquire(self, timeout: float | None = None) -> PooledConnection:
+        """Получить соединение из пула (ожидает освобождения при достижении max_size).
+
+        :param timeout: Предел ожидания вместо таймаута пула (0 — не ждать, для кода в event loop)
+        """
+        timeout = self.timeout if timeout is None else timeout
+        thread_id = threading.get_ident()
+        started = time.monotonic()
+        waited = False
+
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise sqlite3.ProgrammingError(f"Connection pool for {self.db_path} is closed")
+                    entry = self._pop_idle(thread_id)
+                    if entry is not None:
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = timeout - (time.monotonic() - started)
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolExhaustedError(
+                            f"SQLite connection pool exhausted ({self.max_size} connections in use, waited {timeout:.1f}s)"
+                        )
+                    waited = True
+                    self._cond.wait(remaining)
+
+            if entry is None:
+                try:
+                    conn = self._connect()
+                except BaseException:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                break
+
+            conn, _, released_at = entry
+            if time.monotonic() - released_at < self.health_check_interval or self._is_healthy(conn):
+                break
+            self._health_check_failures += 1
+            self._discard(conn)
+
+        waited_for = time.monotonic() - started
+        with self._cond:
+            self._checkouts += 1
+            if waited:
+                self._waits += 1
+                self._wait_time_total += waited_for
+                self._wait_time_max = max(self._wait_time_max, waited_for)
+        return PooledConnection(conn, self)
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """Вернуть соединение в пул; незавершённая транзакция откатывается, настройки владельца сбрасываются."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = sqlite3.Row
+            conn.isolation_level = ""
+            conn.text_factory = str
+        except Exception as exc:
+            _log.debug("Discarding broken pooled SQLite connection: %s", exc)
+            self._discard(conn)
+            return
+
+        with self._cond:
+            keep = not self._closed and os.getpid() == self.pid and len(self._idle) < self.max_idle
+            if keep:
+                self._idle.append((conn, threading.get_ident(), time.monotonic()))
+                self._cond.notify()
+                return
+        self._discard(conn)
+
+    def _pop_idle(self, thread_id: int) -> tuple[sqlite3.Connection, int, float] | None:
+        """Достать простаивающее соединение, предпочитая последнее соединение этого же потока (под _cond)."""
+        if not self._idle:
+            return None
+        for idx in range(len(self._idle) - 1, -1, -1):
+            if self._idle[idx][1] == thread_id:
+                self._thread_hits += 1
+                return self._idle.pop(idx)
+        return self._idle.pop()
+
+    def _open(self, target: Path | str, uri: bool = False) -> sqlite3.Connection:
+        return sqlite3.connect(
+            target,
+            timeout=self.timeout,
+            check_same_thread=False,
+            cached_statements=self.statement_cache_size,
+            uri=uri,
+            factory=self.factory,
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn: sqlite3.Connection | None = None
+        if self.read_only:
+            try:
+                conn = self._open(f"{self.db_path.resolve().as_uri()}?mode=ro", uri=True)
+                # SQLite открывает файл лениво — проверяем доступность сразу
+                conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+            except sqlite3.Error as exc:
+                # Файл ещё не создан или недоступен -shm: обычное соединение + query_only в on_connect
+                _log.debug("Read-only open of %s failed (%s), falling back to read-write handle", self.db_path, exc)
+                if conn is not None:
+                    conn.close()
+                conn = None
+        if conn is None:
+            conn = self._open(self.db_path)
+        conn.row_factory = sqlite3.Row
+        if self._on_connect is not None:
+            try:
+                self._on_connect(conn)
+            except Exception as exc:
+                _log.debug("SQLite connection setup hook failed: %s", exc)
+        with self._cond:
+            self._created += 1
+        return conn
+
+    def _is_healthy(self, conn: sqlite3.Connection) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn: sqlite3.Connection) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._discarded += 1
+            self._cond.notify()
+
+    # ── Управление и метрики ───────────────────────────────────────
+    def close(self) -> None:
+        """Закрыть пул: простаивающие соединения закрываются сразу, выданные — при возврате."""
+        with self._cond:
+            self._closed = True
+            idle = [entry[0] for entry in self._idle]
+            self._idle.clear()
+            self._cond.notify_all()
+        for conn in idle:
+            self._discard(conn)
+
+    @property
+    def is_closed(self) -> bool:
+        return self._closed
+
+    def get_stats(self) -> dict[str, Any]:
+        """Метрики пула: размер, выдачи, ожидания и отбраковка соединений."""
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                "read_only": self.read_only,
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": idle,
+                "in_use": self._size - idle,
+                "checkouts": self._checkouts,
+                "thread_affinity_hits": self._thread_hits,
+                "created": self._created,
+                "discarded": self._discarded,
+                "waits": self._waits,
+                "wait_time_total_ms": round(self._wait_time_total * 1000, 3),
+                "wait_time_max_ms": round(self._wait_time_max * 1000, 3),
+                "timeouts": self._timeouts,
+                "health_check_failures": self._health_check_failures,
+            }
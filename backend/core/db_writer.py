@@ -0,0 +1,339 @@
+"""Единственный писатель SQLite: очередь операций записи и групповые транзакции.
+
+Все запись-операции ядра передаются в выделенный поток, который владеет единственным
+пишущим соединением и объединяет накопившиеся операции в одну транзакцию
+(BEGIN IMMEDIATE … COMMIT). Каждая операция выполняется в собственном SAVEPOINT,
+поэтому ошибка одной операции не откатывает соседние. Результат возвращается через Future.
+
+Операции получают sqlite3.Connection и НЕ должны сами вызывать commit()/rollback()
+или использовать `with conn:` — транзакцией управляет писатель. Для операций, которым
+нужна собственная транзакция (например, инициализация схемы), есть флаг isolated=True.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any
+
+from backend.core.sql_profiler import ProfiledConnection
+
+_log = logging.getLogger("nms.core.db_writer")
+
+DEFAULT_MAX_BATCH = 256
+
+
+def _current_db_path() -> Path:
+    from backend.core import database
+    return Path(database.DB_PATH)
+
+
+def _configure_connection(conn: sqlite3.Connection) -> None:
+    from backend.core.database import _configure_connection as configure
+    configure(conn)
+
+
+class _WriteOp:
+    __slots__ = ("fn", "args", "kwargs", "future", "isolated", "enqueued_at")
+
+    def __init__(self, fn: Callable[..., Any], args: tuple, kwargs: dict, isolated: bool) -> None:
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future: Future = Future()
+        self.isolated = isolated
+        self.enqueued_at = time.monotonic()
+
+
+_STOP = object()
+_RESET = object()
+
+
+class DatabaseWriter:
+    """Поток-писатель с очередью операций, групповыми коммитами и метриками."""
+
+    def __init__(
+        self,
+        path_provider: Callable[[], Path] = _current_db_path,
+        *,
+        on_connect: Callable[[sqlite3.Connection], None] | None = _configure_connection,
+        max_batch: int = DEFAULT_MAX_BATCH,
+    ) -> None:
+        self._path_provider = path_provider
+        self._on_connect = on_connect
+        self.max_batch = max(1, max_batch)
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._pid = os.getpid()
+        self._conn: sqlite3.Connection | None = None
+        self._conn_path: Path | None = None
+        self._depth = 0
+
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._batches = 0
+        self._batched_ops = 0
+        self._max_batch_seen = 0
+        self._max_depth = 0
+        self._commit_time_total = 0.0
+        self._commit_time_max = 0.0
+        self._last_commit_ms = 0.0
+        self._queue_wait_total = 0.0
+
+    # ── Публичный API ──────────────────────────────────────────────
+    def submit(self, fn: Callable[..., Any], *args: Any, isolated: bool = False, **kwargs: Any) -> Future:
+        """Поставить операцию fn(conn, *args, **kwargs) в очередь записи; вернуть Future с её результатом."""
+        op = _WriteOp(fn, args, kwargs, isolated)
+        if self.in_writer_thread():
+            # Вложенный вызов из операции писателя выполняется сразу в текущей транзакции
+            self._run_inline(op)
+            return op.future
+        self._ensure_started()
+        with self._lock:
+            self._submitted += 1
+            self._depth += 1
+            self._max_depth = max(self._max_depth, self._depth)
+        self._queue.put(op)
+        return op.future
+
+    def execute(self, fn: Callable[..., Any], *args: Any, isolated: bool = False, timeout: float | None = None, **kwargs: Any) -> Any:
+        """Выполнить операцию записи и дождаться результата (исключение операции пробрасывается)."""
+        return self.submit(fn, *args, isolated=isolated, **kwargs).result(timeout)
+
+    async def execute_async(self, fn: Callable[..., Any], *args: Any, isolated: bool = False, **kwargs: Any) -> Any:
+        """Асинхронный вариант execute(), не блокирующий event loop."""
+        return await asyncio.wrap_future(self.submit(fn, *args, isolated=isolated, **kwargs))
+
+    def in_writer_thread(self) -> bool:
+        thread = self._thread
+        return thread is not None and thread.ident == threading.get_ident()
+
+    def reset_connection(self) -> None:
+        """Переоткрыть пишущее соединение перед следующей операцией (например, после замены файла БД)."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_RESET)
+        else:
+            self._close_connection()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Дописать очередь и остановить поток-писатель."""
+        with self._lock:
+            thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+        if thread.is_alive():
+            _log.warning("Database writer did not stop within %.1fs", timeout)
+
+    def get_stats(self) -> dict[str, Any]:
+        """Метрики писателя: глубина очереди, размер пакетов, латентность коммита."""
+        with self._lock:
+            batches = self._batches
+            done = self._completed + self._failed
+            return {
+                "running": self._thread is not None and self._thread.is_alive(),
+                "queue_depth": self._depth,
+                "max_queue_depth": self._max_depth,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+                "batches": batches,
+                "avg_batch_size": round(self._batched_ops / batches, 2) if batches else 0.0,
+                "max_batch_size": self._max_batch_seen,
+                "avg_queue_wait_ms": round(self._queue_wait_total / done * 1000, 3) if done else 0.0,
+                "commit_latency_avg_ms": round(self._commit_time_total / batches * 1000, 3) if batches else 0.0,
+                "commit_latency_max_ms": round(self._commit_time_max * 1000, 3),
+                "last_commit_ms": round(self._last_commit_ms, 3),
+            }
+
+    # ── Поток-писатель ─────────────────────────────────────────────
+    def _ensure_started(self) -> None:
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                # После fork поток и соединение родителя недоступны
+                self._pid = os.getpid()
+                self._queue = queue.SimpleQueue()
+                self._conn = None
+                self._depth = 0
+            self._thread = threading.Thread(target=self._run, name="nms-db-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                self._close_connection()
+                return
+            if item is _RESET:
+                self._close_connection()
+                continue
+
+            batch: list[_WriteOp] = [item]
+            stop_after = False
+            while len(batch) < self.max_batch:
+                try:
+                    nxt = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is _STOP:
+                    stop_after = True
+                    break
+                if nxt is _RESET:
+                    self._process(batch)
+                    batch = []
+                    self._close_connection()
+                    continue
+                batch.append(nxt)
+
+            if batch:
+                self._process(batch)
+            if stop_after:
+                self._close_connection()
+                return
+
+    def _process(self, batch: list[_WriteOp]) -> None:
+        started = time.monotonic()
+        with self._lock:
+            self._depth -= len(batch)
+            for op in batch:
+                self._queue_wait_total += started - op.enqueued_at
+
+        grouped: list[_WriteOp] = []
+        for op in batch:
+            if op.isolated:
+                if grouped:
+                    self._commit_group(grouped)
+                    grouped = []
+                self._run_isolated(op)
+            else:
+                grouped.append(op)
+        if grouped:
+            self._commit_group(grouped)
+
+    def _connection(self) -> sqlite3.Connection:
+        path = self._path_provider()
+        if self._conn is not None and self._conn_path == path:
+            return self._conn
+        self._close_connection()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False, factory=ProfiledConnection)
+        conn.row_factory = sqlite3.Row
+        if self._on_connect is not None:
+            try:
+                self._on_connect(conn)
+            except Exception as exc:
+                _log.debug("SQLite writer connection setup failed: %s", exc)
+        self._conn = conn
+        self._conn_path = path
+        return conn
+
+    def _close_connection(self) -> None:
+        conn, self._conn, self._conn_path = self._conn, None, None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def _commit_group(self, ops: list[_WriteOp]) -> None:
+        results: list[tuple[_WriteOp, Any, BaseException | None]] = []
+        commit_started = time.monotonic()
+        try:
+            conn = self._connection()
+            if conn.in_transaction:
+                conn.rollback()
+            conn.execute("BEGIN IMMEDIATE")
+        except Exception as exc:
+            _log.error("Database writer failed to open transaction: %s", exc)
+            self._close_connection()
+            self._finish([(op, None, exc) for op in ops])
+            return
+
+        for idx, op in enumerate(ops):
+            savepoint = f"nms_w{idx}"
+            try:
+                conn.execute(f"SAVEPOINT {savepoint}")
+                result = op.fn(conn, *op.args, **op.kwargs)
+                conn.execute(f"RELEASE {savepoint}")
+                results.append((op, result, None))
+            except BaseException as exc:
+                try:
+                    conn.execute(f"ROLLBACK TO {savepoint}")
+                    conn.execute(f"RELEASE {savepoint}")
+                except Exception:
+                    pass
+                results.append((op, None, exc))
+
+        try:
+            conn.execute("COMMIT")
+        except Exception as exc:
+            _log.error("Database writer failed to commit batch of %d operations: %s", len(ops), exc)
+            try:
+                conn.rollback()
+            except Exception:
+                self._close_connection()
+            results = [(op, None, exc) for op, _, _ in results]
+
+        elapsed = time.monotonic() - commit_started
+        with self._lock:
+            self._batches += 1
+            self._batched_ops += len(ops)
+            self._max_batch_seen = max(self._max_batch_seen, len(ops))
+            self._commit_time_total += elapsed
+            self._commit_time_max = max(self._commit_time_max, elapsed)
+            self._last_commit_ms = elapsed * 1000
+        self._finish(results)
+
+    def _run_isolated(self, op: _WriteOp) -> None:
+        try:
+            conn = self._connection()
+            if conn.in_transaction:
+                conn.rollback()
+            result = op.fn(conn, *op.args, **op.kwargs)
+            if conn.in_transaction:
+                conn.commit()
+            self._finish([(op, result, None)])
+        except BaseException as exc:
+            try:
+                if self._conn is not None and self._conn.in_transaction:
+                    self._conn.rollback()
+            except Exception:
+                self._close_connection()
+            self._finish([(op, None, exc)])
+
+    def _run_inline(self, op: _WriteOp) -> None:
+        try:
+            op.future.set_result(op.fn(self._connection(), *op.args, **op.kwargs))
+        except BaseException as exc:
+            op.future.set_exception(exc)
+
+    def _finish(self, results: list[tuple[_WriteOp, Any, BaseException | None]]) -> None:
+        ok = failed = 0
+        for op, result, exc in results:
+            if exc is None:
+                op.future.set_result(result)
+                ok += 1
+            else:
+                op.future.set_exception(exc)
+                failed += 1
+        with self._lock:
+            self._completed += ok
+            self._failed += failed
+
+
+db_writer = DatabaseWriter()
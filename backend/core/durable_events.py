@@ -0,0 +1,514 @@
+"""Долговременные подписки шины событий: журнал, курсоры и доставка пропущенного.
+
+Долговременная подписка (id, маска) хранится в bus_durable_subscriptions вместе с
+курсором — номером последнего подтверждённого события. Пока подписка существует,
+каждое событие event_bus, подходящее под её маску, дописывается в журнал
+bus_event_journal (в той же БД, через поток-писатель), даже если модуль выключен.
+Активный потребитель читает журнал пачками после курсора, вызывает обработчик и
+подтверждает пачку, сдвигая курсор. Доставка «хотя бы один раз»: при ошибке
+обработчика или перезапуске процесса неподтверждённые события приходят повторно.
+Событие (для batch-обработчика — пачка), не обработанное за NMS_BUS_DURABLE_MAX_ATTEMPTS
+попыток, переносится в bus_dead_letters и пропускается.
+
+При нескольких воркерах каждый регистрирует ту же подписку, но события доставляет
+только владелец аренды (колонки owner и lease_expires, срок LEASE_TTL). Остальные
+ждут истечения аренды, например после остановки владельца. Маски подписок, созданных
+или удалённых другими воркерами, перечитываются задачей bus_durable_refresh, чтобы
+события этого воркера тоже попадали в журнал.
+
+Журнал очищается задачей bus_journal_prune: удаляются события, подтверждённые всеми
+подписками, и события старше NMS_BUS_JOURNAL_RETENTION_DAYS.
+"""
+from __future__ import annotations
+
+import asyncio
+import inspect
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from collections.abc import Callable
+from typing import TYPE_CHECKING, Any, Optional
+
+from backend.core.bus import Subscriber, _inspect_subscriber_params, match_topic
+
+if TYPE_CHECKING:
+    from backend.core.bus import EventBus
+
+_log = logging.getLogger("nms.core.durable_events")
+
+BUS_JOURNAL_RETENTION_DAYS = float(os.environ.get("NMS_BUS_JOURNAL_RETENTION_DAYS", "7"))
+BUS_JOURNAL_PRUNE_INTERVAL = 3600.0
+CATCH_UP_BATCH = 200
+RETRY_DELAY = 5.0
+MAX_ATTEMPTS = int(os.environ.get("NMS_BUS_DURABLE_MAX_ATTEMPTS", "5"))
+IDLE_POLL_INTERVAL = 5.0
+LEASE_TTL = 30.0
+LEASE_RETRY_INTERVAL = LEASE_TTL / 3
+PATTERNS_REFRESH_INTERVAL = 10.0
+
+
+def _append_events(conn, rows: list[tuple[str, str, float]]) -> int:
+    conn.executemany("INSERT INTO bus_event_journal (topic, payload, created_at) VALUES (?, ?, ?)", rows)
+    return len(rows)
+
+
+def _claim(conn, sub_id: str, pattern: str, owner: str, now: float, ttl: float) -> Optional[int]:
+    """Создать подписку (курсор на конце журнала — история не воспроизводится) и взять аренду.
+
+    Возвращает курсор или None, если аренда принадлежит другому воркеру и ещё действует.
+    """
+    conn.execute(
+        """
+        INSERT INTO bus_durable_subscriptions (id, pattern, cursor, created_at, updated_at)
+        VALUES (?, ?, (SELECT COALESCE(MAX(seq), 0) FROM bus_event_journal), ?, ?)
+        ON CONFLICT(id) DO UPDATE SET pattern = excluded.pattern
+        """,
+        (sub_id, pattern, now, now),
+    )
+    claimed = conn.execute(
+        """
+        UPDATE bus_durable_subscriptions SET owner = ?, lease_expires = ?, updated_at = ?
+        WHERE id = ? AND (owner IS NULL OR owner = ? OR lease_expires IS NULL OR lease_expires < ?)
+        """,
+        (owner, now + ttl, now, sub_id, owner, now),
+    ).rowcount
+    if not claimed:
+        return None
+    return conn.execute("SELECT cursor FROM bus_durable_subscriptions WHERE id = ?", (sub_id,)).fetchone()[0]
+
+
+def _ack(conn, sub_id: str, owner: str, seq: int, now: float, ttl: float) -> bool:
+    """Сдвинуть курсор и продлить аренду; False — аренда перешла к другому воркеру."""
+    return bool(conn.execute(
+        """
+        UPDATE bus_durable_subscriptions SET cursor = MAX(cursor, ?), lease_expires = ?, updated_at = ?
+        WHERE id = ? AND owner = ?
+        """,
+        (seq, now + ttl, now, sub_id, owner),
+    ).rowcount)
+
+
+def _release(conn, sub_id: str, owner: str) -> None:
+    conn.execute(
+        "UPDATE bus_durable_subscriptions SET owner = NULL, lease_expires = NULL WHERE id = ? AND owner = ?",
+        (sub_id, owner),
+    )
+
+
+def _dead_letter(conn, sub_id: str, rows: list[tuple[int, str, str]], error: str, now: float) -> None:
+    conn.executemany(
+        "INSERT INTO bus_dead_letters (subscription_id, seq, topic, payload, error, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+        [(sub_id, seq, topic, raw, error, now) for seq, topic, raw in rows],
+    )
+
+
+def _delete_subscription(conn, sub_id: str) -> None:
+    conn.execute("DELETE FROM bus_durable_subscriptions WHERE id = ?", (sub_id,))
+
+
+def _prune(conn, retention_seconds: float) -> tuple[int, list[str]]:
+    """Удалить подтверждённые всеми подписками и устаревшие события; вернуть (удалено, отставшие подписки)."""
+    row = conn.execute("SELECT MIN(cursor) FROM bus_durable_subscriptions").fetchone()
+    acked = row[0] if row[0] is not None else conn.execute("SELECT COALESCE(MAX(seq), 0) FROM bus_event_journal").fetchone()[0]
+    removed = conn.execute("DELETE FROM bus_event_journal WHERE seq <= ?", (acked,)).rowcount
+    expired_row = conn.execute(
+        "SELECT MAX(seq) FROM bus_event_journal WHERE created_at < ?", (time.time() - retention_seconds,)
+    ).fetchone()
+    lagging: list[str] = []
+    if expired_row[0] is not None:
+        lagging = [r[0] for r in conn.execute("SELECT id FROM bus_durable_subscriptions WHERE cursor < ?", (expired_row[0],))]
+        removed += conn.execute("DELETE FROM bus_event_journal WHERE seq <= ?", (expired_row[0],)).rowcount
+    conn.execute("DELETE FROM bus_dead_letters WHERE created_at < ?", (time.time() - retention_seconds,))
+    return removed, lagging
+
+
+def _read_patterns() -> dict[str, str]:
+    from backend.core.database import get_db_read_connection
+
+    conn = get_db_read_connection()
+    try:
+        return {row[0]: row[1] for row in conn.execute("SELECT id, pattern FROM bus_durable_subscriptions")}
+    finally:
+        conn.close()
+
+
+def _read_journal(after_seq: int, limit: int) -> list[tuple[int, str, str]]:
+    from backend.core.database import get_db_read_connection
+
+    conn = get_db_read_connection()
+    try:
+        return [
+            (row[0], row[1], row[2])
+            for row in conn.execute(
+                "SELECT seq, topic, payload FROM bus_event_journal WHERE seq > ? ORDER BY seq LIMIT ?",
+                (after_seq, limit),
+            )
+        ]
+    finally:
+        conn.close()
+
+
+class DurableConsumer:
+    """Активный потребитель долговременной подписки: аренда, курсор и задача доставки."""
+
+    def __init__(self, owner: DurableEvents, sub_id: str, pattern: str, handler: Callable, batch: bool) -> None:
+        self.owner = owner
+        self.id = sub_id
+        self.cursor: Optional[int] = None
+        is_async = inspect.iscoroutinefunction(handler)
+        self.sub = Subscriber(pattern, handler, 1 if batch else _inspect_subscriber_params(handler), is_async)
+        self.sub.batch = batch
+        self.sub.stats = owner.bus.metrics.handler(pattern, handler)
+        self.task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self.leased = False
+        self._lease_until = 0.0
+        self._failed_seq: Optional[int] = None
+        self.attempts = 0
+        self.delivered = 0
+        self.failures = 0
+        self.dead_lettered = 0
+        self.last_error: Optional[str] = None
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        if self.task is None or self.task.done():
+            self.task = loop.create_task(self.run())
+
+    def wake(self) -> None:
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _call(self, topic: str, payload: Any) -> None:
+        bus = self.owner.bus
+        if self.sub.is_async:
+            await bus._call_async_handler(self.sub, topic, payload)
+        else:
+            await asyncio.to_thread(bus._call_sync_handler, self.sub, topic, payload)
+
+    async def _deliver(self, unit: list[tuple[int, str, Any, str]]) -> None:
+        """Вызвать обработчик для одного события или пачки (batch); исключение — не подтверждено."""
+        if self.sub.batch:
+            topic, payload = unit[0][1], [(t, p) for _, t, p, _ in unit]
+        else:
+            topic, payload = unit[0][1], unit[0][2]
+        started = time.perf_counter()
+        try:
+            await self._call(topic, payload)
+        except Exception:
+            self.owner.bus.metrics.completed(self.sub.stats, self.sub.topics_of(topic, payload), (time.perf_counter() - started) * 1000, False)
+            raise
+        self.owner.bus.metrics.completed(self.sub.stats, self.sub.topics_of(topic, payload), (time.perf_counter() - started) * 1000, True)
+        self.delivered += len(unit)
+
+    async def _give_up(self, unit: list[tuple[int, str, Any, str]], exc: Exception) -> bool:
+        """Учесть сбой; True — попытки исчерпаны, события перенесены в bus_dead_letters."""
+        from backend.core.db_writer import db_writer
+
+        if unit[0][0] != self._failed_seq:
+            self._failed_seq, self.attempts = unit[0][0], 0
+        self.attempts += 1
+        self.failures += 1
+        self.last_error = str(exc)
+        if self.attempts < MAX_ATTEMPTS:
+            _log.exception(
+                "Durable subscriber %s failed (attempt %d/%d), events will be redelivered: %s",
+                self.id, self.attempts, MAX_ATTEMPTS, exc,
+            )
+            return False
+        _log.error(
+            "Durable subscriber %s gave up on events %d..%d after %d attempts, moved to bus_dead_letters: %s",
+            self.id, unit[0][0], unit[-1][0], self.attempts, exc,
+        )
+        await db_writer.execute_async(_dead_letter, self.id, [(seq, t, raw) for seq, t, _, raw in unit], str(exc), time.time())
+        self.dead_lettered += len(unit)
+        self._failed_seq, self.attempts = None, 0
+        return True
+
+    async def _ensure_lease(self) -> bool:
+        """Взять или продлить аренду подписки; False — события доставляет другой воркер."""
+        from backend.core.db_writer import db_writer
+
+        now = time.time()
+        if self.leased and now < self._lease_until - LEASE_TTL / 2:
+            return True
+        cursor = await db_writer.execute_async(_claim, self.id, self.sub.pattern, self.owner.owner_id, now, LEASE_TTL)
+        if cursor is None:
+            self.leased = False
+            return False
+        if not self.leased:
+            # Новая аренда: продолжить с курсора, подтверждённого прежним владельцем
+            self.cursor = cursor
+        self.leased = True
+        self._lease_until = now + LEASE_TTL
+        return True
+
+    async def _ack(self, seq: int) -> bool:
+        from backend.core.db_writer import db_writer
+
+        now = time.time()
+        if not await db_writer.execute_async(_ack, self.id, self.owner.owner_id, seq, now, LEASE_TTL):
+            _log.warning("Durable subscriber %s lost its lease, another worker took over", self.id)
+            self.leased = False
+            return False
+        self.cursor = seq
+        self._lease_until = now + LEASE_TTL
+        return True
+
+    async def run(self) -> None:
+        from backend.core.db_writer import db_writer
+
+        self._wake = asyncio.Event()
+        try:
+            while True:
+                if not await self._ensure_lease():
+                    await asyncio.sleep(LEASE_RETRY_INTERVAL)
+                    continue
+                self._wake.clear()
+                rows = await asyncio.to_thread(_read_journal, self.cursor, CATCH_UP_BATCH)
+                events = [(seq, topic, json.loads(raw), raw) for seq, topic, raw in rows if match_topic(self.sub.pattern, topic)]
+                units = [events] if self.sub.batch and events else [[event] for event in events]
+                acked = rows[-1][0] if rows else self.cursor
+                failed = False
+                for index, unit in enumerate(units):
+                    try:
+                        await self._deliver(unit)
+                    except Exception as exc:  # noqa: BLE001
+                        if not await self._give_up(unit, exc):
+                            # Подтвердить всё до упавшего события, его повторить
+                            acked = units[index - 1][-1][0] if index else self.cursor
+                            failed = True
+                            break
+                if acked != self.cursor and not await self._ack(acked):
+                    continue
+                if failed:
+                    await asyncio.sleep(RETRY_DELAY)
+                    continue
+                if len(rows) < CATCH_UP_BATCH:
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), timeout=IDLE_POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            if self.leased:
+                self.leased = False
+                db_writer.submit(_release, self.id, self.owner.owner_id)
+
+    def get_stats(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "pattern": self.sub.pattern,
+            "cursor": self.cursor,
+            "active": self.task is not None and not self.task.done(),
+            "leased": self.leased,
+            "delivered": self.delivered,
+            "failures": self.failures,
+            "attempts": self.attempts,
+            "max_attempts": MAX_ATTEMPTS,
+            "dead_lettered": self.dead_lettered,
+            "last_error": self.last_error,
+        }
+
+
+class DurableEvents:
+    """Реестр долговременных подписок шины и запись подходящих событий в журнал."""
+
+    def __init__(self, bus: EventBus) -> None:
+        self.bus = bus
+        self._lock = threading.Lock()
+        self._patterns: dict[str, str] = {}
+        self._consumers: dict[str, DurableConsumer] = {}
+        # Отменённые задачи доставки: новая задача той же подписки ждёт их завершения (и снятия аренды)
+        self._stopping: dict[str, asyncio.Task] = {}
+        self._wants_cache: dict[str, bool] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._instance = secrets.token_hex(3)
+        self.journaled = 0
+        self.skipped = 0
+
+    @property
+    def owner_id(self) -> str:
+        """Владелец аренды подписок: процесс (новый после fork) и экземпляр реестра."""
+        from backend.core.event_fanout import process_origin
+
+        return f"{process_origin()}/{self._instance}"
+
+    def load(self) -> None:
+        """Загрузить сохранённые подписки и включить журналирование в шине."""
+        patterns = _read_patterns()
+        with self._lock:
+            # Подписки, зарегистрированные модулями до загрузки, остаются
+            self._patterns = {**patterns, **self._patterns}
+            self._wants_cache.clear()
+        self.bus.durable = self
+
+    def refresh(self) -> int:
+        """Фоновая задача bus_durable_refresh: перечитать маски подписок других воркеров.
+
+        Возвращает число подписок, события которых журналирует этот воркер.
+        """
+        patterns = _read_patterns()
+        with self._lock:
+            # Свои подписки остаются, даже если их строка ещё не записана потоком-писателем
+            patterns.update({sub_id: c.sub.pattern for sub_id, c in self._consumers.items()})
+            if patterns != self._patterns:
+                self._patterns = patterns
+                self._wants_cache.clear()
+            return len(patterns)
+
+    def start(self) -> None:
+        """Запустить доставку для зарегистрированных потребителей (из работающего event loop)."""
+        self._loop = asyncio.get_running_loop()
+        for consumer in list(self._consumers.values()):
+            consumer.start(self._loop)
+
+    async def stop(self) -> None:
+        tasks = [c.task for c in self._consumers.values() if c.task is not None and not c.task.done()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._stopping.clear()
+        self._loop = None
+
+    # ── Запись в журнал ────────────────────────────────────────────
+    def wants(self, topic: str) -> bool:
+        """Нужно ли сохранять событие: есть ли подписка с подходящей маской."""
+        if not self._patterns:
+            return False
+        cached = self._wants_cache.get(topic)
+        if cached is None:
+            with self._lock:
+                cached = any(match_topic(pattern, topic) for pattern in self._patterns.values())
+                if len(self._wants_cache) >= 4096:
+                    self._wants_cache.clear()
+                self._wants_cache[topic] = cached
+        return cached
+
+    def append(self, events: list[tuple[str, Any]]) -> None:
+        """Дописать события в журнал через поток-писатель и разбудить потребителей после коммита."""
+        from backend.core.db_writer import db_writer
+
+        now = time.time()
+        rows = []
+        for topic, payload in events:
+            try:
+                rows.append((topic, json.dumps(payload), now))
+            except (TypeError, ValueError):
+                self.skipped += 1
+                _log.warning("Event '%s' payload is not JSON-serializable, skipped in durable journal", topic)
+        if not rows:
+            return
+        self.journaled += len(rows)
+        db_writer.submit(_append_events, rows).add_done_callback(self._on_appended)
+
+    def _on_appended(self, future) -> None:
+        if future.exception() is not None:
+            _log.error("Failed to append events to durable journal: %s", future.exception())
+            return
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            for consumer in list(self._consumers.values()):
+                loop.call_soon_threadsafe(consumer.wake)
+
+    # ── Подписки ───────────────────────────────────────────────────
+    def subscribe(self, sub_id: str, pattern: str, handler: Callable, *, batch: bool = False) -> DurableConsumer:
+        """Подключить обработчик к долговременной подписке sub_id (создаётся при первом вызове).
+
+        Обработчик получает (topic, payload) как обычный подписчик шины, с batch=True —
+        список пар пачки. Успешный возврат подтверждает события, исключение — повтор доставки.
+        Новая подписка начинает с конца журнала; доставка стартует в start() или сразу,
+        если event loop уже запущен.
+        """
+        with self._lock:
+            self._patterns[sub_id] = pattern
+            self._wants_cache.clear()
+            previous = self._consumers.pop(sub_id, None)
+            consumer = self._consumers[sub_id] = DurableConsumer(self, sub_id, pattern, handler, batch)
+        self.bus.durable = self
+        if previous is not None and previous.task is not None:
+            self._cancel(sub_id, previous.task)
+        loop = self._loop
+        if loop is not None and loop.is_running():
+            loop.call_soon_threadsafe(self._launch, consumer)
+        return consumer
+
+    def _launch(self, consumer: DurableConsumer) -> None:
+        loop = self._loop
+        if loop is None or self._consumers.get(consumer.id) is not consumer:
+            return
+        stopping = self._stopping.pop(consumer.id, None)
+        if stopping is not None and not stopping.done():
+            stopping.add_done_callback(lambda _task: self._launch(consumer))
+            return
+        consumer.start(loop)
+
+    def _cancel(self, sub_id: str, task: asyncio.Task) -> None:
+        self._stopping[sub_id] = task
+        loop = self._loop
+        if loop is not None and loop.is_running():
+            loop.call_soon_threadsafe(task.cancel)
+        else:
+            task.cancel()
+
+    def unsubscribe(self, sub_id: str) -> bool:
+        """Отключить обработчик; подписка и журналирование её событий сохраняются."""
+        with self._lock:
+            consumer = self._consumers.pop(sub_id, None)
+        if consumer is None:
+            return False
+        if consumer.task is not None:
+            self._cancel(sub_id, consumer.task)
+        return True
+
+    def delete(self, sub_id: str) -> bool:
+        """Удалить подписку вместе с курсором: её события больше не сохраняются.
+
+        Удаление из БД ставится в очередь потока-писателя без ожидания (безопасно из event loop).
+        """
+        from backend.core.db_writer import db_writer
+
+        self.unsubscribe(sub_id)
+        with self._lock:
+            existed = self._patterns.pop(sub_id, None) is not None
+            self._wants_cache.clear()
+        db_writer.submit(_delete_subscription, sub_id).add_done_callback(
+            lambda future: self._on_deleted(sub_id, future)
+        )
+        return existed
+
+    @staticmethod
+    def _on_deleted(sub_id: str, future) -> None:
+        if future.exception() is not None:
+            _log.error("Failed to delete durable subscription %s: %s", sub_id, future.exception())
+
+    def prune(self) -> int:
+        """Фоновая задача bus_journal_prune."""
+        from backend.core.db_writer import db_writer
+
+        removed, lagging = db_writer.execute(_prune, BUS_JOURNAL_RETENTION_DAYS * 86400)
+        if lagging:
+            _log.warning("Durable subscriptions lost events older than retention: %s", ", ".join(lagging))
+        return removed
+
+    def get_stats(self) -> dict[str, Any]:
+        with self._lock:
+            consumers = list(self._consumers.values())
+            subscriptions = len(self._patterns)
+        return {
+            "subscriptions": subscriptions,
+            "journaled": self.journaled,
+            "skipped": self.skipped,
+            "consumers": [c.get_stats() for c in consumers],
+        }
+
+
+def _create() -> DurableEvents:
+    from backend.core.bus import event_bus
+
+    return DurableEvents(event_bus)
+
+
+durable_events = _create()
@@ -0,0 +1,254 @@
+"""Межпроцессная рассылка WebSocket-событий при запуске с несколькими воркерами.
+
+broadcaster.broadcast() отправляет событие только сокетам своего процесса, но каждое
+событие уже записывается в общий журнал system_events_journal (seq_id, процесс-источник
+origin, время публикации published_at). Транспорт fan-out дочитывает хвост журнала и
+передаёт чужие события локальному ws_manager: клиент, подключённый к любому воркеру,
+получает события всех воркеров с теми же seq_id, что и при replay.
+
+NMS_EVENT_FANOUT: пусто (по умолчанию) — journal при NMS_SHARED_STATE=sqlite, иначе none;
+journal — хвост журнала; none — только локальная доставка.
+
+В шину событий (event_bus) других воркеров события не публикуются: обработчики с
+побочными эффектами выполнились бы в каждом процессе. Межпроцессная инвалидация
+кэшей и отзывы сессий передаются отдельно через backend.core.shared_state.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, NamedTuple, Optional
+
+from backend.core.latency import LatencyHistogram
+
+_log = logging.getLogger("nms.core.event_fanout")
+
+EVENT_FANOUT = os.environ.get("NMS_EVENT_FANOUT", "").strip().lower()
+EVENT_FANOUT_POLL_INTERVAL = float(os.environ.get("NMS_EVENT_FANOUT_POLL_INTERVAL", "0.2"))
+FETCH_LIMIT = 500
+DEDUP_WINDOW = 4096
+
+_origin_lock = threading.Lock()
+_origin: Optional[tuple[int, str]] = None
+
+
+def process_origin() -> str:
+    """Идентификатор текущего процесса для колонки origin (новый после fork)."""
+    global _origin
+    pid = os.getpid()
+    current = _origin
+    if current is not None and current[0] == pid:
+        return current[1]
+    with _origin_lock:
+        if _origin is None or _origin[0] != pid:
+            _origin = (pid, f"{pid}-{secrets.token_hex(4)}")
+        return _origin[1]
+
+
+class FanoutMessage(NamedTuple):
+    seq_id: int
+    data: dict
+    target_user_id: Optional[str]
+    topic: Optional[str]
+    immediate: bool
+    published_at: Optional[float]
+
+
+class FanoutTransport:
+    """Источник событий других воркеров.
+
+    Push-транспорт (например, Unix-сокет) реализует fetch() как выборку из буфера приёма.
+    """
+
+    name = "none"
+
+    @property
+    def primed(self) -> bool:
+        return True
+
+    def prime(self) -> None:
+        """Пропустить накопившееся: события до этого момента не доставляются."""
+
+    def reset(self) -> None:
+        """Забыть позицию чтения (локальных клиентов нет); её заново выставит prime()."""
+
+    def fetch(self, limit: int = FETCH_LIMIT) -> list[FanoutMessage]:
+        """Новые события других процессов в порядке seq_id."""
+        return []
+
+    def get_stats(self) -> dict[str, Any]:
+        return {"transport": self.name}
+
+
+class JournalTailTransport(FanoutTransport):
+    """Чтение хвоста system_events_journal после курсора; свои события пропускаются по origin."""
+
+    name = "journal"
+
+    def __init__(self) -> None:
+        self.cursor: Optional[int] = None
+        self.fetched = 0
+
+    @property
+    def primed(self) -> bool:
+        return self.cursor is not None
+
+    def reset(self) -> None:
+        self.cursor = None
+
+    def prime(self) -> None:
+        from backend.core.database import get_db_read_connection
+
+        conn = get_db_read_connection()
+        try:
+            self.cursor = conn.execute("SELECT COALESCE(MAX(seq_id), 0) FROM system_events_journal").fetchone()[0]
+        finally:
+            conn.close()
+
+    def fetch(self, limit: int = FETCH_LIMIT) -> list[FanoutMessage]:
+        from backend.core.database import get_db_read_connection
+
+        if self.cursor is None:
+            self.prime()
+            return []
+        conn = get_db_read_connection()
+        try:
+            rows = conn.execute(
+                """
+                SELECT seq_id, payload, target_user_id, topic, origin, immediate, published_at
+                FROM system_events_journal
+                WHERE seq_id > ?
+                ORDER BY seq_id ASC LIMIT ?
+                """,
+                (self.cursor, limit),
+            ).fetchall()
+        finally:
+            conn.close()
+        if not rows:
+            return []
+        self.cursor = rows[-1]["seq_id"]
+        origin = process_origin()
+        messages = []
+        for row in rows:
+            if row["origin"] is None or row["origin"] == origin:
+                continue
+            try:
+                data = json.loads(row["payload"])
+            except (TypeError, ValueError):
+                continue
+            messages.append(FanoutMessage(
+                seq_id=row["seq_id"],
+                data=data,
+                target_user_id=row["target_user_id"],
+                topic=row["topic"],
+                immediate=bool(row["immediate"]),
+                published_at=row["published_at"],
+            ))
+        self.fetched += len(messages)
+        return messages
+
+    def get_stats(self) -> dict[str, Any]:
+        return {"transport": self.name, "cursor": self.cursor, "fetched": self.fetched}
+
+
+class EventFanout:
+    """Доставка событий других воркеров локальным WebSocket-клиентам."""
+
+    def __init__(self, transport: FanoutTransport) -> None:
+        self.transport = transport
+        self._seen: OrderedDict[int, None] = OrderedDict()
+        self._lock = threading.Lock()
+        self.latency = LatencyHistogram()
+        self.delivered = 0
+        self.duplicates = 0
+        self.last_poll_at: Optional[float] = None
+
+    def prime(self) -> None:
+        self.transport.prime()
+
+    async def resume(self) -> None:
+        """Выставить курсор в конец журнала при подключении первого локального клиента."""
+        if self.transport.primed:
+            return
+        try:
+            await asyncio.to_thread(self.transport.prime)
+        except sqlite3.Error as exc:
+            _log.warning("Failed to prime event fan-out transport: %s", exc)
+
+    def accept(self, messages: list[FanoutMessage]) -> list[FanoutMessage]:
+        """Отбросить уже доставленные seq_id и учесть задержку распространения."""
+        now = time.time()
+        fresh = []
+        with self._lock:
+            for msg in messages:
+                if msg.seq_id in self._seen:
+                    self.duplicates += 1
+                    continue
+                self._seen[msg.seq_id] = None
+                if len(self._seen) > DEDUP_WINDOW:
+                    self._seen.popitem(last=False)
+                if msg.published_at is not None:
+                    self.latency.record(max(0.0, (now - msg.published_at) * 1000))
+                fresh.append(msg)
+            self.delivered += len(fresh)
+        return fresh
+
+    async def poll(self) -> int:
+        """Фоновая задача event_fanout_poll."""
+        from backend.core.events import ws_manager
+
+        if not ws_manager.active_connections:
+            # Доставлять некому: журнал не читаем, курсор выставит resume() при подключении клиента
+            self.transport.reset()
+            self.last_poll_at = time.time()
+            return 0
+        try:
+            messages = await asyncio.to_thread(self.transport.fetch)
+        except sqlite3.Error as exc:
+            _log.warning("Failed to read event fan-out transport: %s", exc)
+            return 0
+        finally:
+            self.last_poll_at = time.time()
+        messages = self.accept(messages)
+        for msg in messages:
+            await ws_manager.deliver_remote(msg)
+        return len(messages)
+
+    def get_stats(self) -> dict[str, Any]:
+        with self._lock:
+            stats = {
+                "delivered": self.delivered,
+                "duplicates": self.duplicates,
+                "last_poll_at": self.last_poll_at,
+                "latency": self.latency.as_dict(),
+            }
+        stats.update(self.transport.get_stats())
+        return stats
+
+
+def create_event_fanout() -> Optional[EventFanout]:
+    """Fan-out по NMS_EVENT_FANOUT; None — события остаются в своём процессе."""
+    from backend.core.shared_state import is_shared
+
+    mode = EVENT_FANOUT or ("journal" if is_shared() else "none")
+    if mode == "journal":
+        return EventFanout(JournalTailTransport())
+    if mode != "none":
+        _log.warning("Unknown NMS_EVENT_FANOUT %r, WebSocket events stay in-process", mode)
+    return None
+
+
+event_fanout: Optional[EventFanout] = create_event_fanout()
+
+
+def get_event_fanout_stats() -> dict[str, Any]:
+    if event_fanout is None:
+        return {"transport": "none"}
+    return event_fanout.get_stats()
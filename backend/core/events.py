@@ -7,7 +7,8 @@ from typing import Any, Dict, List, Optional, Set
 from fastapi import WebSocket, WebSocketDisconnect
 from starlette.websockets import WebSocketState
 
-from backend.core.database import get_db_connection
+from backend.core.database import get_db_connection, get_db_read_connection
+from backend.core.event_fanout import FanoutMessage, event_fanout, process_origin
 
 _log = logging.getLogger("nms.core.events")
 
@@ -18,22 +19,38 @@ HEARTBEAT_TIMEOUT = 60.0
 BATCH_INTERVAL = 0.1  # 100ms
 
 
-def record_event_in_db(event_type: str, payload_json: str, target_user_id: Optional[str] = None, topic: Optional[str] = None) -> int:
+_JOURNAL_INSERT_SQL = """
+    INSERT INTO system_events_journal (event_type, payload, target_user_id, topic, origin, published_at, immediate)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def _journal_row(event_type: str, payload_json: str, target_user_id: Optional[str], topic: Optional[str], immediate: bool) -> tuple:
+    return (
+        event_type,
+        payload_json,
+        str(target_user_id) if target_user_id is not None else None,
+        str(topic) if topic is not None else None,
+        process_origin(),
+        time.time(),
+        1 if immediate else 0,
+    )
+
+
+def record_event_in_db(
+    event_type: str,
+    payload_json: str,
+    target_user_id: Optional[str] = None,
+    topic: Optional[str] = None,
+    immediate: bool = True,
+) -> int:
     """Запись события в персистентный журнал SQLite. Возвращает seq_id."""
     conn = get_db_connection()
     try:
         with conn:
             cursor = conn.execute(
-                """
-                INSERT INTO system_events_journal (event_type, payload, target_user_id, topic)
-                VALUES (?, ?, ?, ?)
-                """,
-                (
-                    event_type,
-                    payload_json,
-                    str(target_user_id) if target_user_id is not None else None,
-                    str(topic) if topic is not None else None,
-                ),
+                _JOURNAL_INSERT_SQL,
+                _journal_row(event_type, payload_json, target_user_id, topic, immediate),
             )
             return cursor.lastrowid
     except Exception as exc:
@@ -78,11 +95,11 @@ class EventJournalQueue:
         """Асинхронно добавить событие в очередь пакетной записи и дождаться seq_id."""
         self._ensure_started()
         if self._queue is None:
-            return await asyncio.to_thread(record_event_in_db, event_type, payload_json, target_user_id, topic)
+            return await asyncio.to_thread(record_event_in_db, event_type, payload_json, target_user_id, topic, immediate)
 
         loop = asyncio.get_running_loop()
         fut: asyncio.Future[int] = loop.create_future()
-        await self._queue.put((event_type, payload_json, target_user_id, topic, fut))
+        await self._queue.put((_journal_row(event_type, payload_json, target_user_id, topic, immediate), fut))
         if immediate and self._notify_event:
             self._notify_event.set()
         return await fut
@@ -119,20 +136,9 @@ class EventJournalQueue:
                     conn = get_db_connection()
                     try:
                         with conn:
-                            for event_type, payload_json, target_user_id, topic, fut in items:
+                            for row, fut in items:
                                 try:
-                                    cursor = conn.execute(
-                                        """
-                                        INSERT INTO system_events_journal (event_type, payload, target_user_id, topic)
-                                        VALUES (?, ?, ?, ?)
-                                        """,
-                                        (
-                                            event_type,
-                                            payload_json,
-                                            str(target_user_id) if target_user_id is not None else None,
-                                            str(topic) if topic is not None else None,
-                                        ),
-                                    )
+                                    cursor = conn.execute(_JOURNAL_INSERT_SQL, row)
                                     seq_id = cursor.lastrowid
                                     results.append((fut, seq_id))
                                 except Exception as exc:
@@ -140,7 +146,7 @@ class EventJournalQueue:
                                     results.append((fut, 0))
                     except Exception as exc:
                         _log.error("Failed to execute SQLite batch insert: %s", exc)
-                        for _, _, _, _, fut in items:
+                        for _, fut in items:
                             results.append((fut, 0))
                     finally:
                         conn.close()
@@ -166,17 +172,19 @@ def prune_system_events_journal(max_age_days: int = 7, max_rows: int = 50000) ->
     conn = get_db_connection()
     try:
         with conn:
-            cursor = conn.execute(
+            # Два отдельных DELETE: по индексу created_at и по диапазону rowid (OR с NOT IN сканирует таблицу)
+            deleted = conn.execute(
+                "DELETE FROM system_events_journal WHERE created_at < datetime('now', ?)",
+                (f"-{max_age_days} days",),
+            ).rowcount or 0
+            deleted += conn.execute(
                 """
                 DELETE FROM system_events_journal
-                WHERE created_at < datetime('now', ?)
-                   OR seq_id NOT IN (
-                       SELECT seq_id FROM system_events_journal ORDER BY seq_id DESC LIMIT ?
-                   )
+                WHERE seq_id <= (SELECT seq_id FROM system_events_journal ORDER BY seq_id DESC LIMIT 1 OFFSET ?)
                 """,
-                (f"-{max_age_days} days", max_rows),
-            )
-            return cursor.rowcount or 0
+                (max_rows,),
+            ).rowcount or 0
+            return deleted
     except Exception as exc:
         _log.error("Failed to prune system_events_journal: %s", exc)
         return 0
@@ -192,9 +200,13 @@ def check_replay_status_from_db(
     limit: int = 500,
 ) -> tuple[str, List[dict]]:
     """Проверка состояния истории событий и получение досланных записей без ложного resync_required."""
-    conn = get_db_connection()
+    conn = get_db_read_connection()
     try:
-        row = conn.execute("SELECT MIN(seq_id) as min_seq, MAX(seq_id) as max_seq FROM system_events_journal").fetchone()
+        # Раздельные подзапросы: MIN и MAX в одном SELECT заставляют SQLite сканировать всю таблицу
+        row = conn.execute(
+            "SELECT (SELECT MIN(seq_id) FROM system_events_journal) as min_seq, "
+            "(SELECT MAX(seq_id) FROM system_events_journal) as max_seq"
+        ).fetchone()
         min_seq = row["min_seq"] if row and row["min_seq"] is not None else 0
         max_seq = row["max_seq"] if row and row["max_seq"] is not None else 0
 
@@ -371,6 +383,8 @@ class ConnectionManager:
             "protocol_format": protocol_format,
         }
         _log.info("WebSocket client connected (user_id=%s, format=%s, total=%d)", user_str, protocol_format, len(self.active_connections))
+        if event_fanout is not None and len(self.active_connections) == 1:
+            await event_fanout.resume()
 
         self._ensure_background_tasks()
         return True
@@ -398,6 +412,33 @@ class ConnectionManager:
         if info:
             _log.info("WebSocket client disconnected (user_id=%s, total=%d)", info.get("user_id"), len(self.active_connections))
 
+    async def close_sessions(self, jtis: Set[str], code: int = 1008, reason: str = "Session revoked"):
+        """Закрыть сокеты, открытые по указанным (отозванным) jti."""
+        targets = [ws for ws, info in list(self.active_connections.items()) if info.get("jti") in jtis]
+        for ws in targets:
+            info = self.active_connections.get(ws) or {}
+            _log.warning("WebSocket session revoked for user_id=%s (jti=%s)", info.get("user_id"), info.get("jti"))
+            self.disconnect(ws)
+            try:
+                await ws.close(code=code, reason=reason)
+            except Exception:
+                pass
+
+    def on_sessions_revoked(self, payload: Any):
+        """Обработчик core.auth.sessions_revoked: сразу закрыть сокеты отозванных сессий."""
+        jtis = set((payload or {}).get("jtis") or ())
+        if not jtis or not any(info.get("jti") in jtis for info in list(self.active_connections.values())):
+            return
+        coro = self.close_sessions(jtis)
+        try:
+            asyncio.get_running_loop().create_task(coro)
+        except RuntimeError:
+            loop = self._loop
+            if loop and not loop.is_closed() and loop.is_running():
+                asyncio.run_coroutine_threadsafe(coro, loop)
+            else:
+                coro.close()
+
     def update_pong(self, websocket: WebSocket):
         """Обновить timestamp последнего PONG / активности сокета."""
         if websocket in self.active_connections:
@@ -474,7 +515,7 @@ class ConnectionManager:
                 if exp and now > exp:
                     _log.warning("WebSocket token expired for user_id=%s", info.get("user_id"))
                     expired_sockets.add(ws)
-                elif info.get("jti") and await asyncio.to_thread(is_session_revoked, info["jti"]):
+                elif info.get("jti") and is_session_revoked(info["jti"]):
                     _log.warning("WebSocket session revoked for user_id=%s (jti=%s)", info.get("user_id"), info.get("jti"))
                     revoked_sockets.add(ws)
                 elif now - info["last_pong_time"] > HEARTBEAT_TIMEOUT:
@@ -534,7 +575,8 @@ class ConnectionManager:
 
     async def broadcast_immediate(self, data: dict, target_user_id: Optional[str] = None, topic: Optional[str] = None):
         """Мгновенная рассылка срочных/критических событий всем подходящим клиентам."""
-        if not self.active_connections:
+        # С fan-out событие нужно журналу даже без локальных клиентов: его доставят другие воркеры
+        if not self.active_connections and event_fanout is None:
             return
 
         event_type = data.get("type", "event")
@@ -543,8 +585,10 @@ class ConnectionManager:
             event_type, payload_str, target_user_id, topic=topic, immediate=True
         )
         data["seq_id"] = seq_id
+        await self._send_matching(json.dumps(data), target_user_id, topic)
 
-        message = json.dumps(data)
+    async def _send_matching(self, message: str, target_user_id: Optional[str], topic: Optional[str]):
+        """Отправить сообщение клиентам с подходящим адресатом и подпиской на топик."""
         target_str = str(target_user_id) if target_user_id is not None else None
 
         tasks = []
@@ -564,8 +608,9 @@ class ConnectionManager:
         payload_str = json.dumps(data)
         seq_id = await event_journal_queue.record_event_async(event_type, payload_str, target_user_id, topic=topic)
         data["seq_id"] = seq_id
+        await self._enqueue_batch(data, target_user_id, topic)
 
-
+    async def _enqueue_batch(self, data: dict, target_user_id: Optional[str], topic: Optional[str]):
         async with self._batch_lock:
             self._batch_queue.append({
                 "data": data,
@@ -573,6 +618,15 @@ class ConnectionManager:
                 "topic": topic,
             })
 
+    async def deliver_remote(self, msg: FanoutMessage):
+        """Доставка события другого воркера (FanoutMessage) локальным клиентам без повторной записи в журнал."""
+        data = dict(msg.data)
+        data["seq_id"] = msg.seq_id
+        if msg.immediate:
+            await self._send_matching(json.dumps(data), msg.target_user_id, msg.topic)
+        else:
+            await self._enqueue_batch(data, msg.target_user_id, msg.topic)
+
     async def _batch_flush_loop(self):
         """Фоновый цикл отправки накопившихся сообщений каждые 100 мс с изоляцией по получателям."""
         while True:
@@ -716,6 +770,14 @@ def notify_settings_changed(module_id: str, title: Optional[str] = None, body: O
     payload = {"type": "module_settings_changed", "module_id": module_id}
     broadcaster.broadcast(json.dumps(payload), payload, immediate=True)
 
+    try:
+        # Уведомление каждому пользователю — запись через писателя; из event loop уводим в пул потоков
+        asyncio.get_running_loop().run_in_executor(None, _notify_users_settings_changed, module_id, title, body)
+    except RuntimeError:
+        _notify_users_settings_changed(module_id, title, body)
+
+
+def _notify_users_settings_changed(module_id: str, title: Optional[str], body: Optional[str]) -> None:
     try:
         from backend.core.notify import notify
         from backend.core.database import get_db_connection
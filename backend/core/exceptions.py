@@ -154,6 +154,9 @@ def register_exception_handlers(app: FastAPI) -> None:
             },
         )
 
+    from backend.core.db_pool import PoolExhaustedError
+    register_exception(app, PoolExhaustedError, code="DB_POOL_EXHAUSTED", status_code=503)
+
     @app.exception_handler(Exception)
     async def generic_error_handler(_request: Request, exc: Exception) -> JSONResponse:
         _log.exception("Unhandled server exception: %s", exc)
@@ -0,0 +1,135 @@
+"""Скомпилированный белый список IP-адресов (настройка sec_ip_whitelist).
+
+Строка списка (адреса, CIDR-сети и диапазоны «a-b» через запятую, пробел, «;» или
+перевод строки) разбирается один раз в двоичные префиксные деревья для IPv4 и IPv6;
+проверка адреса проходит не больше 32/128 узлов независимо от длины списка.
+Пересборка происходит только при изменении строки настройки.
+"""
+from __future__ import annotations
+
+import ipaddress
+import logging
+import re
+import threading
+from typing import Optional, Union
+
+_log = logging.getLogger("nms.core.ip_allowlist")
+
+_SPLIT_RE = re.compile(r"[\s,;\n]+")
+
+IPNetwork = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+class _PrefixTrie:
+    """Двоичное префиксное дерево сетей одной версии IP. Узел — [дочерний 0, дочерний 1, конец префикса]."""
+
+    __slots__ = ("bits", "_root", "networks")
+
+    def __init__(self, bits: int) -> None:
+        self.bits = bits
+        self._root: list = [None, None, False]
+        self.networks = 0
+
+    def insert(self, network: IPNetwork) -> None:
+        value = int(network.network_address)
+        node = self._root
+        for i in range(network.prefixlen):
+            if node[2]:
+                return  # уже покрыто более короткой сетью
+            bit = (value >> (self.bits - 1 - i)) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, False]
+            node = node[bit]
+        # Сеть покрывает всё поддерево: более длинные префиксы не нужны
+        node[0] = node[1] = None
+        node[2] = True
+        self.networks += 1
+
+    def contains(self, value: int) -> bool:
+        node = self._root
+        for i in range(self.bits):
+            if node[2]:
+                return True
+            node = node[(value >> (self.bits - 1 - i)) & 1]
+            if node is None:
+                return False
+        return node[2]
+
+
+class IPAllowList:
+    """Белый список IP-адресов с проверкой за O(длина префикса)."""
+
+    def __init__(self, source: str) -> None:
+        self.source = source
+        self.entries = [item for item in _SPLIT_RE.split(source or "") if item]
+        self.invalid: list[str] = []
+        self._v4 = _PrefixTrie(32)
+        self._v6 = _PrefixTrie(128)
+        for item in self.entries:
+            try:
+                networks = _parse_entry(item)
+            except ValueError:
+                self.invalid.append(item)
+                continue
+            for network in networks:
+                (self._v4 if network.version == 4 else self._v6).insert(network)
+        if self.invalid:
+            _log.warning("Ignoring invalid IP whitelist entries: %s", ", ".join(self.invalid))
+
+    @property
+    def allows_all(self) -> bool:
+        """Пустой список не ограничивает доступ."""
+        return not self.entries
+
+    def contains(self, client_ip: str) -> bool:
+        """Входит ли адрес в список (пустой список пропускает всех)."""
+        if self.allows_all:
+            return True
+        try:
+            ip_obj = ipaddress.ip_address(client_ip)
+        except ValueError:
+            return False
+        if ip_obj.version == 4:
+            return self._v4.contains(int(ip_obj))
+        if self._v6.contains(int(ip_obj)):
+            return True
+        # IPv4-адрес, пришедший через dual-stack сокет как ::ffff:a.b.c.d
+        mapped = ip_obj.ipv4_mapped
+        return mapped is not None and self._v4.contains(int(mapped))
+
+    def get_stats(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "invalid": len(self.invalid),
+            "ipv4_networks": self._v4.networks,
+            "ipv6_networks": self._v6.networks,
+        }
+
+
+def _parse_entry(item: str) -> list[IPNetwork]:
+    """Сети для элемента списка: адрес, CIDR или диапазон «начало-конец»."""
+    if "/" in item:
+        return [ipaddress.ip_network(item, strict=False)]
+    if "-" in item:
+        start_str, end_str = item.split("-", 1)
+        start, end = ipaddress.ip_address(start_str.strip()), ipaddress.ip_address(end_str.strip())
+        if start.version != end.version or start > end:
+            raise ValueError(f"Invalid IP range: {item}")
+        return list(ipaddress.summarize_address_range(start, end))
+    return [ipaddress.ip_network(ipaddress.ip_address(item))]
+
+
+_lock = threading.Lock()
+_compiled: Optional[IPAllowList] = None
+
+
+def get_ip_allowlist(whitelist_str: str) -> IPAllowList:
+    """Скомпилированный список для строки настройки (пересобирается только при её изменении)."""
+    global _compiled
+    compiled = _compiled
+    if compiled is not None and compiled.source == whitelist_str:
+        return compiled
+    with _lock:
+        if _compiled is None or _compiled.source != whitelist_str:
+            _compiled = IPAllowList(whitelist_str)
+        return _compiled
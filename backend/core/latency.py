@@ -0,0 +1,59 @@
+"""Гистограмма задержек с фиксированными корзинами и оценкой перцентилей."""
+from __future__ import annotations
+
+import bisect
+from typing import Any
+
+# Верхние границы корзин, мс (последняя корзина — всё, что больше)
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class LatencyHistogram:
+    """Счётчик, сумма, максимум и корзины задержек; синхронизацию обеспечивает владелец."""
+
+    __slots__ = ("buckets", "count", "max_ms", "total_ms")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def record(self, ms: float) -> None:
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+
+    @property
+    def avg_ms(self) -> float:
+        return self.total_ms / self.count if self.count else 0.0
+
+    def percentile(self, q: float) -> float:
+        """Оценка перцентиля по гистограмме (верхняя граница корзины, не больше max)."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for idx, n in enumerate(self.buckets):
+            seen += n
+            if seen >= target:
+                bound = LATENCY_BUCKETS_MS[idx] if idx < len(LATENCY_BUCKETS_MS) else self.max_ms
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.avg_ms, 3),
+            "max_ms": round(self.max_ms, 3),
+            "p50_ms": round(self.percentile(0.50), 3),
+            "p95_ms": round(self.percentile(0.95), 3),
+            "p99_ms": round(self.percentile(0.99), 3),
+            "histogram": {
+                (f"le_{b}" if i < len(LATENCY_BUCKETS_MS) else "inf"): n
+                for i, (b, n) in enumerate(zip(LATENCY_BUCKETS_MS + (None,), self.buckets))
+                if n
+            },
+        }
@@ -41,12 +41,15 @@ MESSAGES: dict[str, str] = {
     "db_no_users_table": "Users table 'users' not found in database file",
     "db_restored_success": "Database restored successfully",
     "db_restore_error": "Error restoring backup: {exc}",
+    "db_backup_error": "Error creating backup: {exc}",
+    "backup_file_too_large": "Backup file exceeds the maximum allowed size",
     "log_provider_not_found": "Log provider not found",
     "log_read_error": "Failed to read log provider: {exc}",
     "all_sessions_terminated": "All user sessions terminated successfully",
 
     # Users & Sessions
     "login_attempt_locked": "Login attempt on locked account",
+    "password_hashing_busy": "Server is busy processing sign-ins. Please retry in a few seconds",
     "account_temporarily_locked": "Account temporarily locked due to too many failed attempts",
     "account_locked_duration_audit": "Account locked for {lockout_duration} mins due to failed attempts",
     "account_locked_duration_detail": "Max attempts exceeded. Account locked for {lockout_duration} mins.",
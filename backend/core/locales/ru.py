@@ -41,12 +41,15 @@ MESSAGES: dict[str, str] = {
     "db_no_users_table": "Таблица пользователей 'users' не найдена в файле БД",
     "db_restored_success": "База данных успешно восстановлена",
     "db_restore_error": "Ошибка восстановления резервной копии: {exc}",
+    "db_backup_error": "Ошибка создания резервной копии: {exc}",
+    "backup_file_too_large": "Файл резервной копии превышает допустимый размер",
     "log_provider_not_found": "Источник логов не найден",
     "log_read_error": "Ошибка чтения логов: {exc}",
     "all_sessions_terminated": "Все сторонние сессии пользователей успешно аннулированы",
 
     # Users & Sessions
     "login_attempt_locked": "Попытка входа в заблокированную учетную запись",
+    "password_hashing_busy": "Сервер занят обработкой входов. Повторите попытку через несколько секунд",
     "account_temporarily_locked": "Учетная запись временно заблокирована из-за превышения числа попыток входа",
     "account_locked_duration_audit": "Учетная запись заблокирована на {lockout_duration} мин. из-за неверных входов",
     "account_locked_duration_detail": "Превышено число попыток. Учетная запись заблокирована на {lockout_duration} мин.",
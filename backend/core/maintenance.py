@@ -0,0 +1,194 @@
+"""Периодическое обслуживание SQLite: checkpoint WAL, incremental vacuum, обновление статистики.
+
+Задача регистрируется в AsyncScheduler.cron и выполняет шаги порциями в пределах
+бюджета времени. Все шаги идут через поток-писатель, поэтому между порциями
+успевают проходить обычные операции записи. Отчёт о последнем запуске и текущие
+размеры WAL/freelist отдаются на /api/system/health.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+_log = logging.getLogger("nms.core.maintenance")
+
+MAINTENANCE_CRON = os.environ.get("NMS_DB_MAINTENANCE_CRON", "*/15 * * * *")
+MAINTENANCE_BUDGET = float(os.environ.get("NMS_DB_MAINTENANCE_BUDGET", "10"))
+VACUUM_PAGES_PER_STEP = int(os.environ.get("NMS_DB_VACUUM_PAGES_PER_STEP", "512"))
+ANALYSIS_LIMIT = 400
+CHECKPOINT_BUSY_TIMEOUT_MS = 30000
+
+_AUTO_VACUUM_MODES = {0: "none", 1: "full", 2: "incremental"}
+
+
+def _current_db_path() -> Path:
+    from backend.core import database
+    return Path(database.DB_PATH)
+
+
+def _wal_size(db_path: Path) -> int:
+    try:
+        return os.path.getsize(f"{db_path}-wal")
+    except OSError:
+        return 0
+
+
+def _file_stats(conn: sqlite3.Connection) -> dict[str, Any]:
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    return {
+        "page_size": page_size,
+        "page_count": conn.execute("PRAGMA page_count").fetchone()[0],
+        "freelist_pages": conn.execute("PRAGMA freelist_count").fetchone()[0],
+        "auto_vacuum": _AUTO_VACUUM_MODES.get(conn.execute("PRAGMA auto_vacuum").fetchone()[0], "unknown"),
+    }
+
+
+# ── Шаги (выполняются в потоке-писателе) ───────────────────────────
+def _checkpoint(conn: sqlite3.Connection, busy_timeout_ms: int) -> dict[str, Any]:
+    # Ожидание читателей ограничено бюджетом шага, затем возвращается прежний busy_timeout
+    conn.execute(f"PRAGMA busy_timeout={max(1, busy_timeout_ms)}")
+    try:
+        busy, log_frames, checkpointed = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+    finally:
+        conn.execute(f"PRAGMA busy_timeout={CHECKPOINT_BUSY_TIMEOUT_MS}")
+    return {"busy": bool(busy), "log_frames": log_frames, "checkpointed_frames": checkpointed}
+
+
+def _incremental_vacuum_step(conn: sqlite3.Connection, pages: int) -> int:
+    before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    if before:
+        # execute() делает один шаг и освобождает одну страницу; executescript доводит PRAGMA до конца
+        conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+    return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+def _optimize(conn: sqlite3.Connection) -> str:
+    conn.execute(f"PRAGMA analysis_limit={ANALYSIS_LIMIT}")
+    has_stats = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()
+    if has_stats:
+        conn.execute("PRAGMA optimize").fetchall()
+        return "optimize"
+    # Первый запуск: PRAGMA optimize не собирает статистику для таблиц без sqlite_stat1
+    conn.execute("ANALYZE")
+    return "analyze"
+
+
+def _convert_to_incremental(conn: sqlite3.Connection) -> None:
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("VACUUM")
+
+
+class DatabaseMaintenance:
+    """Обслуживание файла БД порциями в пределах бюджета времени с отчётом о последнем запуске."""
+
+    def __init__(self, *, budget: float = MAINTENANCE_BUDGET, vacuum_pages: int = VACUUM_PAGES_PER_STEP) -> None:
+        self.budget = budget
+        self.vacuum_pages = vacuum_pages
+        self._lock = threading.Lock()
+        self._running = False
+        self._runs = 0
+        self._last_report: dict[str, Any] | None = None
+
+    def run(self) -> dict[str, Any]:
+        """Выполнить один цикл обслуживания (блокирующий вызов, для to_thread/планировщика)."""
+        from backend.core.db_writer import db_writer
+
+        with self._lock:
+            if self._running:
+                return {"skipped": "already_running"}
+            self._running = True
+        try:
+            db_path = _current_db_path()
+            started = time.monotonic()
+            deadline = started + self.budget
+            report: dict[str, Any] = {"started_at": time.time(), "wal_bytes_before": _wal_size(db_path)}
+
+            def remaining_ms() -> int:
+                return int(max(0.0, deadline - time.monotonic()) * 1000)
+
+            step_started = time.monotonic()
+            try:
+                report["checkpoint"] = db_writer.execute(_checkpoint, remaining_ms() // 3, isolated=True)
+            except sqlite3.Error as exc:
+                report["checkpoint"] = {"error": str(exc)}
+            report["checkpoint"]["duration_ms"] = round((time.monotonic() - step_started) * 1000, 1)
+
+            step_started = time.monotonic()
+            freed = steps = 0
+            while time.monotonic() < deadline:
+                try:
+                    n = db_writer.execute(_incremental_vacuum_step, self.vacuum_pages, isolated=True)
+                except sqlite3.Error as exc:
+                    report["incremental_vacuum_error"] = str(exc)
+                    break
+                steps += 1
+                freed += n
+                if n < self.vacuum_pages:
+                    break
+            report["incremental_vacuum"] = {
+                "freed_pages": freed,
+                "steps": steps,
+                "duration_ms": round((time.monotonic() - step_started) * 1000, 1),
+            }
+
+            step_started = time.monotonic()
+            if time.monotonic() < deadline:
+                try:
+                    mode = db_writer.execute(_optimize, isolated=True)
+                    report["optimize"] = {"mode": mode}
+                except sqlite3.Error as exc:
+                    report["optimize"] = {"error": str(exc)}
+            else:
+                report["optimize"] = {"skipped": "budget_exhausted"}
+            report["optimize"]["duration_ms"] = round((time.monotonic() - step_started) * 1000, 1)
+
+            report["wal_bytes_after"] = _wal_size(db_path)
+            report["duration_ms"] = round((time.monotonic() - started) * 1000, 1)
+            _log.info("Database maintenance finished: %s", report)
+            with self._lock:
+                self._runs += 1
+                self._last_report = report
+            return report
+        finally:
+            with self._lock:
+                self._running = False
+
+    def convert_to_incremental(self) -> dict[str, Any]:
+        """Однократно перевести существующую БД в auto_vacuum=INCREMENTAL (полный VACUUM, блокирует запись)."""
+        from backend.core.db_writer import db_writer
+
+        db_writer.execute(_convert_to_incremental, isolated=True)
+        return self.get_status()
+
+    def get_status(self) -> dict[str, Any]:
+        """Текущие размеры WAL/freelist и отчёт о последнем запуске."""
+        from backend.core.database import get_db_read_connection
+
+        db_path = _current_db_path()
+        status: dict[str, Any] = {"wal_bytes": _wal_size(db_path)}
+        try:
+            conn = get_db_read_connection()
+            try:
+                status.update(_file_stats(conn))
+            finally:
+                conn.close()
+        except sqlite3.Error as exc:
+            status["error"] = str(exc)
+        with self._lock:
+            status["runs"] = self._runs
+            status["running"] = self._running
+            status["last_run"] = self._last_report
+        return status
+
+
+db_maintenance = DatabaseMaintenance()
+
+
+def run_db_maintenance() -> dict[str, Any]:
+    """Задача планировщика: один цикл обслуживания БД."""
+    return db_maintenance.run()
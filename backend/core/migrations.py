@@ -0,0 +1,539 @@
+"""Версионированные миграции схемы SQLite (PRAGMA user_version).
+
+Каждая миграция применяется один раз в собственной транзакции (BEGIN IMMEDIATE),
+после чего номер версии записывается в PRAGMA user_version. Если версия БД совпадает
+с SCHEMA_VERSION и все таблицы ядра на месте, init_db() завершается без единой записи
+и без блокировок. Миграции обязаны быть идемпотентными: при потере таблиц ядра они
+повторно применяются в режиме восстановления (repair).
+"""
+from __future__ import annotations
+
+import logging
+import sqlite3
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import List
+
+_log = logging.getLogger("nms.core.migrations")
+
+
+@dataclass(frozen=True)
+class Migration:
+    """Шаг миграции схемы: номер версии, имя и функция применения."""
+
+    version: int
+    name: str
+    apply: Callable[[sqlite3.Connection], None]
+
+
+def _m001_baseline_schema(conn: sqlite3.Connection) -> None:
+    """Базовая схема ядра, роли, права и пользователь root.
+
+    Идемпотентна: на БД без user_version (созданных до появления миграций)
+    догоняет недостающие таблицы и колонки.
+    """
+    from backend.core.database import hash_password
+
+    # 1. Таблица ролей
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS roles (
+            id TEXT PRIMARY KEY,
+            name TEXT UNIQUE NOT NULL,
+            description TEXT,
+            is_system BOOLEAN DEFAULT 0
+        );
+    """)
+
+    # 2. Таблица разрешений (permissions)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS permissions (
+            id TEXT PRIMARY KEY,
+            category TEXT NOT NULL,
+            name TEXT NOT NULL,
+            description TEXT,
+            module_id TEXT DEFAULT NULL
+        );
+    """)
+
+    existing_perm_cols = {col["name"] for col in conn.execute("PRAGMA table_info(permissions)").fetchall()}
+    if "module_id" not in existing_perm_cols:
+        conn.execute("ALTER TABLE permissions ADD COLUMN module_id TEXT DEFAULT NULL")
+
+    # 3. Связь ролей и разрешений
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS role_permissions (
+            role_id TEXT NOT NULL,
+            permission_id TEXT NOT NULL,
+            PRIMARY KEY (role_id, permission_id),
+            FOREIGN KEY (role_id) REFERENCES roles (id) ON DELETE CASCADE,
+            FOREIGN KEY (permission_id) REFERENCES permissions (id) ON DELETE CASCADE
+        );
+    """)
+
+    # 4. Таблица пользователей
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id TEXT PRIMARY KEY,
+            username TEXT UNIQUE NOT NULL,
+            full_name TEXT NOT NULL DEFAULT '',
+            email TEXT,
+            uid TEXT UNIQUE NOT NULL DEFAULT '',
+            hashed_password TEXT NOT NULL DEFAULT '',
+            is_active BOOLEAN DEFAULT 1,
+            role_id TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_login TIMESTAMP,
+            FOREIGN KEY (role_id) REFERENCES roles (id)
+        );
+    """)
+
+    # Автоматическая миграция для добавления отсутствующих полей
+    existing_cols = {col["name"] for col in conn.execute("PRAGMA table_info(users)").fetchall()}
+    if "full_name" not in existing_cols:
+        conn.execute("ALTER TABLE users ADD COLUMN full_name TEXT NOT NULL DEFAULT ''")
+    if "email" not in existing_cols:
+        conn.execute("ALTER TABLE users ADD COLUMN email TEXT")
+    if "uid" not in existing_cols:
+        conn.execute("ALTER TABLE users ADD COLUMN uid TEXT NOT NULL DEFAULT ''")
+    if "hashed_password" not in existing_cols:
+        conn.execute("ALTER TABLE users ADD COLUMN hashed_password TEXT NOT NULL DEFAULT ''")
+    if "avatar" not in existing_cols:
+        conn.execute("ALTER TABLE users ADD COLUMN avatar TEXT")
+    if "token_valid_after" not in existing_cols:
+        conn.execute("ALTER TABLE users ADD COLUMN token_valid_after INTEGER DEFAULT 0")
+    if "must_change_password" not in existing_cols:
+        conn.execute("ALTER TABLE users ADD COLUMN must_change_password BOOLEAN DEFAULT 0")
+    if "failed_login_attempts" not in existing_cols:
+        conn.execute("ALTER TABLE users ADD COLUMN failed_login_attempts INTEGER DEFAULT 0")
+    if "locked_until" not in existing_cols:
+        conn.execute("ALTER TABLE users ADD COLUMN locked_until TIMESTAMP")
+    if "title" not in existing_cols:
+        conn.execute("ALTER TABLE users ADD COLUMN title TEXT DEFAULT ''")
+    if "last_seen" not in existing_cols:
+        conn.execute("ALTER TABLE users ADD COLUMN last_seen TIMESTAMP")
+    if "mfa_enabled" not in existing_cols:
+        conn.execute("ALTER TABLE users ADD COLUMN mfa_enabled INTEGER DEFAULT 0")
+    if "mfa_secret" not in existing_cols:
+        conn.execute("ALTER TABLE users ADD COLUMN mfa_secret TEXT")
+    if "mfa_recovery_codes" not in existing_cols:
+        conn.execute("ALTER TABLE users ADD COLUMN mfa_recovery_codes TEXT")
+
+    # 5. Таблица аудита логов
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS audit_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            user_id TEXT,
+            username TEXT NOT NULL,
+            action TEXT NOT NULL,
+            resource TEXT NOT NULL,
+            details TEXT,
+            ip_address TEXT
+        );
+    """)
+
+    # 6. Таблица системных настроек (key-value)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS system_settings (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """)
+
+    # 7. Таблица активных сессий пользователей
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS active_sessions (
+            id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            token_jti TEXT NOT NULL,
+            ip_address TEXT,
+            user_agent TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_revoked BOOLEAN DEFAULT 0,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        );
+    """)
+
+    # 8. Таблица удаленных источников логов
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS remote_log_sources (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            url TEXT NOT NULL,
+            api_token TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+    # 9. Таблица журнала системных событий (для WebSocket replay/recovery)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS system_events_journal (
+            seq_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_type TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            target_user_id TEXT,
+            topic TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_events_seq_id ON system_events_journal(seq_id);")
+
+    existing_journal_cols = {col["name"] for col in conn.execute("PRAGMA table_info(system_events_journal)").fetchall()}
+    if "topic" not in existing_journal_cols:
+        conn.execute("ALTER TABLE system_events_journal ADD COLUMN topic TEXT DEFAULT NULL")
+
+    # ── Инициализация начальных ролей ───────────────────
+    default_roles = [
+        ("1", "Superuser", "Полный доступ к системе и ее конфигурации", 1),
+        ("2", "Admin", "Административный контроль, ограничение на удаление", 1),
+        ("3", "Operator", "Управление конфигурациями и мониторингом", 1),
+        ("4", "Viewer", "Только чтение параметров и логов", 1),
+    ]
+    for r_id, r_name, r_desc, r_sys in default_roles:
+        conn.execute(
+            "INSERT OR IGNORE INTO roles (id, name, description, is_system) VALUES (?, ?, ?, ?)",
+            (r_id, r_name, r_desc, r_sys)
+        )
+
+    # ── Инициализация стандартных прав ──────────────────
+    default_permissions = [
+        ("system.all", "Система", "Полный доступ", "Полные права суперпользователя"),
+        ("system.admin", "Система", "Администрирование", "Просмотр логов, бэкапы, управление сессиями"),
+        ("users.view", "Пользователи", "Просмотр пользователей", "Просмотр списка пользователей и их данных"),
+        ("users.manage", "Пользователи", "Управление пользователями", "Создание, редактирование и удаление пользователей"),
+        ("roles.view", "Доступ", "Просмотр ролей", "Просмотр списка ролей и прав"),
+        ("roles.manage", "Доступ", "Управление ролями", "Изменение матрицы прав доступа и создание ролей"),
+        ("settings.view", "Настройки", "Просмотр настроек", "Просмотр системных настроек и конфигурации"),
+        ("settings.edit", "Настройки", "Изменение настроек", "Редактирование параметров системы и модулей"),
+        ("modules.view", "Модули", "Просмотр модулей", "Просмотр списка доступных модулей и статусов"),
+        ("modules.manage", "Модули", "Управление модулями", "Включение и выключение плагинов"),
+        ("audit.view", "Аудит", "Просмотр журнала аудита", "Доступ к событиям безопасности и журналам"),
+        ("audit.export", "Аудит", "Экспорт аудита", "Экспорт журнала аудита безопасности"),
+    ]
+    for p_id, p_cat, p_name, p_desc in default_permissions:
+        conn.execute(
+            "INSERT OR IGNORE INTO permissions (id, category, name, description) VALUES (?, ?, ?, ?)",
+            (p_id, p_cat, p_name, p_desc)
+        )
+
+    # ── Обновление стандартов привязок для системных ролей ──
+    conn.execute("DELETE FROM role_permissions WHERE role_id IN ('1', '2', '3', '4')")
+
+    # Назначение всех прав роли Superuser ('1')
+    for p_id, _, _, _ in default_permissions:
+        conn.execute(
+            "INSERT OR IGNORE INTO role_permissions (role_id, permission_id) VALUES ('1', ?)",
+            (p_id,)
+        )
+
+    # Назначение прав роли Admin ('2')
+    admin_perms = [
+        "system.admin", "users.view", "users.manage", "roles.view", "roles.manage",
+        "settings.view", "settings.edit", "modules.view", "modules.manage", "audit.view", "audit.export"
+    ]
+    for p_id in admin_perms:
+        conn.execute(
+            "INSERT OR IGNORE INTO role_permissions (role_id, permission_id) VALUES ('2', ?)",
+            (p_id,)
+        )
+
+    # Назначение прав роли Operator ('3'): доступ к настройкам и модулям, без управления пользователями и ролями
+    operator_perms = ["settings.view", "settings.edit", "modules.view", "audit.view"]
+    for p_id in operator_perms:
+        conn.execute(
+            "INSERT OR IGNORE INTO role_permissions (role_id, permission_id) VALUES ('3', ?)",
+            (p_id,)
+        )
+
+    # Назначение прав роли Viewer ('4'): только чтение логов и аудита (без пользователей, ролей, модулей и системных настроек)
+    viewer_perms = ["audit.view"]
+    for p_id in viewer_perms:
+        conn.execute(
+            "INSERT OR IGNORE INTO role_permissions (role_id, permission_id) VALUES ('4', ?)",
+            (p_id,)
+        )
+
+    # ── Автоматическая миграция admin -> root ──
+    conn.execute("UPDATE users SET username = 'root', full_name = 'Главный администратор (Root)', uid = 'ROOT-001' WHERE username = 'admin'")
+
+    # ── Инициализация системного пользователя root ──
+    root_user = conn.execute("SELECT id FROM users WHERE username = 'root'").fetchone()
+    if not root_user:
+        pass_hash = hash_password("admin")
+        conn.execute(
+            """
+            INSERT INTO users (id, username, full_name, email, uid, hashed_password, is_active, role_id)
+            VALUES (?, ?, ?, ?, ?, ?, 1, '1')
+            """,
+            ("usr-root-01", "root", "Главный администратор (Root)", "root@nms.local", "ROOT-001", pass_hash)
+        )
+
+    # 10. Таблица уведомлений (notifications)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS notifications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            module_id TEXT NOT NULL DEFAULT 'core',
+            user_id TEXT NOT NULL,
+            title TEXT NOT NULL,
+            body TEXT DEFAULT '',
+            severity TEXT DEFAULT 'info',
+            category TEXT DEFAULT 'system',
+            entity_id TEXT DEFAULT NULL,
+            target_url TEXT DEFAULT NULL,
+            group_count INTEGER DEFAULT 1,
+            created_at REAL NOT NULL,
+            read_at REAL DEFAULT NULL
+        );
+    """)
+
+    existing_notif_cols = {col["name"] for col in conn.execute("PRAGMA table_info(notifications)").fetchall()}
+    if "category" not in existing_notif_cols:
+        conn.execute("ALTER TABLE notifications ADD COLUMN category TEXT DEFAULT 'system'")
+    if "target_url" not in existing_notif_cols:
+        conn.execute("ALTER TABLE notifications ADD COLUMN target_url TEXT DEFAULT NULL")
+    if "group_count" not in existing_notif_cols:
+        conn.execute("ALTER TABLE notifications ADD COLUMN group_count INTEGER DEFAULT 1")
+    if "actions" not in existing_notif_cols:
+        conn.execute("ALTER TABLE notifications ADD COLUMN actions TEXT DEFAULT NULL")
+    if "acknowledged_at" not in existing_notif_cols:
+        conn.execute("ALTER TABLE notifications ADD COLUMN acknowledged_at REAL DEFAULT NULL")
+    if "acknowledged_by" not in existing_notif_cols:
+        conn.execute("ALTER TABLE notifications ADD COLUMN acknowledged_by TEXT DEFAULT NULL")
+    if "escalated_at" not in existing_notif_cols:
+        conn.execute("ALTER TABLE notifications ADD COLUMN escalated_at REAL DEFAULT NULL")
+    if "title_template" not in existing_notif_cols:
+        conn.execute("ALTER TABLE notifications ADD COLUMN title_template TEXT DEFAULT NULL")
+
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_notifications_user_read
+        ON notifications(user_id, read_at);
+    """)
+
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_notifications_dedup
+        ON notifications(user_id, module_id, category, severity, title, read_at);
+    """)
+
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_notifications_module
+        ON notifications(module_id);
+    """)
+
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_notifications_created
+        ON notifications(created_at);
+    """)
+
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_notifications_user_id
+        ON notifications(user_id, id DESC);
+    """)
+
+    # 11. Таблица предпочтений уведомлений (notification_preferences)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS notification_preferences (
+            user_id TEXT PRIMARY KEY,
+            push_enabled BOOLEAN DEFAULT 1,
+            sound_enabled BOOLEAN DEFAULT 1,
+            muted_categories TEXT DEFAULT '[]',
+            subscribed_modules TEXT DEFAULT NULL,
+            module_rules TEXT DEFAULT '{}',
+            sound_signals TEXT DEFAULT '{}',
+            muted_until REAL DEFAULT NULL,
+            quiet_hours TEXT DEFAULT '{}'
+        );
+    """)
+
+    existing_pref_cols = {col["name"] for col in conn.execute("PRAGMA table_info(notification_preferences)").fetchall()}
+    if "subscribed_modules" not in existing_pref_cols:
+        conn.execute("ALTER TABLE notification_preferences ADD COLUMN subscribed_modules TEXT DEFAULT NULL")
+    if "module_rules" not in existing_pref_cols:
+        conn.execute("ALTER TABLE notification_preferences ADD COLUMN module_rules TEXT DEFAULT '{}'")
+    if "sound_signals" not in existing_pref_cols:
+        conn.execute("ALTER TABLE notification_preferences ADD COLUMN sound_signals TEXT DEFAULT '{}'")
+    if "muted_until" not in existing_pref_cols:
+        conn.execute("ALTER TABLE notification_preferences ADD COLUMN muted_until REAL DEFAULT NULL")
+    if "quiet_hours" not in existing_pref_cols:
+        conn.execute("ALTER TABLE notification_preferences ADD COLUMN quiet_hours TEXT DEFAULT '{}'")
+
+def _m002_settings_version(conn: sqlite3.Connection) -> None:
+    """Счётчик изменений system_settings для межпроцессной инвалидации кэша настроек."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS system_settings_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL DEFAULT 0
+        );
+    """)
+    conn.execute("INSERT OR IGNORE INTO system_settings_version (id, version) VALUES (1, 0)")
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_system_settings_{event.lower()}
+            AFTER {event} ON system_settings
+            BEGIN
+                UPDATE system_settings_version SET version = version + 1 WHERE id = 1;
+            END;
+        """)
+
+
+def _m003_hot_query_indexes(conn: sqlite3.Connection) -> None:
+    """Индексы под горячие запросы: проверка сессии по jti, онлайн-статус, фильтры аудита, replay журнала."""
+    # Проверка отзыва сессии на каждом запросе (покрывающий для SELECT is_revoked)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_active_sessions_jti ON active_sessions(token_jti, is_revoked)")
+    # Онлайн-статус в списке пользователей и список сессий пользователя
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_active_sessions_user_seen ON active_sessions(user_id, is_revoked, last_seen)")
+    # Список всех живых сессий (частичный индекс: отозванные не нужны)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_active_sessions_live_seen ON active_sessions(last_seen) WHERE is_revoked = 0")
+    # Проверка «последнего активного суперпользователя» (в очень старых БД колонки is_active нет)
+    user_cols = {col["name"] for col in conn.execute("PRAGMA table_info(users)").fetchall()}
+    if "is_active" in user_cols:
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_users_role_active ON users(role_id, is_active)")
+    # Фильтры категорий аудита вида action LIKE 'auth.%' (LIKE без учёта регистра использует только NOCASE-индекс)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_audit_logs_action ON audit_logs(action COLLATE NOCASE)")
+    # Replay журнала событий: адресат + топики + позиция, и адресат + позиция без фильтра топиков
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_events_target_topic_seq ON system_events_journal(target_user_id, topic, seq_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_events_target_seq ON system_events_journal(target_user_id, seq_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_events_created ON system_events_journal(created_at)")
+    # seq_id — INTEGER PRIMARY KEY (rowid), отдельный индекс только замедляет вставку
+    conn.execute("DROP INDEX IF EXISTS idx_events_seq_id")
+
+
+def _m004_events_journal_fanout(conn: sqlite3.Connection) -> None:
+    """Процесс-источник, точное время публикации и режим доставки событий журнала (fan-out между воркерами)."""
+    existing_journal_cols = {col["name"] for col in conn.execute("PRAGMA table_info(system_events_journal)").fetchall()}
+    if "origin" not in existing_journal_cols:
+        conn.execute("ALTER TABLE system_events_journal ADD COLUMN origin TEXT DEFAULT NULL")
+    if "published_at" not in existing_journal_cols:
+        conn.execute("ALTER TABLE system_events_journal ADD COLUMN published_at REAL DEFAULT NULL")
+    if "immediate" not in existing_journal_cols:
+        conn.execute("ALTER TABLE system_events_journal ADD COLUMN immediate INTEGER NOT NULL DEFAULT 1")
+
+
+def _m005_bus_durable_subscriptions(conn: sqlite3.Connection) -> None:
+    """Журнал событий шины и курсоры долговременных подписок модулей."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS bus_event_journal (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            topic TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            created_at REAL NOT NULL
+        );
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bus_journal_created ON bus_event_journal(created_at)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS bus_durable_subscriptions (
+            id TEXT PRIMARY KEY,
+            pattern TEXT NOT NULL,
+            cursor INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+    """)
+
+
+def _m006_bus_durable_leases(conn: sqlite3.Connection) -> None:
+    """Аренда долговременной подписки одним воркером и журнал недоставленных событий."""
+    existing_cols = {col["name"] for col in conn.execute("PRAGMA table_info(bus_durable_subscriptions)").fetchall()}
+    if "owner" not in existing_cols:
+        conn.execute("ALTER TABLE bus_durable_subscriptions ADD COLUMN owner TEXT DEFAULT NULL")
+    if "lease_expires" not in existing_cols:
+        conn.execute("ALTER TABLE bus_durable_subscriptions ADD COLUMN lease_expires REAL DEFAULT NULL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS bus_dead_letters (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            subscription_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            topic TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            error TEXT,
+            created_at REAL NOT NULL
+        );
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bus_dead_letters_sub ON bus_dead_letters(subscription_id, id)")
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "baseline_schema", _m001_baseline_schema),
+    Migration(2, "settings_version", _m002_settings_version),
+    Migration(3, "hot_query_indexes", _m003_hot_query_indexes),
+    Migration(4, "events_journal_fanout", _m004_events_journal_fanout),
+    Migration(5, "bus_durable_subscriptions", _m005_bus_durable_subscriptions),
+    Migration(6, "bus_durable_leases", _m006_bus_durable_leases),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+CORE_TABLES = (
+    "roles", "permissions", "role_permissions", "users", "audit_logs", "system_settings",
+    "active_sessions", "remote_log_sources", "system_events_journal", "notifications",
+    "notification_preferences", "system_settings_version", "bus_event_journal", "bus_durable_subscriptions",
+    "bus_dead_letters",
+)
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Текущая версия схемы из PRAGMA user_version."""
+    return int(conn.execute("PRAGMA user_version").fetchone()[0])
+
+
+def get_pending_migrations(conn: sqlite3.Connection) -> List[Migration]:
+    """Миграции, ещё не применённые к БД."""
+    current = get_schema_version(conn)
+    return [m for m in MIGRATIONS if m.version > current]
+
+
+def get_missing_core_tables(conn: sqlite3.Connection) -> List[str]:
+    """Таблицы ядра, отсутствующие в БД."""
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()}
+    return [name for name in CORE_TABLES if name not in existing]
+
+
+def is_schema_current(conn: sqlite3.Connection) -> bool:
+    """Версия схемы актуальна и таблицы ядра на месте (только чтение)."""
+    return get_schema_version(conn) >= SCHEMA_VERSION and not get_missing_core_tables(conn)
+
+
+def ensure_schema(conn: sqlite3.Connection) -> List[int]:
+    """Применить недостающие миграции; при потере таблиц ядра — повторить все миграции."""
+    missing = get_missing_core_tables(conn)
+    if missing and get_schema_version(conn) > 0:
+        _log.warning("Core tables missing (%s), re-applying migrations", ", ".join(missing))
+        return migrate(conn, repair=True)
+    return migrate(conn)
+
+
+def migrate(conn: sqlite3.Connection, target: int | None = None, repair: bool = False) -> List[int]:
+    """Применить недостающие миграции до target (по умолчанию до SCHEMA_VERSION).
+
+    С repair=True повторно применяются и уже отмеченные миграции.
+    Возвращает список применённых версий.
+    """
+    target = SCHEMA_VERSION if target is None else target
+    current = get_schema_version(conn)
+    if current > SCHEMA_VERSION:
+        _log.warning("Database schema version %d is newer than supported %d", current, SCHEMA_VERSION)
+        return []
+
+    applied: List[int] = []
+    if conn.in_transaction:
+        conn.commit()
+    for migration in MIGRATIONS:
+        if migration.version > target:
+            break
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Повторная проверка под блокировкой: другой процесс мог уже применить миграцию
+            if not repair and get_schema_version(conn) >= migration.version:
+                conn.rollback()
+                continue
+            migration.apply(conn)
+            if get_schema_version(conn) < migration.version:
+                conn.execute(f"PRAGMA user_version = {int(migration.version)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            _log.error("Migration %03d_%s failed", migration.version, migration.name)
+            raise
+        applied.append(migration.version)
+        _log.info("Applied database migration %03d_%s", migration.version, migration.name)
+    return applied
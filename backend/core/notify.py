@@ -12,7 +12,8 @@ import logging
 import time
 from typing import Any, Dict, List, Optional
 
-from backend.core.database import get_db_connection
+from backend.core.database import get_db_connection, get_db_read_connection
+from backend.core.db_writer import db_writer
 from backend.core.exceptions import ValidationError
 
 _log = logging.getLogger("nms.core.notify")
@@ -455,91 +456,96 @@ def notify(
 
         actions_json = json.dumps(actions) if actions and isinstance(actions, list) else None
 
-        # Повторные попытки при блокировках SQLite (database is locked)
-        for attempt in range(5):
-            try:
-                with conn:
-                    if has_group_col:
-                        # Проверка дедупликации: ищем недавнее непрочитанное уведомление за 60 секунд
-                        cutoff = created_at - 60.0
-                        dup_cur = conn.execute(
+        def _write_notification(wconn) -> tuple:
+            notification_id = 0
+            group_count = 1
+            new_title = title_str
+            if has_group_col:
+                # Проверка дедупликации: ищем недавнее непрочитанное уведомление за 60 секунд
+                cutoff = created_at - 60.0
+                dup_cur = wconn.execute(
+                    """
+                    SELECT id, group_count FROM notifications
+                    WHERE user_id = ? AND module_id = ? AND category = ? AND severity = ? AND (title = ? OR title_template = ?) AND read_at IS NULL AND created_at >= ?
+                    ORDER BY id DESC LIMIT 1
+                    """,
+                    (user_str, mod_id, cat, sev, initial_title, effective_template or initial_title, cutoff),
+                )
+                dup_row = dup_cur.fetchone()
+                if dup_row:
+                    notification_id = dup_row["id"]
+                    group_count = (dup_row["group_count"] or 1) + 1
+                    display_title = effective_template.format(count=group_count) if effective_template else title_str
+
+                    if has_actions_col:
+                        wconn.execute(
                             """
-                            SELECT id, group_count FROM notifications
-                            WHERE user_id = ? AND module_id = ? AND category = ? AND severity = ? AND (title = ? OR title_template = ?) AND read_at IS NULL AND created_at >= ?
-                            ORDER BY id DESC LIMIT 1
+                            UPDATE notifications
+                            SET group_count = ?, created_at = ?, title = ?, body = CASE WHEN ? != '' THEN ? ELSE body END, actions = COALESCE(?, actions)
+                            WHERE id = ?
                             """,
-                            (user_str, mod_id, cat, sev, initial_title, effective_template or initial_title, cutoff),
+                            (group_count, created_at, display_title, body_str, body_str, actions_json, notification_id),
+                        )
+                    else:
+                        wconn.execute(
+                            """
+                            UPDATE notifications
+                            SET group_count = ?, created_at = ?, title = ?, body = CASE WHEN ? != '' THEN ? ELSE body END
+                            WHERE id = ?
+                            """,
+                            (group_count, created_at, display_title, body_str, body_str, notification_id),
+                        )
+                    new_title = display_title
+                else:
+                    display_title = initial_title
+                    if has_actions_col:
+                        cursor = wconn.execute(
+                            """
+                            INSERT INTO notifications (module_id, user_id, title, body, severity, category, entity_id, target_url, group_count, actions, title_template, created_at, read_at)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1, ?, ?, ?, NULL)
+                            """,
+                            (mod_id, user_str, display_title, body_str, sev, cat, entity_id, target_url, actions_json, effective_template, created_at),
                         )
-                        dup_row = dup_cur.fetchone()
-                        if dup_row:
-                            notification_id = dup_row["id"]
-                            group_count = (dup_row["group_count"] or 1) + 1
-                            display_title = effective_template.format(count=group_count) if effective_template else title_str
-
-                            if has_actions_col:
-                                conn.execute(
-                                    """
-                                    UPDATE notifications
-                                    SET group_count = ?, created_at = ?, title = ?, body = CASE WHEN ? != '' THEN ? ELSE body END, actions = COALESCE(?, actions)
-                                    WHERE id = ?
-                                    """,
-                                    (group_count, created_at, display_title, body_str, body_str, actions_json, notification_id),
-                                )
-                            else:
-                                conn.execute(
-                                    """
-                                    UPDATE notifications
-                                    SET group_count = ?, created_at = ?, title = ?, body = CASE WHEN ? != '' THEN ? ELSE body END
-                                    WHERE id = ?
-                                    """,
-                                    (group_count, created_at, display_title, body_str, body_str, notification_id),
-                                )
-                            title_str = display_title
-                        else:
-                            display_title = initial_title
-                            if has_actions_col:
-                                cursor = conn.execute(
-                                    """
-                                    INSERT INTO notifications (module_id, user_id, title, body, severity, category, entity_id, target_url, group_count, actions, title_template, created_at, read_at)
-                                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1, ?, ?, ?, NULL)
-                                    """,
-                                    (mod_id, user_str, display_title, body_str, sev, cat, entity_id, target_url, actions_json, effective_template, created_at),
-                                )
-                            else:
-                                cursor = conn.execute(
-                                    """
-                                    INSERT INTO notifications (module_id, user_id, title, body, severity, category, entity_id, target_url, group_count, title_template, created_at, read_at)
-                                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1, ?, ?, NULL)
-                                    """,
-                                    (mod_id, user_str, display_title, body_str, sev, cat, entity_id, target_url, effective_template, created_at),
-                                )
-                            notification_id = cursor.lastrowid
-                            group_count = 1
-                            title_str = display_title
                     else:
-                        cursor = conn.execute(
+                        cursor = wconn.execute(
                             """
-                            INSERT INTO notifications (module_id, user_id, title, body, severity, category, entity_id, target_url, created_at, read_at)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, NULL)
+                            INSERT INTO notifications (module_id, user_id, title, body, severity, category, entity_id, target_url, group_count, title_template, created_at, read_at)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1, ?, ?, NULL)
                             """,
-                            (mod_id, user_str, initial_title, body_str, sev, cat, entity_id, target_url, created_at),
+                            (mod_id, user_str, display_title, body_str, sev, cat, entity_id, target_url, effective_template, created_at),
                         )
-                        notification_id = cursor.lastrowid
-                        group_count = 1
-                        title_str = initial_title
-
-                    invalidate_unread_cache(user_str)
-                    unread_count = count_unread_notifications(user_str, conn=conn)
-                break
-            except Exception as exc:
-                if "locked" in str(exc).lower() and attempt < 4:
-                    time.sleep(0.05 * (2 ** attempt))
-                    continue
-                _log.error("Failed to insert/update notification into DB: %s", exc)
-                raise
+                    notification_id = cursor.lastrowid
+                    group_count = 1
+                    new_title = display_title
+            else:
+                cursor = wconn.execute(
+                    """
+                    INSERT INTO notifications (module_id, user_id, title, body, severity, category, entity_id, target_url, created_at, read_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, NULL)
+                    """,
+                    (mod_id, user_str, initial_title, body_str, sev, cat, entity_id, target_url, created_at),
+                )
+                notification_id = cursor.lastrowid
+                group_count = 1
+                new_title = initial_title
+
+            row = wconn.execute(
+                "SELECT COUNT(*) FROM notifications WHERE user_id = ? AND read_at IS NULL",
+                (user_str,),
+            ).fetchone()
+            return notification_id, group_count, new_title, row[0] if row else 0
     finally:
         conn.close()
 
+    # Соединение пула уже возвращено: ожидание писателя его не удерживает
+    try:
+        notification_id, group_count, title_str, unread_count = db_writer.execute(_write_notification)
+    except Exception as exc:
+        _log.error("Failed to insert/update notification into DB: %s", exc)
+        raise
+    # Кэш сбрасывается только после COMMIT: откат пакета не оставит в нём неверное значение
+    invalidate_unread_cache(user_str)
+
     notification_data: Dict[str, Any] = {
         "id": notification_id,
         "module_id": mod_id,
@@ -612,6 +618,11 @@ def notify(
     return notification_data
 
 
+async def notify_async(user_id: str, title: str, **kwargs: Any) -> Optional[Dict[str, Any]]:
+    """Асинхронный вариант notify() для event loop: чтение настроек и запись выполняются в пуле потоков."""
+    return await asyncio.to_thread(notify, user_id, title, **kwargs)
+
+
 def get_user_notifications(
     user_id: str,
     limit: int = 50,
@@ -623,7 +634,7 @@ def get_user_notifications(
 ) -> Dict[str, Any]:
     """Получить список уведомлений пользователя с фильтрацией, пагинацией и количеством непрочитанных."""
     user_str = str(user_id).strip()
-    conn = get_db_connection()
+    conn = get_db_read_connection()
     try:
         # Всегда считаем общее количество уведомлений пользователя
         total_cur = conn.execute(
@@ -0,0 +1,112 @@
+"""Пул потоков для PBKDF2-хеширования паролей вне event loop.
+
+hashlib.pbkdf2_hmac отпускает GIL на время вычисления, поэтому отдельных потоков
+достаточно: event loop (и WebSocket-трафик) не замирает во время всплеска входов.
+Одновременно считается не больше KDF_WORKERS хешей, в очереди ждут не больше
+KDF_QUEUE_SIZE задач; при переполнении вызов сразу завершается KDFBusyError
+(в API — 429), чтобы очередь не росла без предела.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+
+from backend.core.database import hash_password, verify_password
+
+_log = logging.getLogger("nms.core.password_hasher")
+
+KDF_WORKERS = int(os.environ.get("NMS_KDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+KDF_QUEUE_SIZE = int(os.environ.get("NMS_KDF_QUEUE_SIZE", "32"))
+
+
+class KDFBusyError(RuntimeError):
+    """Очередь хеширования паролей заполнена."""
+
+
+class PasswordHasherPool:
+    """Ограниченный пул потоков для hash_password/verify_password с метриками ожидания."""
+
+    def __init__(self, workers: int = KDF_WORKERS, queue_size: int = KDF_QUEUE_SIZE) -> None:
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.queue_wait_total_ms = 0.0
+        self.queue_wait_max_ms = 0.0
+        self.kdf_total_ms = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="nms-kdf")
+        return self._executor
+
+    def _measured(self, fn: Callable[..., Any], submitted_at: float, *args: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            finished = time.perf_counter()
+            wait_ms = (started - submitted_at) * 1000
+            with self._lock:
+                self.completed += 1
+                self.queue_wait_total_ms += wait_ms
+                self.queue_wait_max_ms = max(self.queue_wait_max_ms, wait_ms)
+                self.kdf_total_ms += (finished - started) * 1000
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Выполнить fn(*args) в пуле; KDFBusyError, если очередь заполнена."""
+        with self._lock:
+            if self._pending >= self.workers + self.queue_size:
+                self.rejected += 1
+                _log.debug("Password hashing queue is full (%d pending)", self._pending)
+                raise KDFBusyError("Password hashing queue is full")
+            self._pending += 1
+            executor = self._get_executor()
+        try:
+            future = executor.submit(self._measured, fn, time.perf_counter(), *args)
+            return await asyncio.wrap_future(future)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        """Асинхронный hash_password."""
+        return await self.run(hash_password, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        """Асинхронный verify_password."""
+        return await self.run(verify_password, password, hashed_password)
+
+    def shutdown(self) -> None:
+        """Остановить потоки пула (дождавшись текущих задач)."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def get_stats(self) -> dict[str, Any]:
+        with self._lock:
+            done = self.completed or 1
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "in_flight": min(self._pending, self.workers),
+                "queued": max(0, self._pending - self.workers),
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "queue_wait_avg_ms": round(self.queue_wait_total_ms / done, 3),
+                "queue_wait_max_ms": round(self.queue_wait_max_ms, 3),
+                "kdf_avg_ms": round(self.kdf_total_ms / done, 3),
+            }
+
+
+password_hasher = PasswordHasherPool()
@@ -0,0 +1,166 @@
+"""Индекс разрешений: роли → frozenset разрешений, пользователь → роль.
+
+Проверки прав (user_has_permission, require_permission, подписка на топики WebSocket)
+выполняются по индексу в памяти без обращения к SQLite. Индекс собирается целиком
+из role_permissions и users при первом обращении, после сброса и не реже раза
+в PERMISSION_INDEX_TTL секунд (правки ролей из других процессов). Сбрасывается
+clear_permissions_cache() (CRUD ролей, синхронизация прав модулей) и событием
+core.auth.principals_invalidated (изменение, блокировка и удаление пользователей).
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any, Optional
+
+_log = logging.getLogger("nms.core.permission_index")
+
+PERMISSION_INDEX_TTL = float(os.environ.get("NMS_PERMISSION_INDEX_TTL", "60"))
+
+SUPERUSER_PERMISSION = "system.all"
+
+
+class RolePermissions:
+    """Скомпилированные разрешения роли."""
+
+    __slots__ = ("items", "names", "is_superuser")
+
+    def __init__(self, items: Iterable[str]) -> None:
+        self.items: tuple[str, ...] = tuple(items)
+        self.names: frozenset[str] = frozenset(self.items)
+        self.is_superuser = SUPERUSER_PERMISSION in self.names
+
+    def allows(self, accepted: frozenset[str]) -> bool:
+        """Есть ли у роли хотя бы одно из разрешений accepted (system.all разрешает всё)."""
+        return self.is_superuser or not accepted.isdisjoint(self.names)
+
+
+_NO_ROLE = RolePermissions(())
+
+
+class PermissionIndex:
+    """Индекс разрешений ролей и ролей активных пользователей."""
+
+    def __init__(self, ttl: float = PERMISSION_INDEX_TTL) -> None:
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._roles: dict[str, RolePermissions] = {}
+        # id пользователя → id роли; None — пользователь не найден или заблокирован
+        self._user_roles: dict[str, Optional[str]] = {}
+        self._db_path: Optional[Path] = None
+        self._built_at: Optional[float] = None
+        self.builds = 0
+        self.lookups = 0
+
+    def _ensure_built_locked(self) -> None:
+        from backend.core import database
+
+        db_path = Path(database.DB_PATH)
+        now = time.monotonic()
+        if db_path == self._db_path and self._built_at is not None and now - self._built_at < self.ttl:
+            return
+
+        conn = database.get_db_read_connection()
+        try:
+            role_ids = [r[0] for r in conn.execute("SELECT id FROM roles").fetchall()]
+            grouped: dict[str, list[str]] = {str(rid): [] for rid in role_ids}
+            for row in conn.execute("SELECT role_id, permission_id FROM role_permissions ORDER BY role_id, permission_id"):
+                grouped.setdefault(str(row[0]), []).append(row[1])
+            user_rows = conn.execute("SELECT id, role_id FROM users WHERE is_active = 1").fetchall()
+        finally:
+            conn.close()
+
+        self._roles = {rid: RolePermissions(perms) for rid, perms in grouped.items()}
+        self._user_roles = {str(r[0]): str(r[1]) for r in user_rows}
+        self._db_path = db_path
+        self._built_at = now
+        self.builds += 1
+
+    def _lookup_user_locked(self, user_id: str) -> Optional[str]:
+        """Роль пользователя, отсутствующего в индексе (создан после сборки)."""
+        from backend.core.database import get_db_read_connection
+
+        self.lookups += 1
+        conn = get_db_read_connection()
+        try:
+            row = conn.execute("SELECT role_id FROM users WHERE id = ? AND is_active = 1", (user_id,)).fetchone()
+        finally:
+            conn.close()
+        role_id = str(row[0]) if row else None
+        self._user_roles[user_id] = role_id
+        return role_id
+
+    def for_role(self, role_id: Optional[str]) -> RolePermissions:
+        """Скомпилированные разрешения роли (пустые для неизвестной роли)."""
+        if role_id is None:
+            return _NO_ROLE
+        with self._lock:
+            self._ensure_built_locked()
+            return self._roles.get(str(role_id), _NO_ROLE)
+
+    def for_user(self, user_id: Optional[str]) -> RolePermissions:
+        """Скомпилированные разрешения активного пользователя (пустые, если он не найден или заблокирован)."""
+        if not user_id:
+            return _NO_ROLE
+        user_id = str(user_id)
+        with self._lock:
+            self._ensure_built_locked()
+            if user_id in self._user_roles:
+                role_id = self._user_roles[user_id]
+            else:
+                role_id = self._lookup_user_locked(user_id)
+            if role_id is None:
+                return _NO_ROLE
+            return self._roles.get(role_id, _NO_ROLE)
+
+    def user_has(self, user_id: Optional[str], permission: str) -> bool:
+        return self.for_user(user_id).allows(frozenset((permission,)))
+
+    def invalidate(self, *, user_ids: Iterable[str] = (), everything: bool = False) -> None:
+        """Пересобрать индекс при следующем обращении (everything) или забыть роли пользователей."""
+        with self._lock:
+            if everything:
+                self._built_at = None
+                return
+            for user_id in user_ids:
+                self._user_roles.pop(str(user_id), None)
+
+    def on_event(self, payload: Any) -> None:
+        """Обработчик core.auth.principals_invalidated."""
+        payload = payload or {}
+        self.invalidate(
+            user_ids=payload.get("user_ids") or (),
+            everything=bool(payload.get("all") or payload.get("role_ids")),
+        )
+
+    def setup(self) -> None:
+        """Подписаться на события инвалидации (идемпотентно, переживает event_bus.clear())."""
+        from backend.core.bus import event_bus
+        from backend.core.principal_cache import INVALIDATION_TOPIC
+
+        event_bus.subscribe(INVALIDATION_TOPIC, self.on_event)
+
+    def clear(self) -> None:
+        self.invalidate(everything=True)
+
+    def get_stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "roles": len(self._roles),
+                "users": len(self._user_roles),
+                "builds": self.builds,
+                "user_lookups": self.lookups,
+                "ttl": self.ttl,
+            }
+
+
+permission_index = PermissionIndex()
+
+
+def accepted_permissions(permission: str, *alternatives: str) -> frozenset[str]:
+    """Множество разрешений, любое из которых даёт доступ (с учётом system.all)."""
+    return frozenset((permission, SUPERUSER_PERMISSION, *alternatives))
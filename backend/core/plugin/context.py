@@ -5,7 +5,7 @@ import logging
 import sqlite3
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Callable
+from typing import Any, Callable, Iterable
 
 from backend.core.exceptions import PermissionDeniedError
 
@@ -19,6 +19,28 @@ class ModuleEvents:
     def __init__(self, module_id: str) -> None:
         self.module_id = module_id
         self._subscriptions: list[tuple[str, Callable]] = []
+        self._durable: set[str] = set()
+        self._reply_handlers: list[tuple[str, Callable]] = []
+
+    def _full_topic(self, topic: str) -> str:
+        if topic.startswith(f"{self.module_id}."):
+            return topic
+        return f"{self.module_id}.{topic}"
+
+    def _warn_undeclared(self, topics: dict[str, str]) -> None:
+        """Предупредить о топиках {полный: исходный}, не объявленных в manifest.events.publishes."""
+        from backend.core.plugin.registry import get_manifest
+        manifest = get_manifest(self.module_id)
+        if manifest:
+            declared_publishes = manifest.events.publishes if manifest.events else []
+            for full_topic, topic in topics.items():
+                if full_topic not in declared_publishes and topic not in declared_publishes:
+                    _log.warning(
+                        "Module '%s' published event '%s' which is not declared in manifest.events.publishes (%s)",
+                        self.module_id,
+                        full_topic,
+                        declared_publishes,
+                    )
 
     def publish(self, topic: str, payload: Any = None) -> int:
         """Опубликовать событие от имени модуля.
@@ -29,30 +51,32 @@ class ModuleEvents:
         if topic.startswith("core.") or topic == "core":
             raise PermissionDeniedError(f"Modules cannot publish to reserved 'core.*' topic: {topic}")
 
-        if topic.startswith(f"{self.module_id}."):
-            full_topic = topic
-        else:
-            full_topic = f"{self.module_id}.{topic}"
-
-        from backend.core.plugin.registry import get_manifest
-        manifest = get_manifest(self.module_id)
-        if manifest:
-            declared_publishes = manifest.events.publishes if manifest.events else []
-            if full_topic not in declared_publishes and topic not in declared_publishes:
-                _log.warning(
-                    "Module '%s' published event '%s' which is not declared in manifest.events.publishes (%s)",
-                    self.module_id,
-                    full_topic,
-                    declared_publishes,
-                )
+        full_topic = self._full_topic(topic)
+        self._warn_undeclared({full_topic: topic})
 
         from backend.core.bus import event_bus
         return event_bus.publish(full_topic, payload, is_core=False)
 
-    def subscribe(self, pattern: str, handler: Callable) -> Callable:
-        """Зарегистрировать обработчик событий для маски/топика."""
+    def publish_many(self, events: Iterable[tuple[str, Any]]) -> int:
+        """Опубликовать пачку событий модуля [(topic, payload), ...] (топики — как в publish).
+
+        Если среди топиков есть 'core.*', пачка отклоняется целиком.
+        """
+        events = list(events)
+        reserved = sorted({topic for topic, _ in events if topic.startswith("core.") or topic == "core"})
+        if reserved:
+            raise PermissionDeniedError(f"Modules cannot publish to reserved 'core.*' topics: {', '.join(reserved)}")
+
+        full_topics = {topic: self._full_topic(topic) for topic, _ in events}
+        self._warn_undeclared({full: topic for topic, full in full_topics.items()})
+
         from backend.core.bus import event_bus
-        event_bus.subscribe(pattern, handler)
+        return event_bus.publish_many(((full_topics[topic], payload) for topic, payload in events), is_core=False)
+
+    def subscribe(self, pattern: str, handler: Callable, **options: Any) -> Callable:
+        """Зарегистрировать обработчик событий для маски/топика (options — параметры очереди EventBus.subscribe)."""
+        from backend.core.bus import event_bus
+        event_bus.subscribe(pattern, handler, **options)
         sub = (pattern, handler)
         if sub not in self._subscriptions:
             self._subscriptions.append(sub)
@@ -73,12 +97,69 @@ class ModuleEvents:
                 self._subscriptions = [s for s in self._subscriptions if s[0] != pattern]
         return removed
 
+    def subscribe_durable(self, name: str, pattern: str, handler: Callable, *, batch: bool = False) -> Callable:
+        """Долговременная подписка name: события копятся в журнале, пока модуль выключен или процесс остановлен.
+
+        Доставка «хотя бы один раз»: события подтверждаются успешным возвратом обработчика,
+        при исключении пачка доставляется повторно. batch=True — список (topic, payload) на вызов.
+        """
+        from backend.core.durable_events import durable_events
+        sub_id = f"{self.module_id}:{name}"
+        durable_events.subscribe(sub_id, pattern, handler, batch=batch)
+        self._durable.add(sub_id)
+        return handler
+
+    def delete_durable(self, name: str) -> bool:
+        """Удалить долговременную подписку вместе с курсором и перестать копить её события."""
+        from backend.core.durable_events import durable_events
+        sub_id = f"{self.module_id}:{name}"
+        self._durable.discard(sub_id)
+        return durable_events.delete(sub_id)
+
+    def reply_handler(self, pattern: str, handler: Callable | None = None, *, max_concurrency: int | None = None) -> Callable:
+        """Зарегистрировать обработчик запросов request()/gather(); возвращаемое значение — ответ.
+
+        Можно использовать как декоратор: @ctx.events.reply_handler("tuya.devices.state").
+        """
+        from backend.core.bus_rpc import request_router
+
+        def register(fn: Callable) -> Callable:
+            request_router.register(pattern, fn, max_concurrency=max_concurrency)
+            if (pattern, fn) not in self._reply_handlers:
+                self._reply_handlers.append((pattern, fn))
+            return fn
+
+        return register(handler) if handler is not None else register
+
+    async def request(self, topic: str, payload: Any = None, timeout: float | None = None) -> Any:
+        """Запросить ответ у обработчика топика (полное имя, например 'tuya.devices.state')."""
+        from backend.core.bus_rpc import REQUEST_TIMEOUT, request_router
+        return await request_router.request(topic, payload, timeout=timeout or REQUEST_TIMEOUT)
+
+    async def gather(self, topic: str, payload: Any = None, first: int | None = None, timeout: float | None = None) -> list:
+        """Опросить всех обработчиков топика и вернуть первые `first` ответов (Reply: pattern, handler, value)."""
+        from backend.core.bus_rpc import REQUEST_TIMEOUT, request_router
+        return await request_router.gather(topic, payload, first=first, timeout=timeout or REQUEST_TIMEOUT)
+
     def cleanup(self) -> None:
-        """Автоматически снять все подписки, зарегистрированные модулем."""
+        """Автоматически снять все подписки, зарегистрированные модулем.
+
+        Долговременные подписки только отключаются: журнал их событий продолжает пополняться.
+        """
         from backend.core.bus import event_bus
         for pattern, handler in list(self._subscriptions):
             event_bus.unsubscribe(pattern, handler)
         self._subscriptions.clear()
+        if self._reply_handlers:
+            from backend.core.bus_rpc import request_router
+            for pattern, handler in self._reply_handlers:
+                request_router.unregister(pattern, handler)
+            self._reply_handlers.clear()
+        if self._durable:
+            from backend.core.durable_events import durable_events
+            for sub_id in self._durable:
+                durable_events.unsubscribe(sub_id)
+            self._durable.clear()
 
 
 _MODULE_EVENTS: dict[str, ModuleEvents] = {}
@@ -348,6 +429,31 @@ class ModuleContext:
             target_url=target_url,
         )
 
+    async def notify_async(
+        self,
+        user_id: str,
+        title: str,
+        body: str = "",
+        severity: str = "info",
+        category: str = "module",
+        entity_id: str | None = None,
+        allow_push: bool = True,
+        target_url: str | None = None,
+    ) -> dict[str, Any] | None:
+        """Асинхронный вариант notify() для корутин модуля: не блокирует event loop записью в БД."""
+        from backend.core.notify import notify_async as core_notify_async
+        return await core_notify_async(
+            user_id,
+            title,
+            body=body,
+            severity=severity,
+            category=category,
+            entity_id=entity_id,
+            module_id=self.module_id,
+            allow_push=allow_push,
+            target_url=target_url,
+        )
+
     def broadcast(self, payload: dict[str, Any] | str, target_user_id: str | None = None) -> None:
         """Прямой WS-мост для отправки событий клиентам через WebSocket от имени модуля."""
         from backend.core.events import broadcaster
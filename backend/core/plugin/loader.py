@@ -465,7 +465,8 @@ def unload_single_module(module_id: str) -> None:
 def uninstall_module(module_id: str) -> None:
     """Останов и транзакционная очистка ВСЕХ сущностей модуля в единой БД nms.db и на диске."""
     import shutil
-    from backend.core.database import get_db_connection
+    from backend.core.auth import clear_permissions_cache
+    from backend.core.database import get_db_connection, invalidate_settings_cache
     from backend.core.plugin.registry import get_instance, unregister_manifest
 
     inst = get_instance(module_id)
@@ -514,6 +515,8 @@ def uninstall_module(module_id: str) -> None:
             conn.execute("DELETE FROM system_settings WHERE key = ?", (f"module_{module_id}_settings",))
 
         conn.close()
+        invalidate_settings_cache()
+        clear_permissions_cache()
         _log.info("Successfully cleaned DB resources for module %s", module_id)
     except Exception as exc:
         _log.error("Failed DB cleanup for module %s: %s", module_id, exc)
@@ -10,7 +10,7 @@ from copy import deepcopy
 from pathlib import Path
 from typing import Any
 
-from backend.core.database import get_system_setting, set_system_setting
+from backend.core.database import get_system_setting, get_system_settings, set_system_setting
 from backend.core.plugin.manifest import ModuleManifest
 from backend.core.events import notify_settings_changed
 
@@ -45,6 +45,7 @@ def get_module_error(module_id: str) -> str | None:
 
 def sync_module_permissions(manifest: ModuleManifest) -> None:
     """Автоматическая синхронизация объявленных разрешений модуля с БД."""
+    from backend.core.auth import clear_permissions_cache
     from backend.core.database import get_db_connection
     perms = []
     if manifest.permissions:
@@ -81,6 +82,8 @@ def sync_module_permissions(manifest: ModuleManifest) -> None:
                     conn.execute("INSERT OR IGNORE INTO role_permissions (role_id, permission_id) VALUES ('2', ?)", (p_id,))
         finally:
             conn.close()
+        clear_permissions_cache("1")
+        clear_permissions_cache("2")
     except Exception as exc:
         _log.warning("Failed to sync permissions for module %s: %s", manifest.id, exc)
 
@@ -275,29 +278,47 @@ def save_module_settings(module_id: str, values: dict[str, Any]) -> None:
     save_webui_settings({"modules": {module_id: values}})
 
 
+SECURITY_SETTINGS_DEFAULTS: dict[str, Any] = {
+    "sec_auth_enabled": True,
+    "sec_mandatory_password_change": True,
+    "sec_max_login_attempts": 5,
+    "sec_lockout_duration": 30,
+    "sec_session_ttl_hours": 12,
+    "sec_inactivity_timeout_mins": 30,
+    "sec_force_mfa": False,
+    "sec_min_password_length": 8,
+    "sec_require_uppercase": False,
+    "sec_require_digits": False,
+    "sec_require_special_chars": False,
+    "sec_ip_whitelist": "",
+}
+
+
 def get_security_settings() -> dict[str, Any]:
     env_disable = os.getenv("NMS_DISABLE_AUTH", "").lower() in ("1", "true", "yes")
     env_enable = os.getenv("NMS_AUTH_ENABLED", "").lower() in ("0", "false", "no")
     cmd_disable = any(arg in sys.argv for arg in ("--no-auth", "--disable-auth", "--auth-disabled"))
 
+    values = get_system_settings(SECURITY_SETTINGS_DEFAULTS, SECURITY_SETTINGS_DEFAULTS)
+
     if env_disable or env_enable or cmd_disable:
         auth_enabled = False
     else:
-        auth_enabled = bool(get_system_setting("sec_auth_enabled", True))
+        auth_enabled = bool(values["sec_auth_enabled"])
 
     return {
         "auth_enabled": auth_enabled,
-        "mandatory_password_change": bool(get_system_setting("sec_mandatory_password_change", True)),
-        "max_login_attempts": int(get_system_setting("sec_max_login_attempts", 5)),
-        "lockout_duration": int(get_system_setting("sec_lockout_duration", 30)),
-        "session_ttl_hours": int(get_system_setting("sec_session_ttl_hours", 12)),
-        "inactivity_timeout_mins": int(get_system_setting("sec_inactivity_timeout_mins", 30)),
-        "force_mfa": bool(get_system_setting("sec_force_mfa", False)),
-        "min_password_length": int(get_system_setting("sec_min_password_length", 8)),
-        "require_uppercase": bool(get_system_setting("sec_require_uppercase", False)),
-        "require_digits": bool(get_system_setting("sec_require_digits", False)),
-        "require_special_chars": bool(get_system_setting("sec_require_special_chars", False)),
-        "ip_whitelist": str(get_system_setting("sec_ip_whitelist", "")),
+        "mandatory_password_change": bool(values["sec_mandatory_password_change"]),
+        "max_login_attempts": int(values["sec_max_login_attempts"]),
+        "lockout_duration": int(values["sec_lockout_duration"]),
+        "session_ttl_hours": int(values["sec_session_ttl_hours"]),
+        "inactivity_timeout_mins": int(values["sec_inactivity_timeout_mins"]),
+        "force_mfa": bool(values["sec_force_mfa"]),
+        "min_password_length": int(values["sec_min_password_length"]),
+        "require_uppercase": bool(values["sec_require_uppercase"]),
+        "require_digits": bool(values["sec_require_digits"]),
+        "require_special_chars": bool(values["sec_require_special_chars"]),
+        "ip_whitelist": str(values["sec_ip_whitelist"]),
     }
 
 
@@ -0,0 +1,183 @@
+"""Кэш аутентифицированных пользователей (CurrentUser) по jti токена.
+
+get_current_user на тёплой сессии не обращается к БД: разобранный CurrentUser берётся
+из кэша, а отметка last_seen копится в памяти (см. backend.core.activity).
+Записи живут не дольше TTL и сбрасываются событием core.auth.principals_invalidated,
+которое публикуют места, отзывающие сессии, меняющие пользователей, роли и их права
+(см. invalidate_principals). Обработчик синхронный — к возврату из publish() кэш уже очищен.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any, Optional
+
+_log = logging.getLogger("nms.core.principal_cache")
+
+PRINCIPAL_CACHE_TTL = float(os.environ.get("NMS_AUTH_CACHE_TTL", "30"))
+PRINCIPAL_CACHE_SIZE = int(os.environ.get("NMS_AUTH_CACHE_SIZE", "10000"))
+
+INVALIDATION_TOPIC = "core.auth.principals_invalidated"
+
+
+class _Entry:
+    __slots__ = ("user", "iat", "expires_at")
+
+    def __init__(self, user: Any, iat: int, expires_at: float) -> None:
+        self.user = user
+        self.iat = iat
+        self.expires_at = expires_at
+
+
+class PrincipalCache:
+    """LRU-кэш CurrentUser по jti с TTL и инвалидацией по jti, пользователю или роли."""
+
+    def __init__(self, ttl: float = PRINCIPAL_CACHE_TTL, max_entries: int = PRINCIPAL_CACHE_SIZE) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._db_path: Optional[Path] = None
+        # Растёт при каждой инвалидации: результат, прочитанный из БД до неё, не кэшируется
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def _check_db_locked(self) -> None:
+        from backend.core import database
+
+        db_path = Path(database.DB_PATH)
+        if db_path != self._db_path:
+            self._entries.clear()
+            self._generation += 1
+            self._db_path = db_path
+
+    def get(self, jti: Optional[str], iat: int) -> Optional[_Entry]:
+        """Запись кэша для токена или None (промах, истёк TTL, другой iat)."""
+        if not jti or not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            self._check_db_locked()
+            entry = self._entries.get(jti)
+            if entry is None or entry.expires_at <= now or entry.iat != iat:
+                if entry is not None:
+                    del self._entries[jti]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(jti)
+            self.hits += 1
+            return entry
+
+    def put(self, jti: Optional[str], user: Any, iat: int, generation: int) -> bool:
+        """Сохранить CurrentUser, если с момента чтения из БД (generation) не было инвалидаций."""
+        if not jti or not self.enabled:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            self._check_db_locked()
+            if generation != self._generation:
+                return False
+            self._entries[jti] = _Entry(user, iat, now + self.ttl)
+            self._entries.move_to_end(jti)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return True
+
+    def invalidate(
+        self,
+        *,
+        jtis: Iterable[str] = (),
+        user_ids: Iterable[str] = (),
+        role_ids: Iterable[str] = (),
+        everything: bool = False,
+    ) -> int:
+        """Удалить записи по jti, id пользователя или роли (everything — все). Возвращает число удалённых."""
+        jti_set = {str(j) for j in jtis if j}
+        user_set = {str(u) for u in user_ids if u}
+        role_set = {str(r) for r in role_ids if r is not None}
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            if everything:
+                removed = len(self._entries)
+                self._entries.clear()
+                return removed
+            stale = [
+                jti for jti, entry in self._entries.items()
+                if jti in jti_set or str(entry.user.id) in user_set or str(entry.user.role_id) in role_set
+            ]
+            for jti in stale:
+                del self._entries[jti]
+            return len(stale)
+
+    def on_event(self, payload: Any) -> None:
+        """Обработчик события core.auth.principals_invalidated."""
+        payload = payload or {}
+        self.invalidate(
+            jtis=payload.get("jtis") or (),
+            user_ids=payload.get("user_ids") or (),
+            role_ids=payload.get("role_ids") or (),
+            everything=bool(payload.get("all")),
+        )
+
+    def setup(self) -> None:
+        """Подписаться на события инвалидации (идемпотентно, переживает event_bus.clear())."""
+        from backend.core.bus import event_bus
+
+        event_bus.subscribe(INVALIDATION_TOPIC, self.on_event)
+
+    def clear(self) -> None:
+        self.invalidate(everything=True)
+
+    def get_stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
+
+
+principal_cache = PrincipalCache()
+
+
+def invalidate_principals(
+    *,
+    jtis: Optional[Iterable[str]] = None,
+    user_ids: Optional[Iterable[str]] = None,
+    role_ids: Optional[Iterable[str]] = None,
+    everything: bool = False,
+) -> None:
+    """Опубликовать инвалидацию кэша CurrentUser (после отзыва сессий, изменения пользователей или ролей)."""
+    from backend.core.bus import event_bus
+    from backend.core.permission_index import permission_index
+    from backend.core.shared_state import broadcast_signal
+
+    principal_cache.setup()
+    permission_index.setup()
+    payload = {
+        "jtis": [str(j) for j in jtis or () if j],
+        "user_ids": [str(u) for u in user_ids or () if u],
+        "role_ids": [str(r) for r in role_ids or () if r is not None],
+        "all": everything,
+    }
+    event_bus.publish(INVALIDATION_TOPIC, payload, is_core=True)
+    broadcast_signal(INVALIDATION_TOPIC, payload)
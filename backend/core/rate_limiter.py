@@ -1,43 +1,380 @@
-"""In-memory sliding window rate limiter per IP + username."""
+"""Ограничение частоты запросов (rate limiting) с подключаемым хранилищем состояния.
+
+Алгоритмы хранят на ключ фиксированное состояние из трёх чисел (O(1) памяти):
+  * sliding_window — скользящее окно со счётчиками текущего и предыдущего окна;
+  * token_bucket — корзина токенов ёмкостью max_requests с пополнением за window_seconds.
+
+Хранилища:
+  * memory — словарь в памяти процесса (по умолчанию при NMS_SHARED_STATE=local);
+  * sqlite — общий файл NMS_RATE_LIMIT_DB (рядом с nms.db), чтобы несколько
+    воркеров uvicorn соблюдали один лимит; проверка выполняется в транзакции
+    BEGIN IMMEDIATE.
+
+Если общее хранилище недоступно (sqlite3.Error), проверка выполняется по резервному
+хранилищу в памяти процесса — лимит сохраняется хотя бы в пределах воркера.
+
+Неактивные ключи удаляются фоновой задачей rate_limit_gc (и при переполнении
+памяти сверх NMS_RATE_LIMIT_MAX_KEYS). Для маршрутов — декоратор rate_limit();
+проверка по SQLite выполняется в пуле потоков, не блокируя event loop.
+"""
 from __future__ import annotations
 
+import asyncio
+import functools
+import logging
+import os
+import sqlite3
+import threading
 import time
-from collections import defaultdict
-from threading import Lock
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any, Optional
+
+_log = logging.getLogger("nms.core.rate_limiter")
+
+RATE_LIMIT_BACKEND = os.environ.get("NMS_RATE_LIMIT_BACKEND", "").strip().lower()
+RATE_LIMIT_DB = os.environ.get("NMS_RATE_LIMIT_DB", "")
+RATE_LIMIT_MAX_KEYS = int(os.environ.get("NMS_RATE_LIMIT_MAX_KEYS", "100000"))
+RATE_LIMIT_GC_INTERVAL = float(os.environ.get("NMS_RATE_LIMIT_GC_INTERVAL", "60"))
+
+# Состояние ключа: (a, b, c) — смысл полей задаёт алгоритм
+State = tuple[float, float, float]
+
+
+def _sliding_window(state: Optional[State], limit: int, window: float, now: float) -> tuple[bool, State, float]:
+    """Скользящее окно: оценка = счётчик предыдущего окна × доля перекрытия + счётчик текущего."""
+    current_start = now - (now % window)
+    if state is None:
+        start, previous, current = current_start, 0.0, 0.0
+    else:
+        start, previous, current = state
+        if current_start != start:
+            previous = current if current_start - start == window else 0.0
+            current = 0.0
+            start = current_start
+    estimated = previous * (1.0 - (now - start) / window) + current
+    limited = estimated >= limit
+    if not limited:
+        current += 1
+    return limited, (start, previous, current), start + 2 * window
+
+
+def _token_bucket(state: Optional[State], limit: int, window: float, now: float) -> tuple[bool, State, float]:
+    """Корзина токенов: ёмкость limit, полное пополнение за window секунд."""
+    if state is None:
+        tokens, updated = float(limit), now
+    else:
+        tokens, updated, _ = state
+        tokens = min(float(limit), tokens + (now - updated) * limit / window)
+    limited = tokens < 1
+    if not limited:
+        tokens -= 1
+    # Через window секунд корзина снова полна — состояние можно забыть
+    return limited, (tokens, now, 0.0), now + window
+
+
+ALGORITHMS: dict[str, Callable[[Optional[State], int, float, float], tuple[bool, State, float]]] = {
+    "sliding_window": _sliding_window,
+    "token_bucket": _token_bucket,
+}
+
+
+class RateLimitBackend(ABC):
+    """Абстрактное хранилище состояния лимитов."""
+
+    name = "base"
+
+    @abstractmethod
+    def hit(self, key: str, algorithm: str, limit: int, window: float, now: float) -> bool:
+        """Учесть запрос; True — лимит превышен."""
+        pass
+
+    @abstractmethod
+    def gc(self, now: Optional[float] = None) -> int:
+        """Удалить неактивные ключи; возвращает число удалённых."""
+        pass
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Удалить состояние всех ключей."""
+        pass
+
+    @abstractmethod
+    def key_count(self) -> int:
+        """Число хранимых ключей."""
+        pass
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """Состояние лимитов в памяти процесса."""
+
+    name = "memory"
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS) -> None:
+        self.max_keys = max(1, max_keys)
+        self._lock = threading.Lock()
+        # ключ → (состояние, момент, после которого ключ можно забыть) в порядке вставки
+        self._entries: OrderedDict[str, tuple[State, float]] = OrderedDict()
+
+    def hit(self, key: str, algorithm: str, limit: int, window: float, now: float) -> bool:
+        fn = ALGORITHMS[algorithm]
+        with self._lock:
+            entry = self._entries.get(key)
+            state = entry[0] if entry is not None and entry[1] > now else None
+            limited, new_state, expires_at = fn(state, limit, window, now)
+            if entry is None:
+                self._shrink_locked()
+            self._entries[key] = (new_state, expires_at)
+            return limited
+
+    def _shrink_locked(self) -> None:
+        # Таблица полна: вытесняем самые старые ключи за O(1); просроченные убирает задача rate_limit_gc
+        while len(self._entries) >= self.max_keys:
+            self._entries.popitem(last=False)
+
+    def _gc_locked(self, now: float) -> int:
+        stale = [key for key, (_, expires_at) in self._entries.items() if expires_at <= now]
+        for key in stale:
+            del self._entries[key]
+        return len(stale)
+
+    def gc(self, now: Optional[float] = None) -> int:
+        with self._lock:
+            return self._gc_locked(time.time() if now is None else now)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def key_count(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class SQLiteRateLimitBackend(RateLimitBackend):
+    """Общее для всех процессов состояние лимитов в отдельном файле SQLite."""
+
+    name = "sqlite"
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self._path = Path(path) if path else None
+        self._local = threading.local()
+        self._initialized: set[Path] = set()
+        self._init_lock = threading.Lock()
+
+    @property
+    def path(self) -> Path:
+        if self._path is not None:
+            return self._path
+        if RATE_LIMIT_DB:
+            return Path(RATE_LIMIT_DB)
+        from backend.core import database
+
+        return Path(database.DB_PATH).with_name("rate_limits.db")
+
+    def _connection(self) -> sqlite3.Connection:
+        path = self.path
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and getattr(self._local, "path", None) == path:
+            return conn
+        if conn is not None:
+            conn.close()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(path), timeout=5.0, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA busy_timeout = 5000")
+        with self._init_lock:
+            if path not in self._initialized:
+                conn.execute("PRAGMA journal_mode = WAL")
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS rate_limits (
+                        key TEXT PRIMARY KEY,
+                        a REAL NOT NULL,
+                        b REAL NOT NULL,
+                        c REAL NOT NULL,
+                        expires_at REAL NOT NULL
+                    )
+                    """
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_rate_limits_expires ON rate_limits (expires_at)")
+                self._initialized.add(path)
+        conn.execute("PRAGMA synchronous = NORMAL")
+        self._local.conn = conn
+        self._local.path = path
+        return conn
+
+    def hit(self, key: str, algorithm: str, limit: int, window: float, now: float) -> bool:
+        fn = ALGORITHMS[algorithm]
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT a, b, c, expires_at FROM rate_limits WHERE key = ?", (key,)).fetchone()
+            state = (row[0], row[1], row[2]) if row is not None and row[3] > now else None
+            limited, new_state, expires_at = fn(state, limit, window, now)
+            conn.execute(
+                """
+                INSERT INTO rate_limits (key, a, b, c, expires_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET a = excluded.a, b = excluded.b, c = excluded.c, expires_at = excluded.expires_at
+                """,
+                (key, *new_state, expires_at),
+            )
+            conn.execute("COMMIT")
+            return limited
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def gc(self, now: Optional[float] = None) -> int:
+        conn = self._connection()
+        cur = conn.execute("DELETE FROM rate_limits WHERE expires_at <= ?", (time.time() if now is None else now,))
+        return cur.rowcount
+
+    def clear(self) -> None:
+        self._connection().execute("DELETE FROM rate_limits")
+
+    def key_count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM rate_limits").fetchone()[0]
+
+
+def create_backend(name: str = RATE_LIMIT_BACKEND) -> RateLimitBackend:
+    """Хранилище по имени из NMS_RATE_LIMIT_BACKEND (по умолчанию sqlite при NMS_SHARED_STATE=sqlite)."""
+    if not name:
+        from backend.core.shared_state import is_shared
+
+        name = "sqlite" if is_shared() else "memory"
+    if name == "sqlite":
+        return SQLiteRateLimitBackend()
+    if name != "memory":
+        _log.warning("Unknown rate limit backend %r, using in-memory backend", name)
+    return MemoryRateLimitBackend()
 
 
 class RateLimiter:
-    def __init__(self):
-        self._requests: dict[str, list[float]] = defaultdict(list)
-        self._lock = Lock()
+    def __init__(self, backend: Optional[RateLimitBackend] = None):
+        self.backend = backend or MemoryRateLimitBackend()
+        # Резерв на время недоступности общего хранилища
+        self._fallback = MemoryRateLimitBackend()
+        self._lock = threading.Lock()
+        self.checks = 0
+        self.limited = 0
+        self.gc_removed = 0
+        self.fallbacks = 0
 
-    def is_rate_limited(self, key: str, max_requests: int, window_seconds: int = 60) -> bool:
+    def is_rate_limited(
+        self,
+        key: str,
+        max_requests: int,
+        window_seconds: int = 60,
+        algorithm: str = "sliding_window",
+    ) -> bool:
         """Проверить превышение лимита запросов.
 
         :param key: уникальный ключ (например ip + ":" + username + ":" + route)
         :param max_requests: максимальное число допустимых запросов за окно
         :param window_seconds: длительность окна в секундах
+        :param algorithm: sliding_window или token_bucket
         :return: True если лимит превышен (блокировать), False если запрос разрешён
         """
         now = time.time()
-        cutoff = now - window_seconds
-
+        fallback = False
+        try:
+            limited = self.backend.hit(key, algorithm, max_requests, float(window_seconds), now)
+        except sqlite3.Error as exc:
+            # Общее хранилище недоступно: лимитируем в памяти процесса, а не пропускаем всех
+            _log.warning("Rate limit backend %s failed, using in-memory fallback: %s", self.backend.name, exc)
+            limited = self._fallback.hit(key, algorithm, max_requests, float(window_seconds), now)
+            fallback = True
         with self._lock:
-            timestamps = self._requests[key]
-            # Очистка устаревших отметок
-            self._requests[key] = [t for t in timestamps if t > cutoff]
-            timestamps = self._requests[key]
+            self.checks += 1
+            if limited:
+                self.limited += 1
+            if fallback:
+                self.fallbacks += 1
+        return limited
 
-            if len(timestamps) >= max_requests:
-                return True
+    async def is_rate_limited_async(
+        self,
+        key: str,
+        max_requests: int,
+        window_seconds: int = 60,
+        algorithm: str = "sliding_window",
+    ) -> bool:
+        """is_rate_limited() для event loop: проверка по SQLite выполняется в пуле потоков."""
+        if isinstance(self.backend, MemoryRateLimitBackend):
+            return self.is_rate_limited(key, max_requests, window_seconds, algorithm)
+        return await asyncio.to_thread(self.is_rate_limited, key, max_requests, window_seconds, algorithm)
 
-            timestamps.append(now)
-            return False
+    def gc(self) -> int:
+        """Фоновая задача: удалить состояние неактивных ключей."""
+        removed = self._fallback.gc() + self.backend.gc()
+        with self._lock:
+            self.gc_removed += removed
+        return removed
 
     def clear(self):
         """Очистить сохранённое состояние."""
+        self._fallback.clear()
+        self.backend.clear()
+
+    def get_stats(self) -> dict[str, Any]:
         with self._lock:
-            self._requests.clear()
+            stats = {
+                "backend": self.backend.name,
+                "checks": self.checks,
+                "limited": self.limited,
+                "gc_removed": self.gc_removed,
+                "fallbacks": self.fallbacks,
+            }
+        try:
+            stats["keys"] = self.backend.key_count()
+        except sqlite3.Error:
+            stats["keys"] = None
+        return stats
+
+
+rate_limiter = RateLimiter(create_backend())
+
+
+def request_ip(request: Any) -> str:
+    """IP-адрес клиента запроса ('local' без клиента)."""
+    return request.client.host if request is not None and request.client else "local"
+
+
+def rate_limit(
+    scope: str,
+    max_requests: int,
+    window_seconds: int = 60,
+    *,
+    key: Optional[Callable[[Any, dict[str, Any]], str]] = None,
+    algorithm: str = "sliding_window",
+    message: str = "Too many requests. Please wait.",
+):
+    """Декоратор маршрута FastAPI: 429 RATE_LIMIT_EXCEEDED при превышении лимита.
+
+    Ключ — ``scope:<key(request, kwargs)>`` (по умолчанию ``scope:<ip клиента>``);
+    маршрут должен принимать параметр ``request: Request``.
+    """
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Unknown rate limit algorithm: {algorithm}")
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            from backend.core.exceptions import NMSError
+            from backend.core.i18n import tr
+
+            request = kwargs.get("request")
+            suffix = key(request, kwargs) if key else request_ip(request)
+            if await rate_limiter.is_rate_limited_async(f"{scope}:{suffix}", max_requests, window_seconds, algorithm):
+                raise NMSError(
+                    message=tr(request, "rate_limit_exceeded", default=message),
+                    status_code=429,
+                    code="RATE_LIMIT_EXCEEDED",
+                )
+            return await func(*args, **kwargs)
 
+        return wrapper
 
-rate_limiter = RateLimiter()
+    return decorator
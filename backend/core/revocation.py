@@ -0,0 +1,191 @@
+"""Реестр отозванных сессий (jti) в памяти процесса.
+
+Проверка is_session_revoked() для HTTP и WebSocket выполняется по множеству в памяти
+без обращения к БД. Реестр загружается из active_sessions при первом обращении
+(и при смене файла БД), пополняется местами отзыва сессий через revoke_sessions()
+и периодически досинхронизируется с БД (отзывы из других процессов и прямые
+правки таблицы). Записи хранятся REVOCATION_RETENTION секунд — дольше не живёт ни один токен.
+О новых отзывах публикуется core.auth.sessions_revoked: по нему закрываются
+открытые WebSocket-соединения отозванных сессий (при NMS_SHARED_STATE=sqlite —
+и в остальных воркерах, см. backend.core.shared_state).
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any, Optional
+
+_log = logging.getLogger("nms.core.revocation")
+
+REVOCATION_RETENTION = float(os.environ.get("NMS_REVOCATION_RETENTION", str(7 * 86400)))
+REVOCATION_SYNC_INTERVAL = float(os.environ.get("NMS_REVOCATION_SYNC_INTERVAL", "30"))
+
+SESSIONS_REVOKED_TOPIC = "core.auth.sessions_revoked"
+
+
+class RevocationRegistry:
+    """Множество отозванных jti со сроком хранения, синхронизируемое с active_sessions."""
+
+    def __init__(self, retention: float = REVOCATION_RETENTION) -> None:
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._revoked: dict[str, float] = {}
+        self._db_path: Optional[Path] = None
+        self._loaded = False
+        self.loads = 0
+        self.last_sync_at: Optional[float] = None
+
+    def _check_db_locked(self) -> None:
+        from backend.core import database
+
+        db_path = Path(database.DB_PATH)
+        if db_path != self._db_path:
+            self._revoked.clear()
+            self._loaded = False
+            self._db_path = db_path
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        """Отозвана ли сессия (без запроса к БД, кроме первой загрузки реестра)."""
+        if not jti:
+            return False
+        with self._lock:
+            self._check_db_locked()
+            loaded = self._loaded
+        if not loaded:
+            self.sync()
+        with self._lock:
+            expires_at = self._revoked.get(jti)
+            if expires_at is None:
+                return False
+            if expires_at < time.time():
+                del self._revoked[jti]
+                return False
+            return True
+
+    def add(self, jtis: Iterable[str]) -> list[str]:
+        """Добавить jti в реестр; возвращает те, что ранее не числились отозванными."""
+        expires_at = time.time() + self.retention
+        added = []
+        with self._lock:
+            self._check_db_locked()
+            for jti in jtis:
+                if jti and jti not in self._revoked:
+                    added.append(jti)
+                if jti:
+                    self._revoked[jti] = expires_at
+        return added
+
+    def sync(self) -> list[str]:
+        """Досинхронизировать реестр с БД; возвращает jti, отозванные в обход revoke_sessions()."""
+        from backend.core.database import get_db_read_connection
+
+        try:
+            conn = get_db_read_connection()
+            try:
+                rows = conn.execute(
+                    """
+                    SELECT token_jti, CAST(strftime('%s', created_at) AS INTEGER) AS created_ts
+                    FROM active_sessions
+                    WHERE is_revoked = 1 AND token_jti IS NOT NULL AND created_at >= datetime('now', ?)
+                    """,
+                    (f"-{int(self.retention)} seconds",),
+                ).fetchall()
+            finally:
+                conn.close()
+        except Exception as exc:
+            _log.warning("Failed to load revoked sessions: %s", exc)
+            return []
+
+        now = time.time()
+        discovered = []
+        with self._lock:
+            self._check_db_locked()
+            first_load = not self._loaded
+            for row in rows:
+                jti = row["token_jti"]
+                if jti not in self._revoked:
+                    if not first_load:
+                        discovered.append(jti)
+                    self._revoked[jti] = (row["created_ts"] or now) + self.retention
+            for jti in [j for j, exp in self._revoked.items() if exp < now]:
+                del self._revoked[jti]
+            self._loaded = True
+            self.loads += 1
+            self.last_sync_at = now
+        return discovered
+
+    def on_event(self, payload: Any) -> None:
+        """Обработчик core.auth.sessions_revoked (в т.ч. пересланного из другого воркера)."""
+        self.add((payload or {}).get("jtis") or ())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._revoked.clear()
+            self._loaded = False
+
+    def get_stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "revoked": len(self._revoked),
+                "loaded": self._loaded,
+                "loads": self.loads,
+                "last_sync_at": self.last_sync_at,
+            }
+
+
+revocation_registry = RevocationRegistry()
+
+
+def live_session_jtis(conn: Any, user_ids: Iterable[str], exclude_jti: Optional[str] = None) -> list[str]:
+    """jti неотозванных сессий пользователей (вызывать до UPDATE ... is_revoked = 1)."""
+    ids = [str(u) for u in user_ids]
+    if not ids:
+        return []
+    placeholders = ",".join("?" for _ in ids)
+    rows = conn.execute(
+        f"SELECT token_jti FROM active_sessions WHERE user_id IN ({placeholders}) AND is_revoked = 0",
+        ids,
+    ).fetchall()
+    return [row[0] for row in rows if row[0] and row[0] != exclude_jti]
+
+
+def setup_revocation_listeners() -> None:
+    """Подписать закрытие WebSocket на core.auth.sessions_revoked (идемпотентно)."""
+    from backend.core.bus import event_bus
+    from backend.core.events import ws_manager
+
+    event_bus.subscribe(SESSIONS_REVOKED_TOPIC, revocation_registry.on_event)
+    event_bus.subscribe(SESSIONS_REVOKED_TOPIC, ws_manager.on_sessions_revoked)
+
+
+def revoke_sessions(jtis: Iterable[str]) -> None:
+    """Отметить сессии отозванными в реестре (после коммита в БД), сбросить их кэш и закрыть их WebSocket."""
+    from backend.core.bus import event_bus
+    from backend.core.principal_cache import invalidate_principals
+    from backend.core.shared_state import broadcast_signal
+
+    jti_list = [str(j) for j in jtis if j]
+    if not jti_list:
+        return
+    revocation_registry.add(jti_list)
+    invalidate_principals(jtis=jti_list)
+    setup_revocation_listeners()
+    event_bus.publish(SESSIONS_REVOKED_TOPIC, {"jtis": jti_list}, is_core=True)
+    broadcast_signal(SESSIONS_REVOKED_TOPIC, {"jtis": jti_list})
+
+
+def sync_revocations() -> int:
+    """Фоновая задача: подтянуть отзывы из БД и закрыть соединения найденных сессий."""
+    from backend.core.bus import event_bus
+    from backend.core.principal_cache import invalidate_principals
+
+    discovered = revocation_registry.sync()
+    if discovered:
+        invalidate_principals(jtis=discovered)
+        setup_revocation_listeners()
+        event_bus.publish(SESSIONS_REVOKED_TOPIC, {"jtis": discovered}, is_core=True)
+    return len(discovered)
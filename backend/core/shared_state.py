@@ -0,0 +1,307 @@
+"""Общее состояние процессов для запуска с несколькими воркерами (uvicorn --workers N).
+
+NMS_SHARED_STATE=local (по умолчанию) — всё состояние в памяти процесса.
+NMS_SHARED_STATE=sqlite — общий файл NMS_SHARED_STATE_DB (по умолчанию shared_state.db
+рядом с nms.db), который используют все воркеры одного хоста:
+  * одноразовые билеты WebSocket и MFA (таблица shared_tickets, значения зашифрованы);
+  * лимиты частоты запросов (SQLite-хранилище backend.core.rate_limiter);
+  * журнал сигналов shared_signals: инвалидации кэша пользователей и индекса прав,
+    отзывы сессий. Каждый воркер раз в NMS_SHARED_STATE_POLL_INTERVAL секунд
+    дочитывает чужие сигналы и публикует их в свою шину событий.
+
+Обращения к файлу синхронные (busy_timeout до 5 с): из event loop билеты
+запрашиваются через *_async-методы хранилищ билетов, а сигналы записываются
+в отдельном потоке (broadcast_signal).
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Optional
+
+_log = logging.getLogger("nms.core.shared_state")
+
+SHARED_STATE_MODE = os.environ.get("NMS_SHARED_STATE", "local").strip().lower()
+SHARED_STATE_DB = os.environ.get("NMS_SHARED_STATE_DB", "")
+SHARED_STATE_POLL_INTERVAL = float(os.environ.get("NMS_SHARED_STATE_POLL_INTERVAL", "1"))
+SHARED_STATE_GC_INTERVAL = 60.0
+SIGNAL_RETENTION = 300.0
+
+# Топики, которые пересылаются между воркерами
+SHARED_SIGNAL_TOPICS = frozenset({
+    "core.auth.principals_invalidated",
+    "core.auth.sessions_revoked",
+})
+
+
+class SQLiteSharedState:
+    """Общие билеты и журнал сигналов в файле SQLite."""
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self._path = Path(path) if path else None
+        self._local = threading.local()
+        self._initialized: set[Path] = set()
+        self._init_lock = threading.Lock()
+        self.origin = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+    @property
+    def path(self) -> Path:
+        if self._path is not None:
+            return self._path
+        if SHARED_STATE_DB:
+            return Path(SHARED_STATE_DB)
+        from backend.core import database
+
+        return Path(database.DB_PATH).with_name("shared_state.db")
+
+    def _connection(self) -> sqlite3.Connection:
+        path = self.path
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and getattr(self._local, "path", None) == path:
+            return conn
+        if conn is not None:
+            conn.close()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(path), timeout=5.0, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA busy_timeout = 5000")
+        with self._init_lock:
+            if path not in self._initialized:
+                conn.execute("PRAGMA journal_mode = WAL")
+                conn.executescript(
+                    """
+                    CREATE TABLE IF NOT EXISTS shared_tickets (
+                        namespace TEXT NOT NULL,
+                        key BLOB NOT NULL,
+                        value TEXT NOT NULL,
+                        expires_at REAL NOT NULL,
+                        PRIMARY KEY (namespace, key)
+                    );
+                    CREATE INDEX IF NOT EXISTS idx_shared_tickets_expires ON shared_tickets (expires_at);
+                    CREATE TABLE IF NOT EXISTS shared_signals (
+                        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                        topic TEXT NOT NULL,
+                        payload TEXT NOT NULL,
+                        origin TEXT NOT NULL,
+                        created_at REAL NOT NULL
+                    );
+                    """
+                )
+                self._initialized.add(path)
+        conn.execute("PRAGMA synchronous = NORMAL")
+        self._local.conn = conn
+        self._local.path = path
+        return conn
+
+    # ── Билеты ──────────────────────────────────────────
+
+    def ticket_put(self, namespace: str, key: bytes, value: str, expires_at: float) -> None:
+        self._connection().execute(
+            "INSERT OR REPLACE INTO shared_tickets (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, value, expires_at),
+        )
+
+    def ticket_get(self, namespace: str, key: bytes) -> Optional[str]:
+        row = self._connection().execute(
+            "SELECT value FROM shared_tickets WHERE namespace = ? AND key = ? AND expires_at > ?",
+            (namespace, key, time.time()),
+        ).fetchone()
+        return row[0] if row else None
+
+    def ticket_take(self, namespace: str, key: bytes) -> Optional[str]:
+        """Атомарно извлечь действующий билет (между всеми процессами)."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT value, expires_at FROM shared_tickets WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+            if row is not None:
+                conn.execute("DELETE FROM shared_tickets WHERE namespace = ? AND key = ?", (namespace, key))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if row is None or row[1] <= time.time():
+            return None
+        return row[0]
+
+    def ticket_count(self, namespace: str) -> int:
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM shared_tickets WHERE namespace = ? AND expires_at > ?",
+            (namespace, time.time()),
+        ).fetchone()[0]
+
+    def ticket_trim(self, namespace: str, max_size: int) -> int:
+        """Удалить билеты сверх max_size (с ближайшим сроком истечения)."""
+        cur = self._connection().execute(
+            """
+            DELETE FROM shared_tickets WHERE namespace = ? AND key IN (
+                SELECT key FROM shared_tickets WHERE namespace = ?
+                ORDER BY expires_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (namespace, namespace, max_size),
+        )
+        return cur.rowcount
+
+    def ticket_clear(self, namespace: str) -> None:
+        self._connection().execute("DELETE FROM shared_tickets WHERE namespace = ?", (namespace,))
+
+    # ── Сигналы ─────────────────────────────────────────
+
+    def publish_signal(self, topic: str, payload: Any) -> int:
+        cur = self._connection().execute(
+            "INSERT INTO shared_signals (topic, payload, origin, created_at) VALUES (?, ?, ?, ?)",
+            (topic, json.dumps(payload), self.origin, time.time()),
+        )
+        return cur.lastrowid
+
+    def last_signal_seq(self) -> int:
+        return self._connection().execute("SELECT COALESCE(MAX(seq), 0) FROM shared_signals").fetchone()[0]
+
+    def fetch_signals(self, after_seq: int, limit: int = 1000) -> tuple[int, list[tuple[str, Any]]]:
+        """Сигналы других процессов после after_seq; возвращает (новый курсор, [(topic, payload)])."""
+        rows = self._connection().execute(
+            "SELECT seq, topic, payload, origin FROM shared_signals WHERE seq > ? ORDER BY seq LIMIT ?",
+            (after_seq, limit),
+        ).fetchall()
+        if not rows:
+            return after_seq, []
+        signals = [(topic, json.loads(payload)) for _, topic, payload, origin in rows if origin != self.origin]
+        return rows[-1][0], signals
+
+    def gc(self) -> int:
+        """Удалить истёкшие билеты и старые сигналы."""
+        now = time.time()
+        conn = self._connection()
+        removed = conn.execute("DELETE FROM shared_tickets WHERE expires_at <= ?", (now,)).rowcount
+        removed += conn.execute("DELETE FROM shared_signals WHERE created_at < ?", (now - SIGNAL_RETENTION,)).rowcount
+        return removed
+
+
+shared_state: Optional[SQLiteSharedState] = SQLiteSharedState() if SHARED_STATE_MODE == "sqlite" else None
+if SHARED_STATE_MODE not in ("local", "sqlite"):
+    _log.warning("Unknown NMS_SHARED_STATE %r, using local in-process state", SHARED_STATE_MODE)
+
+
+def is_shared() -> bool:
+    """Включено ли общее состояние между процессами."""
+    return shared_state is not None
+
+
+_signal_executor: Optional[ThreadPoolExecutor] = None
+_signal_executor_lock = threading.Lock()
+
+
+def _publish_signal(state: SQLiteSharedState, topic: str, payload: Any) -> None:
+    try:
+        state.publish_signal(topic, payload)
+    except sqlite3.Error as exc:
+        _log.warning("Failed to publish shared signal %s: %s", topic, exc)
+
+
+def _get_signal_executor() -> ThreadPoolExecutor:
+    global _signal_executor
+    with _signal_executor_lock:
+        if _signal_executor is None:
+            # Один поток: сигналы попадают в журнал в порядке публикации
+            _signal_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="nms-shared-signal")
+        return _signal_executor
+
+
+def broadcast_signal(topic: str, payload: Any) -> None:
+    """Передать событие остальным воркерам (в режиме local — ничего не делает).
+
+    Вызванный из event loop, не ждёт записи в общий файл: она выполняется в отдельном потоке.
+    """
+    state = shared_state
+    if state is None or topic not in SHARED_SIGNAL_TOPICS:
+        return
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        _publish_signal(state, topic, payload)
+        return
+    _get_signal_executor().submit(_publish_signal, state, topic, payload)
+
+
+class SignalRelay:
+    """Пересылка сигналов других воркеров в локальную шину событий."""
+
+    def __init__(self, state: SQLiteSharedState) -> None:
+        self.state = state
+        self.cursor: Optional[int] = None
+        self.relayed = 0
+        self.last_poll_at: Optional[float] = None
+
+    def prime(self) -> None:
+        """Начать с конца журнала: история до запуска воркера не воспроизводится."""
+        self.cursor = self.state.last_signal_seq()
+
+    def fetch(self) -> list[tuple[str, Any]]:
+        if self.cursor is None:
+            self.prime()
+            return []
+        self.cursor, signals = self.state.fetch_signals(self.cursor)
+        self.last_poll_at = time.time()
+        return signals
+
+    def deliver(self, signals: list[tuple[str, Any]]) -> int:
+        from backend.core.bus import event_bus
+        from backend.core.permission_index import permission_index
+        from backend.core.principal_cache import principal_cache
+        from backend.core.revocation import setup_revocation_listeners
+
+        if not signals:
+            return 0
+        principal_cache.setup()
+        permission_index.setup()
+        setup_revocation_listeners()
+        for topic, payload in signals:
+            event_bus.publish(topic, payload, is_core=True)
+        self.relayed += len(signals)
+        return len(signals)
+
+    async def poll(self) -> int:
+        """Фоновая задача shared_state_poll."""
+        try:
+            signals = await asyncio.to_thread(self.fetch)
+        except sqlite3.Error as exc:
+            _log.warning("Failed to read shared signals: %s", exc)
+            return 0
+        return self.deliver(signals)
+
+    def get_stats(self) -> dict[str, Any]:
+        return {"cursor": self.cursor, "relayed": self.relayed, "last_poll_at": self.last_poll_at}
+
+
+signal_relay: Optional[SignalRelay] = SignalRelay(shared_state) if shared_state is not None else None
+
+
+def gc_shared_state() -> int:
+    """Фоновая задача shared_state_gc."""
+    if shared_state is None:
+        return 0
+    try:
+        return shared_state.gc()
+    except sqlite3.Error as exc:
+        _log.warning("Shared state GC failed: %s", exc)
+        return 0
+
+
+def get_shared_state_stats() -> dict[str, Any]:
+    stats: dict[str, Any] = {"mode": "sqlite" if shared_state is not None else "local"}
+    if shared_state is not None:
+        stats["origin"] = shared_state.origin
+    if signal_relay is not None:
+        stats["signals"] = signal_relay.get_stats()
+    return stats
@@ -0,0 +1,278 @@
+"""Профилировщик SQL-запросов и журнал медленных запросов.
+
+Соединения пула и потока-писателя создаются с фабрикой ProfiledConnection, которая
+замеряет время execute()/executemany()/executescript(), нормализует текст запроса
+(литералы заменяются на ?, списки (?, ?, …) сворачиваются) и копит по каждому нормализованному запросу
+гистограмму задержек. Для SELECT время включает вычисление первой строки, поэтому
+сортировки и агрегаты учитываются полностью, а дочитывание длинных выборок — нет.
+Худшие запросы с EXPLAIN QUERY PLAN отдаются эндпоинтом /api/system/sql-profile.
+Значения параметров не сохраняются (в них бывают хеши паролей и секреты MFA): у образца
+запроса запоминается только форма параметров, а EXPLAIN выполняется с NULL вместо значений.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from collections.abc import Mapping
+from typing import Any
+
+from backend.core.latency import LatencyHistogram
+
+_log = logging.getLogger("nms.core.sql_profiler")
+
+SQL_PROFILER_ENABLED = os.environ.get("NMS_SQL_PROFILER", "1").lower() not in ("0", "false", "no", "off")
+SQL_SLOW_MS = float(os.environ.get("NMS_SQL_SLOW_MS", "100"))
+SQL_PROFILER_MAX_STATEMENTS = int(os.environ.get("NMS_SQL_PROFILER_MAX_STATEMENTS", "1000"))
+SLOW_LOG_SIZE = 200
+_NORMALIZE_CACHE_SIZE = 4096
+
+_OVERFLOW_KEY = "<other statements>"
+
+_RE_COMMENT = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_RE_STRING = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])")
+_RE_NAMED = re.compile(r"[:@$][A-Za-z_]\w*|\?\d*")
+_RE_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_RE_SPACE = re.compile(r"\s+")
+_RE_SAVEPOINT = re.compile(r"^(SAVEPOINT|RELEASE|ROLLBACK TO) \w+?\d+$", re.I)
+
+
+def normalize_sql(sql: str) -> str:
+    """Привести запрос к шаблону: без комментариев и литералов, списки IN (?, ?) → IN (?...)."""
+    text = _RE_COMMENT.sub(" ", sql)
+    text = _RE_STRING.sub("?", text)
+    text = _RE_NUMBER.sub("?", text)
+    text = _RE_NAMED.sub("?", text)
+    text = _RE_IN_LIST.sub("(?...)", text)
+    text = _RE_SPACE.sub(" ", text).strip().rstrip(";").strip()
+    m = _RE_SAVEPOINT.match(text)
+    if m:
+        text = f"{m.group(1).upper()} ?"
+    return text
+
+
+def _param_shape(params: Any) -> int | tuple[str, ...] | None:
+    """Форма параметров без значений: число позиционных или имена именованных."""
+    if params is None:
+        return None
+    if isinstance(params, Mapping):
+        return tuple(params)
+    try:
+        return len(params)
+    except TypeError:
+        return None
+
+
+def _null_params(shape: int | tuple[str, ...] | None) -> Any:
+    """Параметры из NULL той же формы (для EXPLAIN QUERY PLAN)."""
+    if shape is None:
+        return ()
+    if isinstance(shape, int):
+        return (None,) * shape
+    return dict.fromkeys(shape)
+
+
+class _StatementStats:
+    __slots__ = ("sql", "errors", "latency", "sample_sql", "sample_shape", "last_seen")
+
+    def __init__(self, sql: str) -> None:
+        self.sql = sql
+        self.errors = 0
+        self.latency = LatencyHistogram()
+        self.sample_sql: str | None = None
+        self.sample_shape: int | tuple[str, ...] | None = None
+        self.last_seen = 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        latency = self.latency.as_dict()
+        return {
+            "sql": self.sql,
+            "count": latency.pop("count"),
+            "errors": self.errors,
+            "total_ms": round(self.latency.total_ms, 3),
+            **latency,
+            "last_seen": self.last_seen,
+        }
+
+
+class SQLProfiler:
+    """Сбор статистики по нормализованным SQL-запросам с гистограммами задержек и журналом медленных запросов."""
+
+    SORT_KEYS = ("total", "max", "avg", "p95", "count")
+
+    def __init__(
+        self,
+        *,
+        enabled: bool = SQL_PROFILER_ENABLED,
+        slow_ms: float = SQL_SLOW_MS,
+        max_statements: int = SQL_PROFILER_MAX_STATEMENTS,
+    ) -> None:
+        self.enabled = enabled
+        self.slow_ms = slow_ms
+        self.max_statements = max_statements
+        self._lock = threading.Lock()
+        self._stats: dict[str, _StatementStats] = {}
+        self._normalized: dict[str, str] = {}
+        self._slow: deque[dict[str, Any]] = deque(maxlen=SLOW_LOG_SIZE)
+        self._local = threading.local()
+        self._started_at = time.time()
+
+    # ── Запись измерений ───────────────────────────────────────────
+    def _normalize(self, sql: str) -> str:
+        key = self._normalized.get(sql)
+        if key is None:
+            key = normalize_sql(sql)
+            if len(self._normalized) >= _NORMALIZE_CACHE_SIZE:
+                self._normalized.clear()
+            self._normalized[sql] = key
+        return key
+
+    def record(self, sql: str, elapsed_ms: float, params: Any = None, *, failed: bool = False) -> None:
+        """Учесть выполнение запроса (вызывается ProfiledConnection/ProfiledCursor)."""
+        if getattr(self._local, "suspended", False):
+            return
+        key = self._normalize(sql)
+        with self._lock:
+            st = self._stats.get(key)
+            if st is None:
+                if len(self._stats) >= self.max_statements:
+                    key = _OVERFLOW_KEY
+                    st = self._stats.get(key)
+                if st is None:
+                    st = self._stats[key] = _StatementStats(key)
+            if elapsed_ms >= st.latency.max_ms or st.sample_sql is None:
+                st.sample_sql = sql
+                st.sample_shape = _param_shape(params)
+            st.latency.record(elapsed_ms)
+            st.last_seen = time.time()
+            if failed:
+                st.errors += 1
+            is_slow = elapsed_ms >= self.slow_ms
+            if is_slow:
+                self._slow.append({"sql": key, "duration_ms": round(elapsed_ms, 3), "at": st.last_seen, "thread": threading.current_thread().name})
+        if is_slow:
+            _log.warning("Slow SQL (%.1f ms): %s", elapsed_ms, key)
+
+    def suspend(self) -> "_Suspended":
+        """Контекст, в котором запросы текущего потока не учитываются (служебные EXPLAIN)."""
+        return _Suspended(self._local)
+
+    def reset(self) -> None:
+        """Сбросить накопленную статистику."""
+        with self._lock:
+            self._stats.clear()
+            self._slow.clear()
+            self._started_at = time.time()
+
+    # ── Отчёты ─────────────────────────────────────────────────────
+    def get_top(self, limit: int = 20, sort: str = "total") -> list[dict[str, Any]]:
+        """Худшие запросы по выбранному критерию (total, max, avg, p95, count)."""
+        if sort not in self.SORT_KEYS:
+            raise ValueError(f"Unknown sort key '{sort}'")
+        with self._lock:
+            rows = [st.as_dict() for st in self._stats.values()]
+        rows.sort(key=lambda r: r[f"{sort}_ms"] if sort != "count" else r["count"], reverse=True)
+        return rows[:limit]
+
+    def get_slow_log(self, limit: int = 50) -> list[dict[str, Any]]:
+        """Последние медленные запросы (новые первыми)."""
+        with self._lock:
+            return list(self._slow)[-limit:][::-1]
+
+    def get_stats(self) -> dict[str, Any]:
+        """Сводка профилировщика."""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "slow_ms": self.slow_ms,
+                "statements": len(self._stats),
+                "executions": sum(st.latency.count for st in self._stats.values()),
+                "slow_queries": len(self._slow),
+                "since": self._started_at,
+            }
+
+    def explain(self, normalized_sql: str, conn: sqlite3.Connection) -> list[str] | None:
+        """EXPLAIN QUERY PLAN для образца запроса (параметры подставляются как NULL)."""
+        with self._lock:
+            st = self._stats.get(normalized_sql)
+            sample_sql, sample_shape = (st.sample_sql, st.sample_shape) if st else (None, None)
+        if not sample_sql or not sample_sql.lstrip().upper().startswith(("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")):
+            return None
+        try:
+            with self.suspend():
+                rows = conn.execute(f"EXPLAIN QUERY PLAN {sample_sql}", _null_params(sample_shape)).fetchall()
+        except sqlite3.Error as exc:
+            return [f"error: {exc}"]
+        depth: dict[int, int] = {0: -1}
+        plan = []
+        for node_id, parent, _, detail in rows:
+            level = depth.get(parent, -1) + 1
+            depth[node_id] = level
+            plan.append(f"{'  ' * level}{detail}")
+        return plan
+
+
+class _Suspended:
+    __slots__ = ("_local", "_prev")
+
+    def __init__(self, local: threading.local) -> None:
+        self._local = local
+        self._prev = False
+
+    def __enter__(self) -> None:
+        self._prev = getattr(self._local, "suspended", False)
+        self._local.suspended = True
+
+    def __exit__(self, *exc: Any) -> None:
+        self._local.suspended = self._prev
+
+
+sql_profiler = SQLProfiler()
+
+
+def _timed(method: Any, sql: str, params: Any, *args: Any) -> Any:
+    if not sql_profiler.enabled:
+        return method(sql, *args)
+    started = time.perf_counter()
+    failed = False
+    try:
+        return method(sql, *args)
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        sql_profiler.record(sql, (time.perf_counter() - started) * 1000, params, failed=failed)
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Курсор, замеряющий время execute()/executemany()."""
+
+    def execute(self, sql: str, parameters: Any = (), /) -> ProfiledCursor:
+        return _timed(super().execute, sql, parameters, parameters)
+
+    def executemany(self, sql: str, seq_of_parameters: Any, /) -> ProfiledCursor:
+        return _timed(super().executemany, sql, None, seq_of_parameters)
+
+    def executescript(self, sql_script: str, /) -> ProfiledCursor:
+        return _timed(super().executescript, sql_script, None)
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """Соединение (фабрика для sqlite3.connect), передающее замеры в sql_profiler."""
+
+    def cursor(self, factory: Any = ProfiledCursor) -> sqlite3.Cursor:
+        return super().cursor(factory)
+
+    def execute(self, sql: str, parameters: Any = (), /) -> sqlite3.Cursor:
+        return _timed(super().execute, sql, parameters, parameters)
+
+    def executemany(self, sql: str, seq_of_parameters: Any, /) -> sqlite3.Cursor:
+        return _timed(super().executemany, sql, None, seq_of_parameters)
+
+    def executescript(self, sql_script: str, /) -> sqlite3.Cursor:
+        return _timed(super().executescript, sql_script, None)
@@ -0,0 +1,228 @@
+"""Хранилище одноразовых билетов с ограниченным сроком жизни (WebSocket, MFA).
+
+Билеты хранятся под SHA-256 от значения (сам билет в памяти не остаётся),
+истечение отслеживается min-кучей по времени истечения: устаревшие записи
+удаляются при каждом обращении за O(log n) на запись, без перебора всего словаря.
+Размер ограничен max_size — при переполнении вытесняются билеты с ближайшим
+сроком истечения. consume() атомарно извлекает билет: погасить его можно один раз.
+
+При NMS_SHARED_STATE=sqlite create_ticket_store() возвращает SharedTicketStore:
+билеты лежат в общей таблице и гасятся атомарно между всеми воркерами. Из event loop
+используйте issue_async()/get_async()/consume_async(): обращения к SQLite
+выполняются в пуле потоков.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import heapq
+import json
+import os
+import secrets
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Optional
+
+if TYPE_CHECKING:
+    from backend.core.shared_state import SQLiteSharedState
+
+TICKET_STORE_MAX_SIZE = int(os.environ.get("NMS_TICKET_STORE_MAX_SIZE", "10000"))
+
+
+class TicketStore:
+    """Словарь билет → данные с TTL, вытеснением и атомарным погашением."""
+
+    def __init__(self, name: str, ttl: float, max_size: int = TICKET_STORE_MAX_SIZE) -> None:
+        self.name = name
+        self.ttl = ttl
+        self.max_size = max(1, max_size)
+        self._lock = threading.Lock()
+        self._entries: dict[bytes, tuple[float, Any]] = {}
+        self._heap: list[tuple[float, bytes]] = []
+        self.issued = 0
+        self.consumed = 0
+        self.expired = 0
+        self.evicted = 0
+
+    @staticmethod
+    def _key(ticket: str) -> bytes:
+        return hashlib.sha256(ticket.encode("utf-8")).digest()
+
+    def _purge_locked(self, now: float) -> None:
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            expires_at, key = heapq.heappop(heap)
+            entry = self._entries.get(key)
+            # В куче могут остаться записи уже погашенных билетов
+            if entry is not None and entry[0] == expires_at:
+                del self._entries[key]
+                self.expired += 1
+        if len(heap) > 2 * len(self._entries) + 64:
+            self._heap = [(exp, key) for key, (exp, _) in self._entries.items()]
+            heapq.heapify(self._heap)
+
+    def _evict_locked(self) -> None:
+        while len(self._entries) >= self.max_size and self._heap:
+            expires_at, key = heapq.heappop(self._heap)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == expires_at:
+                del self._entries[key]
+                self.evicted += 1
+
+    def put(self, ticket: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Сохранить данные билета на ttl секунд (по умолчанию — ttl хранилища)."""
+        now = time.monotonic()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        key = self._key(ticket)
+        with self._lock:
+            self._purge_locked(now)
+            if key not in self._entries:
+                self._evict_locked()
+            self._entries[key] = (expires_at, value)
+            heapq.heappush(self._heap, (expires_at, key))
+            self.issued += 1
+
+    def issue(self, prefix: str, value: Any, ttl: Optional[float] = None) -> str:
+        """Сгенерировать новый билет с префиксом и сохранить для него данные."""
+        ticket = f"{prefix}{secrets.token_urlsafe(24)}"
+        self.put(ticket, value, ttl)
+        return ticket
+
+    def get(self, ticket: Optional[str]) -> Optional[Any]:
+        """Данные действующего билета без погашения."""
+        if not ticket:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            self._purge_locked(now)
+            entry = self._entries.get(self._key(ticket))
+            return entry[1] if entry is not None else None
+
+    def consume(self, ticket: Optional[str]) -> Optional[Any]:
+        """Атомарно погасить билет: данные возвращаются только первому вызывающему."""
+        if not ticket:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            self._purge_locked(now)
+            entry = self._entries.pop(self._key(ticket), None)
+            if entry is None:
+                return None
+            self.consumed += 1
+            return entry[1]
+
+    # Хранилище в памяти не блокирует: асинхронные варианты выполняются сразу
+    async def issue_async(self, prefix: str, value: Any, ttl: Optional[float] = None) -> str:
+        return self.issue(prefix, value, ttl)
+
+    async def get_async(self, ticket: Optional[str]) -> Optional[Any]:
+        return self.get(ticket)
+
+    async def consume_async(self, ticket: Optional[str]) -> Optional[Any]:
+        return self.consume(ticket)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._purge_locked(time.monotonic())
+            return len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._heap.clear()
+
+    def get_stats(self) -> dict[str, Any]:
+        with self._lock:
+            self._purge_locked(time.monotonic())
+            return {
+                "active": len(self._entries),
+                "max_size": self.max_size,
+                "issued": self.issued,
+                "consumed": self.consumed,
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
+
+
+class SharedTicketStore:
+    """Билеты в общем для процессов хранилище (значения шифруются, как секреты в БД)."""
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float,
+        state: "SQLiteSharedState",
+        max_size: int = TICKET_STORE_MAX_SIZE,
+    ) -> None:
+        self.name = name
+        self.ttl = ttl
+        self.max_size = max(1, max_size)
+        self.state = state
+        self._lock = threading.Lock()
+        self.issued = 0
+        self.consumed = 0
+
+    def _decode(self, raw: Optional[str]) -> Optional[Any]:
+        from backend.core.crypto import decrypt_secret
+
+        return json.loads(decrypt_secret(raw)) if raw is not None else None
+
+    def put(self, ticket: str, value: Any, ttl: Optional[float] = None) -> None:
+        from backend.core.crypto import encrypt_secret
+
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        self.state.ticket_put(self.name, TicketStore._key(ticket), encrypt_secret(json.dumps(value)), expires_at)
+        with self._lock:
+            self.issued += 1
+            trim = self.issued % 100 == 0
+        if trim:
+            self.state.ticket_trim(self.name, self.max_size)
+
+    def issue(self, prefix: str, value: Any, ttl: Optional[float] = None) -> str:
+        ticket = f"{prefix}{secrets.token_urlsafe(24)}"
+        self.put(ticket, value, ttl)
+        return ticket
+
+    def get(self, ticket: Optional[str]) -> Optional[Any]:
+        if not ticket:
+            return None
+        return self._decode(self.state.ticket_get(self.name, TicketStore._key(ticket)))
+
+    def consume(self, ticket: Optional[str]) -> Optional[Any]:
+        if not ticket:
+            return None
+        value = self._decode(self.state.ticket_take(self.name, TicketStore._key(ticket)))
+        if value is not None:
+            with self._lock:
+                self.consumed += 1
+        return value
+
+    async def issue_async(self, prefix: str, value: Any, ttl: Optional[float] = None) -> str:
+        return await asyncio.to_thread(self.issue, prefix, value, ttl)
+
+    async def get_async(self, ticket: Optional[str]) -> Optional[Any]:
+        return await asyncio.to_thread(self.get, ticket)
+
+    async def consume_async(self, ticket: Optional[str]) -> Optional[Any]:
+        return await asyncio.to_thread(self.consume, ticket)
+
+    def __len__(self) -> int:
+        return self.state.ticket_count(self.name)
+
+    def clear(self) -> None:
+        self.state.ticket_clear(self.name)
+
+    def get_stats(self) -> dict[str, Any]:
+        with self._lock:
+            stats = {"shared": True, "max_size": self.max_size, "issued": self.issued, "consumed": self.consumed}
+        stats["active"] = len(self)
+        return stats
+
+
+def create_ticket_store(name: str, ttl: float) -> "TicketStore | SharedTicketStore":
+    """Хранилище билетов: общее между воркерами при NMS_SHARED_STATE=sqlite, иначе в памяти."""
+    from backend.core.shared_state import shared_state
+
+    if shared_state is not None:
+        return SharedTicketStore(name, ttl, shared_state)
+    return TicketStore(name, ttl)
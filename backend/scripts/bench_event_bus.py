@@ -0,0 +1,69 @@
+"""Benchmark: EventBus publish latency with many wildcard subscriptions.
+
+Usage:
+    python3 -m backend.scripts.bench_event_bus [--subscriptions 10000] [--publishes 20000]
+
+Сравнивает публикацию через дерево масок (с LRU и без попаданий в кэш)
+с прежним линейным перебором всех масок через match_topic.
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+from backend.core.bus import MATCH_CACHE_SIZE, EventBus, match_topic
+
+
+def _noop(topic, payload):
+    pass
+
+
+def build_bus(subscriptions: int) -> tuple[EventBus, list[str]]:
+    """Шина с масками вида site{N}.+.status, site{N}.#, *.dev{N}.down."""
+    bus = EventBus()
+    patterns = []
+    shapes = ("site{}.+.status", "site{}.#", "*.dev{}.down", "site{}.dev{}.+")
+    for i in range(subscriptions):
+        pattern = shapes[i % len(shapes)].format(i, i)
+        patterns.append(pattern)
+        bus.subscribe(pattern, _noop)
+    return bus, patterns
+
+
+def _measure(fn, topics: list[str], publishes: int) -> float:
+    """Средняя задержка одного вызова в микросекундах."""
+    started = time.perf_counter()
+    for i in range(publishes):
+        fn(topics[i % len(topics)])
+    return (time.perf_counter() - started) / publishes * 1e6
+
+
+def run(subscriptions: int, publishes: int) -> dict[str, float]:
+    bus, patterns = build_bus(subscriptions)
+    hot_topics = [f"site{i}.dev{i}.status" for i in range(0, 64, 4)]
+    cold_topics = [f"site{i}.dev{i}.status" for i in range(MATCH_CACHE_SIZE * 4)]
+
+    def linear(topic):
+        return [p for p in patterns if match_topic(p, topic)]
+
+    return {
+        "linear_scan_us": _measure(linear, hot_topics, max(1, publishes // 100)),
+        "trie_uncached_us": _measure(lambda t: bus.publish(t), cold_topics, publishes),
+        "trie_cached_us": _measure(lambda t: bus.publish(t), hot_topics, publishes),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="EventBus publish latency benchmark")
+    parser.add_argument("--subscriptions", type=int, default=10000)
+    parser.add_argument("--publishes", type=int, default=20000)
+    args = parser.parse_args()
+
+    results = run(args.subscriptions, args.publishes)
+    print(f"Wildcard subscriptions: {args.subscriptions}")
+    for name, value in results.items():
+        print(f"  {name:<18} {value:10.2f} µs/publish")
+
+
+if __name__ == "__main__":
+    main()
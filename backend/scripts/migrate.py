@@ -0,0 +1,83 @@
+"""CLI: применение миграций схемы SQLite без запуска веб-сервера.
+
+Usage:
+    python3 -m backend.scripts.migrate --migrate-only
+    python3 -m backend.scripts.migrate --status
+    python3 -m backend.scripts.migrate --vacuum
+    OR
+    ./run_webui.sh migrate
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+
+from backend.core import database
+from backend.core.database import get_db_connection
+from backend.core.migrations import SCHEMA_VERSION, ensure_schema, get_pending_migrations, get_schema_version
+
+
+def print_status() -> int:
+    """Вывести текущую версию схемы и список неприменённых миграций (код 1, если они есть)."""
+    conn = get_db_connection()
+    try:
+        current = get_schema_version(conn)
+        pending = get_pending_migrations(conn)
+    finally:
+        conn.close()
+
+    print(f"Database: {database.DB_PATH}")
+    print(f"Schema version: {current} (target {SCHEMA_VERSION})")
+    for m in pending:
+        print(f"  pending: {m.version:03d}_{m.name}")
+    return 1 if pending else 0
+
+
+def migrate_only() -> int:
+    """Применить все недостающие миграции и завершиться."""
+    conn = get_db_connection()
+    try:
+        applied = ensure_schema(conn)
+        current = get_schema_version(conn)
+    except Exception as exc:
+        print(f"FAILED to migrate database: {exc}", file=sys.stderr)
+        return 2
+    finally:
+        conn.close()
+
+    if applied:
+        print(f"Applied migrations: {', '.join(f'{v:03d}' for v in applied)}")
+    print(f"Schema version: {current} (target {SCHEMA_VERSION})")
+    return 0
+
+
+def vacuum() -> int:
+    """Перевести БД в auto_vacuum=INCREMENTAL полным VACUUM (однократно, при остановленном сервере)."""
+    from backend.core.maintenance import db_maintenance
+
+    try:
+        status = db_maintenance.convert_to_incremental()
+    except Exception as exc:
+        print(f"FAILED to vacuum database: {exc}", file=sys.stderr)
+        return 2
+    print(f"auto_vacuum: {status['auto_vacuum']}, pages: {status['page_count']}, free: {status['freelist_pages']}")
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="backend.scripts.migrate", description="NMS database schema migrations")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--migrate-only", action="store_true", help="apply pending migrations and exit (default)")
+    group.add_argument("--status", action="store_true", help="show schema version and pending migrations")
+    group.add_argument("--vacuum", action="store_true", help="rebuild the database with incremental auto-vacuum")
+    args = parser.parse_args(argv)
+
+    if args.status:
+        return print_status()
+    if args.vacuum:
+        return vacuum()
+    return migrate_only()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -112,6 +112,7 @@ print_usage() {
     echo "  backend      — Только бэкенд"
     echo "  frontend     — Только фронтенд"
     echo "  reset-root   — Сброс пароля пользователя root к 'admin'"
+    echo "  migrate      — Применить миграции схемы БД и выйти (--migrate-only)"
     echo ""
     echo "Опции авторизации:"
     echo "  --no-auth, --disable-auth — Отключить форму входа (авто-доступ под Superuser)"
@@ -164,6 +165,11 @@ case "$MODE" in
         PYTHONPATH=. .venv/bin/python3 -m backend.scripts.reset_root
         ;;
 
+    migrate)
+        ensure_venv
+        PYTHONPATH=. .venv/bin/python3 -m backend.scripts.migrate --migrate-only
+        ;;
+
     backend)
         force_cleanup
         ensure_venv
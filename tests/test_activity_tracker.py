@@ -0,0 +1,75 @@
+"""tests/test_activity_tracker.py — тесты отложенной записи отметок активности last_seen."""
+import pytest
+from fastapi.testclient import TestClient
+
+import backend.core.database as db_module
+from backend.core.activity import ActivityTracker, activity_tracker
+from backend.core.app import create_app
+from backend.core.db_writer import db_writer
+from backend.core.rate_limiter import rate_limiter
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # Фоновый сброс не должен вмешиваться в проверку буфера
+    monkeypatch.setattr("backend.core.activity.ACTIVITY_FLUSH_INTERVAL", 3600)
+    db_module.DB_PATH = tmp_path / "activity.db"
+    db_module.init_db()
+    rate_limiter.clear()
+    activity_tracker.flush()
+    with TestClient(create_app()) as test_client:
+        yield test_client
+    rate_limiter.clear()
+
+
+def _session_last_seen():
+    conn = db_module.get_db_connection()
+    try:
+        return conn.execute("SELECT last_seen FROM active_sessions WHERE user_id = 'usr-root-01'").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_requests_coalesce_into_single_flush(client):
+    """Серия запросов не пишет last_seen сразу, а сбрасывается одной транзакцией."""
+    res = client.post("/api/auth/login", json={"username": "root", "password": "admin"})
+    headers = {"Authorization": f"Bearer {res.json()['token']}"}
+    conn = db_module.get_db_connection()
+    try:
+        conn.execute("UPDATE active_sessions SET last_seen = datetime('now', '-1 hour')")
+        conn.execute("UPDATE users SET last_seen = datetime('now', '-1 hour')")
+        conn.commit()
+    finally:
+        conn.close()
+    old = _session_last_seen()
+
+    for _ in range(20):
+        assert client.get("/api/auth/me", headers=headers).status_code == 200
+    assert _session_last_seen() == old
+    assert activity_tracker.get_stats()["pending_sessions"] == 1
+
+    # Списки сессий и пользователей видят ещё не записанную отметку
+    sessions = client.get("/api/users/me/sessions", headers=headers).json()
+    assert sessions[0]["last_seen"] > old
+    root = next(u for u in client.get("/api/users", headers=headers).json()["items"] if u["username"] == "root")
+    assert root["is_online"] is True and root["last_seen"] > old
+
+    assert activity_tracker.flush() == 2
+    assert _session_last_seen() > old
+    assert activity_tracker.flush() == 0
+
+
+def test_failed_flush_keeps_timestamps(monkeypatch):
+    """При ошибке записи отметки возвращаются в буфер и не теряются."""
+    tracker = ActivityTracker()
+    tracker.touch("usr-1", "jti-1")
+
+    def _fail(*args, **kwargs):
+        raise RuntimeError("disk I/O error")
+
+    monkeypatch.setattr(db_writer, "execute", _fail)
+    assert tracker.flush() == 0
+    stats = tracker.get_stats()
+    assert stats["pending_users"] == 1 and stats["pending_sessions"] == 1
+    assert tracker.session_last_seen("jti-1", "2000-01-01 00:00:00") > "2000-01-01 00:00:00"
+    assert tracker.session_last_seen("jti-unknown", "2000-01-01 00:00:00") == "2000-01-01 00:00:00"
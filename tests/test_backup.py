@@ -0,0 +1,140 @@
+"""tests/test_backup.py — онлайн-бэкап SQLite и потоковое восстановление."""
+import gzip
+import sqlite3
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+import backend.core.database as db_module
+from backend.core.app import create_app
+from backend.core.backup import (
+    BackupTooLargeError,
+    BackupUploadWriter,
+    InvalidBackupError,
+    create_online_backup,
+    iter_backup_file,
+    verify_backup_file,
+)
+from backend.core.rate_limiter import rate_limiter
+
+
+def _make_db(path, rows=2000):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.executemany("INSERT INTO users (name) VALUES (?)", [(f"user-{i}" * 10,) for i in range(rows)])
+    conn.commit()
+    conn.close()
+
+
+def test_online_backup_during_writes(tmp_path):
+    """Снимок согласован и проходит integrity_check при параллельной записи в источник."""
+    src = tmp_path / "src.db"
+    _make_db(src)
+    stop = threading.Event()
+
+    def writer():
+        conn = sqlite3.connect(src)
+        while not stop.is_set():
+            conn.execute("INSERT INTO users (name) VALUES ('late')")
+            conn.commit()
+        conn.close()
+
+    th = threading.Thread(target=writer)
+    th.start()
+    try:
+        stats = create_online_backup(tmp_path / "snap.db", source_path=src, pages=4, step_sleep=0.001)
+    finally:
+        stop.set()
+        th.join()
+
+    assert stats["size_bytes"] > 0
+    verify_backup_file(tmp_path / "snap.db")
+    conn = sqlite3.connect(tmp_path / "snap.db")
+    assert conn.execute("SELECT COUNT(*) FROM users WHERE name != 'late'").fetchone()[0] == 2000
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    conn.close()
+
+
+def test_iter_backup_file_compresses_and_removes(tmp_path):
+    """Поток снимка сжимается gzip и удаляет временный файл после чтения."""
+    snap = tmp_path / "snap.db"
+    payload = b"SQLite format 3\x00" + b"x" * 300_000
+    snap.write_bytes(payload)
+
+    data = b"".join(iter_backup_file(snap, chunk_size=65536))
+    assert gzip.decompress(data) == payload
+    assert len(data) < len(payload)
+    assert not snap.exists()
+
+
+def test_upload_writer_gzip_and_size_limit(tmp_path):
+    """Загрузка распаковывает gzip на лету и соблюдает лимит распакованного размера."""
+    payload = b"a" * 200_000
+    compressed = gzip.compress(payload)
+
+    writer = BackupUploadWriter(tmp_path / "up.db", max_bytes=1_000_000)
+    for i in range(0, len(compressed), 7):
+        writer.write(compressed[i:i + 7])
+    writer.close()
+    assert (tmp_path / "up.db").read_bytes() == payload
+
+    writer = BackupUploadWriter(tmp_path / "big.db", max_bytes=100_000)
+    with pytest.raises(BackupTooLargeError):
+        writer.write(compressed)
+    writer.abort()
+    assert not (tmp_path / "big.db").exists()
+
+
+def test_verify_backup_file_rejects_invalid(tmp_path):
+    """Мусор и БД без таблицы users отклоняются."""
+    garbage = tmp_path / "garbage.db"
+    garbage.write_bytes(b"NOT A SQLITE DATABASE" * 10)
+    with pytest.raises(InvalidBackupError) as exc_info:
+        verify_backup_file(garbage)
+    assert exc_info.value.reason == "integrity"
+
+    no_users = tmp_path / "no_users.db"
+    conn = sqlite3.connect(no_users)
+    conn.execute("CREATE TABLE other (id INTEGER)")
+    conn.execute("INSERT INTO other VALUES (1)")
+    conn.commit()
+    conn.close()
+    with pytest.raises(InvalidBackupError) as exc_info:
+        verify_backup_file(no_users)
+    assert exc_info.value.reason == "no_users"
+
+
+def test_backup_restore_roundtrip_api(tmp_path):
+    """Скачанный gzip-бэкап восстанавливается через /restore в живую БД."""
+    db_module.DB_PATH = tmp_path / "api.db"
+    db_module.init_db()
+    rate_limiter.clear()
+
+    with TestClient(create_app()) as client:
+        res = client.post("/api/auth/login", json={"username": "root", "password": "admin"})
+        headers = {"Authorization": f"Bearer {res.json()['token']}"}
+
+        res = client.get("/api/system/backup", params={"format": "gz"}, headers=headers)
+        assert res.status_code == 200
+        assert res.headers["content-type"] == "application/gzip"
+        assert ".db.gz" in res.headers["content-disposition"]
+        archive = res.content
+
+        db_module.set_system_setting("after_backup", "yes")
+
+        res = client.post(
+            "/api/system/restore",
+            content=archive,
+            headers={**headers, "Content-Type": "application/gzip"},
+        )
+        assert res.status_code == 200, res.text
+        assert db_module.get_system_setting("after_backup") is None
+
+        res = client.post("/api/system/restore", content=b"\x00" * 10, headers=headers)
+        assert res.status_code == 400
+        assert res.json()["error"]["code"] == "BACKUP_FILE_EMPTY"
+
+    assert not list(tmp_path.glob("temp_restore_*"))
+    assert not list(tmp_path.glob("backup_*.db"))
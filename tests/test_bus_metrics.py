@@ -0,0 +1,114 @@
+"""tests/test_bus_metrics.py — тесты счётчиков шины событий по топикам и гистограмм задержек обработчиков."""
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import backend.core.database as db_module
+from backend.core.app import create_app
+from backend.core.bus import EventBus, event_bus
+from backend.core.rate_limiter import rate_limiter
+
+
+@pytest.fixture
+def client(tmp_path):
+    db_module.DB_PATH = tmp_path / "bus_metrics.db"
+    db_module.init_db()
+    rate_limiter.clear()
+    with TestClient(create_app()) as test_client:
+        yield test_client
+    rate_limiter.clear()
+
+
+def _handler(items, pattern):
+    return next(item for item in items if item["pattern"] == pattern)
+
+
+def test_sync_handlers_counted_per_topic_and_handler():
+    """Публикации, доставки и ошибки учитываются по топику, задержка — по обработчику."""
+    bus = EventBus()
+
+    def slow(payload):
+        time.sleep(0.02)
+
+    def broken(payload):
+        raise RuntimeError("boom")
+
+    bus.subscribe("core.notifications.created", slow)
+    bus.subscribe("core.notifications.#", broken)
+    for _ in range(3):
+        bus.publish("core.notifications.created", {}, is_core=True)
+    bus.publish("core.notifications.read", {}, is_core=True)
+
+    topics = {item["topic"]: item for item in bus.metrics.get_topics()}
+    assert topics["core.notifications.created"]["publishes"] == 3
+    assert topics["core.notifications.created"]["deliveries"] == 3
+    assert topics["core.notifications.created"]["failures"] == 3
+    assert topics["core.notifications.read"]["failures"] == 1
+    assert topics["core.notifications.created"]["rate"] > 0
+
+    handlers = bus.metrics.get_handlers(sort="total")
+    assert handlers[0]["handler"].endswith("test_sync_handlers_counted_per_topic_and_handler.<locals>.slow")
+    assert handlers[0]["calls"] == 3 and handlers[0]["p95_ms"] >= 10
+    assert _handler(handlers, "core.notifications.#")["failures"] == 4
+
+    summary = bus.metrics.get_summary()
+    assert summary["publishes"] == 4 and summary["deliveries"] == 3 and summary["failures"] == 4
+
+    bus.metrics.reset()
+    assert bus.metrics.get_handlers() == []
+
+
+def test_async_mailbox_latency_drops_and_batches():
+    """Асинхронные обработчики учитываются по времени await, отброшенные очередью события — по топику."""
+
+    async def scenario():
+        bus = EventBus()
+        release = asyncio.Event()
+
+        async def consumer(payload):
+            await release.wait()
+
+        bus.subscribe("jobs.run", consumer, max_queue=1, overflow="drop_newest")
+        bus.subscribe("jobs.#", lambda events: None, batch=True)
+        bus.publish_many([("jobs.run", 1), ("jobs.run", 2), ("jobs.run", 3)])
+        await asyncio.sleep(0.05)
+        release.set()
+        await bus.shutdown(timeout=1.0)
+        return bus
+
+    bus = asyncio.run(scenario())
+    topics = {item["topic"]: item for item in bus.metrics.get_topics()}
+    assert topics["jobs.run"] == {
+        "topic": "jobs.run", "publishes": 3, "rate": topics["jobs.run"]["rate"],
+        "deliveries": 4, "failures": 0, "dropped": 2,
+    }
+    handlers = bus.metrics.get_handlers()
+    consumer = _handler(handlers, "jobs.run")
+    assert consumer["calls"] == 1 and consumer["dropped"] == 2 and consumer["max_ms"] >= 40
+    assert _handler(handlers, "jobs.#")["calls"] == 1
+
+
+def test_metrics_api_requires_admin_and_reports_handlers(client):
+    """GET /api/system/event-bus отдаёт метрики администратору, сводка есть в ws-metrics."""
+    token = client.post("/api/auth/login", json={"username": "root", "password": "admin"}).json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    def probe(payload):
+        pass
+
+    event_bus.subscribe("metrics.probe", probe)
+    try:
+        event_bus.publish("metrics.probe", {})
+        res = client.get("/api/system/event-bus?sort=calls", headers=headers)
+        assert res.status_code == 200, res.text
+        body = res.json()
+        assert any(item["topic"] == "metrics.probe" for item in body["topics"])
+        assert any(item["handler"].endswith("probe") and item["calls"] >= 1 for item in body["handlers"])
+
+        assert client.get("/api/system/ws-metrics", headers=headers).json()["event_bus"]["publishes"] >= 1
+        assert client.post("/api/system/event-bus/reset", headers=headers).json() == {"ok": True}
+        assert client.get("/api/system/event-bus").status_code == 401
+    finally:
+        event_bus.unsubscribe("metrics.probe", probe)
@@ -0,0 +1,190 @@
+"""tests/test_bus_rpc.py — тесты запросов с ответом между модулями поверх топиков шины событий."""
+import asyncio
+import time
+
+import pytest
+
+import backend.core.bus_rpc as rpc_module
+from backend.core.bus_rpc import RequestRouter, RequestTimeoutError
+from backend.core.exceptions import NotFoundError
+from backend.core.plugin.context import ModuleEvents
+
+
+def test_request_returns_reply_and_propagates_errors():
+    """request() возвращает ответ обработчика, пробрасывает его исключение и сообщает об отсутствии отвечающего."""
+    router = RequestRouter()
+
+    async def state(topic, payload):
+        return {"topic": topic, "id": payload["id"]}
+
+    def broken(payload):
+        raise RuntimeError("boom")
+
+    router.register("tuya.devices.state", state)
+    router.register("tuya.devices.broken", broken)
+
+    async def scenario():
+        assert await router.request("tuya.devices.state", {"id": 7}) == {"topic": "tuya.devices.state", "id": 7}
+        with pytest.raises(RuntimeError, match="boom"):
+            await router.request("tuya.devices.broken", {})
+        with pytest.raises(NotFoundError) as exc:
+            await router.request("zigbee.devices.state", {})
+        assert exc.value.code == "NO_RESPONDER"
+
+    asyncio.run(scenario())
+    stats = router.get_stats()
+    assert stats["requests"] == 3 and stats["no_responder"] == 1
+    endpoints = {e["pattern"]: e for e in stats["endpoints"]}
+    assert endpoints["tuya.devices.state"]["calls"] == 1
+    assert endpoints["tuya.devices.broken"]["failures"] == 1
+
+
+def test_request_timeout_cancels_handler():
+    """По таймауту запрос завершается RequestTimeoutError, а асинхронный обработчик отменяется."""
+    router = RequestRouter()
+
+    async def slow(payload):
+        await asyncio.sleep(5)
+
+    router.register("slow.call", slow)
+
+    async def scenario():
+        started = time.perf_counter()
+        with pytest.raises(RequestTimeoutError) as exc:
+            await router.request("slow.call", None, timeout=0.05)
+        assert exc.value.code == "REQUEST_TIMEOUT" and exc.value.status_code == 504
+        assert time.perf_counter() - started < 1.0
+
+    asyncio.run(scenario())
+    endpoint = router.get_stats()["endpoints"][0]
+    assert endpoint["cancelled"] == 1 and endpoint["failures"] == 0 and endpoint["in_flight"] == 0
+    assert router.get_stats()["timeouts"] == 1
+
+
+def test_handler_timeout_error_is_not_request_timeout():
+    """TimeoutError, выброшенный самим обработчиком, пробрасывается как есть и не считается таймаутом запроса."""
+    router = RequestRouter()
+
+    async def upstream(payload):
+        raise asyncio.TimeoutError("upstream device did not answer")
+
+    router.register("tuya.devices.poll", upstream)
+
+    async def scenario():
+        with pytest.raises(asyncio.TimeoutError, match="upstream device") as exc:
+            await router.request("tuya.devices.poll", {}, timeout=5)
+        assert not isinstance(exc.value, RequestTimeoutError)
+
+    asyncio.run(scenario())
+    stats = router.get_stats()
+    assert stats["timeouts"] == 0
+    assert stats["endpoints"][0]["failures"] == 1
+
+
+def test_request_with_several_responders_raises_handler_error():
+    """Если все подходящие отвечающие упали, request() пробрасывает ошибку сразу, а не по таймауту."""
+    router = RequestRouter()
+
+    def broken(payload):
+        raise ValueError("device offline")
+
+    async def slow(payload):
+        await asyncio.sleep(5)
+
+    router.register("tuya.devices.state", broken)
+    router.register("*.devices.state", broken)
+    router.register("zigbee.devices.state", broken)
+    router.register("zigbee.#", slow)
+
+    async def scenario():
+        started = time.perf_counter()
+        with pytest.raises(ValueError, match="device offline"):
+            await router.request("tuya.devices.state", {}, timeout=2.0)
+        assert time.perf_counter() - started < 1.0
+        # Пока отвечающий ещё работает, ошибка соседа не прерывает ожидание
+        with pytest.raises(RequestTimeoutError):
+            await router.request("zigbee.devices.state", {}, timeout=0.05)
+
+    asyncio.run(scenario())
+    assert router.get_stats()["timeouts"] == 1
+
+
+def test_gather_first_n_skips_failures_and_cancels_rest():
+    """gather(first=N) возвращает первые N успешных ответов, пропуская упавших и отменяя медленных."""
+    router = RequestRouter()
+    cancelled = []
+
+    def responder(delay, value):
+        async def handler(payload):
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                cancelled.append(value)
+                raise
+            if value == "broken":
+                raise RuntimeError("boom")
+            return value
+        return handler
+
+    router.register("tuya.devices.ping", responder(0.01, "tuya"))
+    router.register("*.devices.ping", responder(0.0, "broken"))
+    router.register("zigbee.#", responder(0.03, "zigbee"))
+    router.register("#", responder(5, "slow"))
+
+    async def scenario():
+        first = await router.gather("tuya.devices.ping", first=1, timeout=1.0)
+        assert [(r.pattern, r.value) for r in first] == [("tuya.devices.ping", "tuya")]
+        # Без first ждём всех: медленный отвечающий отрезается таймаутом
+        everyone = await router.gather("zigbee.devices.ping", timeout=0.1)
+        assert [r.value for r in everyone] == ["zigbee"]
+
+    asyncio.run(scenario())
+    assert cancelled == ["slow", "slow"]
+    assert router.get_stats()["timeouts"] == 1
+
+
+def test_concurrency_limit_queues_extra_requests():
+    """Обработчик выполняет не больше max_concurrency вызовов одновременно, остальные ждут слота."""
+    router = RequestRouter()
+    running = 0
+    peak = 0
+
+    async def handler(payload):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+        return payload
+
+    router.register("limited.call", handler, max_concurrency=2)
+
+    async def scenario():
+        return await asyncio.gather(*(router.request("limited.call", i) for i in range(6)))
+
+    assert asyncio.run(scenario()) == list(range(6))
+    assert peak == 2
+    endpoint = router.get_stats()["endpoints"][0]
+    assert endpoint["calls"] == 6 and endpoint["max_concurrency"] == 2 and endpoint["p95_ms"] >= 10
+
+
+def test_module_reply_handler_and_cleanup(monkeypatch):
+    """ctx.events.reply_handler регистрирует обработчик как декоратор, cleanup() его снимает."""
+    router = RequestRouter()
+    monkeypatch.setattr(rpc_module, "request_router", router)
+    tuya = ModuleEvents("tuya")
+    caller = ModuleEvents("dashboard")
+
+    @tuya.reply_handler("tuya.devices.count")
+    def count(payload):
+        return 3
+
+    async def scenario():
+        assert await caller.request("tuya.devices.count", timeout=1.0) == 3
+        assert [r.value for r in await caller.gather("tuya.devices.count", first=1)] == [3]
+        tuya.cleanup()
+        with pytest.raises(NotFoundError):
+            await caller.request("tuya.devices.count")
+
+    asyncio.run(scenario())
+    assert count(None) == 3
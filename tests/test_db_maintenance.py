@@ -0,0 +1,82 @@
+"""tests/test_db_maintenance.py — тесты обслуживания SQLite (checkpoint, incremental vacuum, optimize)."""
+import os
+import sqlite3
+
+import pytest
+
+import backend.core.database as db_module
+from backend.core.db_writer import db_writer
+from backend.core.maintenance import DatabaseMaintenance
+
+
+@pytest.fixture
+def maint_db(tmp_path, monkeypatch):
+    db_file = tmp_path / "maint.db"
+    monkeypatch.setattr(db_module, "DB_PATH", db_file)
+    db_module.init_db()
+    return db_file
+
+
+def _fill_and_delete(conn, rows=3000):
+    conn.execute("CREATE TABLE IF NOT EXISTS blobs (id INTEGER PRIMARY KEY, data BLOB)")
+    conn.execute(
+        "INSERT INTO blobs (data) SELECT randomblob(2000) FROM "
+        "(WITH RECURSIVE r(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM r WHERE i < ?) SELECT i FROM r)",
+        (rows,),
+    )
+    conn.execute("DELETE FROM blobs")
+
+
+def test_new_database_uses_incremental_auto_vacuum(maint_db):
+    """Новая БД создаётся с auto_vacuum=INCREMENTAL."""
+    status = DatabaseMaintenance().get_status()
+    assert status["auto_vacuum"] == "incremental"
+    assert status["runs"] == 0 and status["last_run"] is None
+
+
+def test_maintenance_truncates_wal_and_reclaims_space(maint_db):
+    """Цикл обслуживания обнуляет WAL, освобождает страницы freelist и собирает статистику."""
+    db_writer.execute(_fill_and_delete)
+    maintenance = DatabaseMaintenance(budget=30, vacuum_pages=200)
+    assert maintenance.get_status()["freelist_pages"] > 1000
+    assert os.path.getsize(f"{maint_db}-wal") > 0
+
+    report = maintenance.run()
+
+    assert report["checkpoint"]["busy"] is False
+    assert report["incremental_vacuum"]["freed_pages"] > 1000
+    assert report["incremental_vacuum"]["steps"] > 1
+    assert report["optimize"]["mode"] == "analyze"
+    status = maintenance.get_status()
+    assert status["freelist_pages"] == 0
+    assert status["runs"] == 1
+    assert status["last_run"]["duration_ms"] == report["duration_ms"]
+
+    conn = db_module.get_db_connection()
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM sqlite_stat1").fetchone()[0] > 0
+    finally:
+        conn.close()
+    assert maintenance.run()["optimize"]["mode"] == "optimize"
+
+
+def test_maintenance_respects_budget(maint_db):
+    """При исчерпанном бюджете vacuum и optimize пропускаются."""
+    db_writer.execute(_fill_and_delete)
+    report = DatabaseMaintenance(budget=0).run()
+    assert report["incremental_vacuum"]["steps"] == 0
+    assert report["optimize"]["skipped"] == "budget_exhausted"
+
+
+def test_convert_legacy_database(tmp_path, monkeypatch):
+    """Существующая БД без auto_vacuum переводится в incremental через VACUUM."""
+    db_file = tmp_path / "legacy.db"
+    conn = sqlite3.connect(db_file)
+    conn.execute("CREATE TABLE t (v INTEGER)")
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(db_module, "DB_PATH", db_file)
+
+    maintenance = DatabaseMaintenance()
+    assert maintenance.get_status()["auto_vacuum"] == "none"
+    assert maintenance.convert_to_incremental()["auto_vacuum"] == "incremental"
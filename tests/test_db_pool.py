@@ -0,0 +1,161 @@
+"""tests/test_db_pool.py — тесты пула SQLite-соединений (backend.core.db_pool)."""
+import asyncio
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import backend.core.database as db_module
+from backend.core.db_pool import ConnectionPool, PoolExhaustedError
+
+
+def test_connection_is_reused_after_close(tmp_path):
+    """Закрытое соединение возвращается в пул и выдаётся повторно тому же потоку."""
+    pool = ConnectionPool(tmp_path / "pool.db", max_size=4)
+    conn = pool.acquire()
+    raw = conn.raw
+    conn.execute("CREATE TABLE t (v INTEGER)")
+    conn.commit()
+    conn.close()
+    conn.close()  # повторный close безопасен
+
+    conn2 = pool.acquire()
+    assert conn2.raw is raw
+    assert conn2.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+    conn2.close()
+
+    stats = pool.get_stats()
+    assert stats["created"] == 1
+    assert stats["checkouts"] == 2
+    assert stats["thread_affinity_hits"] == 1
+    assert stats["idle"] == 1 and stats["in_use"] == 0
+    pool.close()
+
+
+def test_released_proxy_cannot_be_used(tmp_path):
+    """После close() прокси не даёт выполнять запросы на чужом соединении."""
+    pool = ConnectionPool(tmp_path / "pool.db")
+    conn = pool.acquire()
+    conn.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute("SELECT 1")
+    pool.close()
+
+
+def test_uncommitted_transaction_rolled_back_on_release(tmp_path):
+    """Незавершённая транзакция откатывается при возврате соединения в пул."""
+    pool = ConnectionPool(tmp_path / "pool.db")
+    conn = pool.acquire()
+    conn.execute("CREATE TABLE t (v INTEGER)")
+    conn.commit()
+    conn.execute("INSERT INTO t VALUES (1)")
+    conn.row_factory = None
+    conn.close()
+
+    conn = pool.acquire()
+    assert conn.row_factory is sqlite3.Row
+    assert conn.execute("SELECT COUNT(*) AS c FROM t").fetchone()["c"] == 0
+    conn.close()
+    pool.close()
+
+
+def test_connection_settings_reset_on_release(tmp_path):
+    """Настройки, изменённые через прокси, не достаются следующему владельцу соединения."""
+    pool = ConnectionPool(tmp_path / "pool.db", max_size=1)
+    conn = pool.acquire()
+    conn.isolation_level = None
+    conn.text_factory = bytes
+    conn.row_factory = None
+    conn.close()
+
+    conn = pool.acquire()
+    try:
+        assert conn.isolation_level == ""
+        assert conn.text_factory is str
+        assert conn.row_factory is sqlite3.Row
+    finally:
+        conn.close()
+
+
+def test_pool_max_size_waits_and_times_out(tmp_path):
+    """При исчерпании пула выдача ждёт освобождения, а по таймауту падает."""
+    pool = ConnectionPool(tmp_path / "pool.db", max_size=1, timeout=0.1)
+    held = pool.acquire()
+    with pytest.raises(PoolExhaustedError):
+        pool.acquire()
+    assert pool.get_stats()["timeouts"] == 1
+
+    pool.timeout = 2.0
+    releaser = threading.Timer(0.05, held.close)
+    releaser.start()
+    conn = pool.acquire()
+    releaser.join()
+    stats = pool.get_stats()
+    assert stats["waits"] == 1
+    assert stats["wait_time_max_ms"] > 0
+    assert stats["size"] == 1
+    conn.close()
+    pool.close()
+
+
+def test_health_check_discards_broken_connection(tmp_path):
+    """Соединение, не прошедшее health-check после простоя, заменяется новым."""
+    pool = ConnectionPool(tmp_path / "pool.db", health_check_interval=0.0)
+    conn = pool.acquire()
+    raw = conn.raw
+    conn.close()
+    raw.close()  # имитируем «сломанное» соединение
+
+    time.sleep(0.01)
+    conn = pool.acquire()
+    assert conn.raw is not raw
+    assert conn.execute("SELECT 1").fetchone()[0] == 1
+    conn.close()
+    stats = pool.get_stats()
+    assert stats["health_check_failures"] == 1
+    assert stats["created"] == 2
+    pool.close()
+
+
+def test_get_db_connection_follows_db_path(tmp_path, monkeypatch):
+    """get_db_connection() пересоздаёт пул при смене DB_PATH и применяет PRAGMA."""
+    first = tmp_path / "first.db"
+    second = tmp_path / "second.db"
+
+    monkeypatch.setattr(db_module, "DB_PATH", first)
+    conn = db_module.get_db_connection()
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+    conn.close()
+    assert db_module.get_db_pool().db_path == first
+
+    monkeypatch.setattr(db_module, "DB_PATH", second)
+    conn = db_module.get_db_connection()
+    conn.close()
+    assert db_module.get_db_pool().db_path == second
+    assert second.exists()
+
+    db_module.close_db_pool()
+    assert db_module.get_db_pool_stats()["size"] == 0
+
+
+def test_event_loop_checkout_fails_fast_when_pool_exhausted(tmp_path, monkeypatch):
+    """Из event loop исчерпанный пул сразу отвечает PoolExhaustedError, не ожидая освобождения."""
+    monkeypatch.setattr(db_module, "DB_PATH", tmp_path / "loop.db")
+    monkeypatch.setattr(db_module, "DB_POOL_SIZE", 1)
+    db_module.close_db_pool()
+    held = db_module.get_db_connection()
+
+    async def checkout():
+        started = time.monotonic()
+        with pytest.raises(PoolExhaustedError):
+            db_module.get_db_connection()
+        return time.monotonic() - started
+
+    try:
+        assert asyncio.run(checkout()) < 0.1
+        assert db_module.get_db_pool_stats()["waits"] == 0
+    finally:
+        held.close()
+        db_module.close_db_pool()
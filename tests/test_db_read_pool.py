@@ -0,0 +1,78 @@
+"""tests/test_db_read_pool.py — тесты пула соединений только для чтения."""
+import sqlite3
+
+import pytest
+
+import backend.core.database as db_module
+from backend.core.database import (
+    get_db_connection,
+    get_db_read_connection,
+    get_db_read_pool_stats,
+    init_db,
+)
+from backend.core.events import check_replay_status_from_db
+from backend.core.notify import get_user_notifications
+
+
+@pytest.fixture
+def read_db(tmp_path, monkeypatch):
+    db_file = tmp_path / "read.db"
+    monkeypatch.setattr(db_module, "DB_PATH", db_file)
+    init_db()
+    return db_file
+
+
+def _read_checkouts() -> int:
+    return db_module.get_db_read_pool().get_stats()["checkouts"]
+
+
+def test_read_connection_rejects_writes(read_db):
+    """Соединение только для чтения не выполняет запись и настроено PRAGMA чтения."""
+    conn = get_db_read_connection()
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("INSERT INTO system_settings (key, value) VALUES ('x', '1')")
+        assert conn.execute("PRAGMA query_only").fetchone()[0] == 1
+        assert conn.execute("PRAGMA cache_size").fetchone()[0] == -db_module.DB_READ_CACHE_KB
+    finally:
+        conn.close()
+    assert get_db_read_pool_stats()["read_only"] is True
+
+
+def test_read_connection_sees_committed_writes(read_db):
+    """Закэшированное соединение чтения видит записи, сделанные после его создания."""
+    reader = get_db_read_connection()
+    reader.execute("SELECT COUNT(*) FROM users").fetchone()
+    reader.close()
+
+    conn = get_db_connection()
+    try:
+        with conn:
+            conn.execute("INSERT INTO system_settings (key, value) VALUES ('fresh', '\"1\"')")
+    finally:
+        conn.close()
+
+    reader = get_db_read_connection()
+    try:
+        assert reader.execute("SELECT value FROM system_settings WHERE key = 'fresh'").fetchone() is not None
+    finally:
+        reader.close()
+
+
+def test_read_pool_falls_back_when_file_missing(tmp_path, monkeypatch):
+    """Если файла БД ещё нет, пул чтения всё равно выдаёт соединение с query_only."""
+    monkeypatch.setattr(db_module, "DB_PATH", tmp_path / "missing.db")
+    conn = get_db_read_connection()
+    try:
+        assert conn.execute("PRAGMA query_only").fetchone()[0] == 1
+    finally:
+        conn.close()
+
+
+def test_read_endpoints_use_read_pool(read_db):
+    """Список уведомлений и досылка событий читают через пул только для чтения."""
+    before = _read_checkouts()
+    result = get_user_notifications("usr-root-01")
+    assert result["total"] == 0
+    assert check_replay_status_from_db(0) == ("replay", [])
+    assert _read_checkouts() - before == 2
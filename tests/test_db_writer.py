@@ -0,0 +1,152 @@
+"""tests/test_db_writer.py — тесты единственного писателя SQLite (backend.core.db_writer)."""
+import asyncio
+import sqlite3
+import threading
+
+from backend.core.db_writer import DatabaseWriter
+
+
+def _make_writer(db_file, **kwargs) -> DatabaseWriter:
+    writer = DatabaseWriter(lambda: db_file, **kwargs)
+    writer.execute(lambda conn: conn.execute("CREATE TABLE t (v INTEGER UNIQUE)"), isolated=True)
+    return writer
+
+
+def _count(db_file) -> int:
+    conn = sqlite3.connect(db_file)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM t").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_execute_returns_result_and_commits(tmp_path):
+    """Результат операции возвращается через Future, запись видна другим соединениям."""
+    db_file = tmp_path / "w.db"
+    writer = _make_writer(db_file)
+
+    rowid = writer.execute(lambda conn, v: conn.execute("INSERT INTO t VALUES (?)", (v,)).lastrowid, 7)
+    assert rowid == 1
+    assert _count(db_file) == 1
+
+    writer.stop()
+    assert writer.get_stats()["running"] is False
+
+
+def test_failed_operation_does_not_roll_back_batch(tmp_path):
+    """Ошибка одной операции откатывает только её SAVEPOINT, а не весь пакет."""
+    db_file = tmp_path / "w.db"
+    writer = _make_writer(db_file)
+
+    gate = threading.Event()
+    blocker = writer.submit(lambda conn: gate.wait(5))
+    futures = [writer.submit(lambda conn, v=v: conn.execute("INSERT INTO t VALUES (?)", (v,))) for v in (1, 2, 1, 3)]
+    gate.set()
+    blocker.result(5)
+
+    errors = [f.exception(5) for f in futures]
+    assert isinstance(errors[2], sqlite3.IntegrityError)
+    assert errors[0] is None and errors[1] is None and errors[3] is None
+    assert _count(db_file) == 3
+
+    stats = writer.get_stats()
+    assert stats["failed"] == 1
+    assert stats["max_batch_size"] >= 2
+    assert stats["queue_depth"] == 0
+    writer.stop()
+
+
+def test_concurrent_producers_are_grouped(tmp_path):
+    """Параллельные производители не получают 'database is locked', записи объединяются в пакеты."""
+    db_file = tmp_path / "w.db"
+    writer = _make_writer(db_file)
+
+    def produce(base: int):
+        for i in range(50):
+            writer.execute(lambda conn, v=base + i: conn.execute("INSERT INTO t VALUES (?)", (v,)))
+
+    threads = [threading.Thread(target=produce, args=(n * 1000,)) for n in range(8)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+
+    assert _count(db_file) == 400
+    stats = writer.get_stats()
+    assert stats["completed"] == 401
+    assert stats["batches"] <= 401
+    assert stats["commit_latency_max_ms"] >= stats["commit_latency_avg_ms"]
+    writer.stop()
+
+
+def test_nested_submit_runs_inline(tmp_path):
+    """Вложенная операция из потока-писателя выполняется сразу, без взаимоблокировки."""
+    db_file = tmp_path / "w.db"
+    writer = _make_writer(db_file)
+
+    def outer(conn):
+        conn.execute("INSERT INTO t VALUES (1)")
+        return writer.execute(lambda c: c.execute("INSERT INTO t VALUES (2)").rowcount)
+
+    assert writer.execute(outer, timeout=5) == 1
+    assert _count(db_file) == 2
+    writer.stop()
+
+
+def test_follows_db_path_change(tmp_path):
+    """При смене пути к БД писатель переоткрывает соединение."""
+    paths = {"current": tmp_path / "a.db"}
+    writer = DatabaseWriter(lambda: paths["current"])
+    create = lambda conn: conn.execute("CREATE TABLE t (v INTEGER)")
+    writer.execute(create, isolated=True)
+
+    paths["current"] = tmp_path / "b.db"
+    writer.execute(create, isolated=True)
+    writer.execute(lambda conn: conn.execute("INSERT INTO t VALUES (1)"))
+
+    assert _count(tmp_path / "a.db") == 0
+    assert _count(tmp_path / "b.db") == 1
+    writer.stop()
+
+
+def test_execute_async(tmp_path):
+    """execute_async() ожидает результат без блокировки event loop."""
+    db_file = tmp_path / "w.db"
+    writer = _make_writer(db_file)
+    result = asyncio.run(writer.execute_async(lambda conn: conn.execute("INSERT INTO t VALUES (5)").rowcount))
+    assert result == 1
+    writer.stop()
+
+
+def test_audit_event_is_queued_without_waiting(tmp_path, monkeypatch, caplog):
+    """log_audit_event() не ждёт занятого писателя, а ошибку записи пишет в лог."""
+    import backend.core.audit as audit_module
+
+    db_file = tmp_path / "w.db"
+    writer = DatabaseWriter(lambda: db_file)
+    writer.execute(
+        lambda conn: conn.execute(
+            "CREATE TABLE audit_logs (user_id TEXT, username TEXT, action TEXT, resource TEXT, details TEXT, ip_address TEXT)"
+        ),
+        isolated=True,
+    )
+    monkeypatch.setattr(audit_module, "db_writer", writer)
+    release = threading.Event()
+    writer.submit(lambda conn: release.wait(5))
+
+    audit_module.log_audit_event("u1", "root", "user.login", "auth")
+    assert writer.get_stats()["queue_depth"] >= 1
+    release.set()
+    writer.execute(lambda conn: None)
+    conn = sqlite3.connect(db_file)
+    try:
+        assert conn.execute("SELECT username, action FROM audit_logs").fetchall() == [("root", "user.login")]
+    finally:
+        conn.close()
+
+    writer.execute(lambda conn: conn.execute("DROP TABLE audit_logs"), isolated=True)
+    with caplog.at_level("ERROR", logger="nms.audit"):
+        audit_module.log_audit_event("u1", "root", "user.logout", "auth")
+        writer.execute(lambda conn: None)
+    assert "Failed to write audit log" in caplog.text
+    writer.stop()
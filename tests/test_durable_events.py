@@ -0,0 +1,268 @@
+"""tests/test_durable_events.py — тесты долговременных подписок шины событий с воспроизведением из журнала."""
+import asyncio
+
+import pytest
+
+import backend.core.database as db_module
+import backend.core.durable_events as durable_module
+from backend.core.bus import EventBus
+from backend.core.db_writer import db_writer
+from backend.core.durable_events import DurableEvents
+from backend.core.plugin.context import ModuleEvents
+
+
+@pytest.fixture
+def db(tmp_path):
+    db_module.DB_PATH = tmp_path / "durable_events.db"
+    db_module.init_db()
+    yield
+
+
+async def _wait_for(predicate, timeout: float = 3.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "condition not met in time"
+        await asyncio.sleep(0.01)
+
+
+def _barrier(conn) -> None:
+    """Пустая операция: поток-писатель выполняет очередь по порядку, значит, журнал уже записан."""
+
+
+def _cursor(sub_id: str) -> int:
+    conn = db_module.get_db_read_connection()
+    try:
+        return conn.execute("SELECT cursor FROM bus_durable_subscriptions WHERE id = ?", (sub_id,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _journal_size() -> int:
+    conn = db_module.get_db_read_connection()
+    try:
+        return conn.execute("SELECT COUNT(*) FROM bus_event_journal").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_missed_events_replayed_after_resubscribe(db):
+    """События, опубликованные при отключённом обработчике, доставляются после повторной подписки."""
+
+    async def scenario():
+        bus = EventBus()
+        durable = DurableEvents(bus)
+        durable.start()
+        received = []
+
+        async def handler(topic, payload):
+            received.append((topic, payload))
+
+        consumer = durable.subscribe("mod:state", "dev.#", handler)
+        await _wait_for(lambda: consumer.cursor is not None)
+        bus.publish("dev.a", {"n": 1})
+        await _wait_for(lambda: len(received) == 1)
+
+        durable.unsubscribe("mod:state")
+        bus.publish_many([("dev.b", {"n": 2}), ("other.x", {}), ("dev.c", {"n": 3})])
+        await db_writer.execute_async(_barrier)
+        assert received == [("dev.a", {"n": 1})]
+
+        durable.subscribe("mod:state", "dev.#", handler)
+        await _wait_for(lambda: len(received) == 3)
+        await _wait_for(lambda: _cursor("mod:state") == 3)
+        await durable.stop()
+        return received
+
+    received = asyncio.run(scenario())
+    assert received == [("dev.a", {"n": 1}), ("dev.b", {"n": 2}), ("dev.c", {"n": 3})]
+
+
+def test_failed_batch_redelivered_and_cursor_survives_restart(db, monkeypatch):
+    """Упавшая пачка доставляется повторно, курсор переживает перезапуск процесса."""
+    monkeypatch.setattr(durable_module, "RETRY_DELAY", 0.05)
+
+    async def first_run():
+        bus = EventBus()
+        durable = DurableEvents(bus)
+        durable.start()
+        calls = []
+
+        def handler(events):
+            calls.append(list(events))
+            if len(calls) == 1:
+                raise RuntimeError("boom")
+
+        consumer = durable.subscribe("mod:batch", "jobs.#", handler, batch=True)
+        await _wait_for(lambda: consumer.cursor is not None)
+        bus.publish_many([("jobs.a", 1), ("jobs.b", 2)])
+        await _wait_for(lambda: len(calls) == 2)
+        await _wait_for(lambda: _cursor("mod:batch") == 2)
+        assert consumer.get_stats()["failures"] == 1
+        await durable.stop()
+        # Процесс остановлен: события копятся по сохранённой маске
+        bus.publish("jobs.c", 3)
+        await db_writer.execute_async(_barrier)
+        return calls
+
+    calls = asyncio.run(first_run())
+    assert calls[0] == calls[1] == [("jobs.a", 1), ("jobs.b", 2)]
+
+    async def second_run():
+        bus = EventBus()
+        durable = DurableEvents(bus)
+        await asyncio.to_thread(durable.load)
+        assert bus.durable is durable and durable.wants("jobs.d")
+        durable.start()
+        received = []
+        durable.subscribe("mod:batch", "jobs.#", lambda events: received.extend(events), batch=True)
+        await _wait_for(lambda: received == [("jobs.c", 3)])
+        await durable.stop()
+
+    asyncio.run(second_run())
+
+
+def test_prune_keeps_unacknowledged_and_delete_stops_journaling(db):
+    """Очистка удаляет только подтверждённые события; удалённая подписка больше не копит журнал."""
+
+    async def scenario():
+        bus = EventBus()
+        durable = DurableEvents(bus)
+        durable.start()
+        received = []
+        consumer = durable.subscribe("mod:fast", "a.#", received.append)
+        slow = durable.subscribe("mod:slow", "b.#", lambda payload: None)
+        await _wait_for(lambda: consumer.cursor is not None and slow.cursor is not None)
+        durable.unsubscribe("mod:slow")
+        bus.publish("a.x", 1)
+        bus.publish("b.x", 2)
+        await _wait_for(lambda: received == [1])
+        await _wait_for(lambda: _cursor("mod:fast") == 2)
+
+        assert await asyncio.to_thread(durable.prune) == 0
+        assert _journal_size() == 2
+
+        assert durable.delete("mod:slow") is True
+        assert await asyncio.to_thread(durable.prune) == 2
+        assert not durable.wants("b.x")
+        bus.publish("b.y", 3)
+        await db_writer.execute_async(_barrier)
+        await durable.stop()
+        assert durable.get_stats()["subscriptions"] == 1
+
+    asyncio.run(scenario())
+    assert _journal_size() == 0
+
+
+def test_module_cleanup_keeps_durable_subscription(db, monkeypatch):
+    """ctx.events.cleanup() отключает обработчик, но события модуля продолжают копиться в журнале."""
+    bus = EventBus()
+    durable = DurableEvents(bus)
+    monkeypatch.setattr(durable_module, "durable_events", durable)
+
+    async def scenario():
+        durable.start()
+        events = ModuleEvents("tuya")
+        events.subscribe_durable("state", "tuya.devices.#", lambda payload: None)
+        await _wait_for(lambda: durable._consumers["tuya:state"].cursor is not None)
+        events.cleanup()
+        assert durable.get_stats()["consumers"] == []
+        bus.publish("tuya.devices.down", {"id": 1})
+        await db_writer.execute_async(_barrier)
+        await durable.stop()
+
+    asyncio.run(scenario())
+    assert _journal_size() == 1 and _cursor("tuya:state") == 0
+
+
+def test_refresh_picks_up_subscriptions_of_other_workers(db):
+    """Подписка, созданная другим воркером, после refresh() журналирует события и этого воркера."""
+
+    async def scenario():
+        other = DurableEvents(EventBus())
+        other.start()
+        consumer = other.subscribe("mod:state", "dev.#", lambda payload: None)
+        await _wait_for(lambda: consumer.cursor is not None)
+
+        bus = EventBus()
+        local = DurableEvents(bus)
+        await asyncio.to_thread(local.load)
+        other.delete("mod:state")
+        await db_writer.execute_async(_barrier)
+        assert local.wants("dev.a")
+        assert await asyncio.to_thread(local.refresh) == 0
+        assert not local.wants("dev.a")
+
+        other.subscribe("mod:state", "dev.#", lambda payload: None)
+        await _wait_for(lambda: other._consumers["mod:state"].leased)
+        assert not local.wants("dev.b")
+        assert await asyncio.to_thread(local.refresh) == 1
+        bus.publish("dev.b", 1)
+        await db_writer.execute_async(_barrier)
+        await other.stop()
+
+    asyncio.run(scenario())
+    assert _journal_size() == 1
+
+
+def test_only_lease_owner_consumes_and_standby_takes_over(db, monkeypatch):
+    """Из двух воркеров с одной подпиской события доставляет владелец аренды; после его остановки — второй."""
+    monkeypatch.setattr(durable_module, "LEASE_RETRY_INTERVAL", 0.05)
+
+    async def scenario():
+        bus = EventBus()
+        first, second = DurableEvents(bus), DurableEvents(EventBus())
+        first.start()
+        second.start()
+        got_first, got_second = [], []
+        leader = first.subscribe("mod:state", "dev.#", got_first.append)
+        await _wait_for(lambda: leader.leased)
+        standby = second.subscribe("mod:state", "dev.#", got_second.append)
+        await asyncio.sleep(0.1)
+        assert not standby.leased
+
+        bus.publish("dev.a", 1)
+        await _wait_for(lambda: got_first == [1])
+        await _wait_for(lambda: _cursor("mod:state") == 1)
+
+        await first.stop()
+        bus.publish("dev.b", 2)
+        await _wait_for(lambda: got_second == [2])
+        assert got_first == [1] and standby.get_stats()["leased"] is True
+        await second.stop()
+
+    asyncio.run(scenario())
+
+
+def test_poison_event_moved_to_dead_letters_after_max_attempts(db, monkeypatch):
+    """Событие, упавшее MAX_ATTEMPTS раз, переносится в bus_dead_letters, следующие доставляются."""
+    monkeypatch.setattr(durable_module, "RETRY_DELAY", 0.01)
+    monkeypatch.setattr(durable_module, "MAX_ATTEMPTS", 3)
+    calls = []
+
+    def handler(payload):
+        calls.append(payload)
+        if payload == "bad":
+            raise ValueError("cannot handle")
+
+    async def scenario():
+        bus = EventBus()
+        durable = DurableEvents(bus)
+        durable.start()
+        consumer = durable.subscribe("mod:poison", "jobs.#", handler)
+        await _wait_for(lambda: consumer.cursor is not None)
+        bus.publish_many([("jobs.a", "ok-1"), ("jobs.b", "bad"), ("jobs.c", "ok-2")])
+        await _wait_for(lambda: calls[-1:] == ["ok-2"])
+        await _wait_for(lambda: _cursor("mod:poison") == 3)
+        stats = consumer.get_stats()
+        await durable.stop()
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert calls == ["ok-1", "bad", "bad", "bad", "ok-2"]
+    assert stats["failures"] == 3 and stats["dead_lettered"] == 1 and stats["attempts"] == 0
+    conn = db_module.get_db_read_connection()
+    try:
+        row = conn.execute("SELECT subscription_id, seq, topic, payload, error FROM bus_dead_letters").fetchone()
+    finally:
+        conn.close()
+    assert tuple(row) == ("mod:poison", 2, "jobs.b", '"bad"', "cannot handle")
@@ -1,4 +1,5 @@
 """Unit tests for Core EventBus, ModuleContext event integration, and WS Bridge."""
+import time
 from pathlib import Path
 from unittest.mock import MagicMock, patch
 
@@ -6,7 +7,7 @@ import pytest
 
 from backend.api.events import can_subscribe_to_topic
 from backend.core.bus import EventBus, match_topic
-from backend.core.exceptions import PermissionDeniedError
+from backend.core.exceptions import PermissionDeniedError, ValidationError
 from backend.core.plugin.context import ModuleContext, cleanup_module_events
 
 
@@ -279,3 +280,226 @@ async def test_concurrent_async_task_tracking():
 
 
 
+
+
+def test_topic_trie_matches_like_match_topic():
+    """Индекс масок возвращает тех же подписчиков, что и match_topic, в порядке подписки."""
+    import itertools
+
+    bus = EventBus()
+    segments = ("a", "b", "*", "+", "#")
+    patterns = ["*", "#"] + [
+        ".".join(parts) for depth in (1, 2, 3) for parts in itertools.product(segments, repeat=depth)
+    ]
+    handlers = {}
+    for pattern in patterns:
+        handlers[pattern] = lambda topic, payload, p=pattern: None
+        bus.subscribe(pattern, handlers[pattern])
+
+    topics = [".".join(parts) for depth in (1, 2, 3, 4) for parts in itertools.product(("a", "b", "c"), repeat=depth)]
+    for topic in topics:
+        with bus._lock:
+            matched = [s.pattern for s in bus._match_locked(topic)]
+        expected = [p for p in patterns if p == topic and not any(c in p for c in "*+#")]
+        expected += [p for p in patterns if any(c in p for c in "*+#") and match_topic(p, topic)]
+        assert matched == expected, topic
+
+
+def test_same_handler_on_synonym_wildcards_is_two_subscriptions():
+    """Один обработчик на a.* и a.+ (и на * и #) — две независимые подписки, а не дубликат."""
+    bus = EventBus()
+    received = []
+
+    def handler(topic, payload):
+        received.append(topic)
+
+    bus.subscribe("a.*", handler)
+    bus.subscribe("a.+", handler)
+    bus.subscribe("a.+", handler)
+    bus.subscribe("*", handler)
+    bus.subscribe("#", handler)
+    assert bus.publish("a.x", 1) == 4
+    assert received == ["a.x"] * 4
+
+    assert bus.unsubscribe("a.+", handler) is True
+    assert bus.unsubscribe("#", handler) is True
+    assert bus.publish("a.x", 2) == 2
+    assert bus.unsubscribe("a.+", handler) is False
+
+
+def test_match_cache_invalidated_on_subscribe_and_unsubscribe():
+    """Кэш топик → подписчики сбрасывается при подписке и отписке."""
+    bus = EventBus()
+    received = []
+
+    def first(topic, payload):
+        received.append(("first", topic))
+
+    def second(topic, payload):
+        received.append(("second", topic))
+
+    bus.subscribe("sensor.#", first)
+    assert bus.publish("sensor.temp", 1) == 1
+    assert bus.publish("sensor.temp", 2) == 1
+    assert bus.get_stats()["match_cache"] == {"size": 1, "hits": 1, "misses": 1}
+
+    bus.subscribe("sensor.+", second)
+    bus.subscribe("sensor.+", second)
+    assert bus.publish("sensor.temp", 3) == 2
+
+    bus.unsubscribe(first)
+    assert bus.publish("sensor.temp", 4) == 1
+    assert received[-1] == ("second", "sensor.temp")
+    assert received.count(("first", "sensor.temp")) == 3
+
+
+def _run_mailbox_scenario(overflow, payloads, **options):
+    """Опубликовать payloads, пока асинхронный обработчик занят, и вернуть полученное."""
+    import asyncio
+
+    async def scenario():
+        bus = EventBus()
+        release = asyncio.Event()
+        received = []
+
+        async def handler(payload):
+            await release.wait()
+            received.append(payload)
+
+        bus.subscribe("storm.topic", handler, max_queue=2, overflow=overflow, **options)
+        results = [bus.publish("storm.topic", p) for p in payloads]
+        stats = bus.get_stats()["mailboxes"][0]
+        release.set()
+        await bus.shutdown(timeout=1.0)
+        return received, results, stats
+
+    return asyncio.run(scenario())
+
+
+def test_mailbox_drop_policies():
+    """Очередь асинхронного подписчика ограничена: drop_oldest вытесняет старые, drop_newest — новые события."""
+    received, results, stats = _run_mailbox_scenario("drop_oldest", [1, 2, 3, 4, 5])
+    assert received == [4, 5]
+    assert results == [1, 1, 1, 1, 1]
+    assert stats["dropped"] == 3 and stats["queued"] == 2
+
+    received, results, stats = _run_mailbox_scenario("drop_newest", [1, 2, 3, 4, 5])
+    assert received == [1, 2]
+    assert results == [1, 1, 0, 0, 0]
+
+
+def test_mailbox_coalesce_by_key():
+    """coalesce заменяет ожидающее событие с тем же ключом, сохраняя его место в очереди."""
+    received, _, stats = _run_mailbox_scenario(
+        "coalesce",
+        [{"id": "a", "v": 1}, {"id": "b", "v": 1}, {"id": "a", "v": 2}, {"id": "c", "v": 1}],
+        coalesce_key=lambda topic, payload: payload["id"],
+    )
+    assert received == [{"id": "b", "v": 1}, {"id": "c", "v": 1}]
+    assert stats["coalesced"] == 1 and stats["dropped"] == 1
+
+    with pytest.raises(ValidationError):
+        EventBus().subscribe("x", lambda p: None, mode="thread", overflow="coalesce")
+    with pytest.raises(ValidationError):
+        EventBus().subscribe("x", lambda p: None, overflow="unbounded")
+
+
+def test_mailbox_timeout_skips_slow_event():
+    """Таймаут подписчика прерывает зависшее событие, следующие обрабатываются."""
+    import asyncio
+
+    async def scenario():
+        bus = EventBus()
+        received = []
+
+        async def handler(payload):
+            if payload == "slow":
+                await asyncio.sleep(5)
+            received.append(payload)
+
+        bus.subscribe("t", handler, timeout=0.05)
+        bus.publish("t", "slow")
+        bus.publish("t", "fast")
+        await asyncio.sleep(0.3)
+        stats = bus.get_stats()["mailboxes"][0]
+        await bus.shutdown(timeout=1.0)
+        return received, stats
+
+    received, stats = asyncio.run(scenario())
+    assert received == ["fast"]
+    assert stats["timeouts"] == 1 and stats["processed"] == 1
+
+
+def test_thread_mode_does_not_block_publish_and_block_policy_waits():
+    """Синхронный обработчик в режиме thread не задерживает publish(), а block ждёт места в очереди."""
+    import asyncio
+    import threading
+
+    bus = EventBus()
+    release = threading.Event()
+    received = []
+
+    def handler(payload):
+        release.wait(5)
+        received.append((payload, threading.current_thread().name.startswith("nms-bus")))
+
+    bus.subscribe("jobs", handler, mode="thread", max_queue=1, overflow="block")
+    assert bus.publish("jobs", 1) == 1
+    deadline = time.monotonic() + 2
+    while bus.get_stats()["mailboxes"][0]["queued"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert bus.publish("jobs", 2) == 1
+
+    blocked = threading.Thread(target=bus.publish, args=("jobs", 3))
+    blocked.start()
+    blocked.join(0.2)
+    assert blocked.is_alive()
+
+    release.set()
+    blocked.join(5)
+    asyncio.run(bus.shutdown(timeout=5.0))
+    assert received == [(1, True), (2, True), (3, True)]
+
+    with pytest.raises(ValidationError):
+        bus.subscribe("jobs", handler, mode="async")
+
+
+def test_publish_many_resolves_topics_once_and_batches():
+    """publish_many находит подписчиков один раз на топик, batch-подписчик получает пачку одним вызовом."""
+    bus = EventBus()
+    single, batches = [], []
+
+    bus.subscribe("poll.+.status", lambda topic, payload: single.append((topic, payload)))
+    bus.subscribe("poll.#", lambda events: batches.append(events), batch=True)
+
+    resolved = []
+    original = bus._match_locked
+    with patch.object(bus, "_match_locked", side_effect=lambda topic: resolved.append(topic) or original(topic)):
+        events = [("poll.a.status", 1), ("poll.b.status", 2), ("poll.a.status", 3), ("poll.a.metrics", 4)]
+        assert bus.publish_many(events) == 4
+
+    assert resolved == ["poll.a.status", "poll.b.status", "poll.a.metrics"]
+    assert single == [("poll.a.status", 1), ("poll.b.status", 2), ("poll.a.status", 3)]
+    assert batches == [events]
+
+    bus.publish("poll.c.status", 5)
+    assert batches[-1] == [("poll.c.status", 5)]
+
+
+def test_publish_many_rejects_reserved_topics_before_delivery(tmp_path: Path):
+    """Пачка с core.* отклоняется целиком; ModuleEvents.publish_many разворачивает короткие топики."""
+    bus = EventBus()
+    received = []
+    bus.subscribe("#", lambda topic, payload: received.append(topic))
+
+    with pytest.raises(PermissionDeniedError):
+        bus.publish_many([("a.b", 1), ("core.x", 2)])
+    assert received == []
+
+    ctx = ModuleContext(module_id="poller", root=tmp_path)
+    with patch("backend.core.bus.event_bus", bus):
+        with pytest.raises(PermissionDeniedError):
+            ctx.events.publish_many([("devices.up", 1), ("core.modules.enabled", 2)])
+        assert ctx.events.publish_many([("devices.up", 1), ("poller.devices.down", 2)]) == 2
+
+    assert received == ["poller.devices.up", "poller.devices.down"]
@@ -0,0 +1,126 @@
+"""tests/test_event_fanout.py — тесты межпроцессной рассылки WebSocket-событий через хвост журнала."""
+import asyncio
+import json
+import subprocess
+import sys
+import textwrap
+import time
+from pathlib import Path
+
+import pytest
+
+import backend.core.database as db_module
+from backend.core.event_fanout import EventFanout, JournalTailTransport
+from backend.core.events import record_event_in_db, ws_manager
+
+ROOT = Path(__file__).resolve().parent.parent
+
+PUBLISHER = textwrap.dedent(
+    """
+    import json, sys
+    import backend.core.database as db_module
+    from backend.core.events import record_event_in_db
+
+    db_module.DB_PATH = sys.argv[1]
+    payload = json.dumps({"type": "bus_event", "topic": "demo.changed", "payload": {"n": 1}})
+    print(record_event_in_db("bus_event", payload, topic="demo.changed"))
+    print(record_event_in_db("telemetry", json.dumps({"type": "telemetry", "key": "cpu"}), target_user_id="u1", immediate=False))
+    """
+)
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+
+@pytest.fixture
+def journal(tmp_path):
+    db_module.DB_PATH = tmp_path / "fanout.db"
+    db_module.init_db()
+    return tmp_path / "fanout.db"
+
+
+@pytest.fixture
+def client_ws(monkeypatch):
+    ws = FakeWebSocket()
+    monkeypatch.setattr(ws_manager, "active_connections", {
+        ws: {"user_id": "u1", "topics": {"demo.changed"}, "protocol_format": "json"},
+    })
+    return ws
+
+
+def _publish_from_other_process(journal) -> list[int]:
+    out = subprocess.run(
+        [sys.executable, "-c", PUBLISHER, str(journal)],
+        cwd=ROOT, capture_output=True, text=True, timeout=60, check=True,
+    ).stdout
+    return [int(line) for line in out.split()[-2:]]
+
+
+def test_events_of_other_process_reach_local_clients(journal, client_ws):
+    """События другого процесса доставляются с исходным seq_id, свои события пропускаются."""
+    fanout = EventFanout(JournalTailTransport())
+    fanout.prime()
+
+    record_event_in_db("bus_event", json.dumps({"type": "bus_event", "topic": "demo.changed"}), topic="demo.changed")
+    immediate_seq, batched_seq = _publish_from_other_process(journal)
+
+    assert asyncio.run(fanout.poll()) == 2
+    assert client_ws.sent == [{"type": "bus_event", "topic": "demo.changed", "payload": {"n": 1}, "seq_id": immediate_seq}]
+    assert ws_manager._batch_queue[-1] == {
+        "data": {"type": "telemetry", "key": "cpu", "seq_id": batched_seq},
+        "target_user_id": "u1",
+        "topic": None,
+    }
+    ws_manager._batch_queue.clear()
+
+    stats = fanout.get_stats()
+    assert stats["transport"] == "journal"
+    assert stats["cursor"] == batched_seq
+    assert stats["delivered"] == 2
+    assert stats["latency"]["count"] == 2
+    assert asyncio.run(fanout.poll()) == 0
+
+
+def test_duplicate_seq_ids_are_dropped(journal):
+    """Повторно полученный seq_id не доставляется второй раз."""
+    transport = JournalTailTransport()
+    transport.prime()
+    _publish_from_other_process(journal)
+    messages = transport.fetch()
+
+    fanout = EventFanout(transport)
+    assert len(fanout.accept(messages)) == 2
+    assert fanout.accept(messages) == []
+    assert fanout.get_stats()["duplicates"] == 2
+
+
+def test_idle_worker_does_not_read_journal(journal, monkeypatch):
+    """Без локальных клиентов журнал не читается; курсор выставляется при подключении первого клиента."""
+    monkeypatch.setattr(ws_manager, "active_connections", {})
+    fanout = EventFanout(JournalTailTransport())
+    fanout.prime()
+    _publish_from_other_process(journal)
+
+    def no_queries():
+        raise AssertionError("idle worker must not query the journal")
+
+    with monkeypatch.context() as patched:
+        patched.setattr(db_module, "get_db_read_connection", no_queries)
+        assert asyncio.run(fanout.poll()) == 0
+    assert fanout.transport.cursor is None
+    assert fanout.get_stats()["last_poll_at"] <= time.time()
+
+    last_seq = _publish_from_other_process(journal)[-1]
+    ws = FakeWebSocket()
+    monkeypatch.setattr(ws_manager, "active_connections", {
+        ws: {"user_id": "u1", "topics": {"demo.changed"}, "protocol_format": "json"},
+    })
+    asyncio.run(fanout.resume())
+    assert fanout.transport.cursor == last_seq
+    assert asyncio.run(fanout.poll()) == 0
+    assert ws.sent == []
@@ -0,0 +1,54 @@
+"""tests/test_ip_allowlist.py — тесты скомпилированного белого списка IP-адресов."""
+import ipaddress
+import random
+
+from backend.core.auth import is_ip_whitelisted
+from backend.core.ip_allowlist import IPAllowList, get_ip_allowlist
+
+
+def test_cidr_single_range_and_ipv6():
+    """Сети CIDR, одиночные адреса, диапазоны и IPv6 разбираются в одно дерево."""
+    allowlist = IPAllowList("127.0.0.1, 192.168.1.0/24;10.0.0.5-10.0.0.20\n2001:db8::/32 fe80::1")
+    assert allowlist.contains("127.0.0.1")
+    assert not allowlist.contains("127.0.0.2")
+    assert allowlist.contains("192.168.1.255")
+    assert not allowlist.contains("192.168.2.1")
+    assert allowlist.contains("10.0.0.5") and allowlist.contains("10.0.0.20")
+    assert not allowlist.contains("10.0.0.4") and not allowlist.contains("10.0.0.21")
+    assert allowlist.contains("2001:db8:ffff::1")
+    assert allowlist.contains("fe80::1") and not allowlist.contains("fe80::2")
+    assert allowlist.contains("::ffff:192.168.1.7")
+    assert not allowlist.contains("not-an-ip")
+
+
+def test_invalid_entries_and_empty_list():
+    """Пустой список пропускает всех, список из одних ошибок — никого."""
+    assert is_ip_whitelisted("8.8.8.8", "")
+    assert is_ip_whitelisted("8.8.8.8", "  \n ")
+    broken = IPAllowList("garbage, 10.0.0.9-10.0.0.1")
+    assert broken.invalid == ["garbage", "10.0.0.9-10.0.0.1"]
+    assert not broken.contains("10.0.0.5")
+
+
+def test_compiled_once_per_setting_value():
+    """Список пересобирается только при изменении строки настройки."""
+    first = get_ip_allowlist("10.1.0.0/16")
+    assert get_ip_allowlist("10.1.0.0/16") is first
+    second = get_ip_allowlist("10.2.0.0/16")
+    assert second is not first
+    assert is_ip_whitelisted("10.2.3.4", "10.2.0.0/16")
+    assert not is_ip_whitelisted("10.1.3.4", "10.2.0.0/16")
+
+
+def test_matches_naive_scan_on_large_list():
+    """Результаты совпадают с линейным перебором сетей на большом списке."""
+    rng = random.Random(42)
+    networks = [
+        ipaddress.ip_network((rng.getrandbits(32), rng.randint(8, 32)), strict=False) for _ in range(2000)
+    ]
+    allowlist = IPAllowList(",".join(str(n) for n in networks))
+    for _ in range(2000):
+        ip = ipaddress.ip_address(rng.getrandbits(32))
+        assert allowlist.contains(str(ip)) == any(ip in n for n in networks)
+    for net in networks[:50]:
+        assert allowlist.contains(str(net.network_address))
@@ -0,0 +1,118 @@
+"""tests/test_migrations.py — тесты версионированных миграций схемы (PRAGMA user_version)."""
+import sqlite3
+
+import backend.core.database as db_module
+from backend.core.migrations import MIGRATIONS, SCHEMA_VERSION, get_schema_version, migrate
+from backend.scripts import migrate as migrate_cli
+
+
+def _user_version(db_file) -> int:
+    conn = sqlite3.connect(db_file)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_migrations_are_ordered_and_unique():
+    """Номера миграций строго возрастают без повторов."""
+    versions = [m.version for m in MIGRATIONS]
+    assert versions == sorted(set(versions))
+    assert SCHEMA_VERSION == versions[-1]
+
+
+def test_init_db_sets_schema_version(tmp_path, monkeypatch):
+    """Чистая БД мигрирует до SCHEMA_VERSION, создавая таблицы и root."""
+    db_file = tmp_path / "nms.db"
+    monkeypatch.setattr(db_module, "DB_PATH", db_file)
+
+    db_module.init_db()
+
+    assert _user_version(db_file) == SCHEMA_VERSION
+    conn = db_module.get_db_connection()
+    try:
+        assert conn.execute("SELECT id FROM users WHERE username = 'root'").fetchone()["id"] == "usr-root-01"
+    finally:
+        conn.close()
+
+
+def test_init_db_skips_current_schema(tmp_path, monkeypatch):
+    """При актуальной версии init_db() не переписывает привязки прав системных ролей."""
+    db_file = tmp_path / "nms.db"
+    monkeypatch.setattr(db_module, "DB_PATH", db_file)
+    db_module.init_db()
+
+    conn = db_module.get_db_connection()
+    try:
+        with conn:
+            conn.execute("DELETE FROM role_permissions WHERE role_id = '4'")
+    finally:
+        conn.close()
+
+    db_module.init_db()
+
+    conn = db_module.get_db_connection()
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM role_permissions WHERE role_id = '4'").fetchone()[0] == 0
+        assert migrate(conn) == []
+    finally:
+        conn.close()
+
+
+def test_legacy_database_is_upgraded(tmp_path, monkeypatch):
+    """БД без user_version (старая схема) догоняется недостающими колонками."""
+    db_file = tmp_path / "legacy.db"
+    conn = sqlite3.connect(db_file)
+    conn.execute("CREATE TABLE roles (id TEXT PRIMARY KEY, name TEXT UNIQUE NOT NULL, description TEXT, is_system BOOLEAN DEFAULT 0)")
+    conn.execute("CREATE TABLE users (id TEXT PRIMARY KEY, username TEXT UNIQUE NOT NULL, role_id TEXT NOT NULL)")
+    conn.execute("INSERT INTO users (id, username, role_id) VALUES ('u1', 'admin', '1')")
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(db_module, "DB_PATH", db_file)
+    db_module.init_db()
+
+    conn = db_module.get_db_connection()
+    try:
+        assert get_schema_version(conn) == SCHEMA_VERSION
+        cols = {c["name"] for c in conn.execute("PRAGMA table_info(users)").fetchall()}
+        assert {"token_valid_after", "mfa_enabled", "last_seen"} <= cols
+        assert conn.execute("SELECT username FROM users WHERE id = 'u1'").fetchone()["username"] == "root"
+    finally:
+        conn.close()
+
+
+def test_migrate_cli(tmp_path, monkeypatch, capsys):
+    """CLI --status сообщает о неприменённых миграциях, --migrate-only применяет их."""
+    db_file = tmp_path / "cli.db"
+    monkeypatch.setattr(db_module, "DB_PATH", db_file)
+
+    assert migrate_cli.main(["--status"]) == 1
+    assert "pending: 001_baseline_schema" in capsys.readouterr().out
+
+    assert migrate_cli.main(["--migrate-only"]) == 0
+    assert _user_version(db_file) == SCHEMA_VERSION
+    assert migrate_cli.main(["--status"]) == 0
+
+
+def test_missing_core_table_is_restored(tmp_path, monkeypatch):
+    """Потерянная таблица ядра восстанавливается повторным применением миграций."""
+    db_file = tmp_path / "nms.db"
+    monkeypatch.setattr(db_module, "DB_PATH", db_file)
+    db_module.init_db()
+
+    conn = db_module.get_db_connection()
+    try:
+        conn.execute("DROP TABLE notification_preferences")
+        conn.commit()
+    finally:
+        conn.close()
+
+    db_module.init_db()
+
+    conn = db_module.get_db_connection()
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM notification_preferences").fetchone()[0] == 0
+        assert get_schema_version(conn) == SCHEMA_VERSION
+    finally:
+        conn.close()
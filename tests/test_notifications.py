@@ -1,6 +1,8 @@
 """Тесты системы уведомлений ядра (notify.py, ModuleContext, API)."""
 from __future__ import annotations
 
+import asyncio
+import threading
 import time
 import pytest
 from pathlib import Path
@@ -186,6 +188,55 @@ def test_module_context_notify_and_cleanup():
     assert data_after["items"][0]["module_id"] == "core"
 
 
+def test_module_context_notify_async_runs_off_event_loop(monkeypatch):
+    """ctx.notify_async() пишет уведомление вне потока event loop и возвращает его данные."""
+    import backend.core.notify as notify_module
+
+    ctx = ModuleContext(module_id="mod_async", root=Path("/tmp"))
+    threads = []
+
+    def tracked_notify(*args, **kwargs):
+        threads.append(threading.get_ident())
+        return notify(*args, **kwargs)
+
+    monkeypatch.setattr(notify_module, "notify", tracked_notify)
+
+    async def scenario():
+        return threading.get_ident(), await ctx.notify_async("user-5", "Фоновая задача", severity="warning")
+
+    loop_thread, n = asyncio.run(scenario())
+    assert n["module_id"] == "mod_async" and n["severity"] == "warning" and n["id"] > 0
+    assert get_user_notifications("user-5")["total"] == 1
+    assert len(threads) == 1 and threads[0] != loop_thread
+
+
+def test_rolled_back_notification_leaves_unread_cache_consistent(monkeypatch):
+    """Откат записи уведомления не портит кэш непрочитанных, а писатель не ждёт с занятым соединением пула."""
+    import backend.core.database as db_module
+    import backend.core.notify as notify_module
+
+    notify("user-6", "Первое")
+    assert count_unread_notifications("user-6") == 1
+    in_use = []
+
+    class _RollingBackWriter:
+        def execute(self, fn):
+            in_use.append(db_module.get_db_pool().get_stats()["in_use"])
+            conn = get_db_connection()
+            try:
+                fn(conn)
+                conn.rollback()
+            finally:
+                conn.close()
+            raise RuntimeError("batch rolled back")
+
+    monkeypatch.setattr(notify_module, "db_writer", _RollingBackWriter())
+    with pytest.raises(RuntimeError):
+        notify("user-6", "Второе")
+    assert in_use == [0]
+    assert count_unread_notifications("user-6") == 1
+
+
 def test_prune_old_notifications():
     """Тест автоочистки по retention периоду."""
     conn = get_db_connection()
@@ -0,0 +1,194 @@
+"""tests/test_password_hasher.py — тесты пула хеширования паролей, backpressure и перехеширования."""
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import backend.core.database as db_module
+from backend.core.app import create_app
+from backend.core.password_hasher import KDFBusyError, PasswordHasherPool, password_hasher
+from backend.core.rate_limiter import rate_limiter
+
+
+@pytest.fixture
+def client(tmp_path):
+    db_module.DB_PATH = tmp_path / "kdf.db"
+    db_module.init_db()
+    rate_limiter.clear()
+    with TestClient(create_app()) as test_client:
+        yield test_client
+    rate_limiter.clear()
+
+
+def _root_hash():
+    conn = db_module.get_db_connection()
+    try:
+        return conn.execute("SELECT hashed_password FROM users WHERE username = 'root'").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_legacy_hash_format_verifies():
+    """Хеши старого формата salt$hex продолжают проверяться и не требуют пересчёта."""
+    legacy = db_module.hash_password("secret", "abcd").split("$", 2)[2]
+    assert legacy.startswith("abcd$")
+    assert db_module.verify_password("secret", legacy)
+    assert not db_module.verify_password("wrong", legacy)
+    assert not db_module.password_needs_rehash(legacy)
+
+
+def test_pool_keeps_event_loop_responsive_and_rejects_overflow():
+    """Работа KDF не блокирует event loop, при заполненной очереди вызов сразу отклоняется."""
+    pool = PasswordHasherPool(workers=1, queue_size=1)
+    release = threading.Event()
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while not release.is_set():
+                ticks += 1
+                await asyncio.sleep(0.005)
+
+        tick_task = asyncio.create_task(ticker())
+        jobs = [asyncio.create_task(pool.run(release.wait, 5)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(KDFBusyError):
+            await pool.run(time.sleep, 0)
+        assert pool.get_stats()["queued"] == 1
+        release.set()
+        await asyncio.gather(*jobs, tick_task)
+        return ticks
+
+    assert asyncio.run(scenario()) > 3
+    stats = pool.get_stats()
+    assert stats["completed"] == 2 and stats["rejected"] == 1
+    assert stats["queue_wait_max_ms"] >= 40
+    pool.shutdown()
+
+
+def test_login_rehashes_when_iterations_change(client, monkeypatch):
+    """После изменения числа итераций хеш root пересчитывается при входе."""
+    assert _root_hash().startswith("pbkdf2_sha256$100000$")
+    monkeypatch.setattr(db_module, "PASSWORD_HASH_ITERATIONS", 1000)
+
+    assert client.post("/api/auth/login", json={"username": "root", "password": "admin"}).status_code == 200
+    assert _root_hash().startswith("pbkdf2_sha256$1000$")
+    assert client.post("/api/auth/login", json={"username": "root", "password": "admin"}).status_code == 200
+
+
+def test_login_returns_429_when_queue_full(client, monkeypatch):
+    """Переполненная очередь KDF отдаёт 429, а не копит запросы."""
+    async def _busy(*args, **kwargs):
+        raise KDFBusyError("full")
+
+    monkeypatch.setattr(password_hasher, "verify", _busy)
+    res = client.post("/api/auth/login", json={"username": "root", "password": "admin"})
+    assert res.status_code == 429
+    assert res.json()["error"]["code"] == "PASSWORD_HASHING_BUSY"
+
+
+def test_login_holds_no_connection_while_hashing(client, monkeypatch):
+    """Во время проверки и перехеширования пароля вход не удерживает соединения пула и транзакцию записи."""
+    monkeypatch.setattr(db_module, "PASSWORD_HASH_ITERATIONS", 1000)
+    in_use = []
+    verify, rehash = password_hasher.verify, password_hasher.hash
+
+    def _busy_connections():
+        return db_module.get_db_pool().get_stats()["in_use"] + db_module.get_db_read_pool().get_stats()["in_use"]
+
+    async def _verify(*args, **kwargs):
+        in_use.append(_busy_connections())
+        return await verify(*args, **kwargs)
+
+    async def _hash(*args, **kwargs):
+        in_use.append(_busy_connections())
+        return await rehash(*args, **kwargs)
+
+    monkeypatch.setattr(password_hasher, "verify", _verify)
+    monkeypatch.setattr(password_hasher, "hash", _hash)
+    assert client.post("/api/auth/login", json={"username": "root", "password": "admin"}).status_code == 200
+    assert in_use == [0, 0]
+    assert _root_hash().startswith("pbkdf2_sha256$1000$")
+
+
+def test_parallel_wrong_passwords_do_not_lose_failed_attempts(client, monkeypatch):
+    """Параллельные неверные пароли учитываются все: счётчик растёт атомарно, блокировка срабатывает."""
+    async def _slow_reject(*args, **kwargs):
+        await asyncio.sleep(0.2)
+        return False
+
+    monkeypatch.setattr(password_hasher, "verify", _slow_reject)
+    codes = []
+
+    def attempt():
+        res = client.post("/api/auth/login", json={"username": "root", "password": "wrong"})
+        codes.append(res.json()["error"]["code"])
+
+    threads = [threading.Thread(target=attempt) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(codes) == sorted(
+        ["INVALID_CREDENTIALS"] * 4 + ["ACCOUNT_LOCKED_DURATION"] + ["ACCOUNT_TEMPORARILY_LOCKED"] * 3
+    )
+    conn = db_module.get_db_connection()
+    try:
+        row = conn.execute("SELECT failed_login_attempts, locked_until FROM users WHERE username = 'root'").fetchone()
+    finally:
+        conn.close()
+    assert row[0] == 8 and row[1] is not None
+    monkeypatch.undo()
+    res = client.post("/api/auth/login", json={"username": "root", "password": "admin"})
+    assert res.json()["error"]["code"] == "ACCOUNT_TEMPORARILY_LOCKED"
+
+
+def test_password_routes_hold_no_connection_while_hashing(client, monkeypatch):
+    """Создание пользователя, смена своего и чужого пароля не удерживают соединения пула во время KDF."""
+    token = client.post("/api/auth/login", json={"username": "root", "password": "admin"}).json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    in_use = []
+    verify, rehash = password_hasher.verify, password_hasher.hash
+
+    def _busy_connections():
+        return db_module.get_db_pool().get_stats()["in_use"] + db_module.get_db_read_pool().get_stats()["in_use"]
+
+    async def _verify(*args, **kwargs):
+        in_use.append(_busy_connections())
+        return await verify(*args, **kwargs)
+
+    async def _hash(*args, **kwargs):
+        in_use.append(_busy_connections())
+        return await rehash(*args, **kwargs)
+
+    monkeypatch.setattr(password_hasher, "verify", _verify)
+    monkeypatch.setattr(password_hasher, "hash", _hash)
+
+    res = client.post(
+        "/api/users",
+        json={"username": "kdf_user", "full_name": "KDF", "password": "Password123!", "role_id": "4", "is_active": True},
+        headers=headers,
+    )
+    assert res.status_code == 200, res.text
+    user_id = res.json()["id"]
+    duplicate = client.post(
+        "/api/users",
+        json={"username": "kdf_user", "full_name": "KDF", "password": "Password123!", "role_id": "4"},
+        headers=headers,
+    )
+    assert duplicate.json()["error"]["code"] == "USER_ALREADY_EXISTS"
+    assert client.put(f"/api/users/{user_id}", json={"password": "Password456!"}, headers=headers).status_code == 200
+    res = client.put(
+        "/api/users/me/password",
+        json={"old_password": "admin", "new_password": "Password789!"},
+        headers=headers,
+    )
+    assert res.status_code == 200, res.text
+    assert in_use == [0, 0, 0, 0]
+    assert client.post("/api/auth/login", json={"username": "kdf_user", "password": "Password456!"}).status_code == 200
+    assert client.post("/api/auth/login", json={"username": "root", "password": "Password789!"}).status_code == 200
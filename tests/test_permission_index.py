@@ -0,0 +1,86 @@
+"""tests/test_permission_index.py — тесты индекса разрешений и его пересборки при CRUD ролей и пользователей."""
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import backend.core.database as db_module
+from backend.core.app import create_app
+from backend.core.auth import CurrentUser, require_module_permission, require_permission, user_has_permission
+from backend.core.exceptions import PermissionDeniedError
+from backend.core.permission_index import permission_index
+from backend.core.rate_limiter import rate_limiter
+
+
+@pytest.fixture
+def client(tmp_path):
+    db_module.DB_PATH = tmp_path / "permissions.db"
+    db_module.init_db()
+    rate_limiter.clear()
+    with TestClient(create_app()) as test_client:
+        yield test_client
+    rate_limiter.clear()
+
+
+@pytest.fixture
+def admin_headers(client):
+    res = client.post("/api/auth/login", json={"username": "root", "password": "admin"})
+    return {"Authorization": f"Bearer {res.json()['token']}"}
+
+
+def _no_db(*args, **kwargs):
+    raise AssertionError("permission check must not hit the database")
+
+
+def test_checks_do_not_query_db(client, monkeypatch):
+    """После сборки индекса проверки прав не обращаются к SQLite."""
+    assert user_has_permission("usr-root-01", "anything.at.all")
+    monkeypatch.setattr(db_module, "get_db_read_connection", _no_db)
+    monkeypatch.setattr(db_module, "get_db_connection", _no_db)
+
+    for _ in range(100):
+        assert user_has_permission("usr-root-01", "users.manage")
+    assert permission_index.for_role("2").allows(frozenset(("system.admin",)))
+    assert not permission_index.for_role("4").allows(frozenset(("users.manage",)))
+    assert not permission_index.for_role("missing").items
+
+
+def test_role_and_user_crud_rebuild_index(client, admin_headers):
+    """Создание и правка роли, блокировка пользователя сразу отражаются в проверках прав."""
+    res = client.post("/api/roles", json={"name": "Auditor", "permission_ids": ["audit.view"]}, headers=admin_headers)
+    role_id = res.json()["id"]
+    res = client.post(
+        "/api/users",
+        json={"username": "auditor", "password": "Auditor-pass-1", "full_name": "Auditor", "role_id": role_id},
+        headers=admin_headers,
+    )
+    assert res.status_code == 200, res.text
+    user_id = res.json()["id"]
+
+    assert user_has_permission(user_id, "audit.view")
+    assert not user_has_permission(user_id, "audit.export")
+
+    client.put(f"/api/roles/{role_id}", json={"name": "Auditor", "permission_ids": ["audit.export"]}, headers=admin_headers)
+    assert user_has_permission(user_id, "audit.export")
+    assert not user_has_permission(user_id, "audit.view")
+
+    client.put(f"/api/users/{user_id}", json={"is_active": False}, headers=admin_headers)
+    assert not user_has_permission(user_id, "audit.export")
+
+
+def test_dependency_checkers_use_precomputed_sets(monkeypatch):
+    """require_permission учитывает system.all и управляющие права, require_module_permission — оба формата ключа."""
+    monkeypatch.setattr("backend.core.plugin.registry.is_module_enabled", lambda module_id: True)
+    viewer = CurrentUser(id="u", username="u", full_name="U", email=None, uid="U", role_id="x", role_name="X",
+                         permissions=("users.manage", "demo.view"))
+    root = CurrentUser(id="r", username="r", full_name="R", email=None, uid="R", role_id="1", role_name="S",
+                       permissions=("system.all",))
+
+    assert asyncio.run(require_permission("users.view")(current_user=viewer)) is viewer
+    assert asyncio.run(require_permission("roles.manage")(current_user=root)) is root
+    with pytest.raises(PermissionDeniedError):
+        asyncio.run(require_permission("roles.view")(current_user=viewer))
+
+    assert asyncio.run(require_module_permission("demo", "view")(current_user=viewer)) is viewer
+    with pytest.raises(PermissionDeniedError):
+        asyncio.run(require_module_permission("demo", "edit")(current_user=viewer))
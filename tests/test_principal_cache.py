@@ -0,0 +1,109 @@
+"""tests/test_principal_cache.py — тесты кэша CurrentUser по jti и его инвалидации через шину событий."""
+import asyncio
+import time
+
+import pytest
+from fastapi.security import HTTPAuthorizationCredentials
+from fastapi.testclient import TestClient
+
+import backend.core.auth as auth_module
+import backend.core.database as db_module
+from backend.core.app import create_app
+from backend.core.bus import event_bus
+from backend.core.principal_cache import PrincipalCache, invalidate_principals, principal_cache
+from backend.core.rate_limiter import rate_limiter
+
+
+@pytest.fixture
+def client(tmp_path):
+    db_module.DB_PATH = tmp_path / "principal.db"
+    db_module.init_db()
+    rate_limiter.clear()
+    with TestClient(create_app()) as test_client:
+        yield test_client
+    rate_limiter.clear()
+
+
+def _login(client, username="root", password="admin", user_agent="pytest"):
+    res = client.post("/api/auth/login", json={"username": username, "password": password}, headers={"User-Agent": user_agent})
+    assert res.status_code == 200, res.text
+    return {"Authorization": f"Bearer {res.json()['token']}", "User-Agent": user_agent}
+
+
+def _resolve(headers):
+    creds = HTTPAuthorizationCredentials(scheme="Bearer", credentials=headers["Authorization"].split(" ", 1)[1])
+    return asyncio.run(auth_module.get_current_user(request=None, auth=creds))
+
+
+def test_warm_session_skips_database(client, monkeypatch):
+    """Повторная проверка токена тёплой сессии не обращается к БД."""
+    headers = _login(client)
+    first = _resolve(headers)
+    hits = principal_cache.get_stats()["hits"]
+
+    def _no_db():
+        raise AssertionError("database must not be touched on a warm session")
+
+    monkeypatch.setattr(auth_module, "get_db_connection", _no_db)
+    user = _resolve(headers)
+    assert user is first
+    assert user.username == "root" and "system.all" in user.permissions
+    assert principal_cache.get_stats()["hits"] == hits + 1
+
+
+def test_revoked_session_rejected_immediately(client):
+    """Точечный отзыв сессии администратором сразу сбрасывает запись кэша."""
+    admin = _login(client, user_agent="admin-browser")
+    victim = _login(client, user_agent="victim-browser")
+    assert client.get("/api/auth/me", headers=victim).status_code == 200
+
+    sessions = client.get("/api/users/usr-root-01/sessions", headers=admin).json()
+    victim_session = next(s for s in sessions if s["user_agent"] == "victim-browser")
+    assert client.delete(f"/api/users/sessions/{victim_session['id']}", headers=admin).status_code == 200
+
+    assert client.get("/api/auth/me", headers=victim).status_code == 401
+    assert client.get("/api/auth/me", headers=admin).status_code == 200
+
+
+def test_role_edit_and_user_lock_invalidate(client):
+    """Правка прав роли и блокировка пользователя применяются к уже закэшированной сессии."""
+    admin = _login(client)
+    role_id = client.post(
+        "/api/roles", json={"name": "Auditors", "description": "", "permission_ids": ["users.view"]}, headers=admin
+    ).json()["id"]
+    user_id = client.post(
+        "/api/users",
+        json={"username": "cached_user", "password": "Password123!", "full_name": "Cached", "role_id": role_id},
+        headers=admin,
+    ).json()["id"]
+    user = _login(client, "cached_user", "Password123!", user_agent="user-browser")
+    assert client.get("/api/users", headers=user).status_code == 200
+
+    client.put(f"/api/roles/{role_id}", json={"name": "Auditors", "description": "", "permission_ids": []}, headers=admin)
+    assert client.get("/api/users", headers=user).status_code == 403
+
+    client.put(f"/api/users/{user_id}", json={"is_active": False}, headers=admin)
+    assert client.get("/api/auth/me", headers=user).status_code == 401
+
+
+def test_invalidation_race_and_bus_reset():
+    """Результат, прочитанный до инвалидации, не кэшируется; подписка восстанавливается после event_bus.clear()."""
+    cache = PrincipalCache(ttl=30)
+    user = auth_module.CurrentUser(
+        id="usr-1", username="u", full_name="U", email=None, uid="U-1", role_id="3", role_name="Operator"
+    )
+    generation = cache.generation
+    cache.invalidate(user_ids=["usr-1"])
+    assert cache.put("jti-1", user, 100, generation) is False
+    assert cache.put("jti-1", user, 100, cache.generation) is True
+    assert cache.get("jti-1", 101) is None
+
+    principal_cache.put("jti-x", user, 100, principal_cache.generation)
+    event_bus.clear()
+    invalidate_principals(role_ids=["3"])
+    assert principal_cache.get("jti-x", 100) is None
+
+    short = PrincipalCache(ttl=0.01)
+    short.put("jti-2", user, 1, short.generation)
+    time.sleep(0.02)
+    assert short.get("jti-2", 1) is None
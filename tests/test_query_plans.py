@@ -0,0 +1,179 @@
+"""tests/test_query_plans.py — регрессионные проверки EXPLAIN QUERY PLAN для горячих запросов ядра.
+
+Планы проверяются на крупной БД как без статистики (свежая установка), так и после ANALYZE
+(после первого прохода обслуживания), чтобы смена индексов или текста запроса не вернула полный скан.
+"""
+import random
+import sqlite3
+
+import pytest
+
+from backend.core.migrations import migrate
+
+USERS = 300
+SESSIONS = 10_000
+AUDIT_ROWS = 20_000
+EVENTS = 20_000
+
+_ONLINE = "(julianday('now') - julianday(replace(last_seen, 'T', ' '))) * 86400 <= ?"
+
+HOT_QUERIES = [
+    (
+        "session_is_revoked_by_jti",
+        "SELECT is_revoked FROM active_sessions WHERE token_jti = ?",
+        ("jti-42",),
+        "COVERING INDEX idx_active_sessions_jti",
+    ),
+    (
+        "refresh_session_by_jti",
+        "SELECT id FROM active_sessions WHERE token_jti = ? AND is_revoked = 0",
+        ("jti-42",),
+        "idx_active_sessions_jti",
+    ),
+    (
+        "list_users_online_status",
+        f"SELECT COUNT(*) as cnt FROM active_sessions WHERE user_id = ? AND is_revoked = 0 AND {_ONLINE}",
+        ("usr-7", 1800),
+        "COVERING INDEX idx_active_sessions_user_seen",
+    ),
+    (
+        "user_sessions",
+        f"""SELECT id, ip_address, user_agent, created_at, last_seen, is_revoked FROM active_sessions
+            WHERE user_id = ? AND is_revoked = 0 AND {_ONLINE} ORDER BY last_seen DESC""",
+        ("usr-7", 43200),
+        "idx_active_sessions_user_seen",
+    ),
+    (
+        "all_live_sessions",
+        """SELECT s.id, u.username, r.name FROM active_sessions s
+            JOIN users u ON s.user_id = u.id JOIN roles r ON u.role_id = r.id
+            WHERE s.is_revoked = 0 AND (julianday('now') - julianday(replace(s.last_seen, 'T', ' '))) * 86400 <= ?
+            ORDER BY s.last_seen DESC""",
+        (43200,),
+        "idx_active_sessions_live_seen",
+    ),
+    (
+        "login_by_username",
+        """SELECT u.id, u.hashed_password, r.name as role_name FROM users u
+            JOIN roles r ON u.role_id = r.id WHERE u.username = ?""",
+        ("user-7",),
+        "sqlite_autoindex_users_",
+    ),
+    (
+        "last_superuser_check",
+        "SELECT COUNT(*) as cnt FROM users WHERE role_id = '1' AND is_active = 1 AND id != ?",
+        ("usr-7",),
+        "idx_users_role_active",
+    ),
+    (
+        "audit_filter_auth",
+        "SELECT COUNT(*) as cnt FROM audit_logs WHERE action LIKE 'auth.%'",
+        (),
+        "idx_audit_logs_action",
+    ),
+    (
+        "audit_filter_user",
+        "SELECT COUNT(*) as cnt FROM audit_logs WHERE (action LIKE 'user.%' OR action LIKE 'role.%')",
+        (),
+        "idx_audit_logs_action",
+    ),
+    (
+        "replay_bounds",
+        "SELECT (SELECT MIN(seq_id) FROM system_events_journal) as min_seq, "
+        "(SELECT MAX(seq_id) FROM system_events_journal) as max_seq",
+        (),
+        "SEARCH system_events_journal",
+    ),
+    (
+        "replay_with_topics",
+        """SELECT seq_id, event_type, payload, topic, created_at FROM system_events_journal
+            WHERE seq_id > ? AND (target_user_id IS NULL OR target_user_id = ?)
+              AND (topic IS NULL OR topic IN (?, ?)) ORDER BY seq_id ASC LIMIT ?""",
+        (EVENTS - 100, "usr-7", "core.users", "mod.x", 500),
+        "idx_events_target_",
+    ),
+    (
+        "replay_all_topics",
+        """SELECT seq_id, event_type, payload, topic, created_at FROM system_events_journal
+            WHERE seq_id > ? AND (target_user_id IS NULL OR target_user_id = ?) ORDER BY seq_id ASC LIMIT ?""",
+        (EVENTS - 100, "usr-7", 500),
+        "idx_events_target_seq",
+    ),
+    (
+        "prune_events_by_age",
+        "DELETE FROM system_events_journal WHERE created_at < datetime('now', ?)",
+        ("-7 days",),
+        "idx_events_created",
+    ),
+    (
+        "prune_events_by_count",
+        """DELETE FROM system_events_journal
+            WHERE seq_id <= (SELECT seq_id FROM system_events_journal ORDER BY seq_id DESC LIMIT 1 OFFSET ?)""",
+        (5000,),
+        "INTEGER PRIMARY KEY",
+    ),
+]
+
+
+def _populate(conn: sqlite3.Connection) -> None:
+    rnd = random.Random(42)
+    users = [f"usr-{i}" for i in range(USERS)]
+    conn.executemany(
+        "INSERT INTO users (id, username, uid, role_id, is_active) VALUES (?, ?, ?, ?, ?)",
+        [(u, f"user-{i}", f"uid-{i}", rnd.choice("1234"), rnd.random() < 0.9) for i, u in enumerate(users)],
+    )
+    conn.executemany(
+        "INSERT INTO active_sessions (id, user_id, token_jti, is_revoked, last_seen) VALUES (?, ?, ?, ?, datetime('now', ?))",
+        [
+            (f"sess-{i}", rnd.choice(users), f"jti-{i}", int(rnd.random() < 0.8), f"-{rnd.randint(0, 200_000)} seconds")
+            for i in range(SESSIONS)
+        ],
+    )
+    actions = ["auth.login", "auth.logout", "auth.login_failed", "user.update", "role.create", "system.backup"]
+    conn.executemany(
+        "INSERT INTO audit_logs (username, action, resource) VALUES (?, ?, ?)",
+        [("root", rnd.choice(actions), "res") for _ in range(AUDIT_ROWS)],
+    )
+    topics = [None, "telemetry.cpu", "core.users", "mod.x"]
+    conn.executemany(
+        "INSERT INTO system_events_journal (event_type, payload, target_user_id, topic) VALUES (?, '{}', ?, ?)",
+        [
+            (rnd.choice(["telemetry", "notify", "update"]), rnd.choice(users + [None] * 30), rnd.choice(topics))
+            for _ in range(EVENTS)
+        ],
+    )
+    conn.commit()
+
+
+@pytest.fixture(scope="module", params=[False, True], ids=["no_stats", "analyzed"])
+def fixture_db(request, tmp_path_factory):
+    conn = sqlite3.connect(tmp_path_factory.mktemp("plans") / "plans.db")
+    conn.row_factory = sqlite3.Row
+    migrate(conn)
+    _populate(conn)
+    if request.param:
+        conn.execute("ANALYZE")
+        conn.commit()
+    yield conn
+    conn.close()
+
+
+def _plan(conn: sqlite3.Connection, sql: str, params: tuple) -> list[str]:
+    return [row["detail"] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()]
+
+
+@pytest.mark.parametrize("name,sql,params,expected", HOT_QUERIES, ids=[q[0] for q in HOT_QUERIES])
+def test_hot_query_uses_index(fixture_db, name, sql, params, expected):
+    """Горячий запрос использует ожидаемый индекс и не сканирует целевую таблицу целиком."""
+    plan = _plan(fixture_db, sql, params)
+    assert any(expected in line for line in plan), f"{name}: {plan}"
+    full_scans = [line for line in plan if line.startswith("SCAN ") and " USING " not in line and line != "SCAN CONSTANT ROW"]
+    # Подзапрос «N-я запись с конца» читает только N строк с конца rowid
+    if name != "prune_events_by_count":
+        assert not full_scans, f"{name}: {plan}"
+
+
+def test_redundant_seq_index_dropped(fixture_db):
+    """Отдельный индекс по seq_id (дубликат rowid) удалён миграцией."""
+    names = {row[0] for row in fixture_db.execute("SELECT name FROM sqlite_master WHERE type = 'index'").fetchall()}
+    assert "idx_events_seq_id" not in names
@@ -0,0 +1,120 @@
+"""tests/test_rate_limiter.py — тесты алгоритмов, хранилищ и декоратора ограничения частоты запросов."""
+import asyncio
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+import backend.core.database as db_module
+from backend.core.app import create_app
+from backend.core.rate_limiter import MemoryRateLimitBackend, RateLimiter, SQLiteRateLimitBackend, rate_limiter
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def client(tmp_path):
+    db_module.DB_PATH = tmp_path / "ratelimit.db"
+    db_module.init_db()
+    rate_limiter.clear()
+    with TestClient(create_app()) as test_client:
+        yield test_client
+    rate_limiter.clear()
+
+
+def test_sliding_window_weights_previous_window():
+    """Скользящее окно учитывает долю предыдущего окна и постепенно освобождает лимит."""
+    backend = MemoryRateLimitBackend()
+    assert [backend.hit("k", "sliding_window", 4, 60, 60 + i) for i in range(5)] == [False] * 4 + [True]
+    # В середине следующего окна от прошлых 4 запросов учитывается половина
+    assert backend.hit("k", "sliding_window", 4, 60, 150) is False
+    assert backend.hit("k", "sliding_window", 4, 60, 150) is False
+    assert backend.hit("k", "sliding_window", 4, 60, 150) is True
+    # Через два окна состояние забыто
+    assert backend.hit("k", "sliding_window", 4, 60, 300) is False
+
+
+def test_token_bucket_refills():
+    """Корзина токенов пополняется пропорционально прошедшему времени."""
+    backend = MemoryRateLimitBackend()
+    assert [backend.hit("k", "token_bucket", 2, 10, 100) for _ in range(3)] == [False, False, True]
+    assert backend.hit("k", "token_bucket", 2, 10, 105) is False
+    assert backend.hit("k", "token_bucket", 2, 10, 105) is True
+
+
+def test_idle_keys_are_collected_and_memory_is_bounded():
+    """Неактивные ключи удаляются GC, число ключей не превышает max_keys."""
+    backend = MemoryRateLimitBackend(max_keys=100)
+    limiter = RateLimiter(backend)
+    for i in range(500):
+        limiter.is_rate_limited(f"ip-{i}", max_requests=5, window_seconds=1)
+    remaining = backend.key_count()
+    assert 0 < remaining <= 100
+    assert backend.gc() == 0
+    assert backend.gc(now=10**12) == remaining
+    assert backend.key_count() == 0
+    assert limiter.get_stats()["checks"] == 500
+
+
+def test_full_table_evicts_oldest_key_without_gc_scan(monkeypatch):
+    """При заполненной таблице вытесняется самый старый ключ, полный GC не запускается."""
+    backend = MemoryRateLimitBackend(max_keys=3)
+    monkeypatch.setattr(backend, "_gc_locked", lambda now: pytest.fail("GC must not run on insert"))
+    for key in ("a", "b", "c"):
+        backend.hit(key, "sliding_window", 5, 60, 1000.0)
+    backend.hit("a", "sliding_window", 5, 60, 1001.0)
+    backend.hit("d", "sliding_window", 5, 60, 1002.0)
+    assert list(backend._entries) == ["b", "c", "d"]
+
+
+def test_sqlite_backend_shared_between_processes(tmp_path):
+    """Два процесса с общим SQLite-хранилищем соблюдают один лимит."""
+    db_file = tmp_path / "shared_limits.db"
+    script = textwrap.dedent(
+        f"""
+        from backend.core.rate_limiter import RateLimiter, SQLiteRateLimitBackend
+        limiter = RateLimiter(SQLiteRateLimitBackend({str(db_file)!r}))
+        print(sum(not limiter.is_rate_limited("login:1.2.3.4:root", 10, 60) for _ in range(10)))
+        """
+    )
+    procs = [
+        subprocess.Popen([sys.executable, "-c", script], cwd=ROOT, stdout=subprocess.PIPE, text=True)
+        for _ in range(2)
+    ]
+    allowed = [int(p.communicate(timeout=60)[0].strip()) for p in procs]
+    assert sum(allowed) == 10
+
+    backend = SQLiteRateLimitBackend(db_file)
+    assert backend.key_count() == 1
+    assert backend.gc(now=10**12) == 1
+
+
+def test_login_route_decorator(client):
+    """Декоратор маршрута входа ограничивает попытки по IP и имени пользователя."""
+    for _ in range(10):
+        client.post("/api/auth/login", json={"username": "ghost", "password": "x"})
+    res = client.post("/api/auth/login", json={"username": "ghost", "password": "x"})
+    assert res.status_code == 429
+    assert res.json()["error"]["code"] == "RATE_LIMIT_EXCEEDED"
+    # Другой пользователь с того же IP не затронут
+    assert client.post("/api/auth/login", json={"username": "root", "password": "admin"}).status_code == 200
+
+
+def test_unavailable_shared_backend_falls_back_to_memory(tmp_path):
+    """При ошибке SQLite-хранилища лимит продолжает действовать по памяти процесса."""
+    backend = SQLiteRateLimitBackend(tmp_path / "limits.db")
+    limiter = RateLimiter(backend)
+    assert limiter.is_rate_limited("login:ip", 2, 60) is False
+    # Каталог вместо файла БД: любое обращение к хранилищу завершается sqlite3.Error
+    backend._path = tmp_path
+    backend._local.conn = None
+
+    async def scenario():
+        return [await limiter.is_rate_limited_async("login:ip", 2, 60) for _ in range(3)]
+
+    assert asyncio.run(scenario()) == [False, False, True]
+    stats = limiter.get_stats()
+    assert stats["fallbacks"] == 3 and stats["limited"] == 1 and stats["keys"] is None
@@ -0,0 +1,116 @@
+"""tests/test_session_revocation.py — тесты реестра отозванных сессий и закрытия WebSocket при отзыве."""
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import backend.core.database as db_module
+from backend.core.app import create_app
+from backend.core.auth import is_session_revoked
+from backend.core.rate_limiter import rate_limiter
+from backend.core.revocation import RevocationRegistry, revocation_registry, sync_revocations
+
+
+@pytest.fixture
+def client(tmp_path):
+    db_module.DB_PATH = tmp_path / "revocation.db"
+    db_module.init_db()
+    rate_limiter.clear()
+    with TestClient(create_app()) as test_client:
+        yield test_client
+    rate_limiter.clear()
+
+
+def _login(client):
+    res = client.post("/api/auth/login", json={"username": "root", "password": "admin"})
+    return res.json()["token"]
+
+
+def _session_jtis():
+    conn = db_module.get_db_connection()
+    try:
+        return [r[0] for r in conn.execute("SELECT token_jti FROM active_sessions ORDER BY created_at").fetchall()]
+    finally:
+        conn.close()
+
+
+def test_revoked_check_does_not_query_db(client, monkeypatch):
+    """После загрузки реестра проверка отзыва не обращается к БД."""
+    token = _login(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    jti = _session_jtis()[0]
+    assert not is_session_revoked(jti)
+
+    def _no_db(*args, **kwargs):
+        raise AssertionError("revocation check must not hit the database")
+
+    with monkeypatch.context() as patched:
+        patched.setattr(db_module, "get_db_read_connection", _no_db)
+        for _ in range(100):
+            assert not is_session_revoked(jti)
+
+    assert client.post("/api/auth/logout", headers=headers).status_code == 200
+    with monkeypatch.context() as patched:
+        patched.setattr(db_module, "get_db_read_connection", _no_db)
+        assert is_session_revoked(jti)
+    res = client.get("/api/auth/me", headers=headers)
+    assert res.status_code == 401
+
+
+def test_open_websocket_closed_on_admin_revoke(client):
+    """Открытый WebSocket отозванной сессии закрывается сразу, без ожидания heartbeat."""
+    admin_headers = {"Authorization": f"Bearer {_login(client)}"}
+    ws_token = client.post(
+        "/api/auth/login",
+        json={"username": "root", "password": "admin"},
+        headers={"User-Agent": "ws-client"},
+    ).json()["token"]
+    ws_jti = _session_jtis()[-1]
+
+    with client.websocket_connect(f"/api/events/ws?token={ws_token}") as websocket:
+        websocket.send_text("ping")
+        assert websocket.receive_json()["type"] == "pong"
+
+        sessions = client.get("/api/users/usr-root-01/sessions", headers=admin_headers).json()
+        target = next(s for s in sessions if s["user_agent"] == "ws-client")
+        res = client.delete(f"/api/users/sessions/{target['id']}", headers=admin_headers)
+        assert res.status_code == 200
+
+        message = websocket.receive()
+        while message["type"] == "websocket.send":
+            message = websocket.receive()
+        assert message["type"] == "websocket.close"
+        assert message["code"] == 1008
+
+    assert is_session_revoked(ws_jti)
+
+
+def test_sync_picks_up_direct_revocation(client):
+    """Периодическая синхронизация подхватывает отзыв, сделанный в обход API."""
+    _login(client)
+    jti = _session_jtis()[0]
+    assert not is_session_revoked(jti)
+
+    conn = db_module.get_db_connection()
+    try:
+        conn.execute("UPDATE active_sessions SET is_revoked = 1 WHERE token_jti = ?", (jti,))
+        conn.commit()
+    finally:
+        conn.close()
+
+    assert not is_session_revoked(jti)
+    assert sync_revocations() == 1
+    assert is_session_revoked(jti)
+    assert revocation_registry.get_stats()["revoked"] >= 1
+
+
+def test_entries_expire_after_retention():
+    """Записи реестра живут не дольше срока хранения."""
+    registry = RevocationRegistry(retention=0.05)
+    registry._check_db_locked()
+    registry._loaded = True
+    assert registry.add(["jti-1", "jti-1", "jti-2"]) == ["jti-1", "jti-2"]
+    assert registry.is_revoked("jti-1")
+    time.sleep(0.1)
+    assert not registry.is_revoked("jti-1")
+    assert not registry.is_revoked(None)
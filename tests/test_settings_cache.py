@@ -0,0 +1,99 @@
+"""tests/test_settings_cache.py — тесты кэша system_settings и get_security_settings()."""
+import sqlite3
+
+import pytest
+
+import backend.core.database as db_module
+from backend.core.database import (
+    get_db_pool_stats,
+    get_settings_version,
+    get_system_setting,
+    get_system_settings,
+    init_db,
+    set_system_setting,
+    settings_cache,
+)
+from backend.core.plugin.registry import get_security_settings
+
+
+@pytest.fixture
+def settings_db(tmp_path, monkeypatch):
+    db_file = tmp_path / "settings.db"
+    monkeypatch.setattr(db_module, "DB_PATH", db_file)
+    monkeypatch.setattr(settings_cache, "check_interval", 60.0)
+    init_db()
+    settings_cache.invalidate()
+    return db_file
+
+
+def _checkouts() -> int:
+    return get_db_pool_stats().get("checkouts", 0)
+
+
+def test_bulk_get_uses_single_query_and_cache(settings_db):
+    """Пакетное чтение: один запрос на промах, повторное чтение без обращения к БД."""
+    set_system_setting("a", 1)
+    settings_cache.invalidate()
+
+    before = _checkouts()
+    values = get_system_settings(["a", "b"], {"b": "default"})
+    assert values == {"a": 1, "b": "default"}
+    assert _checkouts() - before == 1
+
+    before = _checkouts()
+    assert get_system_settings(["a", "b"], {"b": "other"}) == {"a": 1, "b": "other"}
+    assert get_system_setting("a") == 1
+    assert _checkouts() == before
+
+
+def test_set_is_write_through_and_bumps_version(settings_db):
+    """set_system_setting() сразу обновляет кэш и версию без повторного чтения."""
+    set_system_setting("key", {"x": 1})
+    version = get_settings_version()
+
+    set_system_setting("key", {"x": 2})
+    assert get_settings_version() > version
+
+    before = _checkouts()
+    assert get_system_setting("key") == {"x": 2}
+    assert _checkouts() == before
+
+
+def test_cached_containers_are_copied(settings_db):
+    """Изменение возвращённого словаря не портит закэшированное значение."""
+    set_system_setting("module_x_settings", {"enabled": True})
+    value = get_system_setting("module_x_settings")
+    value["enabled"] = False
+    assert get_system_setting("module_x_settings") == {"enabled": True}
+
+
+def test_cross_process_change_is_detected(settings_db, monkeypatch):
+    """Изменение из другого процесса видно после сверки счётчика версии."""
+    set_system_setting("shared", "old")
+    assert get_system_setting("shared") == "old"
+
+    # Другой воркер пишет напрямую в ту же БД
+    other = sqlite3.connect(settings_db)
+    other.execute("UPDATE system_settings SET value = 'new' WHERE key = 'shared'")
+    other.commit()
+    other.close()
+
+    assert get_system_setting("shared") == "old"  # в пределах check_interval
+    monkeypatch.setattr(settings_cache, "check_interval", 0.0)
+    assert get_system_setting("shared") == "new"
+
+
+def test_security_settings_single_checkout(settings_db):
+    """get_security_settings() читает все 12 ключей одним запросом, затем из кэша."""
+    set_system_setting("sec_max_login_attempts", 7)
+    settings_cache.invalidate()
+
+    before = _checkouts()
+    sec = get_security_settings()
+    assert sec["max_login_attempts"] == 7
+    assert sec["session_ttl_hours"] == 12
+    assert _checkouts() - before == 1
+
+    before = _checkouts()
+    get_security_settings()
+    assert _checkouts() == before
@@ -0,0 +1,141 @@
+"""tests/test_shared_state.py — тесты общего состояния нескольких воркеров (NMS_SHARED_STATE=sqlite)."""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import textwrap
+import threading
+from pathlib import Path
+
+from backend.core.config import get_settings
+from backend.core.principal_cache import INVALIDATION_TOPIC
+from backend.core.shared_state import SignalRelay, SQLiteSharedState
+from backend.core.ticket_store import SharedTicketStore
+
+ROOT = Path(__file__).resolve().parent.parent
+
+WORKER = textwrap.dedent(
+    """
+    import json, sys, time
+    from types import SimpleNamespace
+
+    from backend.core.auth import consume_ws_ticket
+    from backend.core.principal_cache import INVALIDATION_TOPIC, invalidate_principals, principal_cache
+    from backend.core.rate_limiter import rate_limiter
+    from backend.core.shared_state import signal_relay
+
+    name, other, ticket, cursor = sys.argv[1], sys.argv[2], sys.argv[3], int(sys.argv[4])
+    signal_relay.cursor = cursor
+    principal_cache.setup()
+    principal_cache.put("jti-" + other, SimpleNamespace(id="user-" + other, role_id="4"), 0, principal_cache.generation)
+
+    data = consume_ws_ticket(ticket)
+    allowed = sum(not rate_limiter.is_rate_limited("login:10.0.0.1:root", 10, 60) for _ in range(10))
+    invalidate_principals(user_ids=["user-" + name])
+
+    seen = []
+    deadline = time.time() + 20
+    while time.time() < deadline and not seen:
+        signals = signal_relay.fetch()
+        signal_relay.deliver(signals)
+        seen = [p for t, p in signals if t == INVALIDATION_TOPIC]
+        time.sleep(0.05)
+
+    print(json.dumps({
+        "ticket": data,
+        "allowed": allowed,
+        "seen": seen,
+        "evicted": principal_cache.get("jti-" + other, 0) is None,
+    }))
+    """
+)
+
+
+def test_signals_skip_own_origin(tmp_path):
+    """Воркер получает сигналы других процессов, но не свои."""
+    path = tmp_path / "shared.db"
+    first, second = SQLiteSharedState(path), SQLiteSharedState(path)
+    relay_first, relay_second = SignalRelay(first), SignalRelay(second)
+    relay_first.prime()
+    relay_second.prime()
+
+    first.publish_signal(INVALIDATION_TOPIC, {"user_ids": ["u1"]})
+    assert relay_first.fetch() == []
+    assert relay_second.fetch() == [(INVALIDATION_TOPIC, {"user_ids": ["u1"]})]
+    assert relay_second.fetch() == []
+
+
+def test_shared_ticket_store_encrypts_and_consumes_once(tmp_path):
+    """Общие билеты хранятся зашифрованными и гасятся один раз."""
+    state = SQLiteSharedState(tmp_path / "shared.db")
+    store = SharedTicketStore("mfa", 300, state)
+    ticket = store.issue("mfat_", {"mfa_secret": "JBSWY3DPEHPK3PXP"})
+    raw = state._connection().execute("SELECT value FROM shared_tickets").fetchone()[0]
+    assert "JBSWY3DPEHPK3PXP" not in raw
+    assert store.get(ticket)["mfa_secret"] == "JBSWY3DPEHPK3PXP"
+    assert store.consume(ticket)["mfa_secret"] == "JBSWY3DPEHPK3PXP"
+    assert store.consume(ticket) is None
+
+
+def test_event_loop_paths_use_shared_file_off_loop(tmp_path, monkeypatch):
+    """Билеты и сигналы, запрошенные из event loop, обращаются к общему файлу вне потока loop."""
+    import backend.core.shared_state as shared_module
+
+    state = SQLiteSharedState(tmp_path / "shared.db")
+    threads = []
+    connect = state._connection
+
+    def tracked_connection():
+        threads.append(threading.get_ident())
+        return connect()
+
+    monkeypatch.setattr(state, "_connection", tracked_connection)
+    monkeypatch.setattr(shared_module, "shared_state", state)
+    store = SharedTicketStore("mfa", 300, state)
+
+    async def scenario():
+        ticket = await store.issue_async("mfat_", {"n": 1})
+        assert await store.get_async(ticket) == {"n": 1}
+        assert await store.consume_async(ticket) == {"n": 1}
+        assert await store.consume_async(ticket) is None
+        shared_module.broadcast_signal(INVALIDATION_TOPIC, {"user_ids": ["u1"]})
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(scenario())
+    shared_module._get_signal_executor().submit(lambda: None).result()
+    assert threads and loop_thread not in threads
+    relay = SignalRelay(SQLiteSharedState(tmp_path / "shared.db"))
+    relay.cursor = 0
+    assert relay.fetch() == [(INVALIDATION_TOPIC, {"user_ids": ["u1"]})]
+
+
+def test_two_workers_share_tickets_limits_and_invalidation(tmp_path):
+    """Два процесса-воркера: билет гасится один раз, лимит общий, инвалидации доходят друг до друга."""
+    shared_db = tmp_path / "shared_state.db"
+    state = SQLiteSharedState(shared_db)
+    ticket = SharedTicketStore("ws", 30, state).issue("wst_", {"user_id": "usr-root-01", "jti": "jti-1"})
+    cursor = state.last_signal_seq()
+
+    env = dict(
+        os.environ,
+        NMS_SHARED_STATE="sqlite",
+        NMS_SHARED_STATE_DB=str(shared_db),
+        NMS_RATE_LIMIT_DB=str(tmp_path / "rate_limits.db"),
+        NMS_SECRET_KEY=get_settings().secret_key,
+    )
+    env.pop("NMS_RATE_LIMIT_BACKEND", None)
+    workers = [
+        subprocess.Popen(
+            [sys.executable, "-c", WORKER, name, other, ticket, str(cursor)],
+            cwd=ROOT, env=env, stdout=subprocess.PIPE, text=True,
+        )
+        for name, other in (("a", "b"), ("b", "a"))
+    ]
+    results = [json.loads(w.communicate(timeout=90)[0].strip().splitlines()[-1]) for w in workers]
+
+    assert sum(r["ticket"] is not None for r in results) == 1
+    assert sum(r["allowed"] for r in results) == 10
+    assert results[0]["seen"] == [{"jtis": [], "user_ids": ["user-b"], "role_ids": [], "all": False}]
+    assert results[1]["seen"] == [{"jtis": [], "user_ids": ["user-a"], "role_ids": [], "all": False}]
+    assert all(r["evicted"] for r in results)
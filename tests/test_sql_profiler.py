@@ -0,0 +1,106 @@
+"""tests/test_sql_profiler.py — тесты профилировщика SQL и журнала медленных запросов."""
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+import backend.core.database as db_module
+from backend.core.app import create_app
+from backend.core.rate_limiter import rate_limiter
+from backend.core.sql_profiler import ProfiledConnection, SQLProfiler, normalize_sql, sql_profiler
+
+
+def test_normalize_sql():
+    """Литералы, параметры и списки IN сводятся к одному шаблону."""
+    assert normalize_sql("SELECT * FROM users WHERE id = 'abc'  AND n > 10") == "SELECT * FROM users WHERE id = ? AND n > ?"
+    assert normalize_sql("SELECT 1 FROM t WHERE k IN (?, ?, ?) -- x\n") == normalize_sql("SELECT 1 FROM t WHERE k IN (:a,:b)")
+    assert normalize_sql("SAVEPOINT nms_w12") == "SAVEPOINT ?"
+    assert normalize_sql("SELECT col2 FROM t2") == "SELECT col2 FROM t2"
+
+
+def test_histogram_and_percentiles():
+    """Замеры попадают в корзины гистограммы, перцентили оцениваются по ним."""
+    profiler = SQLProfiler(slow_ms=50)
+    for _ in range(98):
+        profiler.record("SELECT 1", 0.2)
+    profiler.record("SELECT 1", 70.0)
+    profiler.record("SELECT 2", 1.0, failed=True)
+
+    top = profiler.get_top(sort="total")
+    assert top[0]["sql"] == "SELECT ?"
+    assert top[0]["count"] == 100
+    assert top[0]["p50_ms"] == 0.25
+    assert top[0]["max_ms"] == 70.0
+    assert top[0]["errors"] == 1
+    assert sum(top[0]["histogram"].values()) == 100
+    assert [q["duration_ms"] for q in profiler.get_slow_log()] == [70.0]
+    with pytest.raises(ValueError):
+        profiler.get_top(sort="bogus")
+
+
+def test_statement_limit_overflows_into_bucket():
+    """При превышении лимита уникальных запросов остальные копятся в общей записи."""
+    profiler = SQLProfiler(max_statements=2)
+    for table in ("a", "b", "c", "d"):
+        profiler.record(f"SELECT * FROM {table}", 1.0)
+    assert {s["sql"] for s in profiler.get_top()} == {"SELECT * FROM a", "SELECT * FROM b", "<other statements>"}
+
+
+def test_profiled_connection_records_and_explains(monkeypatch):
+    """ProfiledConnection учитывает запросы, EXPLAIN QUERY PLAN строится по образцу с NULL вместо параметров."""
+    profiler = SQLProfiler()
+    monkeypatch.setattr("backend.core.sql_profiler.sql_profiler", profiler)
+    conn = sqlite3.connect(":memory:", factory=ProfiledConnection)
+    conn.execute("CREATE TABLE t (a INTEGER, b TEXT)")
+    conn.execute("CREATE INDEX idx_t_a ON t(a)")
+    conn.executemany("INSERT INTO t VALUES (?, ?)", [(i, str(i)) for i in range(10)])
+    conn.cursor().execute("SELECT b FROM t WHERE a = ?", (3,)).fetchall()
+    conn.execute("SELECT b FROM t WHERE a = ?", (4,)).fetchall()
+
+    stats = {s["sql"]: s for s in profiler.get_top(limit=50)}
+    assert stats["SELECT b FROM t WHERE a = ?"]["count"] == 2
+    assert stats["INSERT INTO t VALUES (?...)"]["count"] == 1
+
+    plan = profiler.explain("SELECT b FROM t WHERE a = ?", conn)
+    assert any("idx_t_a" in line for line in plan)
+    # Служебный EXPLAIN не попадает в статистику
+    assert not any(s["sql"].startswith("EXPLAIN") for s in profiler.get_top(limit=50))
+    conn.close()
+
+
+def test_sample_keeps_no_parameter_values():
+    """Значения параметров не хранятся в профилировщике, EXPLAIN работает по форме параметров."""
+    profiler = SQLProfiler()
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE users (id TEXT PRIMARY KEY, hashed_password TEXT)")
+    profiler.record("UPDATE users SET hashed_password = ? WHERE id = ?", 5.0, ("pbkdf2_sha256$secret-hash", "u1"))
+    profiler.record("SELECT id FROM users WHERE id = :id", 5.0, {"id": "mfa-secret"})
+
+    stored = repr([(st.sample_sql, st.sample_shape) for st in profiler._stats.values()])
+    assert "secret" not in stored
+    assert profiler.explain("UPDATE users SET hashed_password = ? WHERE id = ?", conn)[0].startswith("SEARCH users")
+    assert profiler.explain("SELECT id FROM users WHERE id = ?", conn)[0].startswith("SEARCH users")
+    conn.close()
+
+
+def test_sql_profile_endpoint(tmp_path):
+    """Админ-эндпоинт отдаёт худшие запросы с планами выполнения."""
+    db_module.DB_PATH = tmp_path / "profile.db"
+    db_module.init_db()
+    rate_limiter.clear()
+    sql_profiler.reset()
+
+    with TestClient(create_app()) as client:
+        res = client.post("/api/auth/login", json={"username": "root", "password": "admin"})
+        headers = {"Authorization": f"Bearer {res.json()['token']}"}
+        client.get("/api/users", headers=headers)
+
+        res = client.get("/api/system/sql-profile", params={"sort": "count", "limit": 50}, headers=headers)
+        assert res.status_code == 200, res.text
+        body = res.json()
+        assert body["profiler"]["executions"] > 0
+        users_query = next(s for s in body["statements"] if s["sql"].startswith("SELECT COUNT(*) as cnt FROM users"))
+        assert users_query["query_plan"]
+
+        assert client.get("/api/system/sql-profile", params={"sort": "bogus"}, headers=headers).status_code == 422
+        assert client.post("/api/system/sql-profile/reset", headers=headers).json() == {"ok": True}
@@ -0,0 +1,42 @@
+"""tests/test_system_runtime.py — тесты публичного health-check и закрытой статистики процесса."""
+import pytest
+from fastapi.testclient import TestClient
+
+import backend.core.database as db_module
+from backend.core.app import create_app
+from backend.core.rate_limiter import rate_limiter
+
+
+@pytest.fixture
+def client(tmp_path):
+    db_module.DB_PATH = tmp_path / "runtime.db"
+    db_module.init_db()
+    rate_limiter.clear()
+    with TestClient(create_app()) as test_client:
+        yield test_client
+    rate_limiter.clear()
+
+
+def test_public_health_exposes_only_status(client, tmp_path):
+    """/health доступен без авторизации и не раскрывает внутреннюю статистику и пути."""
+    for url in ("/health", "/api/health", "/api/system/health"):
+        res = client.get(url)
+        assert res.status_code == 200
+        body = res.json()
+        assert set(body) == {"status", "timestamp", "database", "disk", "modules"}
+        assert body["database"] == {"status": "ok"}
+        assert str(tmp_path) not in res.text
+
+
+def test_runtime_stats_require_admin(client, tmp_path):
+    """GET /api/system/runtime отдаёт статистику пулов и кэшей только администратору, без путей к файлам."""
+    assert client.get("/api/system/runtime").status_code == 401
+
+    token = client.post("/api/auth/login", json={"username": "root", "password": "admin"}).json()["token"]
+    res = client.get("/api/system/runtime", headers={"Authorization": f"Bearer {token}"})
+    assert res.status_code == 200, res.text
+    body = res.json()
+    assert body["database"]["pool"]["max_size"] >= 1
+    assert {"writer", "principal_cache", "maintenance"} <= set(body["database"])
+    assert {"password_hasher", "rate_limiter", "shared_state", "event_fanout", "tickets"} <= set(body)
+    assert str(tmp_path) not in res.text
@@ -0,0 +1,65 @@
+"""tests/test_ticket_store.py — тесты хранилища одноразовых билетов с TTL."""
+import threading
+import time
+
+from backend.core.auth import consume_ws_ticket, create_ws_ticket, ws_tickets
+from backend.core.ticket_store import TicketStore
+
+
+def test_expired_tickets_are_purged_without_full_scan():
+    """Истёкшие билеты удаляются по куче сроков и не возвращаются."""
+    store = TicketStore("test", ttl=0.05)
+    short = store.issue("t_", {"n": 1})
+    long = store.issue("t_", {"n": 2}, ttl=60)
+    assert store.get(short) == {"n": 1}
+    time.sleep(0.1)
+    assert store.get(short) is None
+    assert store.consume(long) == {"n": 2}
+    stats = store.get_stats()
+    assert stats["active"] == 0 and stats["expired"] == 1 and stats["consumed"] == 1
+
+
+def test_keys_are_hashed_and_size_is_bounded():
+    """Билеты хранятся под хешем, при переполнении вытесняются ближайшие к истечению."""
+    store = TicketStore("test", ttl=60, max_size=3)
+    tickets = [store.issue("t_", i, ttl=10 + i) for i in range(5)]
+    assert len(store) == 3
+    assert store.get_stats()["evicted"] == 2
+    assert store.get(tickets[0]) is None and store.get(tickets[1]) is None
+    assert store.get(tickets[4]) == 4
+    assert all(isinstance(key, bytes) and len(key) == 32 for key in store._entries)
+
+
+def test_consume_is_atomic():
+    """Из множества параллельных погашений успешно только одно."""
+    store = TicketStore("test", ttl=60)
+    ticket = store.issue("t_", "payload")
+    results = []
+    barrier = threading.Barrier(16)
+
+    def worker():
+        barrier.wait()
+        results.append(store.consume(ticket))
+
+    threads = [threading.Thread(target=worker) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results.count("payload") == 1
+
+
+def test_consumed_tickets_do_not_grow_heap():
+    """Погашенные билеты не накапливаются в куче сроков."""
+    store = TicketStore("test", ttl=60)
+    for _ in range(1000):
+        store.consume(store.issue("t_", None))
+    assert len(store._heap) < 200
+
+
+def test_ws_ticket_single_use():
+    """WebSocket-билет гасится один раз и содержит данные сессии."""
+    ticket = create_ws_ticket("usr-root-01", jti="jti-1")
+    assert ws_tickets.get(ticket)["jti"] == "jti-1"
+    assert consume_ws_ticket(ticket)["user_id"] == "usr-root-01"
+    assert consume_ws_ticket(ticket) is None